@@ -0,0 +1,3 @@
+"""
+Módulo de análises de frequência para o sistema de monitoramento de academia.
+"""
@@ -0,0 +1,137 @@
+# app/analytics/bitmap.py
+from datetime import date, datetime, timedelta
+import numpy as np
+
+# Dias cobertos pelo bitmap de cada aluno (128 bytes); dias mais antigos são descartados
+BITMAP_MAX_DAYS = 1024
+
+# Janela padrão das estatísticas de presença
+DEFAULT_WINDOW_DAYS = 90
+
+DIAS_SEMANA = ['seg', 'ter', 'qua', 'qui', 'sex', 'sab', 'dom']
+
+
+def _as_date(dia) -> date:
+    return dia.date() if isinstance(dia, datetime) else dia
+
+
+def unpack(bitmap: bytes) -> np.ndarray:
+    """Bits do bitmap como array booleano (bit i = dia inicio + i)"""
+    if not bitmap:
+        return np.zeros(0, dtype=bool)
+    return np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), bitorder='little').astype(bool)
+
+
+def pack(bits: np.ndarray) -> bytes:
+    return np.packbits(bits.astype(np.uint8), bitorder='little').tobytes()
+
+
+def mark_day(bitmap: bytes, inicio, dia) -> tuple:
+    """Marcar presença em um dia; retorna (bitmap, inicio) atualizados
+
+    O custo é limitado por BITMAP_MAX_DAYS: ao passar do limite, os dias mais
+    antigos saem do bitmap e o início avança.
+    """
+    dia = _as_date(dia)
+    if not bitmap or inicio is None:
+        return pack(np.ones(1, dtype=bool)), dia
+
+    inicio = _as_date(inicio)
+    bits = unpack(bitmap)
+    offset = (dia - inicio).days
+
+    if offset < 0:
+        presentes = np.flatnonzero(bits)
+        ultimo = presentes[-1] if len(presentes) else 0
+        if ultimo - offset >= BITMAP_MAX_DAYS:
+            # Mais antigo que a janela mantida
+            return bitmap, inicio
+        bits = np.concatenate([np.zeros(-offset, dtype=bool), bits[:ultimo + 1]])
+        inicio, offset = dia, 0
+    elif offset >= BITMAP_MAX_DAYS:
+        descartar = offset - BITMAP_MAX_DAYS + 1
+        bits = bits[descartar:]
+        inicio += timedelta(days=descartar)
+        offset -= descartar
+
+    if offset >= len(bits):
+        bits = np.concatenate([bits, np.zeros(offset - len(bits) + 1, dtype=bool)])
+    bits[offset] = True
+    return pack(bits), inicio
+
+
+def from_days(dias, fim) -> tuple:
+    """Montar (bitmap, inicio) a partir de datas de presença, até fim"""
+    fim = _as_date(fim)
+    ordinais = np.unique([_as_date(d).toordinal() for d in dias])
+    ordinais = ordinais[(ordinais > fim.toordinal() - BITMAP_MAX_DAYS) & (ordinais <= fim.toordinal())]
+    if len(ordinais) == 0:
+        return None, None
+
+    bits = np.zeros(ordinais[-1] - ordinais[0] + 1, dtype=bool)
+    bits[ordinais - ordinais[0]] = True
+    return pack(bits), date.fromordinal(int(ordinais[0]))
+
+
+def window(bitmap: bytes, inicio, fim, n_dias: int) -> np.ndarray:
+    """Presença nos n_dias terminando em fim (inclusive), com zeros fora do bitmap"""
+    fim = _as_date(fim)
+    saida = np.zeros(n_dias, dtype=bool)
+    if not bitmap or inicio is None:
+        return saida
+
+    bits = unpack(bitmap)
+    primeiro = (fim - _as_date(inicio)).days - n_dias + 1  # índice no bitmap de saida[0]
+    origem = slice(max(0, primeiro), min(len(bits), primeiro + n_dias))
+    if origem.start < origem.stop:
+        saida[origem.start - primeiro:origem.stop - primeiro] = bits[origem]
+    return saida
+
+
+def runs(bits: np.ndarray) -> tuple:
+    """Codificação run-length: (inícios, tamanhos, valores)"""
+    if len(bits) == 0:
+        vazio = np.zeros(0, dtype=np.int64)
+        return vazio, vazio, np.zeros(0, dtype=bool)
+    inicios = np.concatenate([[0], np.flatnonzero(bits[1:] != bits[:-1]) + 1])
+    tamanhos = np.diff(np.concatenate([inicios, [len(bits)]]))
+    return inicios, tamanhos, bits[inicios]
+
+
+def longest_run(bits: np.ndarray, valor: bool) -> int:
+    _, tamanhos, valores = runs(bits)
+    selecionados = tamanhos[valores == valor]
+    return int(selecionados.max()) if len(selecionados) else 0
+
+
+def current_streak(bits: np.ndarray) -> int:
+    """Dias seguidos com presença terminando no último dia (ou no anterior, se ainda não veio hoje)"""
+    if len(bits) == 0:
+        return 0
+    if not bits[-1]:
+        bits = bits[:-1]
+    if len(bits) == 0 or not bits[-1]:
+        return 0
+    _, tamanhos, _ = runs(bits)
+    return int(tamanhos[-1])
+
+
+def weekday_counts(bits: np.ndarray, fim) -> np.ndarray:
+    """Dias com presença por dia da semana (segunda a domingo) na janela que termina em fim"""
+    fim = _as_date(fim)
+    dias_semana = (np.arange(len(bits)) - (len(bits) - 1) + fim.weekday()) % 7
+    return np.bincount(dias_semana[bits], minlength=7)
+
+
+def attendance_summary(bitmap: bytes, inicio, hoje, n_dias: int = DEFAULT_WINDOW_DAYS) -> dict:
+    """Estatísticas de presença com custo constante por aluno"""
+    bits = window(bitmap, inicio, hoje, n_dias)
+    return {
+        'dias_presentes_7': int(np.count_nonzero(bits[-7:])),
+        'dias_presentes_30': int(np.count_nonzero(bits[-30:])),
+        f'dias_presentes_{n_dias}': int(np.count_nonzero(bits)),
+        'sequencia_atual_dias': current_streak(bits),
+        'maior_sequencia_dias': longest_run(bits, True),
+        'maior_intervalo_dias': longest_run(bits, False),
+        'presencas_por_dia_semana': dict(zip(DIAS_SEMANA, weekday_counts(bits, hoje).tolist())),
+    }
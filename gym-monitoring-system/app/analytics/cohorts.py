@@ -0,0 +1,76 @@
+# app/analytics/cohorts.py
+import numpy as np
+
+MICROS_DIA = 24 * 3600 * 1_000_000
+
+# Dias sem checkin para considerar desistência (mesma definição do treino do modelo)
+INACTIVITY_DAYS = 90
+
+# Um "mês" das curvas de sobrevivência
+DIAS_MES = 30
+
+
+def month_index(epoch_us: np.ndarray) -> np.ndarray:
+    """Meses desde janeiro de 1970"""
+    return np.asarray(epoch_us, dtype='datetime64[us]').astype('datetime64[M]').astype(np.int64)
+
+
+def lifetimes(matricula_us: np.ndarray, ultimo_us: np.ndarray, ativo: np.ndarray, as_of_us: int,
+              inatividade_dias: int = INACTIVITY_DAYS) -> tuple:
+    """(dias de vida, meses de vida, evento) de cada aluno em as_of
+
+    Evento (desistência) = aluno inativo ou mais de inatividade_dias sem checkin; a vida
+    termina no último checkin (na matrícula, sem checkins). Sem evento, a observação é
+    censurada em as_of.
+    """
+    ultimo = np.maximum(ultimo_us, matricula_us)
+    evento = ~ativo | (as_of_us - ultimo > inatividade_dias * MICROS_DIA)
+    fim = np.where(evento, ultimo, as_of_us - 1)
+    dias = np.maximum(0, (fim - matricula_us) // MICROS_DIA)
+    meses = np.maximum(0, month_index(fim) - month_index(matricula_us))
+    return dias, meses, evento
+
+
+def retention_matrix(linhas: np.ndarray, vida_meses: np.ndarray, idade_meses: np.ndarray,
+                     meses: int) -> tuple:
+    """(retenção, tamanho): fração de cada linha ainda ativa k meses após a matrícula
+
+    linhas indexa a coorte (0..n-1) de cada aluno e idade_meses é a idade de cada coorte;
+    células ainda não observáveis (k > idade) ficam NaN.
+    """
+    n = len(idade_meses)
+    vida = np.minimum(vida_meses, meses)
+    histograma = np.bincount(linhas * (meses + 1) + vida, minlength=n * (meses + 1)).reshape(n, meses + 1)
+    retidos = histograma[:, ::-1].cumsum(axis=1)[:, ::-1]
+    tamanho = retidos[:, 0]
+    retencao = retidos / np.maximum(tamanho, 1)[:, None]
+    observavel = np.arange(meses + 1)[None, :] <= np.asarray(idade_meses)[:, None]
+    return np.where(observavel, retencao, np.nan), tamanho
+
+
+def kaplan_meier(grupos: np.ndarray, dias: np.ndarray, eventos: np.ndarray, n_grupos: int,
+                 pontos: np.ndarray) -> tuple:
+    """Estimador de Kaplan-Meier por grupo
+
+    Retorna (S nos dias de pontos, mediana em dias ou -1 se não atingida até o último
+    ponto). S fica NaN depois da maior duração observada no grupo.
+    """
+    limite = int(pontos.max()) + 1
+    # Durações além do último ponto só contam como "em risco"
+    eventos = eventos & (dias < limite)
+    dias = np.minimum(dias, limite)
+    largura = limite + 1
+
+    total = np.bincount(grupos * largura + dias, minlength=n_grupos * largura).reshape(n_grupos, largura)
+    mortes = np.bincount(grupos[eventos] * largura + dias[eventos],
+                         minlength=n_grupos * largura).reshape(n_grupos, largura)
+    em_risco = total[:, ::-1].cumsum(axis=1)[:, ::-1]
+    risco = np.divide(mortes, em_risco, out=np.zeros(mortes.shape), where=em_risco > 0)
+    sobrevivencia = np.cumprod(1 - risco, axis=1)
+
+    maior = np.where(total > 0, np.arange(largura)[None, :], -1).max(axis=1)
+    curva = np.where(pontos[None, :] <= maior[:, None], sobrevivencia[:, pontos], np.nan)
+
+    abaixo = sobrevivencia[:, :limite] <= 0.5
+    mediana = np.where(abaixo.any(axis=1), abaixo.argmax(axis=1), -1)
+    return curva, mediana
@@ -0,0 +1,308 @@
+# app/analytics/columnar.py
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.database import Aluno, Checkin
+
+EPOCH = datetime(1970, 1, 1)
+MICROS_HORA = 3600 * 1_000_000
+MICROS_DIA = 24 * MICROS_HORA
+
+# Linhas por partição na carga em massa
+LOAD_CHUNK_SIZE = 50_000
+
+# Ids abaixo do maior já carregado relidos a cada atualização (transações que
+# fizeram commit fora de ordem e saídas registradas depois da carga)
+REFRESH_ID_LOOKBACK = 10_000
+
+# Checkins sem saída mais antigos que isso não são mais acompanhados
+OPEN_CHECKIN_HOURS = 24
+
+INTERVALOS = ('hora', 'dia', 'semana')
+
+COLUNAS = ('id', 'aluno_id', 'entrada', 'duracao', 'plano_id')
+
+
+def to_epoch_us(momento: datetime) -> int:
+    return (momento - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_us(valor) -> datetime:
+    return EPOCH + timedelta(microseconds=int(valor))
+
+
+def _vazio() -> dict:
+    return _indexar({
+        'id': np.zeros(0, dtype=np.int64),
+        'aluno_id': np.zeros(0, dtype=np.int32),
+        'entrada': np.zeros(0, dtype=np.int64),
+        'duracao': np.zeros(0, dtype=np.float32),
+        'plano_id': np.zeros(0, dtype=np.int32),
+    })
+
+
+def _colunas(ids, aluno_ids, entradas, duracoes, planos) -> dict:
+    """Converter listas de valores do banco em colunas tipadas (None -> NaN / -1)"""
+    return {
+        'id': np.asarray(ids, dtype=np.int64),
+        'aluno_id': np.asarray(aluno_ids, dtype=np.int32),
+        'entrada': np.asarray(entradas, dtype='datetime64[us]').astype(np.int64),
+        'duracao': np.asarray(duracoes, dtype=np.float32),
+        'plano_id': np.nan_to_num(np.asarray(planos, dtype=np.float64), nan=-1).astype(np.int32),
+    }
+
+
+def _ordenar(dados: dict) -> dict:
+    ordem = np.lexsort((dados['entrada'], dados['aluno_id']))
+    return {nome: dados[nome][ordem] for nome in COLUNAS}
+
+
+def _indexar(dados: dict) -> dict:
+    """Acrescentar alunos distintos e offsets (checkins do aluno i em offsets[i]:offsets[i+1])"""
+    aluno_ids = dados['aluno_id']
+    inicios = np.flatnonzero(np.diff(aluno_ids)) + 1
+    if len(aluno_ids):
+        inicios = np.concatenate([[0], inicios])
+    dados['alunos'] = aluno_ids[inicios]
+    dados['offsets'] = np.concatenate([inicios, [len(aluno_ids)]]).astype(np.int64)
+    return dados
+
+
+class ColumnarCheckinStore:
+    """Checkins em colunas NumPy ordenadas por aluno e entrada, para análises agregadas
+
+    As colunas são substituídas de uma vez a cada carga/atualização; leitores usam o
+    conjunto de arrays vigente sem bloqueio. Checkins novos (append) entram em uma fila
+    sem lock, chamada também do event loop, e são mesclados na próxima atualização.
+    """
+
+    def __init__(self, refresh_seconds: float = 30.0, id_lookback: int = REFRESH_ID_LOOKBACK):
+        self.refresh_seconds = refresh_seconds
+        self.id_lookback = id_lookback
+        self._dados = _vazio()
+        self._carregado = False
+        self._atualizado_em = 0.0
+        self._lock = threading.Lock()
+        # (id, aluno_id, entrada, duracao) acrescentados desde a última mesclagem
+        self._pendentes = deque()
+
+    @classmethod
+    def from_env(cls) -> "ColumnarCheckinStore":
+        return cls(refresh_seconds=float(os.getenv("ANALYTICS_REFRESH_SECONDS", "30")))
+
+    def __len__(self) -> int:
+        return len(self._dados['id'])
+
+    @property
+    def loaded(self) -> bool:
+        return self._carregado
+
+    def columns(self) -> dict:
+        """Arrays vigentes: id, aluno_id, entrada (µs desde 1970), duracao, plano_id, alunos, offsets"""
+        return self._dados
+
+    def load(self, db: Session):
+        """Carga completa em massa a partir do banco"""
+        with self._lock:
+            partes = [_colunas(*zip(*linhas)) for linhas in self._consultar(db)]
+            if partes:
+                dados = {nome: np.concatenate([p[nome] for p in partes]) for nome in COLUNAS}
+                self._dados = _indexar(_ordenar(dados))
+            else:
+                self._dados = _vazio()
+            self._carregado = True
+            self._mesclar_pendentes(db)
+            self._atualizado_em = time.monotonic()
+
+    def refresh(self, db: Session):
+        """Trazer checkins novos e saídas recentes (carga completa na primeira vez)"""
+        if not self._carregado:
+            return self.load(db)
+
+        with self._lock:
+            # Antes das linhas do banco, que prevalecem (ex.: saída registrada depois)
+            self._mesclar_pendentes(db)
+            dados = self._dados
+            limite = self._menor_id_pendente(dados)
+            novas = [_colunas(*zip(*linhas)) for linhas in self._consultar(db, Checkin.id >= limite)]
+            if novas:
+                self._mesclar({nome: np.concatenate([p[nome] for p in novas]) for nome in COLUNAS})
+            self._atualizado_em = time.monotonic()
+
+    def refresh_if_stale(self, db: Session):
+        # Outra requisição já está atualizando: responder com as colunas atuais
+        if self._carregado and self._lock.locked():
+            return
+        if not self._carregado or time.monotonic() - self._atualizado_em >= self.refresh_seconds:
+            self.refresh(db)
+        elif self._pendentes:
+            with self._lock:
+                self._mesclar_pendentes(db)
+
+    def append(self, checkins: list):
+        """Enfileirar checkins recém-criados, sem lock nem consulta (ignorado antes da carga)
+
+        Só lê colunas do próprio checkin: o plano do aluno é buscado para todos os
+        pendentes em uma consulta, na mesclagem.
+        """
+        if not self._carregado:
+            return
+        self._pendentes.extend((c.id, c.aluno_id, c.data_entrada, c.duracao_minutos) for c in checkins)
+
+    def _mesclar_pendentes(self, db: Session):
+        """Mesclar a fila de append (com o lock)"""
+        linhas = []
+        while self._pendentes:
+            linhas.append(self._pendentes.popleft())
+        if not linhas:
+            return
+        ids, aluno_ids, entradas, duracoes = zip(*linhas)
+        planos = dict(db.execute(
+            select(Aluno.id, Aluno.plano_id).where(Aluno.id.in_(set(aluno_ids)))
+        ).all())
+        self._mesclar(_colunas(ids, aluno_ids, entradas, duracoes, [planos.get(a) for a in aluno_ids]))
+
+    def _consultar(self, db: Session, *filtros):
+        consulta = select(
+            Checkin.id, Checkin.aluno_id, Checkin.data_entrada, Checkin.duracao_minutos, Aluno.plano_id
+        ).join(Aluno, Aluno.id == Checkin.aluno_id).where(Checkin.data_entrada.isnot(None), *filtros)
+        return db.execute(consulta.execution_options(yield_per=LOAD_CHUNK_SIZE)).partitions()
+
+    def _menor_id_pendente(self, dados: dict) -> int:
+        """Menor id a reler: janela de ids recentes e checkins ainda sem saída"""
+        if len(dados['id']) == 0:
+            return 0
+        limite = int(dados['id'].max()) - self.id_lookback
+        recentes = dados['entrada'] >= to_epoch_us(datetime.utcnow()) - OPEN_CHECKIN_HOURS * MICROS_HORA
+        abertos = dados['id'][recentes & np.isnan(dados['duracao'])]
+        return min(limite, int(abertos.min())) if len(abertos) else limite
+
+    def _mesclar(self, novos: dict):
+        """Atualizar linhas já presentes e inserir as novas mantendo a ordenação"""
+        dados = {nome: self._dados[nome] for nome in COLUNAS}
+        novos = _ordenar(novos)
+        _, unicos = np.unique(novos['id'], return_index=True)
+        novos = {nome: novos[nome][np.sort(unicos)] for nome in COLUNAS}
+
+        # Linhas já carregadas: só a duração muda (saída registrada)
+        candidatos = np.flatnonzero(dados['id'] >= novos['id'].min())
+        ordem = np.argsort(dados['id'][candidatos])
+        ids_candidatos = dados['id'][candidatos][ordem]
+        posicao = np.searchsorted(ids_candidatos, novos['id'])
+        existe = posicao < len(ids_candidatos)
+        existe[existe] = ids_candidatos[posicao[existe]] == novos['id'][existe]
+        if existe.any():
+            dados['duracao'] = dados['duracao'].copy()
+            dados['duracao'][candidatos[ordem[posicao[existe]]]] = novos['duracao'][existe]
+        novos = {nome: novos[nome][~existe] for nome in COLUNAS}
+
+        if len(novos['id']):
+            # Caso comum: o checkin novo é o mais recente do aluno -> fim do segmento
+            alunos, offsets = self._dados['alunos'], self._dados['offsets']
+            indice = np.searchsorted(alunos, novos['aluno_id'])
+            conhecido = indice < len(alunos)
+            conhecido[conhecido] = alunos[indice[conhecido]] == novos['aluno_id'][conhecido]
+            fim = offsets[indice + conhecido.astype(np.int64)]
+            ultimo = np.full(len(fim), np.iinfo(np.int64).min)
+            ultimo[conhecido] = dados['entrada'][fim[conhecido] - 1]
+            if np.all(novos['entrada'] >= ultimo):
+                dados = {nome: np.insert(dados[nome], fim, novos[nome]) for nome in COLUNAS}
+            else:
+                dados = _ordenar({nome: np.concatenate([dados[nome], novos[nome]]) for nome in COLUNAS})
+
+        self._dados = _indexar(dados)
+
+    # Consultas vetorizadas
+
+    def _janela(self, dados: dict, inicio: datetime = None, fim: datetime = None) -> np.ndarray:
+        """Máscara de checkins com inicio <= entrada < fim"""
+        mascara = np.ones(len(dados['entrada']), dtype=bool)
+        if inicio is not None:
+            mascara &= dados['entrada'] >= to_epoch_us(inicio)
+        if fim is not None:
+            mascara &= dados['entrada'] < to_epoch_us(fim)
+        return mascara
+
+    def checkins_per_student(self, inicio: datetime = None, fim: datetime = None) -> tuple:
+        """(alunos, contagens) de checkins na janela, para todos os alunos com histórico"""
+        dados = self._dados
+        if len(dados['alunos']) == 0:
+            return dados['alunos'], np.zeros(0, dtype=np.int64)
+        mascara = self._janela(dados, inicio, fim)
+        return dados['alunos'], np.add.reduceat(mascara.astype(np.int64), dados['offsets'][:-1])
+
+    def last_checkin_per_student(self, fim: datetime = None) -> tuple:
+        """(alunos, último checkin antes de fim em µs desde 1970), só alunos com algum checkin"""
+        dados = self._dados
+        if fim is None:
+            return dados['alunos'], dados['entrada'][dados['offsets'][1:] - 1]
+
+        mascara = self._janela(dados, None, fim)
+        indice = np.repeat(np.arange(len(dados['alunos'])), np.diff(dados['offsets']))[mascara]
+        ultimos = np.flatnonzero(np.diff(indice, append=-1) != 0)
+        return dados['alunos'][indice[ultimos]], dados['entrada'][mascara][ultimos]
+
+    def hourly_heatmap(self, inicio: datetime = None, fim: datetime = None) -> np.ndarray:
+        """Matriz 7 x 24 de checkins por dia da semana (segunda = 0) e hora de entrada"""
+        dados = self._dados
+        entradas = dados['entrada'][self._janela(dados, inicio, fim)]
+        dia = entradas // MICROS_DIA
+        hora = (entradas % MICROS_DIA) // MICROS_HORA
+        dia_semana = (dia + 3) % 7  # 01/01/1970 foi uma quinta-feira
+        return np.bincount(dia_semana * 24 + hora, minlength=7 * 24).reshape(7, 24)
+
+    def by_plan(self, inicio: datetime = None, fim: datetime = None) -> dict:
+        """Por plano: checkins, alunos distintos e duração média das visitas com saída"""
+        dados = self._dados
+        mascara = self._janela(dados, inicio, fim)
+        planos, indice, checkins = np.unique(dados['plano_id'][mascara], return_inverse=True, return_counts=True)
+
+        pares = np.unique(indice.astype(np.int64) << 32 | dados['aluno_id'][mascara].astype(np.int64))
+        alunos = np.bincount(pares >> 32, minlength=len(planos))
+
+        duracao = dados['duracao'][mascara].astype(np.float64)
+        com_duracao = ~np.isnan(duracao)
+        soma = np.bincount(indice[com_duracao], weights=duracao[com_duracao], minlength=len(planos))
+        visitas = np.bincount(indice[com_duracao], minlength=len(planos))
+
+        return {
+            int(plano): {
+                'checkins': int(checkins[i]),
+                'alunos': int(alunos[i]),
+                'duracao_media_minutos': float(soma[i] / visitas[i]) if visitas[i] else None,
+            }
+            for i, plano in enumerate(planos)
+        }
+
+    def time_series(self, inicio: datetime, fim: datetime, intervalo: str = 'dia') -> tuple:
+        """(inícios dos intervalos, checkins, alunos distintos), com intervalos vazios incluídos"""
+        if intervalo not in INTERVALOS:
+            raise ValueError(f"Intervalo deve ser um de {', '.join(INTERVALOS)}")
+
+        dados = self._dados
+        mascara = self._janela(dados, inicio, fim)
+        entradas = dados['entrada'][mascara]
+
+        if intervalo == 'hora':
+            largura, deslocamento = MICROS_HORA, 0
+        elif intervalo == 'dia':
+            largura, deslocamento = MICROS_DIA, 0
+        else:
+            # Semanas começando na segunda-feira (05/01/1970)
+            largura, deslocamento = 7 * MICROS_DIA, 4 * MICROS_DIA
+
+        primeiro = (to_epoch_us(inicio) - deslocamento) // largura
+        ultimo = (to_epoch_us(fim) - 1 - deslocamento) // largura
+        n = max(0, ultimo - primeiro + 1)
+        balde = (entradas - deslocamento) // largura - primeiro
+
+        checkins = np.bincount(balde, minlength=n)
+        pares = np.unique(balde << 32 | dados['aluno_id'][mascara].astype(np.int64))
+        alunos = np.bincount(pares >> 32, minlength=n)
+        inicios = [from_epoch_us((primeiro + i) * largura + deslocamento) for i in range(n)]
+        return inicios, checkins, alunos
@@ -0,0 +1,207 @@
+# app/api/ingestao_catraca.py
+import asyncio
+import json
+import logging
+import os
+from typing import Callable
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+from app.api.schemas import EventoCheckin
+from app.services.checkin_service import CheckinService
+
+logger = logging.getLogger(__name__)
+
+# Eventos enviados e ainda sem ack que uma catraca pode ter (controle de fluxo)
+INGEST_WINDOW = 256
+
+# Eventos por lote e espera máxima para completar um lote
+INGEST_MAX_BATCH = 64
+INGEST_BATCH_WINDOW_MS = 10.0
+
+# Código de fechamento quando a catraca ultrapassa a janela
+WS_POLICY_VIOLATION = 1008
+
+
+class GatewayCatraca:
+    """Conexão persistente de uma catraca: eventos em fluxo, ack em lotes
+
+    Protocolo (mensagens JSON em texto):
+      servidor -> {"tipo": "pronto", "janela": N, "lote_max": M} ao conectar
+      catraca  -> {"seq": 1, "tipo": "entrada" | "saida", "aluno_id": 5, "chave_idempotencia": "..."}
+                  ou uma lista desses eventos na mesma mensagem
+      servidor -> {"tipo": "ack", "ate": 17, "janela": N, "resultados": [{"seq": 1, "status": ..., ...}]}
+
+    A catraca pode ter no máximo `janela` eventos sem ack; quem ultrapassa é
+    desconectado (1008). Os eventos passam por CheckinService.registrar_eventos,
+    com as mesmas validações e a mesma idempotência de /aluno/checkins/lote; sem
+    chave no evento, a chave é "<dispositivo>:<sessao>:<seq>", e o reenvio após
+    uma reconexão na mesma sessão devolve o resultado original. A sessão é um id
+    gerado pela catraca a cada boot: depois de reiniciar, seq volta a 1 em uma
+    sessão nova e os eventos não colidem com as chaves já gravadas.
+
+    Cada lote abre e fecha a própria sessão do banco: uma catraca conectada e
+    ociosa não segura uma conexão do pool.
+    """
+
+    def __init__(self, websocket: WebSocket, session_factory: Callable[[], Session] = None, dispositivo: str = None,
+                 sessao: str = None, cache=None, janela: int = INGEST_WINDOW, lote_max: int = INGEST_MAX_BATCH,
+                 janela_lote_ms: float = INGEST_BATCH_WINDOW_MS, ao_processar: Callable[[list], None] = None):
+        if session_factory is None:
+            from app.models.database import SessionLocal
+            session_factory = SessionLocal
+        self.websocket = websocket
+        self.session_factory = session_factory
+        self.dispositivo = dispositivo
+        self.sessao = sessao
+        self.cache = cache
+        self.janela = janela
+        self.lote_max = lote_max
+        self.janela_lote = janela_lote_ms / 1000
+        # Chamado com os checkins criados em cada lote (fora do event loop)
+        self.ao_processar = ao_processar
+
+        self._fila = asyncio.Queue()
+        self._em_voo = 0
+
+        # Métricas da conexão
+        self.eventos = 0
+        self.lotes = 0
+
+    @classmethod
+    def from_env(cls, websocket: WebSocket, session_factory: Callable[[], Session] = None,
+                 **kwargs) -> "GatewayCatraca":
+        return cls(
+            websocket, session_factory,
+            janela=int(os.getenv("INGEST_WINDOW", str(INGEST_WINDOW))),
+            lote_max=int(os.getenv("INGEST_MAX_BATCH", str(INGEST_MAX_BATCH))),
+            janela_lote_ms=float(os.getenv("INGEST_BATCH_WINDOW_MS", str(INGEST_BATCH_WINDOW_MS))),
+            **kwargs,
+        )
+
+    async def executar(self):
+        """Atender a conexão (já aceita) até a catraca desconectar"""
+        await self.websocket.send_json({"tipo": "pronto", "janela": self.janela, "lote_max": self.lote_max})
+        processador = asyncio.create_task(self._processar())
+        try:
+            await self._ler()
+        finally:
+            # Eventos já recebidos são gravados mesmo sem quem receba o ack
+            self._fila.put_nowait(None)
+            await processador
+        logger.info(f"Catraca {self.dispositivo or '-'} desconectada: {self.eventos} eventos em {self.lotes} lotes")
+
+    async def _ler(self):
+        while True:
+            try:
+                mensagem = await self.websocket.receive_text()
+            except WebSocketDisconnect:
+                return
+            try:
+                dados = json.loads(mensagem)
+            except json.JSONDecodeError as e:
+                await self._enviar({"tipo": "erro", "erro": f"JSON inválido: {e.msg}"})
+                continue
+            eventos = dados if isinstance(dados, list) else [dados]
+            if self._em_voo + len(eventos) > self.janela:
+                await self.websocket.close(code=WS_POLICY_VIOLATION, reason="Janela de eventos excedida")
+                return
+            self._em_voo += len(eventos)
+            for evento in eventos:
+                self._fila.put_nowait(evento)
+
+    async def _processar(self):
+        loop = asyncio.get_running_loop()
+        fim = False
+        while not fim:
+            primeiro = await self._fila.get()
+            if primeiro is None:
+                return
+            lote = [primeiro]
+            prazo = loop.time() + self.janela_lote
+            while len(lote) < self.lote_max:
+                try:
+                    evento = self._fila.get_nowait()
+                except asyncio.QueueEmpty:
+                    restante = prazo - loop.time()
+                    if restante <= 0:
+                        break
+                    try:
+                        evento = await asyncio.wait_for(self._fila.get(), restante)
+                    except asyncio.TimeoutError:
+                        break
+                if evento is None:
+                    fim = True
+                    break
+                lote.append(evento)
+
+            resultados = await asyncio.to_thread(self._registrar, lote)
+            self._em_voo -= len(lote)
+            self.eventos += len(lote)
+            self.lotes += 1
+            await self._enviar({
+                "tipo": "ack",
+                "ate": max((r['seq'] for r in resultados if isinstance(r['seq'], int)), default=None),
+                "janela": self.janela - self._em_voo,
+                "resultados": resultados,
+            })
+
+    def _registrar(self, lote: list) -> list:
+        """Validar e gravar um lote; um resultado por evento, na ordem recebida"""
+        resultados = [None] * len(lote)
+        validos = []
+        for posicao, dados in enumerate(lote):
+            seq = dados.get('seq') if isinstance(dados, dict) else None
+            try:
+                if not isinstance(dados, dict):
+                    raise ValueError("Evento deve ser um objeto JSON")
+                if not isinstance(seq, int):
+                    raise ValueError("seq obrigatório (inteiro)")
+                evento = EventoCheckin(**{k: v for k, v in dados.items() if k != 'seq'})
+            except ValidationError as e:
+                erros = "; ".join(f"{'.'.join(map(str, erro['loc']))}: {erro['msg']}" for erro in e.errors())
+                resultados[posicao] = {'seq': seq, 'status': 'erro', 'erro': erros}
+                continue
+            except ValueError as e:
+                resultados[posicao] = {'seq': seq, 'status': 'erro', 'erro': str(e)}
+                continue
+            if not evento.chave_idempotencia and self.dispositivo and self.sessao:
+                evento.chave_idempotencia = f"{self.dispositivo}:{self.sessao}:{seq}"
+            validos.append((posicao, seq, evento))
+
+        if validos:
+            db = self.session_factory()
+            # Os checkins criados seguem em uso (ao_processar) depois de fechar a sessão
+            db.expire_on_commit = False
+            try:
+                gravados, criados = CheckinService(db).registrar_eventos([e for _, _, e in validos], self.cache)
+            except Exception as e:
+                # Banco indisponível: o lote volta com erro e a catraca reenvia com as mesmas chaves
+                logger.error(f"Erro ao gravar eventos da catraca {self.dispositivo or '-'}: {e}")
+                db.rollback()
+                gravados = [{'status': 'erro', 'erro': "Erro ao gravar o evento, reenviar"}] * len(validos)
+                criados = []
+            finally:
+                # Devolve a conexão ao pool antes do ack
+                db.close()
+            for (posicao, seq, _), resultado in zip(validos, gravados):
+                if resultado['status'] == 'erro':
+                    resultados[posicao] = {'seq': seq, 'status': 'erro', 'erro': resultado['erro']}
+                else:
+                    resultados[posicao] = {'seq': seq, 'status': resultado['status'],
+                                           'checkin_id': resultado['checkin']['id']}
+            if criados and self.ao_processar is not None:
+                try:
+                    self.ao_processar(criados)
+                except Exception as e:
+                    logger.error(f"Erro ao processar checkins da catraca {self.dispositivo or '-'}: {e}")
+        return resultados
+
+    async def _enviar(self, mensagem: dict):
+        if self.websocket.client_state != WebSocketState.CONNECTED:
+            return
+        try:
+            await self.websocket.send_json(mensagem)
+        except (WebSocketDisconnect, RuntimeError):
+            # Catraca desconectou: o reenvio com as mesmas chaves devolve o resultado original
+            pass
@@ -1,7 +1,7 @@
 # app/api/schemas.py
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from datetime import datetime, date
+from typing import Optional, List, Dict, Literal
 
 # Schemas para Plano
 class PlanoBase(BaseModel):
@@ -16,8 +16,7 @@ class PlanoResponse(PlanoBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Schemas para Aluno
 class AlunoBase(BaseModel):
@@ -38,15 +37,22 @@ class AlunoResponse(AlunoBase):
     updated_at: datetime
     plano: Optional[PlanoResponse] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Schemas para Checkin
 class CheckinBase(BaseModel):
     aluno_id: int
 
 class CheckinCreate(CheckinBase):
-    pass
+    # Chave de idempotência do evento (ou header Idempotency-Key): repetições devolvem o original
+    chave_idempotencia: Optional[str] = Field(None, max_length=128)
+
+class CheckoutCreate(CheckinBase):
+    chave_idempotencia: Optional[str] = Field(None, max_length=128)
+
+class EventoCheckin(CheckinBase):
+    tipo: Literal['entrada', 'saida']
+    chave_idempotencia: Optional[str] = Field(None, max_length=128)
 
 class CheckinResponse(CheckinBase):
     id: int
@@ -55,8 +61,19 @@ class CheckinResponse(CheckinBase):
     duracao_minutos: Optional[int] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class CheckinAceito(CheckinBase):
+    """Checkin aceito no journal (CHECKIN_WRITE_BEHIND=1), ainda não gravado no banco"""
+    data_entrada: datetime
+    chave_idempotencia: str
+    status: Literal['pendente'] = 'pendente'
+
+class ResultadoEventoCheckin(BaseModel):
+    indice: int
+    status: Literal['criado', 'repetido', 'erro']
+    checkin: Optional[CheckinResponse] = None
+    erro: Optional[str] = None
 
 # Schemas para Frequência
 class FrequenciaResponse(BaseModel):
@@ -67,6 +84,14 @@ class FrequenciaResponse(BaseModel):
     media_checkins_semana: float
     ultimo_checkin: Optional[datetime] = None
     media_duracao_minutos: Optional[float] = None
+    # Presença diária (dias distintos com checkin), a partir do bitmap do aluno
+    dias_presentes_7: Optional[int] = None
+    dias_presentes_30: Optional[int] = None
+    dias_presentes_90: Optional[int] = None
+    sequencia_atual_dias: Optional[int] = None
+    maior_sequencia_dias: Optional[int] = None
+    maior_intervalo_dias: Optional[int] = None
+    presencas_por_dia_semana: Optional[Dict[str, int]] = None
     checkins: List[CheckinResponse] = []
 
 # Schemas para Previsão de Churn
@@ -87,6 +112,59 @@ class RelatorioFrequenciaResponse(BaseModel):
     alunos_risco_medio: int
     alunos_risco_baixo: int
 
+class MapaHorariosResponse(BaseModel):
+    inicio: datetime
+    fim: datetime
+    dias_semana: List[str]
+    checkins: List[List[int]]  # 7 x 24: dia da semana x hora de entrada
+    dia_pico: str
+    hora_pico: int
+
+class FrequenciaPlanoItem(BaseModel):
+    plano_id: Optional[int] = None
+    plano_nome: Optional[str] = None
+    checkins: int
+    alunos: int
+    checkins_por_aluno: float
+    duracao_media_minutos: Optional[float] = None
+
+class FrequenciaPorPlanoResponse(BaseModel):
+    inicio: datetime
+    fim: datetime
+    planos: List[FrequenciaPlanoItem]
+
+class SerieCheckinsItem(BaseModel):
+    inicio: datetime
+    checkins: int
+    alunos: int
+
+class SerieCheckinsResponse(BaseModel):
+    intervalo: str  # "hora", "dia", "semana"
+    inicio: datetime
+    fim: datetime
+    pontos: List[SerieCheckinsItem]
+
+class CoorteRetencaoItem(BaseModel):
+    coorte: str  # "AAAA-MM", mês de matrícula
+    plano_id: Optional[int] = None
+    alunos: int
+    retencao: List[Optional[float]]  # meses 0..N após a matrícula; None se ainda não observável
+
+class CurvaSobrevivenciaItem(BaseModel):
+    plano_id: Optional[int] = None
+    alunos: int
+    desistencias: int
+    sobrevivencia: List[Optional[float]]  # Kaplan-Meier a cada 30 dias
+    mediana_dias: Optional[int] = None
+
+class RetencaoCoortesResponse(BaseModel):
+    data_referencia: date
+    meses: int
+    inatividade_dias: int
+    por_plano: bool
+    coortes: List[CoorteRetencaoItem]
+    sobrevivencia: List[CurvaSobrevivenciaItem]
+
 # Schemas para Autenticação
 class Token(BaseModel):
     access_token: str
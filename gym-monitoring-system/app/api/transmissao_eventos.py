@@ -0,0 +1,181 @@
+# app/api/transmissao_eventos.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterable, Optional
+from app.monitoring.metrics import Counter, Gauge
+from app.services.eventos_ao_vivo import CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Eventos guardados por cliente enquanto ele não lê; acima disso os mais antigos são descartados
+EVENTS_CLIENT_BUFFER = 256
+
+# Comentário enviado a clientes sem eventos, para manter proxies e detectar desconexões
+EVENTS_HEARTBEAT_SECONDS = 15.0
+
+# Conexões simultâneas por processo
+EVENTS_MAX_CLIENTS = 5000
+
+TIPOS = ('checkin', 'checkout', 'ocupacao', 'alerta_risco')
+
+# Métricas expostas em /metrics
+EVENTS_CLIENTS = Gauge('gym_events_stream_clients', 'Clientes conectados ao stream de eventos')
+EVENTS_DROPPED = Counter('gym_events_stream_dropped_total', 'Eventos descartados por clientes lentos')
+
+
+def formatar(tipo: str, dados) -> bytes:
+    """Evento no formato text/event-stream"""
+    return f"event: {tipo}\ndata: {json.dumps(dados, default=str)}\n\n".encode()
+
+
+class Assinante:
+    """Cliente do stream com buffer limitado
+
+    A ocupação é estado, não histórico: o cliente recebe só o valor mais recente.
+    Os demais eventos ficam em uma fila de até buffer_size; se o cliente não lê a
+    tempo, os mais antigos são descartados e ele recebe um evento "perdidos" com a
+    quantidade, para recarregar o painel em vez de atrasar todos os outros.
+    """
+
+    def __init__(self, tipos: Optional[Iterable[str]] = None, buffer_size: int = EVENTS_CLIENT_BUFFER):
+        self.tipos = set(tipos) if tipos else None
+        self.buffer_size = buffer_size
+        self.perdidos = 0
+        self._fila = deque()
+        self._ocupacao = None
+        self._novo = asyncio.Event()
+
+    def aceita(self, tipo: str) -> bool:
+        return self.tipos is None or tipo in self.tipos
+
+    def enviar(self, tipo: str, bloco: bytes):
+        if tipo == 'ocupacao':
+            self._ocupacao = bloco
+        else:
+            if len(self._fila) >= self.buffer_size:
+                self._fila.popleft()
+                self.perdidos += 1
+                EVENTS_DROPPED.inc()
+            self._fila.append(bloco)
+        self._novo.set()
+
+    def drenar(self) -> bytes:
+        """Tudo o que está pendente, em um único bloco"""
+        partes = []
+        if self.perdidos:
+            partes.append(formatar('perdidos', {'eventos': self.perdidos}))
+            self.perdidos = 0
+        partes.extend(self._fila)
+        self._fila.clear()
+        if self._ocupacao is not None:
+            partes.append(self._ocupacao)
+            self._ocupacao = None
+        self._novo.clear()
+        return b"".join(partes)
+
+
+class HubEventos:
+    """Fan-out dos eventos ao vivo do Redis para os clientes SSE deste processo
+
+    Uma única inscrição em CHANNEL por processo, em uma thread; cada mensagem é
+    convertida em text/event-stream uma vez e o mesmo bloco vai para a fila de
+    todos os assinantes interessados, no event loop. Nenhum cliente lento segura
+    a thread nem os outros clientes: o buffer de cada um é limitado (Assinante).
+    """
+
+    def __init__(self, buffer_size: int = EVENTS_CLIENT_BUFFER, heartbeat_seconds: float = EVENTS_HEARTBEAT_SECONDS,
+                 max_clients: int = EVENTS_MAX_CLIENTS):
+        self.buffer_size = buffer_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_clients = max_clients
+        self.redis = None
+        self._assinantes = set()
+        self._ocupacao = None
+        self._loop = None
+        self._listener = None
+        EVENTS_CLIENTS.set_function(lambda: len(self._assinantes))
+
+    @classmethod
+    def from_env(cls) -> "HubEventos":
+        return cls(
+            buffer_size=int(os.getenv("EVENTS_CLIENT_BUFFER", str(EVENTS_CLIENT_BUFFER))),
+            heartbeat_seconds=float(os.getenv("EVENTS_HEARTBEAT_SECONDS", str(EVENTS_HEARTBEAT_SECONDS))),
+            max_clients=int(os.getenv("EVENTS_MAX_CLIENTS", str(EVENTS_MAX_CLIENTS))),
+        )
+
+    def start(self, redis_client):
+        """Inscrever-se no canal (chamar de dentro do event loop)"""
+        self.redis = redis_client
+        self._loop = asyncio.get_running_loop()
+        if self._listener is None or not self._listener.is_alive():
+            self._listener = threading.Thread(target=self._escutar, name="eventos-ao-vivo", daemon=True)
+            self._listener.start()
+
+    def assinar(self, tipos: Optional[Iterable[str]] = None) -> Assinante:
+        tipos = [t for t in (tipos or []) if t]
+        invalidos = set(tipos) - set(TIPOS)
+        if invalidos:
+            raise ValueError(f"Tipos de evento inválidos: {', '.join(sorted(invalidos))} (use {', '.join(TIPOS)})")
+        if len(self._assinantes) >= self.max_clients:
+            raise ValueError("Limite de conexões do stream de eventos atingido")
+        assinante = Assinante(tipos, self.buffer_size)
+        # Quem conecta já recebe a ocupação atual
+        if self._ocupacao is not None and assinante.aceita('ocupacao'):
+            assinante.enviar('ocupacao', self._ocupacao)
+        self._assinantes.add(assinante)
+        return assinante
+
+    def cancelar(self, assinante: Assinante):
+        self._assinantes.discard(assinante)
+
+    def distribuir(self, mensagem: str):
+        """Repassar uma mensagem do canal a todos os assinantes (no event loop)"""
+        try:
+            eventos = json.loads(mensagem)['eventos']
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Mensagem inválida no canal de eventos ao vivo")
+            return
+        for evento in eventos:
+            tipo = evento.get('tipo')
+            bloco = formatar(tipo, evento.get('dados'))
+            if tipo == 'ocupacao':
+                self._ocupacao = bloco
+            for assinante in self._assinantes:
+                if assinante.aceita(tipo):
+                    assinante.enviar(tipo, bloco)
+
+    async def stream(self, assinante: Assinante) -> AsyncIterator[bytes]:
+        """Corpo da resposta text/event-stream de um assinante"""
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(assinante._novo.wait(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                bloco = assinante.drenar()
+                if bloco:
+                    yield bloco
+        finally:
+            self.cancelar(assinante)
+
+    def _escutar(self):
+        espera = 1.0
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                espera = 1.0
+                for mensagem in pubsub.listen():
+                    if mensagem.get("type") == "message":
+                        self._loop.call_soon_threadsafe(self.distribuir, mensagem["data"])
+            except Exception as e:
+                logger.warning(f"Canal de eventos ao vivo indisponível, nova tentativa em {espera:.0f}s: {e}")
+                time.sleep(espera)
+                espera = min(espera * 2, 60.0)
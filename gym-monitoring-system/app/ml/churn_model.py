@@ -1,33 +1,79 @@
 # app/ml/churn_model.py
-import pandas as pd
+# pandas, scikit-learn e joblib são importados só no treino ou ao ler o pickle:
+# a inferência usa a floresta compacta (NumPy) e a API sobe sem carregá-los
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-import joblib
 import os
 from datetime import datetime
+from typing import TYPE_CHECKING
+from app.ml.compact_forest import CompactForest
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Features do modelo: as seis básicas e a presença diária (bitmap); modelos antigos
+# salvos com as seis primeiras continuam válidos (feature_names vem dos metadados)
+MODEL_FEATURES = [
+    'frequencia_semanal',
+    'dias_desde_ultimo_checkin',
+    'duracao_media_minutos',
+    'plano_valor',
+    'plano_duracao',
+    'dias_como_aluno',
+    'dias_presentes_30',
+    'sequencia_atual_dias',
+    'maior_intervalo_dias'
+]
 
 class ChurnPredictor:
     def __init__(self):
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.scaler = StandardScaler()
-        self.feature_names = [
-            'frequencia_semanal',
-            'dias_desde_ultimo_checkin',
-            'duracao_media_minutos',
-            'plano_valor',
-            'plano_duracao',
-            'dias_como_aluno'
-        ]
+        self._model = None
+        self._scaler = None
+        self.feature_names = list(MODEL_FEATURES)
         self.is_trained = False
         self.model_path = "models/churn_model.pkl"
         self.scaler_path = "models/scaler.pkl"
+        self.compact_path = "models/churn_forest"
+        
+        # Floresta achatada (scaler incorporado) usada na inferência
+        self.compact = None
         
         # Tentar carregar modelo existente
         self.load_model()
     
+    def _new_model(self):
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=100, random_state=42)
+    
+    def _new_scaler(self):
+        from sklearn.preprocessing import StandardScaler
+        return StandardScaler()
+    
+    @property
+    def model(self):
+        """Modelo sklearn, lido do pickle só quando necessário (ex.: retreino)"""
+        if self._model is None:
+            self._model = _load_pickle(self.model_path) if os.path.exists(self.model_path) else self._new_model()
+        return self._model
+    
+    @model.setter
+    def model(self, value):
+        self._model = value
+    
+    @property
+    def scaler(self):
+        """Scaler sklearn, lido do pickle só quando necessário"""
+        if self._scaler is None:
+            self._scaler = _load_pickle(self.scaler_path) if os.path.exists(self.scaler_path) else self._new_scaler()
+        return self._scaler
+    
+    @scaler.setter
+    def scaler(self, value):
+        self._scaler = value
+    
+    def feature_vector(self, features_dict: dict) -> np.ndarray:
+        """Valores brutos das features, na ordem do modelo"""
+        return np.array([features_dict.get(name, 0) for name in self.feature_names], dtype=np.float64)
+    
     def prepare_features(self, features_dict: dict) -> np.array:
         """Preparar features para o modelo"""
         # Garantir que todas as features estejam presentes
@@ -51,12 +97,26 @@ class ChurnPredictor:
             # Se não tiver modelo treinado, usar heurística simples
             return self._heuristic_prediction(features_dict)
         
+        if self.compact is not None:
+            return self.compact.predict_one(self.feature_vector(features_dict))
+        
         features = self.prepare_features(features_dict)
         probabilities = self.model.predict_proba(features)
         
         # Retornar probabilidade da classe positiva (churn)
         return probabilities[0][1]
     
+    def predict_proba_batch(self, features_list: list) -> np.ndarray:
+        """Predizer probabilidade de churn para vários alunos em uma única chamada"""
+        if not self.is_trained:
+            return np.array([self._heuristic_prediction(f) for f in features_list])
+        
+        X = np.array([self.feature_vector(f) for f in features_list]).reshape(-1, len(self.feature_names))
+        if self.compact is not None:
+            return self.compact.predict_proba(X)
+        
+        return self.model.predict_proba(self.scaler.transform(X))[:, 1]
+    
     def _heuristic_prediction(self, features_dict: dict) -> float:
         """Heurística simples para quando não há modelo treinado"""
         score = 0.0
@@ -93,8 +153,12 @@ class ChurnPredictor:
         
         return min(score, 1.0)
     
-    def train_model(self, training_data: pd.DataFrame):
+    def train_model(self, training_data: "pd.DataFrame"):
         """Treinar o modelo com dados históricos"""
+        import pandas as pd
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import classification_report
+        
         # Preparar features
         X = training_data[self.feature_names]
         y = training_data['churn']
@@ -127,6 +191,7 @@ class ChurnPredictor:
         print(feature_importance)
         
         self.is_trained = True
+        self.compact = self._build_compact()
         self.save_model()
         
         return {
@@ -136,17 +201,96 @@ class ChurnPredictor:
     
     def save_model(self):
         """Salvar modelo treinado"""
+        import joblib
         os.makedirs("models", exist_ok=True)
         joblib.dump(self.model, self.model_path)
         joblib.dump(self.scaler, self.scaler_path)
+        if self.compact is not None:
+            self.export_compact_model()
+    
+    def export_compact_model(self, path: str = None):
+        """Exportar a floresta achatada, com o scaler incorporado, em arrays NumPy"""
+        if self.compact is None:
+            raise ValueError("Modelo não treinado ou não suportado pela floresta compacta")
+        self.compact.save(path or self.compact_path, metadata={'feature_names': self.feature_names})
+    
+    def _build_compact(self):
+        """Achatar o modelo sklearn, se for um ensemble de árvores"""
+        try:
+            return CompactForest.from_sklearn(self.model, self.scaler)
+        except (AttributeError, ValueError) as e:
+            print(f"Floresta compacta indisponível, usando sklearn: {e}")
+            return None
+    
+    def _pickle_feature_names(self) -> list:
+        """Features do scaler salvo: nomes, se treinado com DataFrame, ou o prefixo de MODEL_FEATURES"""
+        nomes = getattr(self.scaler, 'feature_names_in_', None)
+        if nomes is not None:
+            return list(nomes)
+        n = getattr(self.scaler, 'n_features_in_', len(self.feature_names))
+        return self.feature_names[:n]
+    
+    def artifact_paths(self) -> list:
+        """Arquivos cujo mtime identifica a versão do modelo em disco"""
+        return [os.path.join(self.compact_path, "CURRENT"), self.model_path]
+    
+    def _compact_is_current(self) -> bool:
+        """A floresta exportada existe e não é mais antiga que o pickle"""
+        if not CompactForest.exists(self.compact_path):
+            return False
+        if not os.path.exists(self.model_path):
+            return True
+        current = os.path.join(self.compact_path, "CURRENT")
+        return os.path.getmtime(current) >= os.path.getmtime(self.model_path)
     
     def load_model(self):
-        """Carregar modelo existente"""
+        """Carregar modelo existente
+        
+        A floresta compacta é mapeada em memória (mmap_mode='r'), então todos os
+        processos do host (API e workers) compartilham as mesmas páginas. O pickle
+        do sklearn só é desserializado quando a floresta exportada não existe ou
+        está desatualizada, e nesse caso ela é reexportada para os próximos processos.
+        """
+        if self._compact_is_current():
+            try:
+                self.compact = CompactForest.load(self.compact_path, mmap_mode='r')
+                self.feature_names = self.compact.metadata.get('feature_names', self.feature_names)
+                self._model = None
+                self._scaler = None
+                self.is_trained = True
+                return
+            except Exception as e:
+                print(f"Erro ao carregar floresta compacta: {e}")
+        
         try:
             if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-                self.model = joblib.load(self.model_path)
-                self.scaler = joblib.load(self.scaler_path)
+                self.model = _load_pickle(self.model_path)
+                self.scaler = _load_pickle(self.scaler_path)
+                self.feature_names = self._pickle_feature_names()
                 self.is_trained = True
+                self.compact = self._build_compact()
         except Exception as e:
             print(f"Erro ao carregar modelo: {e}")
+            self._model = self._new_model()
+            self._scaler = self._new_scaler()
             self.is_trained = False
+            return
+        
+        if self.compact is not None:
+            try:
+                self.export_compact_model()
+            except OSError as e:
+                print(f"Não foi possível exportar a floresta compacta: {e}")
+
+
+def _load_pickle(path: str):
+    import joblib
+    return joblib.load(path)
+
+
+def create_predictor() -> ChurnPredictor:
+    """Preditor escolhido em CHURN_MODEL: 'batch' (floresta) ou 'online' (SGD incremental)"""
+    if os.getenv("CHURN_MODEL", "batch") == "online":
+        from app.ml.online_model import OnlineChurnPredictor
+        return OnlineChurnPredictor()
+    return ChurnPredictor()
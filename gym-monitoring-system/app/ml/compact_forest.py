@@ -0,0 +1,224 @@
+# app/ml/compact_forest.py
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+
+# Arrays que compõem a floresta, um arquivo .npy por array
+ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+def _fold_thresholds(threshold, mean, scale):
+    """Levar os thresholds do espaço normalizado para o espaço bruto das features
+
+    O sklearn decide float32((x - mean) / scale) <= t. Como essa expressão é
+    monótona em x, existe um T tal que ela equivale a x <= T; T é o maior float64
+    que ainda satisfaz a condição, encontrado por bissecção vetorizada a partir
+    da aproximação t * scale + mean.
+    """
+    def satisfaz(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    aproximado = threshold * scale + mean
+    margem = (np.abs(threshold) + 1.0) * scale * 1e-5
+    lo = aproximado - margem
+    hi = aproximado + margem
+    while not (satisfaz(lo).all() and not satisfaz(hi).any()):
+        margem *= 2
+        lo = aproximado - margem
+        hi = aproximado + margem
+
+    for _ in range(200):
+        meio = lo + (hi - lo) / 2
+        ativo = (meio > lo) & (meio < hi)
+        if not ativo.any():
+            break
+        ok = satisfaz(meio)
+        lo = np.where(ativo & ok, meio, lo)
+        hi = np.where(ativo & ~ok, meio, hi)
+    return lo
+
+class CompactForest:
+    """Floresta de decisão achatada em arrays NumPy contíguos
+
+    Todos os nós de todas as árvores ficam em arrays únicos (feature, threshold,
+    filhos [esquerdo, direito] e valor da folha). As folhas apontam para si mesmas,
+    então a avaliação é um laço de profundidade fixa sem desvios, vetorizado em
+    linhas e árvores.
+    A normalização do StandardScaler (e o arredondamento para float32 feito pelo
+    sklearn) é incorporada aos thresholds na exportação, dispensando o transform
+    na inferência.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features):
+        # Arrays já no dtype certo (por exemplo, mapeados do disco) não são copiados
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.children = np.ascontiguousarray(children, dtype=np.intp).reshape(-1, 2)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.metadata = {}
+
+        # Visão plana dos filhos: o próximo nó é children[2 * nó + (x > threshold)]
+        self._next = self.children.ravel()
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None, positive_class: int = 1) -> "CompactForest":
+        """Exportar um RandomForestClassifier (e opcionalmente o scaler) treinado"""
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators:
+            raise ValueError("Modelo não é um ensemble de árvores treinado")
+
+        n_features = model.n_features_in_
+        classe = list(model.classes_).index(positive_class)
+
+        mean = np.zeros(n_features)
+        scale = np.ones(n_features)
+        if scaler is not None:
+            if getattr(scaler, 'mean_', None) is not None:
+                mean = scaler.mean_
+            if getattr(scaler, 'scale_', None) is not None:
+                scale = scaler.scale_
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            feature = np.where(is_leaf, 0, tree.feature)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+
+            # Folhas apontam para si mesmas; índices deslocados para o array global
+            left = np.where(is_leaf, nodes, tree.children_left) + offset
+            right = np.where(is_leaf, nodes, tree.children_right) + offset
+
+            contagens = tree.value[:, 0, :]
+            value = contagens[:, classe] / contagens.sum(axis=1)
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.column_stack([left, right]))
+            values.append(value)
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        # Incorporar o scaler de uma vez em todos os nós internos
+        feature = np.concatenate(features)
+        threshold = np.concatenate(thresholds)
+        interno = np.isfinite(threshold)
+        threshold[interno] = _fold_thresholds(
+            threshold[interno], mean[feature[interno]], scale[feature[interno]]
+        )
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children=np.concatenate(children),
+            value=np.concatenate(values),
+            roots=np.asarray(roots),
+            max_depth=max_depth,
+            n_features=n_features
+        )
+
+    def predict_one(self, x) -> float:
+        """Probabilidade da classe positiva para uma única linha"""
+        x = np.asarray(x, dtype=np.float64)
+        idx = self.roots
+        for _ in range(self.max_depth):
+            idx = self._next[(idx << 1) + (x[self.feature[idx]] > self.threshold[idx])]
+        return float(self.value[idx].mean())
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Probabilidade da classe positiva para um lote de linhas"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        n_linhas, n_features = X.shape
+        if n_features != self.n_features:
+            raise ValueError(f"Esperadas {self.n_features} features, recebidas {n_features}")
+
+        # Índice plano de X[linha, feature] = base da linha + feature
+        valores = X.ravel()
+        base = (np.arange(n_linhas) * n_features)[:, None]
+        idx = np.broadcast_to(self.roots, (n_linhas, len(self.roots)))
+        for _ in range(self.max_depth):
+            proximo = self._next[(idx << 1) + (valores[base + self.feature[idx]] > self.threshold[idx])]
+            # Todas as linhas já chegaram às folhas
+            if np.array_equal(proximo, idx):
+                break
+            idx = proximo
+        return self.value[idx].mean(axis=1)
+
+    def save(self, path: str, metadata: dict = None) -> str:
+        """Salvar os arrays da floresta em arquivos .npy não comprimidos
+        
+        Cada exportação vai para um subdiretório novo e o arquivo CURRENT é
+        trocado atomicamente no final. Processos que já mapearam a versão
+        anterior continuam lendo arquivos íntegros.
+        """
+        versao = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        destino = os.path.join(path, versao)
+        os.makedirs(destino)
+
+        for nome in ARRAYS:
+            np.save(os.path.join(destino, f"{nome}.npy"), getattr(self, nome))
+
+        meta = dict(metadata or {})
+        meta.update(versao=versao, max_depth=self.max_depth, n_features=self.n_features)
+        with open(os.path.join(destino, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        tmp = os.path.join(path, f"CURRENT.{versao}")
+        with open(tmp, "w") as f:
+            f.write(versao)
+        os.replace(tmp, os.path.join(path, "CURRENT"))
+
+        self.metadata = meta
+        self._remove_old_versions(path, manter=2)
+        return destino
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> "CompactForest":
+        """Carregar a versão atual salva com save()
+        
+        Com mmap_mode='r' os arrays são mapeados do disco, e processos no mesmo
+        host compartilham as mesmas páginas via page cache.
+        """
+        with open(os.path.join(path, "CURRENT")) as f:
+            origem = os.path.join(path, f.read().strip())
+
+        with open(os.path.join(origem, "meta.json")) as f:
+            meta = json.load(f)
+
+        arrays = {
+            nome: np.load(os.path.join(origem, f"{nome}.npy"), mmap_mode=mmap_mode)
+            for nome in ARRAYS
+        }
+        forest = cls(max_depth=meta['max_depth'], n_features=meta['n_features'], **arrays)
+        forest.metadata = meta
+        return forest
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Verificar se há uma floresta salva no diretório"""
+        return os.path.exists(os.path.join(path, "CURRENT"))
+
+    @staticmethod
+    def _remove_old_versions(path: str, manter: int):
+        """Remover versões antigas, mantendo as mais recentes"""
+        versoes = sorted(
+            nome for nome in os.listdir(path)
+            if os.path.isdir(os.path.join(path, nome))
+        )
+        for nome in versoes[:-manter]:
+            shutil.rmtree(os.path.join(path, nome), ignore_errors=True)
@@ -1,20 +1,58 @@
 # app/ml/feature_engineering.py
 from sqlalchemy.orm import Session
-from app.models.database import Aluno, Checkin, Plano
+from app.models.database import Aluno, Checkin
+from app.analytics import bitmap as presenca
+from app.analytics.columnar import to_epoch_us, MICROS_DIA, MICROS_HORA
+from app.services.plan_catalog import plan_catalog
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 
+# Incrementar ao mudar o significado de uma feature sem mudar este módulo nem
+# app/analytics (ex.: regra de negócio vinda do banco ou do catálogo de planos)
+FEATURE_SCHEMA_VERSION = 1
+
+# Schema completo de features produzido por _calculate_features
+FEATURE_COLUMNS = [
+    'frequencia_semanal',
+    'dias_desde_ultimo_checkin',
+    'duracao_media_minutos',
+    'plano_valor',
+    'plano_duracao',
+    'dias_como_aluno',
+    'checkins_fins_semana',
+    'checkins_manha',
+    'checkins_tarde',
+    'checkins_noite',
+    'tendencia_frequencia',
+    'dias_presentes_30',
+    'sequencia_atual_dias',
+    'maior_intervalo_dias'
+]
+
+# Linhas por bloco na geração de dados sintéticos
+SYNTHETIC_CHUNK_SIZE = 100_000
+
 class FeatureEngineer:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, checkin_store=None, catalog=plan_catalog):
         self.db = db
+        # ColumnarCheckinStore opcional: features de todos os alunos em uma passada vetorizada
+        self.checkin_store = checkin_store
+        # Planos em memória: sem consulta por aluno
+        self.catalog = catalog
     
-    def create_training_dataset(self, months_back: int = 6) -> pd.DataFrame:
-        """Criar dataset de treinamento com features e targets"""
+    def create_training_dataset(self, months_back: int = 6, end_date: datetime = None) -> pd.DataFrame:
+        """Criar dataset de treinamento com features e targets (até end_date, padrão agora)"""
         # Definir período de análise
-        end_date = datetime.utcnow()
+        end_date = end_date or datetime.utcnow()
         start_date = end_date - timedelta(days=months_back * 30)
         
+        if self.checkin_store is not None:
+            feature_end_date = start_date + timedelta(days=90)
+            return self._create_dataset_columnar(
+                start_date, feature_end_date, feature_end_date + timedelta(days=90)
+            )
+        
         # Obter alunos que estavam ativos no início do período
         alunos = self.db.query(Aluno).filter(
             Aluno.data_matricula <= start_date
@@ -54,6 +92,157 @@ class FeatureEngineer:
         
         return pd.DataFrame(training_data)
     
+    def create_outcome_dataset(self, as_of: datetime, window_days: int = 90, horizon_days: int = 90,
+                               aluno_ids: set = None) -> pd.DataFrame:
+        """Desfechos rotulados em as_of: features da janela que terminou horizon_days
+        antes e churn se não houve checkin desde então (mesma definição do treino)
+
+        Com aluno_ids, só as linhas desses alunos são montadas (ex.: outcome_due_ids).
+        """
+        feature_end_date = as_of - timedelta(days=horizon_days)
+        start_date = feature_end_date - timedelta(days=window_days)
+        if aluno_ids is not None and not aluno_ids:
+            return pd.DataFrame(columns=FEATURE_COLUMNS + ['churn', 'aluno_id'])
+        
+        if self.checkin_store is not None:
+            return self._create_dataset_columnar(start_date, feature_end_date, as_of, aluno_ids)
+        
+        consulta = self.db.query(Aluno).filter(Aluno.data_matricula <= start_date)
+        if aluno_ids is not None:
+            consulta = consulta.filter(Aluno.id.in_(aluno_ids))
+        alunos = consulta.all()
+        if not alunos:
+            return pd.DataFrame(columns=FEATURE_COLUMNS + ['churn', 'aluno_id'])
+        ids = [aluno.id for aluno in alunos]
+        
+        # Checkins da janela e do horizonte em duas consultas, agrupados por aluno
+        checkins_por_aluno = {}
+        for checkin in self.db.query(Checkin).filter(
+            Checkin.aluno_id.in_(ids),
+            Checkin.data_entrada >= start_date,
+            Checkin.data_entrada <= feature_end_date
+        ).yield_per(10000):
+            checkins_por_aluno.setdefault(checkin.aluno_id, []).append(checkin)
+        
+        ativos_depois = {
+            aluno_id for (aluno_id,) in self.db.query(Checkin.aluno_id).filter(
+                Checkin.aluno_id.in_(ids),
+                Checkin.data_entrada > feature_end_date,
+                Checkin.data_entrada <= as_of
+            ).distinct()
+        }
+        
+        dados = []
+        for aluno in alunos:
+            features = self._calculate_features(
+                aluno, checkins_por_aluno.get(aluno.id, []), start_date, feature_end_date
+            )
+            features['churn'] = 0 if aluno.id in ativos_depois else 1
+            features['aluno_id'] = aluno.id
+            dados.append(features)
+        
+        return pd.DataFrame(dados)
+    
+    def outcome_due_ids(self, as_of: datetime, horizon_days: int = 90) -> set:
+        """Alunos cujo horizonte de desfecho fecha em as_of: a cada horizon_days desde a
+        matrícula, para que cada aluno entre uma vez por ciclo no modelo online"""
+        dia = as_of.date()
+        return {
+            aluno_id for aluno_id, matricula in self.db.query(Aluno.id, Aluno.data_matricula)
+            if matricula is not None and (dia - matricula.date()).days % horizon_days == 0
+        }
+    
+    def _create_dataset_columnar(self, start_date: datetime, feature_end_date: datetime,
+                                 churn_check_date: datetime, aluno_ids: set = None) -> pd.DataFrame:
+        """Mesmo resultado de _calculate_features + churn, para todos os alunos (ou aluno_ids) de uma vez"""
+        self.checkin_store.refresh_if_stale(self.db)
+        colunas = self.checkin_store.columns()
+        
+        consulta = self.db.query(
+            Aluno.id, Aluno.data_matricula, Aluno.plano_id
+        ).filter(
+            Aluno.data_matricula <= start_date
+        )
+        if aluno_ids is not None:
+            consulta = consulta.filter(Aluno.id.in_(aluno_ids))
+        alunos = consulta.order_by(Aluno.id).all()
+        if not alunos:
+            return pd.DataFrame(columns=FEATURE_COLUMNS + ['churn', 'aluno_id'])
+        
+        aluno_ids, matriculas, plano_ids = zip(*alunos)
+        planos = self.catalog.all(self.db)
+        aluno_ids = np.asarray(aluno_ids, dtype=np.int64)
+        n = len(aluno_ids)
+        
+        # Linha do aluno (ou -1) para cada checkin do store
+        linha_do_aluno = np.full(len(colunas['alunos']), -1)
+        indice = np.searchsorted(colunas['alunos'], aluno_ids)
+        encontrado = indice < len(colunas['alunos'])
+        encontrado[encontrado] = colunas['alunos'][indice[encontrado]] == aluno_ids[encontrado]
+        linha_do_aluno[indice[encontrado]] = np.flatnonzero(encontrado)
+        linha = np.repeat(linha_do_aluno, np.diff(colunas['offsets']))
+        
+        inicio_us, fim_us = to_epoch_us(start_date), to_epoch_us(feature_end_date)
+        entrada = colunas['entrada']
+        na_janela = (linha >= 0) & (entrada >= inicio_us) & (entrada <= fim_us)
+        linha_j, entrada_j = linha[na_janela], entrada[na_janela]
+        duracao_j = colunas['duracao'][na_janela].astype(np.float64)
+        
+        def contar(mascara=None):
+            return np.bincount(linha_j if mascara is None else linha_j[mascara], minlength=n)
+        
+        total = contar()
+        features = pd.DataFrame(index=range(n))
+        features['frequencia_semanal'] = total / max(1, (feature_end_date - start_date).days / 7)
+        
+        # Entradas ordenadas por aluno: a última linha de cada aluno é o último checkin
+        ultimo = np.zeros(n, dtype=np.int64)
+        fim_segmento = np.flatnonzero(np.diff(linha_j, append=-1) != 0)
+        ultimo[linha_j[fim_segmento]] = entrada_j[fim_segmento]
+        features['dias_desde_ultimo_checkin'] = np.where(total > 0, (fim_us - ultimo) // MICROS_DIA, 999)
+        
+        com_duracao = ~np.isnan(duracao_j)
+        visitas = contar(com_duracao)
+        soma = np.bincount(linha_j[com_duracao], weights=duracao_j[com_duracao], minlength=n)
+        features['duracao_media_minutos'] = np.divide(soma, visitas, out=np.zeros(n), where=visitas > 0)
+        
+        plano_por_aluno = [planos.get(plano_id) for plano_id in plano_ids]
+        features['plano_valor'] = [p.valor if p else 0 for p in plano_por_aluno]
+        features['plano_duracao'] = [p.duracao_meses if p else 0 for p in plano_por_aluno]
+        matriculas_us = np.asarray(matriculas, dtype='datetime64[us]').astype(np.int64)
+        features['dias_como_aluno'] = (fim_us - matriculas_us) // MICROS_DIA
+        
+        hora = (entrada_j % MICROS_DIA) // MICROS_HORA
+        dia_semana = (entrada_j // MICROS_DIA + 3) % 7  # 01/01/1970 foi uma quinta-feira
+        features['checkins_fins_semana'] = contar(dia_semana >= 5)
+        features['checkins_manha'] = contar(hora < 12)
+        features['checkins_tarde'] = contar((hora >= 12) & (hora < 18))
+        features['checkins_noite'] = contar(hora >= 18)
+        
+        meio_us = to_epoch_us(start_date + timedelta(days=45))
+        primeira = contar(entrada_j <= meio_us)
+        features['tendencia_frequencia'] = (total - primeira) / 6.43 - primeira / 6.43
+        
+        # Presença diária nos 90 dias terminando em feature_end_date (como o bitmap)
+        janela = presenca.DEFAULT_WINDOW_DAYS
+        atraso = fim_us // MICROS_DIA - entrada_j // MICROS_DIA
+        no_bitmap = atraso < janela
+        matriz = np.zeros((n, janela), dtype=bool)
+        matriz[linha_j[no_bitmap], janela - 1 - atraso[no_bitmap]] = True
+        posicoes = np.arange(janela)
+        ultima_presenca = np.maximum.accumulate(np.where(matriz, posicoes, -1), axis=1)
+        ultima_ausencia = np.maximum.accumulate(np.where(matriz, -1, posicoes), axis=1)
+        sequencia = posicoes - ultima_ausencia
+        features['dias_presentes_30'] = matriz[:, -30:].sum(axis=1)
+        features['sequencia_atual_dias'] = np.where(matriz[:, -1], sequencia[:, -1], sequencia[:, -2])
+        features['maior_intervalo_dias'] = (posicoes - ultima_presenca).max(axis=1)
+        
+        # Churn: nenhum checkin em (feature_end_date, churn_check_date]
+        depois = (linha >= 0) & (entrada > fim_us) & (entrada <= to_epoch_us(churn_check_date))
+        features['churn'] = (np.bincount(linha[depois], minlength=n) == 0).astype(np.int64)
+        features['aluno_id'] = aluno_ids
+        return features[FEATURE_COLUMNS + ['churn', 'aluno_id']]
+    
     def _calculate_features(self, aluno: Aluno, checkins: list, start_date: datetime, end_date: datetime) -> dict:
         """Calcular features para um aluno específico"""
         features = {}
@@ -81,7 +270,7 @@ class FeatureEngineer:
             features['duracao_media_minutos'] = 0
         
         # Informações do plano
-        plano = self.db.query(Plano).filter(Plano.id == aluno.plano_id).first()
+        plano = self.catalog.get(self.db, aluno.plano_id)
         features['plano_valor'] = plano.valor if plano else 0
         features['plano_duracao'] = plano.duracao_meses if plano else 0
         
@@ -104,52 +293,97 @@ class FeatureEngineer:
         
         features['tendencia_frequencia'] = freq_segunda - freq_primeira
         
+        # Presença diária (mesmo cálculo do bitmap mantido a cada checkin)
+        bitmap, inicio = presenca.from_days([c.data_entrada for c in checkins], end_date)
+        resumo = presenca.attendance_summary(bitmap, inicio, end_date)
+        features['dias_presentes_30'] = resumo['dias_presentes_30']
+        features['sequencia_atual_dias'] = resumo['sequencia_atual_dias']
+        features['maior_intervalo_dias'] = resumo['maior_intervalo_dias']
+        
         return features
     
-    def generate_synthetic_data(self, n_samples: int = 1000) -> pd.DataFrame:
+    def generate_synthetic_data(self, n_samples: int = 1000, seed: int = 42,
+                                chunk_size: int = SYNTHETIC_CHUNK_SIZE) -> pd.DataFrame:
         """Gerar dados sintéticos para treinamento inicial"""
-        np.random.seed(42)
-        
-        data = []
-        
-        for i in range(n_samples):
-            # Gerar features com distribuições realistas
-            frequencia_semanal = np.random.gamma(2, 1.5)  # Média ~3
-            dias_desde_ultimo = np.random.exponential(7)  # Média 7 dias
-            duracao_media = np.random.normal(60, 20)  # Média 60 min
-            plano_valor = np.random.choice([50, 80, 120, 200])
-            plano_duracao = np.random.choice([1, 6, 12])
-            dias_como_aluno = np.random.uniform(30, 365)
-            
-            # Definir churn baseado em regras
-            churn_prob = 0.1  # Base 10%
-            
-            if frequencia_semanal < 1:
-                churn_prob += 0.4
-            elif frequencia_semanal < 2:
-                churn_prob += 0.2
-            
-            if dias_desde_ultimo > 14:
-                churn_prob += 0.3
-            elif dias_desde_ultimo > 7:
-                churn_prob += 0.1
-            
-            if duracao_media < 30:
-                churn_prob += 0.2
-            
-            if dias_como_aluno > 180 and frequencia_semanal < 2:
-                churn_prob += 0.2
-            
-            churn = 1 if np.random.random() < churn_prob else 0
-            
-            data.append({
-                'frequencia_semanal': frequencia_semanal,
-                'dias_desde_ultimo_checkin': dias_desde_ultimo,
-                'duracao_media_minutos': max(0, duracao_media),
-                'plano_valor': plano_valor,
-                'plano_duracao': plano_duracao,
-                'dias_como_aluno': dias_como_aluno,
-                'churn': churn
-            })
-        
-        return pd.DataFrame(data)
\ No newline at end of file
+        chunks = list(self.iter_synthetic_data(n_samples, seed=seed, chunk_size=chunk_size))
+        if not chunks:
+            return self._synthetic_chunk(np.random.default_rng(seed), 0)
+        return pd.concat(chunks, ignore_index=True)
+    
+    def iter_synthetic_data(self, n_samples: int, seed: int = 42,
+                            chunk_size: int = SYNTHETIC_CHUNK_SIZE):
+        """Gerar dados sintéticos em blocos, para datasets maiores que a memória
+        
+        O mesmo par (seed, chunk_size) reproduz exatamente os mesmos dados.
+        """
+        rng = np.random.default_rng(seed)
+        for inicio in range(0, n_samples, chunk_size):
+            yield self._synthetic_chunk(rng, min(chunk_size, n_samples - inicio))
+    
+    def _synthetic_chunk(self, rng: np.random.Generator, n: int) -> pd.DataFrame:
+        """Gerar um bloco vetorizado com o schema completo de features"""
+        # Gerar features com distribuições realistas
+        frequencia_semanal = rng.gamma(2, 1.5, n)  # Média ~3
+        dias_desde_ultimo = rng.exponential(7, n)  # Média 7 dias
+        duracao_media = np.maximum(0, rng.normal(60, 20, n))  # Média 60 min
+        plano_valor = rng.choice([50, 80, 120, 200], n)
+        plano_duracao = rng.choice([1, 6, 12], n)
+        dias_como_aluno = rng.uniform(30, 365, n)
+        
+        # Features adicionais, coerentes com a janela de 90 dias de _calculate_features
+        total_checkins = rng.poisson(frequencia_semanal * 90 / 7)
+        checkins_fins_semana = rng.binomial(total_checkins, 2 / 7)
+        # Manhã 35%, tarde 25%, noite 40% (binomiais encadeadas, mais rápidas que multinomial)
+        checkins_manha = rng.binomial(total_checkins, 0.35)
+        checkins_tarde = rng.binomial(total_checkins - checkins_manha, 0.25 / 0.65)
+        checkins_noite = total_checkins - checkins_manha - checkins_tarde
+        
+        # Quem está há mais tempo sem vir concentrou as visitas na primeira metade
+        proporcao_recente = np.clip(0.5 - 0.02 * (dias_desde_ultimo - 7), 0.05, 0.95)
+        segunda_metade = rng.binomial(total_checkins, proporcao_recente)
+        tendencia_frequencia = (2 * segunda_metade - total_checkins) / 6.43  # 45 dias / 7 dias
+        
+        # Definir churn baseado em regras
+        churn_prob = np.full(n, 0.1)  # Base 10%
+        churn_prob += np.select([frequencia_semanal < 1, frequencia_semanal < 2], [0.4, 0.2], 0)
+        churn_prob += np.select([dias_desde_ultimo > 14, dias_desde_ultimo > 7], [0.3, 0.1], 0)
+        churn_prob += np.where(duracao_media < 30, 0.2, 0)
+        churn_prob += np.where((dias_como_aluno > 180) & (frequencia_semanal < 2), 0.2, 0)
+        
+        churn = (rng.random(n) < churn_prob).astype(np.int64)
+        
+        # Presença diária, sorteada depois do churn para manter as demais colunas estáveis
+        p_dia = np.clip(frequencia_semanal / 7, 0, 1)
+        presente_recente = dias_desde_ultimo < 30
+        dias_presentes_30 = np.where(
+            presente_recente,
+            1 + rng.binomial(np.maximum(0, 29 - np.floor(dias_desde_ultimo)).astype(np.int64), p_dia),
+            0
+        )
+        sequencia_atual = np.where(
+            dias_desde_ultimo < 2,
+            np.minimum(rng.geometric(np.clip(1 - p_dia, 0.05, 1)), dias_presentes_30),
+            0
+        )
+        maior_intervalo = np.maximum(
+            np.floor(dias_desde_ultimo),
+            rng.geometric(np.clip(p_dia, 0.02, 1)) - 1
+        ).clip(0, presenca.DEFAULT_WINDOW_DAYS)
+        
+        return pd.DataFrame({
+            'frequencia_semanal': frequencia_semanal,
+            'dias_desde_ultimo_checkin': dias_desde_ultimo,
+            'duracao_media_minutos': duracao_media,
+            'plano_valor': plano_valor,
+            'plano_duracao': plano_duracao,
+            'dias_como_aluno': dias_como_aluno,
+            'checkins_fins_semana': checkins_fins_semana,
+            'checkins_manha': checkins_manha,
+            'checkins_tarde': checkins_tarde,
+            'checkins_noite': checkins_noite,
+            'tendencia_frequencia': tendencia_frequencia,
+            'dias_presentes_30': dias_presentes_30,
+            'sequencia_atual_dias': sequencia_atual,
+            'maior_intervalo_dias': maior_intervalo,
+            'churn': churn
+        }, columns=FEATURE_COLUMNS + ['churn'])
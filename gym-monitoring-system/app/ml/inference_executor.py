@@ -0,0 +1,227 @@
+# app/ml/inference_executor.py
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from app.ml.churn_model import ChurnPredictor, create_predictor
+from app.monitoring.metrics import Gauge, Histogram
+
+# Limites dos buckets do histograma de tamanho de lote
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# Intervalo para verificar se o modelo em disco foi atualizado
+MODEL_RELOAD_CHECK_SECONDS = 30
+
+# Preditor do processo (no modo process, um por processo do pool)
+_predictor = None
+_predictor_lock = threading.Lock()
+_predictor_checked_at = 0.0
+_predictor_version = None
+
+# Métricas expostas em /metrics
+MODEL_INFERENCE_SECONDS = Histogram(
+    'gym_model_inference_seconds', 'Duração de cada lote de inferência de churn', ['mode']
+)
+MODEL_BATCH_SIZE = Histogram(
+    'gym_model_batch_size', 'Alunos por lote de inferência', buckets=BATCH_SIZE_BUCKETS
+)
+MODEL_INFO = Gauge(
+    'gym_model_info', 'Versão do modelo de churn em uso (data dos artefatos em disco)', ['version']
+)
+
+
+def _model_version(predictor: ChurnPredictor):
+    """Identificador da versão em disco (mtime dos artefatos)"""
+    versao = []
+    for path in predictor.artifact_paths():
+        versao.append(os.path.getmtime(path) if os.path.exists(path) else None)
+    return tuple(versao)
+
+
+def _version_label(versao) -> str:
+    """Versão legível: data de modificação mais recente dos artefatos"""
+    datas = [m for m in (versao or ()) if m is not None]
+    if not datas:
+        return "sem_modelo"
+    return datetime.utcfromtimestamp(max(datas)).isoformat(timespec="seconds")
+
+
+def _get_predictor() -> ChurnPredictor:
+    """Preditor carregado uma vez, recarregado se o modelo em disco mudar"""
+    global _predictor, _predictor_checked_at, _predictor_version
+    with _predictor_lock:
+        agora = time.monotonic()
+        if _predictor is None:
+            _predictor = create_predictor()
+            _predictor_version = _model_version(_predictor)
+            _predictor_checked_at = agora
+        elif agora - _predictor_checked_at >= MODEL_RELOAD_CHECK_SECONDS:
+            _predictor_checked_at = agora
+            versao = _model_version(_predictor)
+            if versao != _predictor_version:
+                _predictor = create_predictor()
+                _predictor_version = _model_version(_predictor)
+        return _predictor
+
+
+def _preload():
+    """Inicializador dos processos do pool: carregar o modelo antes da primeira requisição"""
+    _get_predictor()
+
+
+def _predict_batch(features_list: list) -> tuple:
+    """Pontuar um lote de alunos (executado fora do event loop) e informar a versão do modelo"""
+    probabilidades = [float(p) for p in _get_predictor().predict_proba_batch(features_list)]
+    return probabilidades, _version_label(_predictor_version)
+
+
+class InferenceExecutor:
+    """Executor de inferência de churn fora do event loop
+
+    Requisições que chegam dentro da janela de agrupamento (batch_window_ms) são
+    combinadas em uma única chamada de predict em lote, executada em um pool de
+    threads ou de processos com o modelo pré-carregado.
+    """
+
+    def __init__(self, mode: str = "thread", workers: int = 1,
+                 batch_window_ms: float = 2.0, max_batch_size: int = 64):
+        if mode not in ("thread", "process"):
+            raise ValueError("Modo do executor deve ser 'thread' ou 'process'")
+
+        self.mode = mode
+        self.workers = workers
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+
+        self._executor = None
+        self._pending = []
+        self._flush_handle = None
+        self._in_flight = 0
+
+        # Métricas
+        self._requests = 0
+        self._batches = 0
+        self._batched_requests = 0
+        self._errors = 0
+        self._max_batch = 0
+        self._batch_histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._inference_seconds = 0.0
+        self.model_version = None
+        MODEL_INFO.set_function(lambda: {(self.model_version,): 1} if self.model_version else {})
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        """Criar o executor a partir das variáveis de ambiente"""
+        return cls(
+            mode=os.getenv("INFERENCE_EXECUTOR", "thread"),
+            workers=int(os.getenv("INFERENCE_WORKERS", "1")),
+            batch_window_ms=float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "2")),
+            max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH", "64")),
+        )
+
+    def start(self):
+        """Criar o pool e pré-carregar o modelo"""
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_preload)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inferencia")
+            self._executor.submit(_preload)
+
+    def shutdown(self):
+        """Encerrar o pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def predict(self, features: dict) -> float:
+        """Probabilidade de churn de um aluno, agrupada com requisições concorrentes"""
+        if self._executor is None:
+            self.start()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((features, future))
+        self._requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Enviar as requisições pendentes como um lote ao pool"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        lote, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if not lote:
+            return
+        if self._pending:
+            # Ainda há requisições além do tamanho máximo: agendar o próximo lote
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+        self._record_batch(len(lote))
+        asyncio.ensure_future(self._run_batch(lote))
+
+    async def _run_batch(self, lote: list):
+        loop = asyncio.get_running_loop()
+        self._in_flight += len(lote)
+        inicio = time.perf_counter()
+        try:
+            resultados, self.model_version = await loop.run_in_executor(
+                self._executor, _predict_batch, [f for f, _ in lote]
+            )
+        except Exception as e:
+            self._errors += 1
+            for _, future in lote:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= len(lote)
+            segundos = time.perf_counter() - inicio
+            self._inference_seconds += segundos
+            MODEL_INFERENCE_SECONDS.labels(self.mode).observe(segundos)
+
+        for (_, future), probabilidade in zip(lote, resultados):
+            if not future.done():
+                future.set_result(probabilidade)
+
+    def _record_batch(self, tamanho: int):
+        MODEL_BATCH_SIZE.observe(tamanho)
+        self._batches += 1
+        self._batched_requests += tamanho
+        self._max_batch = max(self._max_batch, tamanho)
+        for i, limite in enumerate(BATCH_SIZE_BUCKETS):
+            if tamanho <= limite:
+                self._batch_histogram[i] += 1
+                break
+        else:
+            self._batch_histogram[-1] += 1
+
+    def metrics(self) -> dict:
+        """Profundidade da fila e estatísticas de tamanho de lote"""
+        buckets = {f"<={limite}": n for limite, n in zip(BATCH_SIZE_BUCKETS, self._batch_histogram)}
+        buckets[f">{BATCH_SIZE_BUCKETS[-1]}"] = self._batch_histogram[-1]
+        return {
+            "modo": self.mode,
+            "workers": self.workers,
+            "janela_ms": self.batch_window * 1000,
+            "fila_pendente": len(self._pending),
+            "em_execucao": self._in_flight,
+            "requisicoes": self._requests,
+            "lotes": self._batches,
+            "erros": self._errors,
+            "media_lote": self._batched_requests / self._batches if self._batches else 0.0,
+            "maior_lote": self._max_batch,
+            "histograma_lote": buckets,
+            "tempo_inferencia_segundos": self._inference_seconds,
+            "versao_modelo": self.model_version,
+        }
@@ -0,0 +1,132 @@
+# app/ml/online_model.py
+import os
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from app.ml.churn_model import ChurnPredictor
+
+# Classes do problema (partial_fit precisa conhecê-las desde o primeiro lote)
+CLASSES = np.array([0, 1])
+
+
+class OnlineChurnPredictor(ChurnPredictor):
+    """Preditor de churn atualizado incrementalmente com partial_fit
+
+    Mesma interface do ChurnPredictor (predict_proba, predict_proba_batch,
+    train_model, save_model), com um modelo logístico (SGDClassifier) e um
+    StandardScaler atualizados em mini-lotes a partir de novos desfechos rotulados.
+    O estado é salvo em um único checkpoint a cada checkpoint_every amostras.
+    """
+
+    def __init__(self, model_path: str = "models/churn_online.pkl", batch_size: int = 256,
+                 checkpoint_every: int = 5000, alpha: float = 1e-4):
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.alpha = alpha
+        self.samples_seen = 0
+        self.samples_since_checkpoint = 0
+        self.last_labeled_at = None
+        self._online_model_path = model_path
+        super().__init__()
+
+    def _new_model(self) -> SGDClassifier:
+        return SGDClassifier(loss='log_loss', alpha=self.alpha, learning_rate='optimal',
+                             average=True, random_state=42)
+
+    def reset(self):
+        """Descartar o estado aprendido"""
+        self._model = self._new_model()
+        self._scaler = StandardScaler()
+        self.compact = None
+        self.is_trained = False
+        self.samples_seen = 0
+        self.samples_since_checkpoint = 0
+        self.last_labeled_at = None
+
+    def artifact_paths(self) -> list:
+        return [self.model_path]
+
+    def partial_fit(self, X, y) -> int:
+        """Atualizar scaler e modelo em mini-lotes; retorna o número de amostras usadas"""
+        if isinstance(X, pd.DataFrame):
+            X = X[self.feature_names].to_numpy(dtype=np.float64)
+        else:
+            X = np.array([self.feature_vector(f) for f in X]).reshape(-1, len(self.feature_names))
+        y = np.asarray(y, dtype=np.int64)
+
+        for inicio in range(0, len(X), self.batch_size):
+            X_lote = X[inicio:inicio + self.batch_size]
+            y_lote = y[inicio:inicio + self.batch_size]
+            self.scaler.partial_fit(X_lote)
+            self.model.partial_fit(self.scaler.transform(X_lote), y_lote, classes=CLASSES)
+
+            self.samples_seen += len(X_lote)
+            self.samples_since_checkpoint += len(X_lote)
+            self.is_trained = True
+            if self.samples_since_checkpoint >= self.checkpoint_every:
+                self.save_model()
+
+        return len(X)
+
+    def train_model(self, training_data: pd.DataFrame, epochs: int = 5):
+        """Treino inicial a partir de um histórico, em épocas de mini-lotes"""
+        X = training_data[self.feature_names]
+        y = training_data['churn']
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+
+        self.reset()
+        rng = np.random.default_rng(42)
+        for _ in range(epochs):
+            ordem = rng.permutation(len(X_train))
+            self.partial_fit(X_train.iloc[ordem], y_train.iloc[ordem].to_numpy())
+        self.save_model()
+
+        probabilidades = self.model.predict_proba(self.scaler.transform(X_test.to_numpy(dtype=np.float64)))[:, 1]
+        return {
+            'accuracy': accuracy_score(y_test, probabilidades >= 0.5),
+            'auc': roc_auc_score(y_test, probabilidades),
+        }
+
+    def save_model(self):
+        """Gravar o checkpoint (modelo, scaler e contadores) de forma atômica"""
+        os.makedirs(os.path.dirname(self.model_path) or ".", exist_ok=True)
+        tmp = f"{self.model_path}.{os.getpid()}.tmp"
+        joblib.dump({
+            'model': self.model,
+            'scaler': self.scaler,
+            'feature_names': self.feature_names,
+            'samples_seen': self.samples_seen,
+            'last_labeled_at': self.last_labeled_at,
+            'saved_at': datetime.utcnow(),
+        }, tmp)
+        os.replace(tmp, self.model_path)
+        self.samples_since_checkpoint = 0
+
+    def export_compact_model(self, path: str = None):
+        raise ValueError("O modelo online não é um ensemble de árvores")
+
+    def load_model(self):
+        """Carregar o último checkpoint, se existir"""
+        self.model_path = self._online_model_path
+        self.reset()
+        if not os.path.exists(self.model_path):
+            return
+
+        try:
+            checkpoint = joblib.load(self.model_path)
+            self._model = checkpoint['model']
+            self._scaler = checkpoint['scaler']
+            self.feature_names = checkpoint['feature_names']
+            self.samples_seen = checkpoint['samples_seen']
+            self.last_labeled_at = checkpoint['last_labeled_at']
+            self.is_trained = self.samples_seen > 0
+        except Exception as e:
+            print(f"Erro ao carregar checkpoint do modelo online: {e}")
+            self.reset()
@@ -0,0 +1,149 @@
+# app/ml/snapshot_store.py
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from datetime import date, datetime, time
+import numpy as np
+import pandas as pd
+from app.analytics import bitmap, columnar
+from app.ml.feature_engineering import FeatureEngineer, FEATURE_COLUMNS, FEATURE_SCHEMA_VERSION
+
+# Incrementar ao mudar o layout dos arquivos
+FORMAT_VERSION = 1
+
+# Métodos e módulos cujo código define o conteúdo dos snapshots
+FEATURE_CODE = (
+    FeatureEngineer.create_training_dataset,
+    FeatureEngineer.create_outcome_dataset,
+    FeatureEngineer._calculate_features,
+    FeatureEngineer._create_dataset_columnar,
+    # Bitmaps de presença e layout colunar usados pelo caminho colunar
+    bitmap,
+    columnar,
+)
+
+
+def feature_code_version() -> str:
+    """Hash do código das features: snapshots de outra versão não são reutilizados"""
+    digest = hashlib.sha1(f"{FORMAT_VERSION}:{FEATURE_SCHEMA_VERSION}:{FEATURE_COLUMNS}".encode())
+    for codigo in FEATURE_CODE:
+        digest.update(inspect.getsource(codigo).encode())
+    return digest.hexdigest()[:12]
+
+
+def snapshot_datetime(dia) -> datetime:
+    """Data de referência de um snapshot (meia-noite do dia)"""
+    if isinstance(dia, datetime):
+        dia = dia.date()
+    return datetime.combine(dia, time.min)
+
+
+class FeatureSnapshotStore:
+    """Snapshots datados de matrizes de features em arquivos .npy
+
+    Layout: <root>/<versão do código>/<tipo>/<AAAA-MM-DD>/ com features.npy
+    (float64 em ordem de coluna, uma coluna contígua por feature), churn.npy,
+    aluno_id.npy e meta.json. Os snapshots são lidos com mmap_mode='r', então
+    treino, notebook e backtests carregam o histórico sem copiar nem consultar
+    o banco, e apenas os snapshots ausentes são calculados.
+    """
+
+    def __init__(self, root: str = None, version: str = None):
+        self.root = root or os.getenv("FEATURE_SNAPSHOT_DIR", "data/snapshots")
+        self.version = version or feature_code_version()
+
+    def path(self, tipo: str, dia) -> str:
+        return os.path.join(self.root, self.version, tipo, snapshot_datetime(dia).date().isoformat())
+
+    def exists(self, tipo: str, dia) -> bool:
+        return os.path.exists(os.path.join(self.path(tipo, dia), "meta.json"))
+
+    def list_dates(self, tipo: str) -> list:
+        """Datas com snapshot salvo para a versão atual do código"""
+        diretorio = os.path.join(self.root, self.version, tipo)
+        if not os.path.isdir(diretorio):
+            return []
+        return sorted(
+            date.fromisoformat(nome) for nome in os.listdir(diretorio)
+            if os.path.exists(os.path.join(diretorio, nome, "meta.json"))
+        )
+
+    def save(self, tipo: str, dia, dados: pd.DataFrame, params: dict = None) -> str:
+        """Gravar um snapshot de forma atômica (diretório temporário + rename)"""
+        if len(dados) == 0:
+            dados = pd.DataFrame(columns=FEATURE_COLUMNS + ['churn', 'aluno_id'])
+
+        destino = self.path(tipo, dia)
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        colunas = [c for c in FEATURE_COLUMNS if c in dados.columns]
+        np.save(os.path.join(tmp, "features.npy"),
+                np.asfortranarray(dados[colunas].to_numpy(dtype=np.float64)).reshape(len(dados), len(colunas)))
+        np.save(os.path.join(tmp, "churn.npy"), dados['churn'].to_numpy(dtype=np.int8))
+        ids = dados['aluno_id'] if 'aluno_id' in dados.columns else pd.Series(-1, index=dados.index)
+        np.save(os.path.join(tmp, "aluno_id.npy"), ids.to_numpy(dtype=np.int64))
+
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({
+                'versao': self.version,
+                'tipo': tipo,
+                'data': snapshot_datetime(dia).date().isoformat(),
+                'colunas': colunas,
+                'linhas': int(len(dados)),
+                'params': params or {},
+                'criado_em': datetime.utcnow().isoformat(),
+            }, f, indent=2)
+
+        if os.path.exists(destino):
+            shutil.rmtree(destino)
+        os.replace(tmp, destino)
+        return destino
+
+    def load_arrays(self, tipo: str, dia) -> dict:
+        """Arrays mapeados em memória de um snapshot"""
+        caminho = self.path(tipo, dia)
+        if not self.exists(tipo, dia):
+            raise ValueError(f"Snapshot {tipo} de {snapshot_datetime(dia).date()} não encontrado")
+
+        with open(os.path.join(caminho, "meta.json")) as f:
+            meta = json.load(f)
+        return {
+            'meta': meta,
+            'features': np.load(os.path.join(caminho, "features.npy"), mmap_mode='r'),
+            'churn': np.load(os.path.join(caminho, "churn.npy"), mmap_mode='r'),
+            'aluno_id': np.load(os.path.join(caminho, "aluno_id.npy"), mmap_mode='r'),
+        }
+
+    def load(self, tipo: str, dia) -> pd.DataFrame:
+        """DataFrame sobre os arrays mapeados (sem cópia das features)"""
+        arrays = self.load_arrays(tipo, dia)
+        dados = pd.DataFrame(arrays['features'], columns=arrays['meta']['colunas'], copy=False)
+        dados['churn'] = arrays['churn']
+        dados['aluno_id'] = arrays['aluno_id']
+        return dados
+
+    def get_or_compute(self, tipo: str, dia, compute, params: dict = None) -> pd.DataFrame:
+        """Carregar o snapshot do dia ou calculá-lo com compute() e salvá-lo"""
+        if not self.exists(tipo, dia):
+            self.save(tipo, dia, compute(), params=params)
+        return self.load(tipo, dia)
+
+    def ensure(self, tipo: str, dias: list, compute, params: dict = None) -> list:
+        """Calcular apenas os snapshots ausentes; compute recebe a data de referência"""
+        calculados = []
+        for dia in dias:
+            if not self.exists(tipo, dia):
+                self.save(tipo, dia, compute(snapshot_datetime(dia)), params=params)
+                calculados.append(snapshot_datetime(dia).date())
+        return calculados
+
+    def load_range(self, tipo: str, dias: list) -> pd.DataFrame:
+        """Concatenar vários snapshots (uma cópia, ao contrário de load)"""
+        partes = [self.load(tipo, dia).assign(data_snapshot=snapshot_datetime(dia).date()) for dia in dias]
+        if not partes:
+            return pd.DataFrame(columns=FEATURE_COLUMNS + ['churn', 'aluno_id', 'data_snapshot'])
+        return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,203 @@
+# app/ml/training_pipeline.py
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score, accuracy_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+from app.ml.compact_forest import CompactForest
+
+# Espaço de busca padrão: o número de árvores e a profundidade limitam a latência
+DEFAULT_SEARCH_SPACE = [
+    {'n_estimators': n_estimators, 'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf}
+    for n_estimators in (25, 50, 100, 200)
+    for max_depth in (6, 10, 14, None)
+    for min_samples_leaf in (1, 4)
+]
+
+
+def _evaluate_candidate(params: dict, X, y, folds: list, seed: int):
+    """Validação cruzada de um candidato e ajuste final no conjunto de treino
+
+    X chega como memmap do cache de features: os processos do pool leem o
+    mesmo arquivo sem copiar a matriz para cada candidato.
+    """
+    aucs = []
+    for train_idx, test_idx in folds:
+        model = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+        model.fit(X[train_idx], y[train_idx])
+        aucs.append(roc_auc_score(y[test_idx], model.predict_proba(X[test_idx])[:, 1]))
+
+    model = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    model.fit(X, y)
+    return params, float(np.mean(aucs)), model
+
+
+def _single_row_latency_us(forest: CompactForest, X: np.ndarray, repeticoes: int = 200) -> float:
+    """Latência mediana de predict_one, em microssegundos"""
+    amostras = []
+    for i in range(repeticoes):
+        x = X[i % len(X)]
+        inicio = time.perf_counter()
+        forest.predict_one(x)
+        amostras.append(time.perf_counter() - inicio)
+    return float(np.median(amostras) * 1e6)
+
+
+class TrainingPipeline:
+    """Pipeline de treino com busca de hiperparâmetros em paralelo
+
+    Etapas: preparação (split, scaler e cache da matriz de features), busca com
+    validação cruzada em um pool de processos, medição de latência dos candidatos,
+    seleção equilibrando AUC e latência, comparação com o modelo atual no mesmo
+    holdout e promoção apenas se o candidato for melhor. O tempo de cada etapa
+    fica registrado em self.timings.
+    """
+
+    def __init__(self, feature_names: list = None, search_space: list = None, cv_folds: int = 3,
+                 n_jobs: int = -1, latency_budget_us: float = 250.0, auc_tolerance: float = 0.002,
+                 min_improvement: float = 0.0, cache_dir: str = "models/cache",
+                 report_path: str = "models/training_report.json", random_state: int = 42):
+        self.feature_names = feature_names
+        self.search_space = search_space or DEFAULT_SEARCH_SPACE
+        self.cv_folds = cv_folds
+        self.n_jobs = n_jobs
+        self.latency_budget_us = latency_budget_us
+        self.auc_tolerance = auc_tolerance
+        self.min_improvement = min_improvement
+        self.cache_dir = cache_dir
+        self.report_path = report_path
+        self.random_state = random_state
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, nome: str):
+        """Registrar o tempo de uma etapa"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[nome] = round(time.perf_counter() - inicio, 4)
+
+    def run(self, training_data: pd.DataFrame, predictor) -> dict:
+        """Executar a busca e promover o melhor candidato se superar o modelo atual"""
+        feature_names = self.feature_names or predictor.feature_names
+
+        with self.stage('preparacao'):
+            X = training_data[feature_names].to_numpy(dtype=np.float64)
+            y = training_data['churn'].to_numpy(dtype=np.int64)
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=self.random_state, stratify=y
+            )
+            scaler = StandardScaler().fit(X_train)
+            X_train_cached = self._cached_matrix(scaler.transform(X_train))
+            folds = list(StratifiedKFold(
+                n_splits=self.cv_folds, shuffle=True, random_state=self.random_state
+            ).split(X_train_cached, y_train))
+
+        with self.stage('busca'):
+            resultados = Parallel(n_jobs=self.n_jobs)(
+                delayed(_evaluate_candidate)(params, X_train_cached, y_train, folds, self.random_state)
+                for params in self.search_space
+            )
+
+        with self.stage('latencia'):
+            candidatos = []
+            for params, cv_auc, model in resultados:
+                forest = CompactForest.from_sklearn(model, scaler)
+                candidatos.append({
+                    'params': params,
+                    'cv_auc': round(cv_auc, 4),
+                    'latencia_us': round(_single_row_latency_us(forest, X_test), 1),
+                    'nos': int(len(forest.feature)),
+                    '_model': model,
+                    '_forest': forest,
+                })
+
+        with self.stage('selecao'):
+            escolhido = self._select(candidatos)
+
+        with self.stage('comparacao'):
+            auc_candidato = float(roc_auc_score(y_test, escolhido['_forest'].predict_proba(X_test)))
+            accuracy = float(accuracy_score(y_test, escolhido['_model'].predict(scaler.transform(X_test))))
+            auc_atual = self._current_auc(predictor, feature_names, X_test, y_test)
+            promovido = auc_atual is None or auc_candidato > auc_atual + self.min_improvement
+
+        if promovido:
+            with self.stage('promocao'):
+                predictor.feature_names = feature_names
+                predictor.model = escolhido['_model']
+                predictor.scaler = scaler
+                predictor.compact = escolhido['_forest']
+                predictor.is_trained = True
+                predictor.save_model()
+
+        relatorio = {
+            'data': datetime.utcnow().isoformat(),
+            'amostras': int(len(X)),
+            'features': feature_names,
+            'escolhido': {k: v for k, v in escolhido.items() if not k.startswith('_')},
+            'auc_candidato': round(auc_candidato, 4),
+            'auc_atual': None if auc_atual is None else round(auc_atual, 4),
+            'accuracy': accuracy,
+            'promovido': promovido,
+            'candidatos': [
+                {k: v for k, v in c.items() if not k.startswith('_')}
+                for c in sorted(candidatos, key=lambda c: -c['cv_auc'])
+            ],
+            'tempos': dict(self.timings),
+        }
+        self._save_report(relatorio)
+        return relatorio
+
+    def _select(self, candidatos: list) -> dict:
+        """Melhor AUC dentro do orçamento de latência; entre empates, o mais rápido"""
+        dentro = [c for c in candidatos if c['latencia_us'] <= self.latency_budget_us]
+        if not dentro:
+            return min(candidatos, key=lambda c: c['latencia_us'])
+
+        melhor_auc = max(c['cv_auc'] for c in dentro)
+        empatados = [c for c in dentro if c['cv_auc'] >= melhor_auc - self.auc_tolerance]
+        return min(empatados, key=lambda c: c['latencia_us'])
+
+    def _current_auc(self, predictor, feature_names, X_test, y_test):
+        """AUC do modelo em produção no mesmo holdout (None se não houver modelo)"""
+        if not predictor.is_trained:
+            return None
+        try:
+            linhas = [dict(zip(feature_names, x)) for x in X_test]
+            return float(roc_auc_score(y_test, predictor.predict_proba_batch(linhas)))
+        except Exception as e:
+            print(f"Não foi possível avaliar o modelo atual: {e}")
+            return None
+
+    def _cached_matrix(self, X: np.ndarray) -> np.ndarray:
+        """Gravar a matriz de features uma vez e devolvê-la mapeada em memória"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        digest = hashlib.sha1(np.ascontiguousarray(X).tobytes()).hexdigest()[:16]
+        path = os.path.join(self.cache_dir, f"features_{digest}.npy")
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, X)
+            os.replace(tmp, path)
+            # Manter apenas a matriz do treino atual
+            for nome in os.listdir(self.cache_dir):
+                antigo = os.path.join(self.cache_dir, nome)
+                if nome.startswith("features_") and nome.endswith(".npy") and antigo != path:
+                    os.remove(antigo)
+        return np.load(path, mmap_mode='r')
+
+    def _save_report(self, relatorio: dict):
+        if not self.report_path:
+            return
+        os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+        with open(self.report_path, 'w') as f:
+            json.dump(relatorio, f, indent=2, default=str)
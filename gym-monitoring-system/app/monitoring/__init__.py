@@ -0,0 +1,3 @@
+"""
+Módulo de monitoramento de desempenho para o sistema de monitoramento de academia.
+"""
@@ -0,0 +1,129 @@
+# app/monitoring/celery_metrics.py
+"""Métricas das tarefas Celery: duração, resultado, retentativas e atraso na fila
+
+Os sinais do Celery alimentam o registro do processo; o worker expõe /metrics em
+CELERY_METRICS_PORT (0 desativa). O exportador sobe em worker_init, no processo
+principal, então as tarefas precisam rodar nesse mesmo processo: o worker deve ser
+iniciado com --pool=solo (ou threads). Com prefork os sinais das tarefas disparam
+nos processos filhos e /metrics nunca as veria; nesse caso o exportador não sobe e
+o worker registra um erro.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+from celery import concurrency, signals
+from app.monitoring.metrics import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Tarefas vão de milissegundos (checkin) a dezenas de minutos (treino do modelo)
+TASK_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+QUEUE_LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+# Cabeçalho com o instante da publicação (epoch em segundos)
+SENT_AT_HEADER = 'enviado_em'
+
+TASK_DURATION = Histogram(
+    'gym_celery_task_duration_seconds', 'Duração das tarefas Celery', ['task', 'state'],
+    buckets=TASK_DURATION_BUCKETS
+)
+TASKS_TOTAL = Counter(
+    'gym_celery_tasks_total', 'Execuções de tarefas Celery por estado final', ['task', 'state']
+)
+TASK_RETRIES = Counter(
+    'gym_celery_task_retries_total', 'Retentativas agendadas por tarefa', ['task']
+)
+QUEUE_LAG = Histogram(
+    'gym_celery_queue_lag_seconds', 'Espera entre a publicação (ou o eta) e o início da tarefa', ['task'],
+    buckets=QUEUE_LAG_BUCKETS
+)
+TASKS_IN_PROGRESS = Gauge(
+    'gym_celery_tasks_in_progress', 'Tarefas Celery em execução', ['task']
+)
+
+# Pools em que as tarefas rodam no processo que serve /metrics
+SAME_PROCESS_POOLS = ('solo', 'threads')
+
+# Início de cada execução em andamento, por task_id
+_inicios = {}
+_instalado = False
+
+
+def _on_publish(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(SENT_AT_HEADER, time.time())
+
+
+def _enviado_em(request):
+    enviado = getattr(request, SENT_AT_HEADER, None)
+    if enviado is None:
+        enviado = (getattr(request, 'headers', None) or {}).get(SENT_AT_HEADER)
+    return enviado
+
+
+def _liberado_em(request, enviado: float) -> float:
+    """Tarefas com eta/countdown só contam atraso a partir do horário agendado"""
+    eta = getattr(request, 'eta', None)
+    if not eta:
+        return enviado
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    return max(enviado, eta.timestamp())
+
+
+def _on_prerun(task_id=None, task=None, **kwargs):
+    _inicios[task_id] = time.perf_counter()
+    TASKS_IN_PROGRESS.labels(task.name).inc()
+    enviado = _enviado_em(task.request)
+    if enviado is not None:
+        QUEUE_LAG.labels(task.name).observe(max(0.0, time.time() - _liberado_em(task.request, float(enviado))))
+
+
+def _on_postrun(task_id=None, task=None, state=None, **kwargs):
+    inicio = _inicios.pop(task_id, None)
+    TASKS_IN_PROGRESS.labels(task.name).dec()
+    estado = (state or 'unknown').lower()
+    TASKS_TOTAL.labels(task.name, estado).inc()
+    if inicio is not None:
+        TASK_DURATION.labels(task.name, estado).observe(time.perf_counter() - inicio)
+
+
+def _on_retry(sender=None, **kwargs):
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+def pool_no_mesmo_processo(pool_cls) -> bool:
+    """Se o pool (nome ou classe) executa as tarefas no processo do worker"""
+    implementacao = concurrency.get_implementation(pool_cls)
+    return any(implementacao is concurrency.get_implementation(nome) for nome in SAME_PROCESS_POOLS)
+
+
+def _on_worker_init(sender=None, **kwargs):
+    porta = int(os.getenv('CELERY_METRICS_PORT', '9808'))
+    if porta <= 0:
+        return
+    if sender is not None and not pool_no_mesmo_processo(sender.pool_cls):
+        logger.error(
+            f"Métricas do worker desativadas: o pool {sender.pool_cls!r} executa as tarefas em processos "
+            f"filhos; inicie o worker com --pool=solo ou --pool=threads"
+        )
+        return
+    try:
+        start_http_server(porta)
+        logger.info(f"Métricas do worker em :{porta}/metrics")
+    except OSError as e:
+        logger.error(f"Não foi possível servir as métricas do worker na porta {porta}: {e}")
+
+
+def install_celery_metrics():
+    """Conectar os sinais do Celery (idempotente)"""
+    global _instalado
+    if _instalado:
+        return
+    signals.before_task_publish.connect(_on_publish, weak=False)
+    signals.task_prerun.connect(_on_prerun, weak=False)
+    signals.task_postrun.connect(_on_postrun, weak=False)
+    signals.task_retry.connect(_on_retry, weak=False)
+    signals.worker_init.connect(_on_worker_init, weak=False)
+    _instalado = True
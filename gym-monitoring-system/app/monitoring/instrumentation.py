@@ -0,0 +1,341 @@
+# app/monitoring/instrumentation.py
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+import redis
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from starlette.datastructures import MutableHeaders
+from app.monitoring.metrics import Counter, Gauge, Histogram as MetricHistogram
+
+logger = logging.getLogger(__name__)
+
+# Limites (ms) dos buckets de latência
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Limites dos buckets de número de consultas por requisição
+QUERY_COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000]
+
+# Comandos de leitura do Redis contados como acerto/falha de cache
+CACHE_READ_COMMANDS = {'GET', 'HGET', 'HGETALL', 'MGET'}
+
+# Estatísticas da requisição em andamento (None fora de requisições)
+_current_request = ContextVar('current_request', default=None)
+
+# Métricas expostas em /metrics
+HTTP_REQUEST_DURATION = MetricHistogram(
+    'gym_http_request_duration_seconds', 'Duração das requisições HTTP', ['method', 'route', 'status']
+)
+HTTP_REQUEST_QUERIES = MetricHistogram(
+    'gym_http_request_db_queries', 'Consultas ao banco por requisição', ['route'], buckets=QUERY_COUNT_BUCKETS
+)
+REDIS_COMMAND_DURATION = MetricHistogram(
+    'gym_redis_command_duration_seconds', 'Duração dos comandos Redis', ['command'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+CACHE_REQUESTS = Counter(
+    'gym_cache_requests_total', 'Leituras de cache por prefixo da chave e resultado', ['prefix', 'result']
+)
+DB_POOL_CHECKOUT_WAIT = MetricHistogram(
+    'gym_db_pool_checkout_wait_seconds', 'Espera para obter uma conexão do pool do SQLAlchemy', ['pool']
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'gym_db_pool_connections', 'Conexões do pool por estado', ['pool', 'state']
+)
+
+# Engines medidos por nome do pool (primario, replica), lidos na coleta de DB_POOL_CONNECTIONS;
+# o pool é lido do engine a cada coleta porque engine.dispose() troca o pool
+_engines = {}
+
+
+class RequestStats:
+    """Tempos e contadores de uma requisição"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.db_segundos = 0.0
+        self.consultas = 0
+        self.redis_segundos = 0.0
+        self.redis_chamadas = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.inicio
+
+    def server_timing(self) -> str:
+        """Valor do header Server-Timing (durações em ms)"""
+        return ", ".join([
+            f"total;dur={self.elapsed() * 1000:.1f}",
+            f'db;dur={self.db_segundos * 1000:.1f};desc="{self.consultas} consultas"',
+            f'redis;dur={self.redis_segundos * 1000:.1f};desc="{self.redis_chamadas} chamadas"',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+        ])
+
+
+def current_request() -> RequestStats:
+    return _current_request.get()
+
+
+class Histogram:
+    """Histograma de buckets fixos com percentis aproximados (interpolação no bucket)"""
+
+    def __init__(self, buckets: list):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último: acima do maior limite
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, valor: float):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            self.counts[indice] += 1
+            self.total += 1
+            self.soma += valor
+            self.maximo = max(self.maximo, valor)
+
+    def percentile(self, q: float) -> float:
+        if self.total == 0:
+            return 0.0
+        alvo = q * self.total
+        acumulado = 0
+        for indice, contagem in enumerate(self.counts):
+            if contagem and acumulado + contagem >= alvo:
+                inferior = self.buckets[indice - 1] if indice > 0 else 0.0
+                superior = self.buckets[indice] if indice < len(self.buckets) else self.maximo
+                valor = inferior + (superior - inferior) * (alvo - acumulado) / contagem
+                return min(valor, self.maximo)
+            acumulado += contagem
+        return self.maximo
+
+    def snapshot(self) -> dict:
+        return {
+            'total': self.total,
+            'media': self.soma / self.total if self.total else 0.0,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'maximo': self.maximo,
+        }
+
+
+class RequestMetrics:
+    """Histogramas por rota de latência, tempo de banco e número de consultas"""
+
+    def __init__(self):
+        self.rotas = {}
+        self._lock = threading.Lock()
+
+    def _rota(self, rota: str) -> dict:
+        metricas = self.rotas.get(rota)
+        if metricas is None:
+            with self._lock:
+                metricas = self.rotas.setdefault(rota, {
+                    'latencia_ms': Histogram(LATENCY_BUCKETS_MS),
+                    'db_ms': Histogram(LATENCY_BUCKETS_MS),
+                    'consultas': Histogram(QUERY_COUNT_BUCKETS),
+                    'redis_chamadas': 0,
+                    'cache_hits': 0,
+                    'cache_misses': 0,
+                })
+        return metricas
+
+    def record(self, rota: str, stats: RequestStats, segundos: float):
+        metricas = self._rota(rota)
+        metricas['latencia_ms'].observe(segundos * 1000)
+        metricas['db_ms'].observe(stats.db_segundos * 1000)
+        metricas['consultas'].observe(stats.consultas)
+        with self._lock:
+            metricas['redis_chamadas'] += stats.redis_chamadas
+            metricas['cache_hits'] += stats.cache_hits
+            metricas['cache_misses'] += stats.cache_misses
+
+    def snapshot(self) -> dict:
+        resultado = {}
+        for rota, metricas in list(self.rotas.items()):
+            resultado[rota] = {
+                nome: valor.snapshot() if isinstance(valor, Histogram) else valor
+                for nome, valor in metricas.items()
+            }
+        return resultado
+
+
+# Registro do processo, exposto em /metricas/requisicoes
+request_metrics = RequestMetrics()
+
+
+class PerformanceMiddleware:
+    """Middleware ASGI: tempo total, de banco e de Redis por requisição
+
+    Adiciona o header Server-Timing, registra os histogramas por rota e avisa no log
+    quando uma requisição passa de query_warn_threshold consultas (N+1). Respostas
+    text/event-stream (SSE) não entram nos histogramas: a duração é a da conexão.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics = None, query_warn_threshold: int = None):
+        self.app = app
+        self.metrics = metrics or request_metrics
+        if query_warn_threshold is None:
+            query_warn_threshold = int(os.getenv("PERF_QUERY_WARN_THRESHOLD", "20"))
+        self.query_warn_threshold = query_warn_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = 500
+        stream = False
+
+        async def send_with_timing(message):
+            nonlocal status, stream
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = MutableHeaders(scope=message)
+                stream = headers.get('content-type', '').startswith('text/event-stream')
+                headers.append('Server-Timing', stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            if not stream:
+                self._registrar(scope, stats, status)
+
+    def _registrar(self, scope, stats: RequestStats, status: int):
+        segundos = stats.elapsed()
+        rota = self._rota(scope)
+        self.metrics.record(rota, stats, segundos)
+        metodo, caminho = rota.split(' ', 1)
+        HTTP_REQUEST_DURATION.labels(metodo, caminho, status).observe(segundos)
+        HTTP_REQUEST_QUERIES.labels(caminho).observe(stats.consultas)
+        if stats.consultas > self.query_warn_threshold:
+            logger.warning(
+                f"{rota}: {stats.consultas} consultas em uma requisição "
+                f"({stats.db_segundos * 1000:.1f} ms de banco) - possível N+1"
+            )
+
+    def _rota(self, scope) -> str:
+        # Template da rota (/aluno/{aluno_id}/frequencia), não o caminho com ids
+        route = scope.get('route')
+        caminho = getattr(route, 'path', None) or 'sem_rota'
+        return f"{scope['method']} {caminho}"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('instrumentation_inicio', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info['instrumentation_inicio'].pop()
+    stats = _current_request.get()
+    if stats is not None:
+        stats.db_segundos += time.perf_counter() - inicio
+        stats.consultas += 1
+
+
+def _handle_error(exception_context):
+    # Consulta com erro: descartar o início registrado
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('instrumentation_inicio'):
+        conn.info['instrumentation_inicio'].pop()
+
+
+def instrument_engine(engine, pool_name: str = 'primario'):
+    """Contar consultas e tempo de banco da requisição atual e medir o pool (idempotente)"""
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    instrument_pool(engine, pool_name)
+    return engine
+
+
+class MeasuredQueuePool(QueuePool):
+    """QueuePool que mede a espera no checkout (gym_db_pool_checkout_wait_seconds)
+
+    Usado como poolclass em create_db_engine; o nome do pool vem de instrument_pool
+    e é mantido quando engine.dispose() recria o pool.
+    """
+
+    pool_name = 'primario'
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.pool_name).observe(time.perf_counter() - inicio)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.pool_name = self.pool_name
+        return pool
+
+
+def instrument_pool(engine, pool_name: str = 'primario'):
+    """Expor o estado do pool e nomear a espera no checkout (se for um MeasuredQueuePool)"""
+    if isinstance(engine.pool, MeasuredQueuePool):
+        engine.pool.pool_name = pool_name
+    _engines[pool_name] = engine
+    DB_POOL_CONNECTIONS.set_function(_estado_pools)
+    return engine
+
+
+def _estado_pools():
+    estados = {}
+    for pool_name, engine in list(_engines.items()):
+        pool = engine.pool
+        for nome, metodo in (('checked_out', 'checkedout'), ('idle', 'checkedin'), ('overflow', 'overflow')):
+            if hasattr(pool, metodo):
+                estados[(pool_name, nome)] = max(0, getattr(pool, metodo)())
+    return estados
+
+
+class RedisInstrumentationMixin:
+    """Tempo e número de comandos Redis, e acerto/falha das leituras de cache"""
+
+    def execute_command(self, *args, **options):
+        stats = _current_request.get()
+        comando = str(args[0]).upper()
+        inicio = time.perf_counter()
+        try:
+            resultado = super().execute_command(*args, **options)
+        finally:
+            segundos = time.perf_counter() - inicio
+            REDIS_COMMAND_DURATION.labels(comando).observe(segundos)
+            if stats is not None:
+                stats.redis_segundos += segundos
+                stats.redis_chamadas += 1
+
+        if comando in CACHE_READ_COMMANDS:
+            if comando == 'MGET':
+                # Uma leitura por chave: cada valor ausente é uma falta
+                leituras = zip(args[1:], resultado or [])
+            else:
+                # HGETALL devolve {} para chave inexistente
+                acerto = bool(resultado) if comando == 'HGETALL' else resultado is not None
+                leituras = [(args[1] if len(args) > 1 else '', resultado if acerto else None)]
+            for chave, valor in leituras:
+                acerto = valor is not None
+                prefixo = str(chave).split(':', 1)[0]
+                CACHE_REQUESTS.labels(prefixo, 'hit' if acerto else 'miss').inc()
+                if stats is not None:
+                    if acerto:
+                        stats.cache_hits += 1
+                    else:
+                        stats.cache_misses += 1
+        return resultado
+
+
+class InstrumentedRedis(RedisInstrumentationMixin, redis.Redis):
+    """Cliente Redis com instrumentação por requisição"""
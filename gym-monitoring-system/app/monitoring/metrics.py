@@ -0,0 +1,247 @@
+# app/monitoring/metrics.py
+"""Registro mínimo de métricas no formato de exposição de texto do Prometheus
+
+Contadores, gauges e histogramas com rótulos; cada série tem o próprio lock, então o
+custo de um inc/observe é uma busca em dicionário e uma soma.
+"""
+import bisect
+import math
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+# Limites (segundos) padrão dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(valor: float) -> str:
+    if valor == math.inf:
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return f"{valor:.1f}"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _format_labels(nomes, valores, extra: dict = None) -> str:
+    pares = [f'{nome}="{_escape(valor)}"' for nome, valor in zip(nomes, valores)]
+    pares += [f'{nome}="{_escape(valor)}"' for nome, valor in (extra or {}).items()]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Registry:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def register(self, metrica):
+        with self._lock:
+            if metrica.name in self._metricas:
+                raise ValueError(f"Métrica {metrica.name} já registrada")
+            self._metricas[metrica.name] = metrica
+
+    def get(self, nome: str):
+        return self._metricas.get(nome)
+
+    def render(self) -> str:
+        """Todas as métricas no formato de texto 0.0.4"""
+        linhas = []
+        for metrica in list(self._metricas.values()):
+            linhas.append(f"# HELP {metrica.name} {_escape(metrica.documentation)}")
+            linhas.append(f"# TYPE {metrica.name} {metrica.tipo}")
+            for sufixo, labels, valor in metrica.samples():
+                linhas.append(f"{metrica.name}{sufixo}{labels} {_format_value(valor)}")
+        return "\n".join(linhas) + "\n"
+
+
+# Registro do processo (API ou worker)
+REGISTRY = Registry()
+
+
+class _Metric:
+    tipo = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        self._function = None
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *valores, **rotulos):
+        if rotulos:
+            valores = tuple(rotulos[nome] for nome in self.labelnames)
+        chave = tuple(str(v) for v in valores)
+        if len(chave) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera os rótulos {self.labelnames}")
+        serie = self._series.get(chave)
+        if serie is None:
+            with self._lock:
+                serie = self._series.setdefault(chave, self._new_series())
+        return serie
+
+    def remove(self, *valores):
+        with self._lock:
+            self._series.pop(tuple(str(v) for v in valores), None)
+
+    def _default(self):
+        return self.labels()
+
+
+class _CounterSeries:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, quantidade: float = 1.0):
+        with self._lock:
+            self.value += quantidade
+
+
+class Counter(_Metric):
+    """Contador monotônico (o nome já deve terminar em _total)"""
+    tipo = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, quantidade: float = 1.0):
+        self._default().inc(quantidade)
+
+    def samples(self):
+        for chave, serie in list(self._series.items()):
+            yield "", _format_labels(self.labelnames, chave), serie.value
+
+
+class _GaugeSeries(_CounterSeries):
+    def set(self, valor: float):
+        with self._lock:
+            self.value = valor
+
+    def dec(self, quantidade: float = 1.0):
+        self.inc(-quantidade)
+
+
+class Gauge(_Metric):
+    tipo = "gauge"
+
+    def _new_series(self):
+        return _GaugeSeries()
+
+    def set(self, valor: float):
+        self._default().set(valor)
+
+    def inc(self, quantidade: float = 1.0):
+        self._default().inc(quantidade)
+
+    def dec(self, quantidade: float = 1.0):
+        self._default().dec(quantidade)
+
+    def set_function(self, funcao):
+        """Valor calculado na coleta: número (sem rótulos) ou {valores dos rótulos: número}"""
+        self._function = funcao
+
+    def samples(self):
+        if self._function is not None:
+            valores = self._function()
+            if not isinstance(valores, dict):
+                valores = {(): valores}
+            for chave, valor in valores.items():
+                chave = chave if isinstance(chave, tuple) else (chave,)
+                yield "", _format_labels(self.labelnames, chave), valor
+            return
+        for chave, serie in list(self._series.items()):
+            yield "", _format_labels(self.labelnames, chave), serie.value
+
+
+class _HistogramSeries:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, valor: float):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            self.counts[indice] += 1
+            self.sum += valor
+
+
+class Histogram(_Metric):
+    tipo = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, valor: float):
+        self._default().observe(valor)
+
+    def samples(self):
+        for chave, serie in list(self._series.items()):
+            with serie._lock:
+                counts, soma = list(serie.counts), serie.sum
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (math.inf,), counts):
+                acumulado += contagem
+                yield "_bucket", _format_labels(self.labelnames, chave, {"le": _format_value(float(limite))}), acumulado
+            yield "_sum", _format_labels(self.labelnames, chave), soma
+            yield "_count", _format_labels(self.labelnames, chave), acumulado
+
+
+def parse_text(texto: str) -> dict:
+    """Ler o formato de texto: {(nome da amostra, rótulos ordenados): valor}"""
+    amostras = {}
+    for linha in texto.splitlines():
+        if not linha or linha.startswith("#"):
+            continue
+        serie, valor = linha.rsplit(" ", 1)
+        nome, _, rotulos = serie.partition("{")
+        pares = [
+            (chave, re.sub(r'\\(.)', lambda m: "\n" if m.group(1) == "n" else m.group(1), conteudo))
+            for chave, conteudo in _LABEL_RE.findall(rotulos)
+        ]
+        amostras[(nome, tuple(sorted(pares)))] = float(valor.replace("+Inf", "inf"))
+    return amostras
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Servir /metrics em uma thread daemon (processos sem a API, como o worker Celery)"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    servidor = ThreadingHTTPServer((host, port), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metrics-http", daemon=True).start()
+    return servidor
@@ -0,0 +1,340 @@
+# app/services/alertas_retencao.py
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Callable
+import httpx
+from app.monitoring.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Alunos por requisição/e-mail e envios simultâneos por destino
+ALERT_BATCH_SIZE = 100
+ALERT_CONCURRENCY = 4
+
+# Tentativas por lote e espera máxima (com jitter) entre elas
+ALERT_MAX_ATTEMPTS = 4
+ALERT_RETRY_BASE_SECONDS = 0.5
+ALERT_RETRY_MAX_SECONDS = 30.0
+
+# Um aluno não é alertado de novo no mesmo nível e destino dentro desse período
+ALERT_DEDUPE_HOURS = 72
+
+# Reserva do alerta enquanto ele é enviado (liberada se o envio falhar)
+ALERT_RESERVE_SECONDS = 600
+
+# Métricas exportadas pelo worker (CELERY_METRICS_PORT)
+ALERTS_TOTAL = Counter('gym_retention_alerts_total', 'Alertas de retenção por destino e resultado',
+                       ['sink', 'resultado'])
+ALERT_RETRIES = Counter('gym_retention_alert_retries_total', 'Novas tentativas de envio de alertas', ['sink'])
+
+
+class FalhaTemporaria(Exception):
+    """Falha que vale uma nova tentativa: rede, HTTP 429/5xx, SMTP 4xx"""
+
+
+class SinkWebhook:
+    """POST JSON {"nivel": ..., "alertas": [...]} por lote, em conexões keep-alive compartilhadas"""
+
+    nome = 'webhook'
+
+    def __init__(self, url: str, token: str = None, batch_size: int = ALERT_BATCH_SIZE,
+                 concorrencia: int = ALERT_CONCURRENCY, timeout: float = 10.0):
+        self.url = url
+        self.headers = {'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+        self.batch_size = batch_size
+        self.concorrencia = concorrencia
+        self.timeout = timeout
+        self._client = None
+
+    async def abrir(self):
+        limites = httpx.Limits(max_connections=self.concorrencia, max_keepalive_connections=self.concorrencia)
+        self._client = httpx.AsyncClient(headers=self.headers, timeout=self.timeout, limits=limites)
+
+    async def fechar(self):
+        await self._client.aclose()
+
+    async def enviar(self, lote: list, nivel: str):
+        corpo = json.dumps({'nivel': nivel, 'alertas': lote}, default=str)
+        try:
+            resposta = await self._client.post(self.url, content=corpo)
+        except httpx.TransportError as e:
+            raise FalhaTemporaria(f"{type(e).__name__}: {e}") from e
+        if resposta.status_code == 429 or resposta.status_code >= 500:
+            raise FalhaTemporaria(f"HTTP {resposta.status_code}")
+        resposta.raise_for_status()
+
+
+class SinkSMTP:
+    """Um e-mail por lote para a equipe de retenção, com as conexões SMTP reaproveitadas"""
+
+    nome = 'smtp'
+
+    def __init__(self, host: str, port: int = 25, remetente: str = 'alertas@gym.local', destinatarios: list = None,
+                 usuario: str = None, senha: str = None, starttls: bool = False,
+                 batch_size: int = ALERT_BATCH_SIZE, concorrencia: int = 2, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.remetente = remetente
+        self.destinatarios = destinatarios or []
+        self.usuario = usuario
+        self.senha = senha
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.concorrencia = concorrencia
+        self.timeout = timeout
+        self._livres = []
+        self._lock = threading.Lock()
+
+    async def abrir(self):
+        pass
+
+    async def fechar(self):
+        with self._lock:
+            conexoes, self._livres = self._livres, []
+        for conexao in conexoes:
+            await asyncio.to_thread(self._encerrar, conexao)
+
+    async def enviar(self, lote: list, nivel: str):
+        await asyncio.to_thread(self._enviar, self._mensagem(lote, nivel))
+
+    def _mensagem(self, lote: list, nivel: str) -> EmailMessage:
+        mensagem = EmailMessage()
+        mensagem['Subject'] = f"{len(lote)} aluno(s) em risco {nivel} de cancelamento"
+        mensagem['From'] = self.remetente
+        mensagem['To'] = ', '.join(self.destinatarios)
+        mensagem.set_content("\n".join(
+            f"{a['nome']} (ID: {a['aluno_id']}) - Probabilidade: {a['probabilidade']:.2%}" for a in lote
+        ))
+        return mensagem
+
+    def _enviar(self, mensagem: EmailMessage):
+        with self._lock:
+            conexao = self._livres.pop() if self._livres else None
+        try:
+            if conexao is None:
+                conexao = self._conectar()
+            conexao.send_message(mensagem)
+        except smtplib.SMTPResponseException as e:
+            self._encerrar(conexao)
+            if 400 <= e.smtp_code < 500:
+                raise FalhaTemporaria(f"SMTP {e.smtp_code}: {e.smtp_error}") from e
+            raise
+        except smtplib.SMTPRecipientsRefused:
+            self._encerrar(conexao)
+            raise
+        except OSError as e:
+            # Conexão recusada, expirada ou fechada pelo servidor enquanto ociosa
+            self._encerrar(conexao)
+            raise FalhaTemporaria(f"{type(e).__name__}: {e}") from e
+        with self._lock:
+            self._livres.append(conexao)
+
+    def _conectar(self) -> smtplib.SMTP:
+        conexao = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            conexao.starttls()
+        if self.usuario:
+            conexao.login(self.usuario, self.senha)
+        return conexao
+
+    @staticmethod
+    def _encerrar(conexao):
+        if conexao is None:
+            return
+        try:
+            conexao.quit()
+        except (OSError, smtplib.SMTPException):
+            conexao.close()
+
+
+class SinkArquivo:
+    """Uma linha JSON por alerta, acrescentada ao arquivo (integração com CRM por importação)"""
+
+    nome = 'arquivo'
+
+    def __init__(self, caminho: str, batch_size: int = 1000):
+        self.caminho = Path(caminho)
+        self.batch_size = batch_size
+        self.concorrencia = 1
+
+    async def abrir(self):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+
+    async def fechar(self):
+        pass
+
+    async def enviar(self, lote: list, nivel: str):
+        enviado_em = datetime.utcnow().isoformat()
+        linhas = "".join(
+            json.dumps({**aluno, 'nivel': nivel, 'enviado_em': enviado_em}, default=str) + "\n" for aluno in lote
+        )
+        await asyncio.to_thread(self._acrescentar, linhas)
+
+    def _acrescentar(self, linhas: str):
+        with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linhas)
+
+
+class EntregaAlertas:
+    """Entrega dos alertas de risco de churn aos destinos configurados
+
+    Para cada destino, os alunos ainda não alertados naquele nível (chave no Redis
+    por ALERT_DEDUPE_HOURS) são divididos em lotes de batch_size, enviados com até
+    `concorrencia` lotes em paralelo e, nas falhas temporárias, reenviados com
+    espera exponencial e jitter. Um lote que falha de vez libera a reserva dos seus
+    alunos, que entram de novo na próxima análise. Os destinos são independentes:
+    a falha de um não impede nem repete a entrega nos outros.
+    """
+
+    def __init__(self, sinks: list = None, redis_client=None, max_tentativas: int = ALERT_MAX_ATTEMPTS,
+                 espera_base: float = ALERT_RETRY_BASE_SECONDS, espera_max: float = ALERT_RETRY_MAX_SECONDS,
+                 dedupe_hours: float = ALERT_DEDUPE_HOURS):
+        self.sinks = sinks or []
+        self.redis = redis_client
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.dedupe_seconds = int(dedupe_hours * 3600)
+
+    @classmethod
+    def from_env(cls, redis_client=None) -> "EntregaAlertas":
+        batch_size = int(os.getenv("ALERT_BATCH_SIZE", str(ALERT_BATCH_SIZE)))
+        concorrencia = int(os.getenv("ALERT_CONCURRENCY", str(ALERT_CONCURRENCY)))
+        sinks = []
+        if os.getenv("ALERT_WEBHOOK_URL"):
+            sinks.append(SinkWebhook(os.getenv("ALERT_WEBHOOK_URL"), os.getenv("ALERT_WEBHOOK_TOKEN"),
+                                     batch_size, concorrencia))
+        if os.getenv("ALERT_SMTP_HOST"):
+            sinks.append(SinkSMTP(
+                os.getenv("ALERT_SMTP_HOST"),
+                int(os.getenv("ALERT_SMTP_PORT", "25")),
+                os.getenv("ALERT_SMTP_FROM", "alertas@gym.local"),
+                [e.strip() for e in os.getenv("ALERT_SMTP_TO", "").split(",") if e.strip()],
+                os.getenv("ALERT_SMTP_USER"),
+                os.getenv("ALERT_SMTP_PASSWORD"),
+                os.getenv("ALERT_SMTP_STARTTLS", "0") == "1",
+                batch_size,
+                min(concorrencia, 2),
+            ))
+        if os.getenv("ALERT_FILE"):
+            sinks.append(SinkArquivo(os.getenv("ALERT_FILE")))
+        return cls(
+            sinks, redis_client,
+            max_tentativas=int(os.getenv("ALERT_MAX_ATTEMPTS", str(ALERT_MAX_ATTEMPTS))),
+            dedupe_hours=float(os.getenv("ALERT_DEDUPE_HOURS", str(ALERT_DEDUPE_HOURS))),
+        )
+
+    def connect(self, redis_client):
+        self.redis = redis_client
+
+    def entregar(self, alunos: list, nivel: str) -> dict:
+        """Enviar a todos os destinos; {destino: {"enviados", "repetidos", "falhas"}}"""
+        if not self.sinks:
+            return {}
+        return asyncio.run(self._entregar(alunos, nivel))
+
+    async def _entregar(self, alunos: list, nivel: str) -> dict:
+        # Um aluno aparece uma vez por análise
+        alunos = list({a['aluno_id']: a for a in alunos}.values())
+        resumos = await asyncio.gather(*(self._entregar_sink(sink, alunos, nivel) for sink in self.sinks))
+        return {sink.nome: resumo for sink, resumo in zip(self.sinks, resumos)}
+
+    async def _entregar_sink(self, sink, alunos: list, nivel: str) -> dict:
+        novos = await self._reservar(sink, alunos, nivel)
+        resumo = {'enviados': 0, 'repetidos': len(alunos) - len(novos), 'falhas': 0}
+        ALERTS_TOTAL.labels(sink.nome, 'repetido').inc(resumo['repetidos'])
+        if not novos:
+            return resumo
+
+        limite = asyncio.Semaphore(sink.concorrencia)
+
+        async def enviar_lote(lote):
+            async with limite:
+                try:
+                    await self._com_retentativas(sink, lote, nivel)
+                except Exception as e:
+                    logger.error(f"Falha ao enviar {len(lote)} alertas {nivel} via {sink.nome}: {e}")
+                    await self._liberar(sink, lote, nivel)
+                    resumo['falhas'] += len(lote)
+                    ALERTS_TOTAL.labels(sink.nome, 'falha').inc(len(lote))
+                    return
+            await self._confirmar(sink, lote, nivel)
+            resumo['enviados'] += len(lote)
+            ALERTS_TOTAL.labels(sink.nome, 'enviado').inc(len(lote))
+
+        await sink.abrir()
+        try:
+            await asyncio.gather(*(
+                enviar_lote(novos[inicio:inicio + sink.batch_size])
+                for inicio in range(0, len(novos), sink.batch_size)
+            ))
+        finally:
+            await sink.fechar()
+        return resumo
+
+    async def _com_retentativas(self, sink, lote: list, nivel: str):
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                return await sink.enviar(lote, nivel)
+            except FalhaTemporaria as e:
+                if tentativa == self.max_tentativas:
+                    raise
+                # Jitter completo: lotes que falharam juntos não voltam todos ao mesmo tempo
+                espera = random.uniform(0, min(self.espera_max, self.espera_base * 2 ** (tentativa - 1)))
+                logger.warning(f"Envio via {sink.nome} falhou ({e}), tentativa {tentativa + 1} em {espera:.2f}s")
+                ALERT_RETRIES.labels(sink.nome).inc()
+                await asyncio.sleep(espera)
+
+    @staticmethod
+    def _chave(sink, aluno: dict, nivel: str) -> str:
+        return f"alerta:{sink.nome}:{nivel}:{aluno['aluno_id']}"
+
+    async def _reservar(self, sink, alunos: list, nivel: str) -> list:
+        """Alunos sem alerta recente neste destino e nível (sem Redis, todos)"""
+        if self.redis is None:
+            return alunos
+        try:
+            reservados = await self._pipeline(
+                lambda pipe: [pipe.set(self._chave(sink, a, nivel), 1, ex=ALERT_RESERVE_SECONDS, nx=True) for a in alunos]
+            )
+        except Exception as e:
+            logger.warning(f"Deduplicação de alertas indisponível: {e}")
+            return alunos
+        return [aluno for aluno, reservado in zip(alunos, reservados) if reservado]
+
+    async def _confirmar(self, sink, lote: list, nivel: str):
+        if self.redis is None:
+            return
+        enviado_em = datetime.utcnow().isoformat()
+        try:
+            await self._pipeline(
+                lambda pipe: [pipe.set(self._chave(sink, a, nivel), enviado_em, ex=self.dedupe_seconds) for a in lote]
+            )
+        except Exception as e:
+            logger.warning(f"Deduplicação de alertas indisponível: {e}")
+
+    async def _liberar(self, sink, lote: list, nivel: str):
+        if self.redis is None:
+            return
+        try:
+            await self._pipeline(lambda pipe: pipe.delete(*[self._chave(sink, a, nivel) for a in lote]))
+        except Exception as e:
+            logger.warning(f"Deduplicação de alertas indisponível: {e}")
+
+    async def _pipeline(self, comandos: Callable) -> list:
+        """Uma ida e volta ao Redis para todos os comandos, fora do event loop"""
+        def executar():
+            pipe = self.redis.pipeline(transaction=False)
+            comandos(pipe)
+            return pipe.execute()
+        return await asyncio.to_thread(executar)
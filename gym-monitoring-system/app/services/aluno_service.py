@@ -1,16 +1,18 @@
 # app/services/aluno_service.py
 from sqlalchemy.orm import Session
-from app.models.database import Aluno, Plano
+from app.models.database import Aluno
+from app.services.plan_catalog import PlanCatalog, plan_catalog
 from app.api.schemas import AlunoCreate
 from datetime import datetime
 
 class AlunoService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, catalog: PlanCatalog = plan_catalog):
         self.db = db
+        self.catalog = catalog
     
     def criar_aluno(self, aluno_data: AlunoCreate) -> Aluno:
         # Verificar se o plano existe
-        plano = self.db.query(Plano).filter(Plano.id == aluno_data.plano_id).first()
+        plano = self.catalog.get(self.db, aluno_data.plano_id)
         if not plano:
             raise ValueError("Plano não encontrado")
         
@@ -20,7 +22,7 @@ class AlunoService:
             raise ValueError("Email já cadastrado")
         
         # Criar novo aluno
-        novo_aluno = Aluno(**aluno_data.dict())
+        novo_aluno = Aluno(**aluno_data.model_dump())
         self.db.add(novo_aluno)
         self.db.commit()
         self.db.refresh(novo_aluno)
@@ -0,0 +1,407 @@
+# app/services/checkin_journal.py
+import json
+import logging
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from app.models.database import Checkin
+from app.services.checkin_service import CheckinService
+from app.services.eventos_ao_vivo import eventos_ao_vivo
+from app.services.features_service import FeaturesAlunoService
+from app.monitoring.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Intervalo máximo entre gravações no banco e checkins que antecipam a próxima
+JOURNAL_FLUSH_SECONDS = 0.2
+JOURNAL_BATCH_SIZE = 1000
+
+# Checkins aceitos e ainda não gravados; acima disso novos checkins são recusados
+JOURNAL_MAX_PENDING = 100000
+
+# Limites dos buckets do histograma de checkins por fsync
+FSYNC_GROUP_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# Métricas expostas em /metrics
+JOURNAL_PENDING = Gauge(
+    'gym_checkin_journal_pending', 'Checkins aceitos no journal e ainda não gravados no banco'
+)
+JOURNAL_FSYNC_GROUP = Histogram(
+    'gym_checkin_journal_fsync_group', 'Checkins confirmados por fsync do journal', buckets=FSYNC_GROUP_BUCKETS
+)
+JOURNAL_FLUSH_DURATION = Histogram(
+    'gym_checkin_journal_flush_seconds', 'Duração de cada gravação de segmento do journal no banco'
+)
+JOURNAL_REJECTED = Counter(
+    'gym_checkin_journal_rejected_total', 'Checkins do journal recusados pelo banco e movidos para rejeitados-*.log'
+)
+
+
+class CheckinJournal:
+    """Modo write-behind dos checkins: journal local com fsync em grupo
+
+    Cada checkin aceito vira uma linha JSON no segmento atual e só é confirmado
+    depois do fsync; quem chega enquanto um fsync está em andamento espera o
+    próximo, que confirma todos de uma vez. Uma thread troca de segmento a cada
+    flush_interval (ou batch_size checkins), grava o segmento fechado no banco em
+    uma transação e só então apaga o arquivo. Segmentos que sobraram de uma queda
+    são regravados em start(); como todo checkin do journal tem chave_entrada, o
+    INSERT ... ON CONFLICT (chave_entrada) DO NOTHING não duplica o que já tinha
+    sido gravado. Um segmento recusado pelo banco por erro permanente (aluno
+    removido, restrição violada) é regravado linha a linha; as linhas que ainda
+    falham vão para rejeitados-*.log, para não travar os segmentos seguintes.
+
+    Cada diretório pertence a um único processo: start() regrava e apaga todos os
+    segmentos que encontra, então toma uma trava exclusiva (flock em journal.lock)
+    e recusa iniciar se outro processo já usa o diretório. Com vários workers ou
+    réplicas da API, cada um precisa do próprio CHECKIN_JOURNAL_DIR.
+    """
+
+    def __init__(self, diretorio: str, session_factory: Callable[[], Session] = None,
+                 flush_interval: float = JOURNAL_FLUSH_SECONDS, batch_size: int = JOURNAL_BATCH_SIZE,
+                 max_pending: int = JOURNAL_MAX_PENDING, ao_gravar: Callable[[list], None] = None):
+        if session_factory is None:
+            from app.models.database import SessionLocal
+            session_factory = SessionLocal
+        self.diretorio = Path(diretorio)
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # Chamado com os checkins recém-gravados, antes de fechar a sessão
+        self.ao_gravar = ao_gravar
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._arquivo = None
+        self._numero = 0
+        self._registros = []       # do segmento aberto
+        self._segmentos = []       # [(caminho, registros)] fechados, ainda não gravados
+        self._chaves = {}          # chave -> registro pendente
+        self._alunos = {}          # aluno_id -> chave do checkin pendente
+        self._escritos = 0
+        self._duraveis = 0
+        self._sincronizando = False
+
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._trava = None
+        JOURNAL_PENDING.set_function(lambda: len(self._chaves))
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "CheckinJournal":
+        return cls(
+            diretorio=os.getenv("CHECKIN_JOURNAL_DIR", "data/journal"),
+            flush_interval=float(os.getenv("CHECKIN_JOURNAL_FLUSH_MS", "200")) / 1000,
+            batch_size=int(os.getenv("CHECKIN_JOURNAL_BATCH", str(JOURNAL_BATCH_SIZE))),
+            max_pending=int(os.getenv("CHECKIN_JOURNAL_MAX_PENDING", str(JOURNAL_MAX_PENDING))),
+            **kwargs,
+        )
+
+    def start(self):
+        """Regravar segmentos de uma execução anterior e iniciar a thread de gravação"""
+        if self._thread is not None:
+            return
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._travar()
+        with self._cond:
+            for caminho in sorted(self.diretorio.glob("checkins-*.log")):
+                registros = self._ler_segmento(caminho)
+                self._segmentos.append((caminho, registros))
+                for registro in registros:
+                    registro['posicao'] = 0
+                    self._chaves[registro['chave']] = registro
+                    self._alunos[registro['aluno_id']] = registro['chave']
+                self._numero = max(self._numero, int(caminho.stem.split('-')[1]))
+            self._abrir_segmento()
+        if self._segmentos:
+            logger.info(f"Regravando {len(self._chaves)} checkins de {len(self._segmentos)} segmentos do journal")
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao regravar o journal de checkins (nova tentativa em segundo plano): {e}")
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executar, name="journal-checkins", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """Parar a thread e gravar o que estiver pendente"""
+        if self._thread is None:
+            return
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Checkins pendentes ficam no journal para a próxima inicialização: {e}")
+        with self._cond:
+            self._arquivo.close()
+            if not self._registros:
+                os.unlink(self._arquivo.name)
+            self._arquivo = None
+        self._liberar_trava()
+
+    def _travar(self):
+        """Trava exclusiva do diretório; falha se outro processo já o usa"""
+        if self._trava is not None:
+            return
+        if fcntl is None:
+            logger.warning("flock indisponível: garanta um único processo por diretório do journal")
+            return
+        trava = open(self.diretorio / "journal.lock", "a")
+        try:
+            fcntl.flock(trava.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            trava.close()
+            raise ValueError(
+                f"Journal de checkins em {self.diretorio} já está em uso por outro processo; "
+                f"use um CHECKIN_JOURNAL_DIR por processo da API"
+            )
+        self._trava = trava
+
+    def _liberar_trava(self):
+        if self._trava is not None:
+            fcntl.flock(self._trava.fileno(), fcntl.LOCK_UN)
+            self._trava.close()
+            self._trava = None
+
+    def aceitar(self, db: Session, aluno_id: int, chave: str = None) -> tuple:
+        """(checkin gravado ou registro pendente, aceito agora)
+
+        Com a mesma chave, a repetição devolve o registro pendente ou, se já
+        gravado, o checkin do banco. O retorno só acontece com o registro em disco.
+        """
+        if chave:
+            pendente = self._chaves.get(chave)
+            if pendente is not None:
+                self._sincronizar(pendente['posicao'])
+                return pendente, False
+            original = db.query(Checkin).filter(Checkin.chave_entrada == chave).first()
+            if original is not None:
+                return original, False
+        if aluno_id in self._alunos:
+            raise ValueError("Aluno já possui um checkin ativo")
+        CheckinService(db).validar_entrada(aluno_id)
+
+        registro = {
+            'aluno_id': aluno_id,
+            'data_entrada': datetime.utcnow(),
+            'chave': chave or f"journal:{uuid.uuid4().hex}",
+        }
+        return self.append(registro)
+
+    def append(self, registro: dict) -> tuple:
+        """Escrever o registro e esperar o fsync do grupo em que ele entrou"""
+        with self._cond:
+            if self._arquivo is None:
+                raise ValueError("Journal de checkins não iniciado")
+            pendente = self._chaves.get(registro['chave'])
+            if pendente is None:
+                if registro['aluno_id'] in self._alunos:
+                    raise ValueError("Aluno já possui um checkin ativo")
+                if len(self._chaves) >= self.max_pending:
+                    raise ValueError("Journal de checkins cheio, tente novamente")
+
+                self._arquivo.write(json.dumps({
+                    'aluno_id': registro['aluno_id'],
+                    'data_entrada': registro['data_entrada'].isoformat(),
+                    'chave': registro['chave'],
+                }) + "\n")
+                self._escritos += 1
+                registro['posicao'] = self._escritos
+                self._registros.append(registro)
+                self._chaves[registro['chave']] = registro
+                self._alunos[registro['aluno_id']] = registro['chave']
+                if len(self._registros) >= self.batch_size:
+                    self._acordar.set()
+        if pendente is not None:
+            self._sincronizar(pendente['posicao'])
+            return pendente, False
+        self._sincronizar(registro['posicao'])
+        return registro, True
+
+    def _sincronizar(self, posicao: int):
+        """Esperar até a linha `posicao` estar em disco, fazendo o fsync se ninguém estiver fazendo"""
+        with self._cond:
+            # Se outro fsync está em andamento, esperar: o próximo confirma todo o grupo
+            while self._duraveis < posicao and self._sincronizando:
+                self._cond.wait()
+            if self._duraveis >= posicao:
+                return
+            self._sincronizando = True
+            alvo = self._escritos
+            grupo = alvo - self._duraveis
+            self._arquivo.flush()
+            descritor = self._arquivo.fileno()
+
+        sincronizado = False
+        try:
+            os.fsync(descritor)
+            sincronizado = True
+        finally:
+            with self._cond:
+                self._sincronizando = False
+                if sincronizado:
+                    self._duraveis = max(self._duraveis, alvo)
+                self._cond.notify_all()
+        JOURNAL_FSYNC_GROUP.observe(grupo)
+
+    def pendente(self, aluno_id: int) -> bool:
+        """O aluno tem um checkin aceito e ainda não gravado no banco"""
+        return aluno_id in self._alunos
+
+    def flush(self) -> int:
+        """Fechar o segmento atual e gravar no banco todos os segmentos fechados"""
+        with self._flush_lock:
+            with self._cond:
+                if self._registros:
+                    self._rotacionar()
+                    self._abrir_segmento()
+            gravados = 0
+            while self._segmentos:
+                caminho, registros = self._segmentos[0]
+                if registros:
+                    inicio = time.perf_counter()
+                    try:
+                        gravados += self._gravar(registros)
+                    except (IntegrityError, DataError) as e:
+                        logger.warning(f"Segmento {caminho.name} recusado pelo banco, gravando linha a linha: {e}")
+                        gravados += self._gravar_por_linha(caminho, registros)
+                    JOURNAL_FLUSH_DURATION.observe(time.perf_counter() - inicio)
+                os.unlink(caminho)
+                with self._cond:
+                    self._segmentos.pop(0)
+                    for registro in registros:
+                        self._chaves.pop(registro['chave'], None)
+                        if self._alunos.get(registro['aluno_id']) == registro['chave']:
+                            del self._alunos[registro['aluno_id']]
+            return gravados
+
+    def _executar(self):
+        while not self._parar.is_set():
+            self._acordar.wait(self.flush_interval)
+            self._acordar.clear()
+            if self._parar.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gravar o journal de checkins: {e}")
+                self._parar.wait(1.0)
+
+    def _rotacionar(self):
+        """Fechar o segmento atual com tudo em disco (com self._cond)"""
+        while self._sincronizando:
+            self._cond.wait()
+        if self._duraveis < self._escritos:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._duraveis = self._escritos
+            self._cond.notify_all()
+        self._arquivo.close()
+        self._segmentos.append((Path(self._arquivo.name), self._registros))
+        self._registros = []
+
+    def _abrir_segmento(self):
+        self._numero += 1
+        caminho = self.diretorio / f"checkins-{self._numero:012d}.log"
+        self._arquivo = open(caminho, "a", encoding="utf-8")
+        # A entrada do arquivo no diretório também precisa sobreviver a uma queda
+        descritor = os.open(self.diretorio, os.O_RDONLY)
+        try:
+            os.fsync(descritor)
+        finally:
+            os.close(descritor)
+
+    def _ler_segmento(self, caminho: Path) -> list:
+        registros = []
+        with open(caminho, encoding="utf-8") as arquivo:
+            linhas = arquivo.readlines()
+        for numero, linha in enumerate(linhas, start=1):
+            try:
+                registro = json.loads(linha)
+                registro['data_entrada'] = datetime.fromisoformat(registro['data_entrada'])
+            except (ValueError, KeyError, TypeError):
+                # Última linha incompleta: queda durante a escrita, antes do fsync (nunca confirmada)
+                if numero < len(linhas):
+                    logger.warning(f"Linha {numero} inválida em {caminho.name}, ignorada")
+                continue
+            registros.append(registro)
+        return registros
+
+    def _gravar_por_linha(self, caminho: Path, registros: list) -> int:
+        """Gravar cada checkin em sua transação; os recusados vão para rejeitados-<segmento>.log"""
+        gravados = 0
+        rejeitados = []
+        for registro in registros:
+            try:
+                gravados += self._gravar([registro])
+            except (IntegrityError, DataError) as e:
+                rejeitados.append((registro, e))
+        if rejeitados:
+            destino = self.diretorio / f"rejeitados-{caminho.stem.split('-')[1]}.log"
+            with open(destino, "a", encoding="utf-8") as arquivo:
+                for registro, erro in rejeitados:
+                    arquivo.write(json.dumps({
+                        'aluno_id': registro['aluno_id'],
+                        'data_entrada': registro['data_entrada'].isoformat(),
+                        'chave': registro['chave'],
+                        'erro': str(getattr(erro, 'orig', erro)),
+                    }) + "\n")
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            JOURNAL_REJECTED.inc(len(rejeitados))
+            logger.error(f"{len(rejeitados)} checkins do journal recusados pelo banco, movidos para {destino.name}")
+        return gravados
+
+    def _gravar(self, registros: list) -> int:
+        """Inserir os checkins do segmento em uma transação e atualizar os agregados"""
+        db = self.session_factory()
+        # Os checkins seguem em uso (ao_gravar) depois do commit
+        db.expire_on_commit = False
+        try:
+            insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+            tabela = Checkin.__table__
+            consulta = insert(tabela).on_conflict_do_nothing(
+                index_elements=[tabela.c.chave_entrada]
+            ).returning(tabela.c.id)
+            ids = []
+            for inicio in range(0, len(registros), self.batch_size):
+                linhas = [
+                    {'aluno_id': r['aluno_id'], 'data_entrada': r['data_entrada'], 'chave_entrada': r['chave']}
+                    for r in registros[inicio:inicio + self.batch_size]
+                ]
+                ids.extend(db.execute(consulta, linhas).scalars())
+
+            # Somente os inseridos agora: os já gravados antes de uma queda já estão nos agregados
+            checkins = db.query(Checkin).filter(Checkin.id.in_(ids)).order_by(Checkin.id).all() if ids else []
+            if checkins:
+                FeaturesAlunoService(db).registrar_checkins(checkins)
+            db.commit()
+            # O insert em lote não passa pelos eventos da sessão: publicar aqui
+            eventos_ao_vivo.checkins(checkins, [])
+            if checkins and self.ao_gravar is not None:
+                try:
+                    self.ao_gravar(checkins)
+                except Exception as e:
+                    logger.error(f"Erro ao processar checkins gravados pelo journal: {e}")
+            return len(checkins)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
@@ -1,8 +1,11 @@
 # app/services/checkin_service.py
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
-from app.models.database import Checkin, Aluno
-from app.api.schemas import CheckinCreate, FrequenciaResponse, RelatorioFrequenciaResponse
+from sqlalchemy.exc import IntegrityError
+from app.models.database import Checkin, Aluno, FeaturesAluno
+from app.api.schemas import CheckinCreate, CheckinResponse, EventoCheckin, FrequenciaResponse, RelatorioFrequenciaResponse
+from app.services.features_service import FeaturesAlunoService
+from app.analytics import bitmap as presenca
 from datetime import datetime, timedelta
 
 class CheckinService:
@@ -10,8 +13,37 @@ class CheckinService:
         self.db = db
     
     def criar_checkin(self, checkin_data: CheckinCreate) -> Checkin:
+        return self.registrar_entrada(checkin_data.aluno_id, checkin_data.chave_idempotencia)[0]
+    
+    def registrar_entrada(self, aluno_id: int, chave: str = None) -> tuple:
+        """(checkin, criado): com chave, a repetição do evento devolve o checkin original"""
+        if chave:
+            original = self._por_chave(Checkin.chave_entrada, chave)
+            if original:
+                return original, False
+        
+        self.validar_entrada(aluno_id)
+        
+        # Criar novo checkin
+        novo_checkin = Checkin(aluno_id=aluno_id, chave_entrada=chave)
+        self.db.add(novo_checkin)
+        try:
+            self.db.flush()
+        except IntegrityError:
+            # Repetição concorrente com a mesma chave: prevalece o checkin já gravado
+            return self._original_apos_conflito(Checkin.chave_entrada, chave), False
+        
+        # Atualizar os agregados do aluno na mesma transação
+        FeaturesAlunoService(self.db).registrar_checkin(novo_checkin)
+        self.db.commit()
+        self.db.refresh(novo_checkin)
+        
+        return novo_checkin, True
+    
+    def validar_entrada(self, aluno_id: int):
+        """Aluno existente, ativo e sem checkin em aberto"""
         # Verificar se o aluno existe
-        aluno = self.db.query(Aluno).filter(Aluno.id == checkin_data.aluno_id).first()
+        aluno = self.db.query(Aluno).filter(Aluno.id == aluno_id).first()
         if not aluno:
             raise ValueError("Aluno não encontrado")
         
@@ -21,39 +53,120 @@ class CheckinService:
         # Verificar se já existe um checkin ativo (sem saída)
         checkin_ativo = self.db.query(Checkin).filter(
             and_(
-                Checkin.aluno_id == checkin_data.aluno_id,
+                Checkin.aluno_id == aluno_id,
                 Checkin.data_saida.is_(None)
             )
         ).first()
         
         if checkin_ativo:
             raise ValueError("Aluno já possui um checkin ativo")
-        
-        # Criar novo checkin
-        novo_checkin = Checkin(**checkin_data.dict())
-        self.db.add(novo_checkin)
-        self.db.commit()
-        self.db.refresh(novo_checkin)
-        
-        return novo_checkin
     
-    def registrar_saida(self, checkin_id: int) -> Checkin:
+    def registrar_saida(self, checkin_id: int, chave: str = None) -> Checkin:
+        if chave:
+            original = self._por_chave(Checkin.chave_saida, chave)
+            if original:
+                return original
+        
         checkin = self.db.query(Checkin).filter(Checkin.id == checkin_id).first()
         if not checkin:
             raise ValueError("Checkin não encontrado")
         
+        return self._fechar(checkin, chave)[0]
+    
+    def registrar_saida_aluno(self, aluno_id: int, chave: str = None) -> tuple:
+        """(checkin, criado): saída do checkin ativo do aluno, idempotente pela chave"""
+        if chave:
+            original = self._por_chave(Checkin.chave_saida, chave)
+            if original:
+                return original, False
+        
+        checkin = self.db.query(Checkin).filter(
+            and_(
+                Checkin.aluno_id == aluno_id,
+                Checkin.data_saida.is_(None)
+            )
+        ).order_by(Checkin.data_entrada.desc()).first()
+        if not checkin:
+            raise ValueError("Aluno não possui checkin ativo")
+        
+        return self._fechar(checkin, chave)
+    
+    def registrar_eventos(self, eventos: list, cache=None) -> tuple:
+        """Processar eventos de catraca em lote
+        
+        Devolve (resultados na ordem dos eventos, checkins criados). Repetições (chave
+        já vista no cache, no banco ou antes no mesmo lote) voltam com o resultado
+        original e status "repetido", sem passar pelo caminho de escrita.
+        """
+        eventos = [e if isinstance(e, EventoCheckin) else EventoCheckin(**e) for e in eventos]
+        conhecidos = {}
+        if cache is not None:
+            for tipo in ('entrada', 'saida'):
+                chaves = [e.chave_idempotencia for e in eventos if e.tipo == tipo]
+                conhecidos.update({(tipo, c): CheckinResponse.model_validate(r).model_dump(mode='json') for c, r in cache.buscar(tipo, chaves).items()})
+        
+        resultados = []
+        criados = []
+        novos = {'entrada': {}, 'saida': {}}
+        for indice, evento in enumerate(eventos):
+            chave = evento.chave_idempotencia
+            if chave and (evento.tipo, chave) in conhecidos:
+                resultados.append({'indice': indice, 'status': 'repetido', 'checkin': conhecidos[(evento.tipo, chave)]})
+                continue
+            try:
+                if evento.tipo == 'entrada':
+                    checkin, criado = self.registrar_entrada(evento.aluno_id, chave)
+                else:
+                    checkin, criado = self.registrar_saida_aluno(evento.aluno_id, chave)
+            except ValueError as e:
+                self.db.rollback()
+                resultados.append({'indice': indice, 'status': 'erro', 'erro': str(e)})
+                continue
+            
+            resultado = CheckinResponse.model_validate(checkin).model_dump(mode='json')
+            resultados.append({'indice': indice, 'status': 'criado' if criado else 'repetido', 'checkin': resultado})
+            if criado and evento.tipo == 'entrada':
+                criados.append(checkin)
+            if chave:
+                conhecidos[(evento.tipo, chave)] = resultado
+                novos[evento.tipo][chave] = resultado
+        
+        if cache is not None:
+            for tipo, resultados_tipo in novos.items():
+                if resultados_tipo:
+                    cache.guardar(tipo, resultados_tipo)
+        return resultados, criados
+    
+    def _fechar(self, checkin: Checkin, chave: str = None) -> tuple:
         if checkin.data_saida:
             raise ValueError("Checkin já possui saída registrada")
         
         checkin.data_saida = datetime.utcnow()
+        checkin.chave_saida = chave
         if checkin.data_entrada:
             duracao = checkin.data_saida - checkin.data_entrada
             checkin.duracao_minutos = int(duracao.total_seconds() / 60)
         
+        try:
+            self.db.flush()
+        except IntegrityError:
+            return self._original_apos_conflito(Checkin.chave_saida, chave), False
+        
+        FeaturesAlunoService(self.db).registrar_saida(checkin)
         self.db.commit()
         self.db.refresh(checkin)
         
-        return checkin
+        return checkin, True
+    
+    def _por_chave(self, coluna, chave: str) -> Checkin:
+        return self.db.query(Checkin).filter(coluna == chave).first()
+    
+    def _original_apos_conflito(self, coluna, chave: str) -> Checkin:
+        self.db.rollback()
+        original = self._por_chave(coluna, chave) if chave else None
+        if original is None:
+            raise ValueError("Evento em conflito com outro registro")
+        return original
     
     def obter_frequencia_aluno(self, aluno_id: int) -> FrequenciaResponse:
         # Verificar se o aluno existe
@@ -88,7 +201,16 @@ class CheckinService:
         if checkins_com_duracao:
             media_duracao = sum(c.duracao_minutos for c in checkins_com_duracao) / len(checkins_com_duracao)
         
+        # Presença diária: bitmap mantido a cada checkin, ou montado dos checkins já carregados
+        features = self.db.query(FeaturesAluno).filter(FeaturesAluno.aluno_id == aluno_id).first()
+        if features is not None and features.bitmap_presenca is not None:
+            resumo = FeaturesAlunoService(self.db).resumo_presenca(features, agora)
+        else:
+            bitmap, inicio = presenca.from_days([c.data_entrada for c in checkins], agora)
+            resumo = presenca.attendance_summary(bitmap, inicio, agora)
+        
         return FrequenciaResponse(
+            **resumo,
             aluno_id=aluno_id,
             total_checkins=len(checkins),
             checkins_ultimos_30_dias=len(checkins_30_dias),
@@ -96,7 +218,7 @@ class CheckinService:
             media_checkins_semana=media_checkins_semana,
             ultimo_checkin=ultimo_checkin,
             media_duracao_minutos=media_duracao,
-            checkins=[CheckinResponse.from_orm(c) for c in checkins[-10:]]  # Últimos 10
+            checkins=[CheckinResponse.model_validate(c) for c in checkins[-10:]]  # Últimos 10
         )
     
     def gerar_relatorio_frequencia(self) -> RelatorioFrequenciaResponse:
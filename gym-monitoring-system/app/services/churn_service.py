@@ -1,27 +1,49 @@
 # app/services/churn_service.py
 from sqlalchemy.orm import Session
-from app.models.database import Aluno, Checkin, Plano
+from app.models.database import Aluno, Checkin
+from app.analytics import bitmap as presenca
 from app.api.schemas import ChurnPredictionResponse
-from app.ml.churn_model import ChurnPredictor
+from app.ml.churn_model import ChurnPredictor, create_predictor
+from app.services.features_service import FeaturesAlunoService
+from app.services.plan_catalog import PlanCatalog, plan_catalog
 from datetime import datetime, timedelta
 
 class ChurnService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, predictor: ChurnPredictor = None, catalog: PlanCatalog = plan_catalog):
         self.db = db
-        self.predictor = ChurnPredictor()
+        self._predictor = predictor
+        self.catalog = catalog
+    
+    @property
+    def predictor(self) -> ChurnPredictor:
+        # Carregar o modelo só quando a previsão for feita por este serviço
+        if self._predictor is None:
+            self._predictor = create_predictor()
+        return self._predictor
     
     def prever_churn(self, aluno_id: int) -> ChurnPredictionResponse:
-        # Verificar se o aluno existe
-        aluno = self.db.query(Aluno).filter(Aluno.id == aluno_id).first()
-        if not aluno:
-            raise ValueError("Aluno não encontrado")
-        
         # Obter features do aluno
-        features = self._extrair_features(aluno)
+        features = self.obter_features(aluno_id)
         
         # Fazer previsão
         probabilidade = self.predictor.predict_proba(features)
         
+        return self.montar_predicao(aluno_id, features, probabilidade)
+    
+    def obter_features(self, aluno_id: int) -> dict:
+        # Agregados mantidos a cada checkin: uma única consulta
+        features = FeaturesAlunoService(self.db).obter_features(aluno_id)
+        if features is not None:
+            return features
+        
+        # Aluno ainda sem agregados (antes da reconciliação): calcular do histórico
+        aluno = self.db.query(Aluno).filter(Aluno.id == aluno_id).first()
+        if not aluno:
+            raise ValueError("Aluno não encontrado")
+        
+        return self._extrair_features(aluno)
+    
+    def montar_predicao(self, aluno_id: int, features: dict, probabilidade: float) -> ChurnPredictionResponse:
         # Classificar risco
         if probabilidade >= 0.7:
             risco_nivel = "alto"
@@ -75,13 +97,19 @@ class ChurnService:
             features['duracao_media_minutos'] = 0
         
         # Tipo de plano
-        plano = self.db.query(Plano).filter(Plano.id == aluno.plano_id).first()
+        plano = self.catalog.get(self.db, aluno.plano_id)
         features['plano_valor'] = plano.valor if plano else 0
         features['plano_duracao'] = plano.duracao_meses if plano else 0
         
         # Tempo como aluno
         features['dias_como_aluno'] = (agora - aluno.data_matricula).days
         
+        # Presença diária (mesmo resumo do bitmap dos agregados)
+        bitmap, inicio = presenca.from_days([c.data_entrada for c in checkins], agora)
+        resumo = presenca.attendance_summary(bitmap, inicio, agora)
+        for nome in ('dias_presentes_30', 'sequencia_atual_dias', 'maior_intervalo_dias'):
+            features[nome] = resumo[nome]
+        
         return features
     
     def _identificar_fatores_risco(self, features: dict) -> list:
@@ -0,0 +1,131 @@
+# app/services/cohort_service.py
+from sqlalchemy.orm import Session
+from app.models.database import Aluno
+from app.api.schemas import RetencaoCoortesResponse, CoorteRetencaoItem, CurvaSobrevivenciaItem
+from app.analytics.columnar import ColumnarCheckinStore, to_epoch_us
+from app.analytics import cohorts
+from datetime import datetime, date, time, timedelta
+import numpy as np
+import os
+
+# Resultados de um dia fechado não mudam: manter no cache até o dia seguinte fechar
+COHORT_CACHE_TTL = int(os.getenv("COHORT_CACHE_TTL", str(2 * 24 * 3600)))
+
+def ultimo_dia_fechado() -> date:
+    return datetime.utcnow().date() - timedelta(days=1)
+
+class CohortService:
+    """Retenção por coorte de matrícula e sobrevivência (Kaplan-Meier) por dia fechado"""
+    
+    def __init__(self, db: Session, store: ColumnarCheckinStore):
+        self.db = db
+        self.store = store
+    
+    @staticmethod
+    def cache_key(dia: date, meses: int, por_plano: bool) -> str:
+        return f"coortes:{dia.isoformat()}:{meses}:{int(por_plano)}"
+    
+    def obter_retencao(self, redis_client, meses: int = 12, por_plano: bool = False,
+                       dia: date = None) -> RetencaoCoortesResponse:
+        """Resultado do dia em cache ou calculado e armazenado"""
+        dia = dia or ultimo_dia_fechado()
+        chave = self.cache_key(dia, meses, por_plano)
+        cached = redis_client.get(chave)
+        if cached:
+            return RetencaoCoortesResponse.model_validate_json(cached)
+        
+        resultado = self.calcular_retencao(meses, por_plano, dia)
+        redis_client.setex(chave, COHORT_CACHE_TTL, resultado.model_dump_json())
+        return resultado
+    
+    def calcular_retencao(self, meses: int = 12, por_plano: bool = False,
+                          dia: date = None) -> RetencaoCoortesResponse:
+        """Matriz de retenção e curvas de sobrevivência com dados até o fim de dia"""
+        if meses <= 0:
+            raise ValueError("Número de meses deve ser positivo")
+        
+        dia = dia or ultimo_dia_fechado()
+        as_of = datetime.combine(dia + timedelta(days=1), time.min)
+        as_of_us = to_epoch_us(as_of)
+        
+        # Checkins: só os ids novos desde a última atualização do store
+        self.store.refresh_if_stale(self.db)
+        
+        alunos = self.db.query(Aluno.id, Aluno.data_matricula, Aluno.plano_id, Aluno.ativo).filter(
+            Aluno.data_matricula < as_of
+        ).order_by(Aluno.id).all()
+        if not alunos:
+            return RetencaoCoortesResponse(
+                data_referencia=dia, meses=meses, inatividade_dias=cohorts.INACTIVITY_DAYS,
+                por_plano=por_plano, coortes=[], sobrevivencia=[]
+            )
+        
+        ids, matriculas, planos, ativos = zip(*alunos)
+        ids = np.asarray(ids, dtype=np.int64)
+        matricula_us = np.asarray(matriculas, dtype='datetime64[us]').astype(np.int64)
+        planos = np.array([p if p is not None else -1 for p in planos], dtype=np.int64)
+        ativos = np.array([a is not False for a in ativos])
+        
+        # Último checkin até as_of de cada aluno (sem checkins: mínimo -> matrícula)
+        ultimo_us = np.full(len(ids), np.iinfo(np.int64).min)
+        com_checkin, ultimos = self.store.last_checkin_per_student(as_of)
+        posicao = np.searchsorted(ids, com_checkin)
+        encontrado = posicao < len(ids)
+        encontrado[encontrado] = ids[posicao[encontrado]] == com_checkin[encontrado]
+        ultimo_us[posicao[encontrado]] = ultimos[encontrado]
+        
+        dias, vida_meses, evento = cohorts.lifetimes(matricula_us, ultimo_us, ativos, as_of_us)
+        if por_plano:
+            grupos_planos, grupo = np.unique(planos, return_inverse=True)
+        else:
+            grupos_planos, grupo = np.array([-1]), np.zeros(len(ids), dtype=np.int64)
+        n_grupos = len(grupos_planos)
+        
+        # Retenção das coortes dos últimos `meses` meses, por (coorte, plano)
+        mes_as_of = int(cohorts.month_index(as_of_us - 1))
+        coorte = cohorts.month_index(matricula_us)
+        recentes = coorte >= mes_as_of - meses
+        chave = (coorte[recentes] - (mes_as_of - meses)) * n_grupos + grupo[recentes]
+        chaves, linhas = np.unique(chave, return_inverse=True)
+        coorte_linha = chaves // n_grupos + (mes_as_of - meses)
+        retencao, tamanho = cohorts.retention_matrix(
+            linhas, vida_meses[recentes], mes_as_of - coorte_linha, meses
+        )
+        
+        # Sobrevivência com todos os alunos, a cada 30 dias
+        pontos = np.arange(meses + 1) * cohorts.DIAS_MES
+        curva, mediana = cohorts.kaplan_meier(grupo, dias, evento, n_grupos, pontos)
+        tamanho_grupo = np.bincount(grupo, minlength=n_grupos)
+        desistencias = np.bincount(grupo[evento], minlength=n_grupos)
+        
+        return RetencaoCoortesResponse(
+            data_referencia=dia,
+            meses=meses,
+            inatividade_dias=cohorts.INACTIVITY_DAYS,
+            por_plano=por_plano,
+            coortes=[
+                CoorteRetencaoItem(
+                    coorte=str(np.datetime64(int(coorte_linha[i]), 'M')),
+                    plano_id=self._plano(grupos_planos[chaves[i] % n_grupos], por_plano),
+                    alunos=int(tamanho[i]),
+                    retencao=self._lista(retencao[i])
+                )
+                for i in range(len(chaves))
+            ],
+            sobrevivencia=[
+                CurvaSobrevivenciaItem(
+                    plano_id=self._plano(grupos_planos[g], por_plano),
+                    alunos=int(tamanho_grupo[g]),
+                    desistencias=int(desistencias[g]),
+                    sobrevivencia=self._lista(curva[g]),
+                    mediana_dias=int(mediana[g]) if mediana[g] >= 0 else None
+                )
+                for g in range(n_grupos)
+            ]
+        )
+    
+    def _plano(self, plano_id, por_plano: bool):
+        return int(plano_id) if por_plano and plano_id >= 0 else None
+    
+    def _lista(self, valores: np.ndarray) -> list:
+        return [None if np.isnan(v) else round(float(v), 4) for v in valores]
@@ -0,0 +1,119 @@
+# app/services/eventos_ao_vivo.py
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models.database import Checkin
+
+logger = logging.getLogger(__name__)
+
+# Canal com os eventos ao vivo e contador de alunos presentes
+CHANNEL = "eventos:ao_vivo"
+OCUPACAO_KEY = "ocupacao:presentes"
+
+
+def _checkin(checkin) -> dict:
+    return {
+        'checkin_id': checkin.id,
+        'aluno_id': checkin.aluno_id,
+        'data_entrada': checkin.data_entrada,
+        'data_saida': checkin.data_saida,
+        'duracao_minutos': checkin.duracao_minutos,
+    }
+
+
+class EventosAoVivo:
+    """Publicação no Redis dos eventos para os painéis (checkins, ocupação, alertas de risco)
+
+    Cada transação vira uma única mensagem em CHANNEL com a lista de eventos, que
+    o HubEventos de cada processo da API repassa aos clientes conectados. Sem
+    Redis configurado (connect), nada é publicado.
+    """
+
+    def __init__(self):
+        self.redis = None
+
+    def connect(self, redis_client):
+        self.redis = redis_client
+
+    def publicar(self, eventos: list):
+        """Publicar [{"tipo": ..., "dados": ...}] em uma mensagem (erros só vão para o log)"""
+        if self.redis is None or not eventos:
+            return
+        try:
+            self.redis.publish(CHANNEL, json.dumps({'eventos': eventos}, default=str))
+        except Exception as e:
+            logger.warning(f"Não foi possível publicar eventos ao vivo: {e}")
+
+    def checkins(self, entradas: list, saidas: list):
+        """Entradas e saídas confirmadas, com a ocupação resultante"""
+        if self.redis is None or not (entradas or saidas):
+            return
+        eventos = [{'tipo': 'checkin', 'dados': _checkin(c)} for c in entradas]
+        eventos += [{'tipo': 'checkout', 'dados': _checkin(c)} for c in saidas]
+        try:
+            presentes = self.redis.incrby(OCUPACAO_KEY, len(entradas) - len(saidas))
+            eventos.append({'tipo': 'ocupacao', 'dados': {'presentes': max(int(presentes), 0)}})
+        except Exception as e:
+            logger.warning(f"Ocupação indisponível: {e}")
+        self.publicar(eventos)
+
+    def sincronizar_ocupacao(self, presentes: int):
+        """Corrigir o contador com a contagem do banco e publicar o valor"""
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(OCUPACAO_KEY, presentes)
+        except Exception as e:
+            logger.warning(f"Ocupação indisponível: {e}")
+            return
+        self.publicar([{'tipo': 'ocupacao', 'dados': {'presentes': presentes}}])
+
+    def alertas(self, alunos: list, nivel: str):
+        """Alunos em risco de churn identificados pela análise periódica"""
+        self.publicar([{
+            'tipo': 'alerta_risco',
+            'dados': {'nivel': nivel, 'alunos': alunos, 'gerado_em': datetime.utcnow()},
+        }])
+
+
+# Publicador do processo (API ou worker)
+eventos_ao_vivo = EventosAoVivo()
+
+
+class _Registro:
+    """Cópia dos campos no flush: depois do commit os atributos do ORM estão expirados"""
+    __slots__ = ('id', 'aluno_id', 'data_entrada', 'data_saida', 'duracao_minutos')
+
+    def __init__(self, checkin):
+        for campo in self.__slots__:
+            setattr(self, campo, getattr(checkin, campo))
+
+
+@event.listens_for(Session, "after_flush")
+def _coletar_checkins(session, flush_context):
+    if eventos_ao_vivo.redis is None:
+        return
+    entradas = [obj for obj in session.new if isinstance(obj, Checkin)]
+    saidas = [
+        obj for obj in session.dirty
+        if isinstance(obj, Checkin) and obj.data_saida is not None
+        and inspect(obj).attrs.data_saida.history.added
+    ]
+    if entradas or saidas:
+        pendentes = session.info.setdefault("eventos_checkins", ([], []))
+        pendentes[0].extend(_Registro(c) for c in entradas)
+        pendentes[1].extend(_Registro(c) for c in saidas)
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_checkins(session):
+    pendentes = session.info.pop("eventos_checkins", None)
+    if pendentes:
+        eventos_ao_vivo.checkins(*pendentes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_checkins(session):
+    session.info.pop("eventos_checkins", None)
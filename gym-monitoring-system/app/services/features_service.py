@@ -0,0 +1,322 @@
+# app/services/features_service.py
+import math
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, extract
+from app.models.database import Aluno, Checkin, FeaturesAluno
+from app.analytics import bitmap as presenca
+from app.services.plan_catalog import PlanCatalog, PlanoInfo, plan_catalog
+from datetime import datetime, timedelta
+
+# Meia-vida da frequência com decaimento exponencial
+DECAY_HALF_LIFE_DAYS = 30
+DECAY_TAU_DAYS = DECAY_HALF_LIFE_DAYS / math.log(2)
+
+# Checkins mais antigos contribuem menos de 0,1% para a frequência decaída
+DECAY_WINDOW_DAYS = 10 * DECAY_HALF_LIFE_DAYS
+
+# Alunos por transação na reconciliação
+RECONCILE_BATCH_SIZE = 1000
+
+# Alunos por consulta na varredura de pontuação
+SCORING_BATCH_SIZE = 1000
+
+
+def _inicio_semana(momento: datetime):
+    return (momento - timedelta(days=momento.weekday())).date()
+
+
+class FeaturesAlunoService:
+    """Agregados por aluno em features_aluno
+
+    Os contadores são atualizados na mesma transação do checkin/saída (com a
+    linha do aluno bloqueada), e a leitura para pontuação é uma única consulta.
+    reconstruir() recalcula a tabela a partir dos checkins.
+    """
+
+    def __init__(self, db: Session, catalog: PlanCatalog = plan_catalog):
+        self.db = db
+        self.catalog = catalog
+
+    def registrar_checkin(self, checkin: Checkin):
+        """Somar um checkin aos agregados (o commit fica com quem chama)"""
+        features = self._obter_para_atualizacao(checkin.aluno_id)
+        if features is None:
+            # Primeira atualização do aluno: partir do histórico, que já inclui este checkin
+            self.db.flush()
+            self._reconstruir_alunos([checkin.aluno_id])
+            return
+        self._somar_checkin(features, checkin)
+
+    def registrar_checkins(self, checkins: list):
+        """Somar um lote de checkins, com um único SELECT ... FOR UPDATE para os alunos do lote"""
+        ids = sorted({checkin.aluno_id for checkin in checkins})
+        existentes = {
+            f.aluno_id: f for f in self.db.query(FeaturesAluno).filter(
+                FeaturesAluno.aluno_id.in_(ids)
+            ).with_for_update()
+        }
+        novos = [aluno_id for aluno_id in ids if aluno_id not in existentes]
+        if novos:
+            # Primeira atualização: o histórico já inclui os checkins do lote
+            self.db.flush()
+            self._reconstruir_alunos(novos)
+        for checkin in checkins:
+            features = existentes.get(checkin.aluno_id)
+            if features is not None:
+                self._somar_checkin(features, checkin)
+
+    def _somar_checkin(self, features: FeaturesAluno, checkin: Checkin):
+        entrada = checkin.data_entrada
+        features.total_checkins += 1
+        if features.primeiro_checkin is None or entrada < features.primeiro_checkin:
+            features.primeiro_checkin = entrada
+        if features.ultimo_checkin is None or entrada > features.ultimo_checkin:
+            features.ultimo_checkin = entrada
+        if entrada.weekday() >= 5:
+            features.checkins_fins_semana += 1
+        if entrada.hour < 12:
+            features.checkins_manha += 1
+        elif entrada.hour < 18:
+            features.checkins_tarde += 1
+        else:
+            features.checkins_noite += 1
+        if checkin.duracao_minutos is not None:
+            features.checkins_com_duracao += 1
+            features.soma_duracao_minutos += checkin.duracao_minutos
+
+        self._aplicar_recencia(features, entrada)
+        features.bitmap_presenca, features.bitmap_inicio = presenca.mark_day(
+            features.bitmap_presenca, features.bitmap_inicio, entrada
+        )
+
+    def registrar_saida(self, checkin: Checkin):
+        """Somar a duração de um checkin encerrado"""
+        if checkin.duracao_minutos is None:
+            return
+        features = self._obter_para_atualizacao(checkin.aluno_id)
+        if features is None:
+            self.db.flush()
+            self._reconstruir_alunos([checkin.aluno_id])
+            return
+        features.checkins_com_duracao += 1
+        features.soma_duracao_minutos += checkin.duracao_minutos
+
+    def obter_features(self, aluno_id: int, agora: datetime = None) -> dict:
+        """Features de pontuação em uma consulta (None se o aluno ainda não tem agregados)"""
+        linha = self.db.query(Aluno, FeaturesAluno).outerjoin(
+            FeaturesAluno, FeaturesAluno.aluno_id == Aluno.id
+        ).filter(Aluno.id == aluno_id).first()
+
+        if not linha:
+            raise ValueError("Aluno não encontrado")
+
+        aluno, features = linha
+        if features is None:
+            return None
+        plano = self.catalog.get(self.db, aluno.plano_id)
+        return self.montar_features(aluno, plano, features, agora or datetime.utcnow())
+
+    def features_ativos(self, batch_size: int = SCORING_BATCH_SIZE, agora: datetime = None):
+        """Alunos ativos em lotes de [(aluno, features ou None)], uma consulta por lote
+
+        None indica aluno ainda sem agregados (quem chama decide o caminho pelo histórico).
+        """
+        agora = agora or datetime.utcnow()
+        ultimo_id = 0
+        while True:
+            linhas = self.db.query(Aluno, FeaturesAluno).outerjoin(
+                FeaturesAluno, FeaturesAluno.aluno_id == Aluno.id
+            ).filter(Aluno.ativo, Aluno.id > ultimo_id).order_by(Aluno.id).limit(batch_size).all()
+            if not linhas:
+                return
+            yield [
+                (aluno, self.montar_features(aluno, self.catalog.get(self.db, aluno.plano_id), features, agora)
+                 if features is not None else None)
+                for aluno, features in linhas
+            ]
+            ultimo_id = linhas[-1][0].id
+
+    def montar_features(self, aluno: Aluno, plano: PlanoInfo, features: FeaturesAluno, agora: datetime) -> dict:
+        """Mesmas definições de ChurnService._extrair_features, a partir dos agregados"""
+        dias_como_aluno = (agora - aluno.data_matricula).days
+        resultado = {
+            'frequencia_semanal': features.total_checkins / max(1, dias_como_aluno / 7) if features.total_checkins else 0,
+            'dias_desde_ultimo_checkin': (agora - features.ultimo_checkin).days if features.ultimo_checkin else 999,
+            'duracao_media_minutos': (
+                features.soma_duracao_minutos / features.checkins_com_duracao
+                if features.checkins_com_duracao else 0
+            ),
+            'plano_valor': plano.valor if plano else 0,
+            'plano_duracao': plano.duracao_meses if plano else 0,
+            'dias_como_aluno': dias_como_aluno,
+        }
+
+        # Frequência recente: contagem decaída convertida em checkins por semana
+        frequencia = 0.0
+        if features.frequencia_referencia is not None:
+            dias = (agora - features.frequencia_referencia).total_seconds() / 86400
+            frequencia = features.frequencia_decaida * math.exp(-max(0.0, dias) / DECAY_TAU_DAYS)
+        resultado['frequencia_recente'] = frequencia * 7 / DECAY_TAU_DAYS
+
+        semana = _inicio_semana(agora)
+        if features.semana_inicio == semana:
+            resultado['checkins_semana_atual'] = features.checkins_semana
+            resultado['checkins_semana_anterior'] = features.checkins_semana_anterior
+        elif features.semana_inicio == semana - timedelta(days=7):
+            resultado['checkins_semana_atual'] = 0
+            resultado['checkins_semana_anterior'] = features.checkins_semana
+        else:
+            resultado['checkins_semana_atual'] = 0
+            resultado['checkins_semana_anterior'] = 0
+
+        # Presença diária nos últimos 90 dias (mesma janela das features de treino)
+        resultado.update(self.resumo_presenca(features, agora))
+        return resultado
+
+    def resumo_presenca(self, features: FeaturesAluno, agora: datetime) -> dict:
+        """Frequência, sequência atual, maior intervalo e padrão semanal a partir do bitmap"""
+        return presenca.attendance_summary(features.bitmap_presenca, features.bitmap_inicio, agora)
+
+    def reconstruir(self, batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+        """Recalcular features_aluno a partir dos checkins, em lotes de alunos"""
+        alunos = 0
+        divergentes = 0
+        ultimo_id = 0
+        while True:
+            ids = [
+                aluno_id for (aluno_id,) in self.db.query(Aluno.id).filter(
+                    Aluno.id > ultimo_id
+                ).order_by(Aluno.id).limit(batch_size)
+            ]
+            if not ids:
+                break
+            divergentes += self._reconstruir_alunos(ids)
+            self.db.commit()
+            alunos += len(ids)
+            ultimo_id = ids[-1]
+
+        return {"alunos": alunos, "divergentes": divergentes}
+
+    def _obter_para_atualizacao(self, aluno_id: int) -> FeaturesAluno:
+        return self.db.query(FeaturesAluno).filter(
+            FeaturesAluno.aluno_id == aluno_id
+        ).with_for_update().first()
+
+    def _aplicar_recencia(self, features: FeaturesAluno, entrada: datetime):
+        """Atualizar a frequência decaída e os contadores semanais com um checkin"""
+        referencia = features.frequencia_referencia
+        if referencia is None:
+            features.frequencia_decaida = 1.0
+            features.frequencia_referencia = entrada
+        elif entrada >= referencia:
+            dias = (entrada - referencia).total_seconds() / 86400
+            features.frequencia_decaida = features.frequencia_decaida * math.exp(-dias / DECAY_TAU_DAYS) + 1.0
+            features.frequencia_referencia = entrada
+        else:
+            dias = (referencia - entrada).total_seconds() / 86400
+            features.frequencia_decaida += math.exp(-dias / DECAY_TAU_DAYS)
+
+        semana = _inicio_semana(entrada)
+        if features.semana_inicio is None or semana > features.semana_inicio:
+            if features.semana_inicio == semana - timedelta(days=7):
+                features.checkins_semana_anterior = features.checkins_semana
+            else:
+                features.checkins_semana_anterior = 0
+            features.checkins_semana = 1
+            features.semana_inicio = semana
+        elif semana == features.semana_inicio:
+            features.checkins_semana += 1
+        elif semana == features.semana_inicio - timedelta(days=7):
+            features.checkins_semana_anterior += 1
+
+    def _reconstruir_alunos(self, ids: list) -> int:
+        """Recalcular os agregados de alguns alunos; retorna quantos estavam divergentes"""
+        existentes = {
+            f.aluno_id: f for f in self.db.query(FeaturesAluno).filter(
+                FeaturesAluno.aluno_id.in_(ids)
+            ).with_for_update()
+        }
+
+        hora = extract('hour', Checkin.data_entrada)
+        dia_semana = extract('dow', Checkin.data_entrada)
+        agregados = {
+            linha.aluno_id: linha for linha in self.db.query(
+                Checkin.aluno_id,
+                func.count(Checkin.id).label('total'),
+                func.count(Checkin.duracao_minutos).label('com_duracao'),
+                func.coalesce(func.sum(Checkin.duracao_minutos), 0).label('soma_duracao'),
+                func.min(Checkin.data_entrada).label('primeiro'),
+                func.max(Checkin.data_entrada).label('ultimo'),
+                func.sum(case((dia_semana.in_([0, 6]), 1), else_=0)).label('fins_semana'),
+                func.sum(case((hora < 12, 1), else_=0)).label('manha'),
+                func.sum(case((hora.between(12, 17), 1), else_=0)).label('tarde'),
+                func.sum(case((hora >= 18, 1), else_=0)).label('noite'),
+            ).filter(Checkin.aluno_id.in_(ids)).group_by(Checkin.aluno_id)
+        }
+
+        recentes = {}
+        agora = datetime.utcnow()
+        limite = agora - timedelta(days=max(DECAY_WINDOW_DAYS, presenca.BITMAP_MAX_DAYS))
+        limite_decaimento = agora - timedelta(days=DECAY_WINDOW_DAYS)
+        for aluno_id, entrada in self.db.query(Checkin.aluno_id, Checkin.data_entrada).filter(
+            Checkin.aluno_id.in_(ids),
+            Checkin.data_entrada >= limite
+        ).order_by(Checkin.aluno_id, Checkin.data_entrada):
+            recentes.setdefault(aluno_id, []).append(entrada)
+
+        divergentes = 0
+        for aluno_id in ids:
+            agregado = agregados.get(aluno_id)
+            if agregado is None and aluno_id not in existentes:
+                continue
+
+            novo = FeaturesAluno(
+                aluno_id=aluno_id,
+                total_checkins=agregado.total if agregado else 0,
+                checkins_com_duracao=agregado.com_duracao if agregado else 0,
+                soma_duracao_minutos=int(agregado.soma_duracao) if agregado else 0,
+                primeiro_checkin=agregado.primeiro if agregado else None,
+                ultimo_checkin=agregado.ultimo if agregado else None,
+                checkins_fins_semana=int(agregado.fins_semana) if agregado else 0,
+                checkins_manha=int(agregado.manha) if agregado else 0,
+                checkins_tarde=int(agregado.tarde) if agregado else 0,
+                checkins_noite=int(agregado.noite) if agregado else 0,
+                semana_inicio=None,
+                checkins_semana=0,
+                checkins_semana_anterior=0,
+                frequencia_decaida=0.0,
+                frequencia_referencia=None,
+            )
+            for entrada in recentes.get(aluno_id, []):
+                if entrada >= limite_decaimento:
+                    self._aplicar_recencia(novo, entrada)
+            novo.bitmap_presenca, novo.bitmap_inicio = presenca.from_days(
+                [entrada for entrada in recentes.get(aluno_id, []) if entrada <= agora], agora
+            )
+
+            atual = existentes.get(aluno_id)
+            if atual is None:
+                self.db.add(novo)
+                divergentes += 1
+                continue
+            if self._diverge(atual, novo, agora):
+                divergentes += 1
+            for coluna in FeaturesAluno.__table__.columns.keys():
+                if coluna not in ('aluno_id', 'atualizado_em'):
+                    setattr(atual, coluna, getattr(novo, coluna))
+
+        self.db.flush()
+        return divergentes
+
+    def _diverge(self, atual: FeaturesAluno, novo: FeaturesAluno, agora: datetime) -> bool:
+        # Comparar os bitmaps na mesma janela: o início de cada um pode ser diferente
+        janela = presenca.BITMAP_MAX_DAYS
+        if not (presenca.window(atual.bitmap_presenca, atual.bitmap_inicio, agora, janela) ==
+                presenca.window(novo.bitmap_presenca, novo.bitmap_inicio, agora, janela)).all():
+            return True
+        for coluna in ('total_checkins', 'checkins_com_duracao', 'soma_duracao_minutos', 'ultimo_checkin',
+                       'checkins_fins_semana', 'checkins_manha', 'checkins_tarde', 'checkins_noite'):
+            if getattr(atual, coluna) != getattr(novo, coluna):
+                return True
+        # A reconstrução ignora checkins além de DECAY_WINDOW_DAYS, então a tolerância é folgada
+        return not math.isclose(atual.frequencia_decaida or 0.0, novo.frequencia_decaida, rel_tol=1e-2, abs_tol=1e-3)
@@ -0,0 +1,54 @@
+# app/services/idempotencia.py
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Tempo em que uma repetição é respondida pelo Redis; depois dele, pela coluna única no banco
+IDEMPOTENCY_TTL_SECONDS = 3600
+
+
+class IdempotencyCache:
+    """Resultado de cada evento de catraca já processado, por tipo e chave de idempotência
+
+    É só o atalho das repetições: se o Redis estiver indisponível ou a chave tiver
+    expirado, a coluna com índice único (chave_entrada/chave_saida) garante o mesmo
+    resultado.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def from_env(cls, redis_client) -> "IdempotencyCache":
+        return cls(redis_client, int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(IDEMPOTENCY_TTL_SECONDS))))
+
+    @staticmethod
+    def _chave(tipo: str, chave: str) -> str:
+        return f"idem:{tipo}:{chave}"
+
+    def buscar(self, tipo: str, chaves: list) -> dict:
+        """{chave: resultado} das chaves já processadas (uma ida ao Redis)"""
+        chaves = list(dict.fromkeys(c for c in chaves if c))
+        if not chaves:
+            return {}
+        try:
+            valores = self.redis.mget([self._chave(tipo, c) for c in chaves])
+        except Exception as e:
+            logger.warning(f"Cache de idempotência indisponível: {e}")
+            return {}
+        return {chave: json.loads(valor) for chave, valor in zip(chaves, valores) if valor}
+
+    def guardar(self, tipo: str, resultados: dict):
+        """Registrar {chave: resultado}; a primeira gravação de cada chave prevalece (uma ida ao Redis)"""
+        if not resultados:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for chave, resultado in resultados.items():
+                pipe.set(self._chave(tipo, chave), json.dumps(resultado, default=str), ex=self.ttl_seconds, nx=True)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Cache de idempotência indisponível: {e}")
@@ -0,0 +1,222 @@
+# app/services/importacao_service.py
+import codecs
+import csv
+import io
+import json
+import re
+import time
+from datetime import datetime
+from typing import Iterable, Iterator
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from app.models.database import Aluno
+from app.services.plan_catalog import PlanCatalog, plan_catalog
+
+# Alunos validados e gravados por transação
+IMPORT_CHUNK_SIZE = 5000
+
+FORMATOS = ('csv', 'ndjson')
+
+COLUNAS = ('nome', 'email', 'telefone', 'data_nascimento', 'plano_id',
+           'data_matricula', 'ativo', 'created_at', 'updated_at')
+
+# Parte local em dot-atom ASCII; o restante (ex.: UTF-8) passa pelo email_validator completo
+_LOCAL_RE = re.compile(r"^[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*$")
+
+
+def iter_linhas(blocos: Iterable[bytes]) -> Iterator[str]:
+    """Linhas de texto (com o '\\n') de blocos de bytes UTF-8, sem juntar o corpo inteiro"""
+    decodificador = codecs.getincrementaldecoder('utf-8-sig')()
+    resto = ''
+    for bloco in blocos:
+        resto += decodificador.decode(bloco)
+        *linhas, resto = resto.split('\n')
+        for linha in linhas:
+            yield linha + '\n'
+    resto += decodificador.decode(b'', final=True)
+    if resto:
+        yield resto
+
+
+def iter_registros(linhas: Iterable[str], formato: str) -> Iterator[tuple]:
+    """(número da linha, dict ou mensagem de erro) de um CSV com cabeçalho ou NDJSON"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    if formato == 'csv':
+        leitor = csv.DictReader(linhas)
+        for registro in leitor:
+            yield leitor.line_num, registro
+        return
+    for numero, linha in enumerate(linhas, start=1):
+        if not linha.strip():
+            continue
+        try:
+            registro = json.loads(linha)
+        except json.JSONDecodeError as e:
+            yield numero, f"JSON inválido: {e.msg}"
+            continue
+        yield numero, registro if isinstance(registro, dict) else "Linha não é um objeto JSON"
+
+
+class ImportacaoAlunosService:
+    """Cadastro de alunos em massa
+
+    Planos e emails são validados por conjunto (catálogo de planos, um domínio
+    validado uma vez por lote, emails repetidos no arquivo) e cada lote é gravado
+    em uma transação: COPY para uma tabela temporária e INSERT ... ON CONFLICT
+    (email) DO NOTHING no PostgreSQL, INSERT ... ON CONFLICT em lote no SQLite.
+    Emails já cadastrados são os que o INSERT não retornou, sem consulta prévia.
+    """
+
+    def __init__(self, db: Session, catalog: PlanCatalog = plan_catalog, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.catalog = catalog
+        self.chunk_size = chunk_size
+
+    def importar(self, linhas: Iterable[str], formato: str = 'csv') -> Iterator[dict]:
+        """Eventos {"tipo": "erro" | "progresso" | "resumo", ...}, erros por linha à medida que ocorrem"""
+        inicio = time.perf_counter()
+        vistos = {}
+        totais = {'linhas': 0, 'importados': 0, 'erros': 0}
+        lote = []
+        for numero, registro in iter_registros(linhas, formato):
+            totais['linhas'] += 1
+            lote.append((numero, registro))
+            if len(lote) >= self.chunk_size:
+                yield from self._processar_lote(lote, vistos, totais)
+                lote = []
+        if lote:
+            yield from self._processar_lote(lote, vistos, totais)
+        yield {'tipo': 'resumo', **totais, 'segundos': round(time.perf_counter() - inicio, 3)}
+
+    def _processar_lote(self, lote: list, vistos: dict, totais: dict) -> Iterator[dict]:
+        erros = []
+        validos = []
+        planos = self.catalog.all(self.db)
+        dominios = {}
+        agora = datetime.utcnow()
+        for numero, registro in lote:
+            try:
+                if isinstance(registro, str):
+                    raise ValueError(registro)
+                aluno = self._validar(registro, planos, dominios, agora)
+            except ValueError as e:
+                erros.append(self._erro(numero, registro, str(e)))
+                continue
+            anterior = vistos.get(aluno['email'])
+            if anterior is not None:
+                erros.append(self._erro(numero, registro, f"Email repetido no arquivo (linha {anterior})"))
+                continue
+            vistos[aluno['email']] = numero
+            validos.append((numero, aluno))
+
+        inseridos = self._inserir([aluno for _, aluno in validos]) if validos else set()
+        for numero, aluno in validos:
+            if aluno['email'] not in inseridos:
+                erros.append(self._erro(numero, aluno, "Email já cadastrado"))
+
+        erros.sort(key=lambda erro: erro['linha'])
+        totais['importados'] += len(inseridos)
+        totais['erros'] += len(erros)
+        yield from erros
+        yield {'tipo': 'progresso', 'linhas': totais['linhas'], 'importados': totais['importados'], 'erros': totais['erros']}
+
+    def _validar(self, registro: dict, planos: dict, dominios: dict, agora: datetime) -> dict:
+        nome = (registro.get('nome') or '').strip()
+        if not nome:
+            raise ValueError("Nome obrigatório")
+        try:
+            plano_id = int(registro.get('plano_id'))
+        except (TypeError, ValueError):
+            raise ValueError("plano_id inválido")
+        if plano_id not in planos:
+            raise ValueError("Plano não encontrado")
+        data_nascimento = registro.get('data_nascimento') or None
+        if data_nascimento is not None:
+            try:
+                data_nascimento = datetime.fromisoformat(str(data_nascimento))
+            except ValueError:
+                raise ValueError("data_nascimento inválida (use AAAA-MM-DD)")
+        telefone = str(registro.get('telefone') or '').strip() or None
+        return {
+            'nome': nome,
+            'email': self._normalizar_email(str(registro.get('email') or '').strip(), dominios),
+            'telefone': telefone,
+            'data_nascimento': data_nascimento,
+            'plano_id': plano_id,
+            'data_matricula': agora,
+            'ativo': True,
+            'created_at': agora,
+            'updated_at': agora,
+        }
+
+    def _normalizar_email(self, email: str, dominios: dict) -> str:
+        """Mesma normalização do EmailStr, validando cada domínio uma vez"""
+        local, _, dominio = email.rpartition('@')
+        if local and len(local) <= 64 and _LOCAL_RE.match(local):
+            if dominio not in dominios:
+                try:
+                    dominios[dominio] = validate_email(f"a@{dominio}", check_deliverability=False).domain
+                except EmailNotValidError as e:
+                    dominios[dominio] = e
+            resultado = dominios[dominio]
+            if isinstance(resultado, EmailNotValidError):
+                raise ValueError(f"Email inválido: {resultado}")
+            return f"{local}@{resultado}"
+        try:
+            return validate_email(email, check_deliverability=False).normalized
+        except EmailNotValidError as e:
+            raise ValueError(f"Email inválido: {e}")
+
+    def _inserir(self, alunos: list) -> set:
+        """Gravar o lote e devolver os emails inseridos (os demais já existiam)"""
+        conexao = self.db.connection()
+        try:
+            if conexao.dialect.name == 'postgresql':
+                inseridos = self._inserir_copy(conexao.connection.driver_connection, alunos)
+            elif conexao.dialect.name == 'sqlite':
+                inseridos = self._inserir_on_conflict(alunos)
+            else:
+                raise ValueError(f"Importação em massa não suportada para {conexao.dialect.name}")
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return inseridos
+
+    def _inserir_on_conflict(self, alunos: list) -> set:
+        tabela = Aluno.__table__
+        consulta = insert(tabela).on_conflict_do_nothing(index_elements=[tabela.c.email]).returning(tabela.c.email)
+        return set(self.db.execute(consulta, alunos).scalars())
+
+    def _inserir_copy(self, conexao, alunos: list) -> set:
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for aluno in alunos:
+            escritor.writerow([aluno[coluna] for coluna in COLUNAS])
+        buffer.seek(0)
+
+        colunas = ", ".join(COLUNAS)
+        with conexao.cursor() as cursor:
+            # Só as colunas importadas: sem id, para não consumir a sequência de alunos
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS alunos_importacao ON COMMIT DELETE ROWS AS "
+                f"SELECT {colunas} FROM alunos WITH NO DATA"
+            )
+            if hasattr(cursor, 'copy_expert'):
+                cursor.copy_expert(f"COPY alunos_importacao ({colunas}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                # psycopg 3
+                with cursor.copy(f"COPY alunos_importacao ({colunas}) FROM STDIN WITH (FORMAT csv)") as copia:
+                    copia.write(buffer.getvalue())
+            cursor.execute(
+                f"INSERT INTO alunos ({colunas}) SELECT {colunas} FROM alunos_importacao "
+                "ON CONFLICT (email) DO NOTHING RETURNING email"
+            )
+            return {email for (email,) in cursor.fetchall()}
+
+    @staticmethod
+    def _erro(numero: int, registro, mensagem: str) -> dict:
+        email = registro.get('email') if isinstance(registro, dict) else None
+        return {'tipo': 'erro', 'linha': numero, 'email': email, 'erro': mensagem}
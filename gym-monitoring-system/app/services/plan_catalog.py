@@ -0,0 +1,172 @@
+# app/services/plan_catalog.py
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.database import Plano
+
+logger = logging.getLogger(__name__)
+
+# Chave com a versão do catálogo e canal em que cada nova versão é publicada
+VERSION_KEY = "planos:versao"
+CHANNEL = "planos:invalidar"
+
+# Plano ausente no catálogo força nova carga, no máximo uma vez por este intervalo
+MISS_RELOAD_SECONDS = 1.0
+
+
+class PlanoInfo(NamedTuple):
+    """Cópia imutável de um plano, compartilhada entre threads e sessões"""
+    id: int
+    nome: str
+    valor: float
+    duracao_meses: int
+
+
+class PlanCatalog:
+    """Planos carregados uma vez em memória e compartilhados por serviços, features e workers
+
+    Escritas em planos feitas pelo ORM, em qualquer sessão, invalidam o catálogo local
+    no commit e incrementam a versão no Redis, publicada em CHANNEL para os demais
+    processos. Como rede de segurança para mensagens perdidas, a versão no Redis também
+    é conferida a cada check_seconds.
+    """
+
+    def __init__(self, check_seconds: float = 30.0):
+        self.check_seconds = check_seconds
+        self.redis = None
+        self._planos = None
+        self._versao = None
+        self._carregado_em = 0.0
+        self._conferido_em = 0.0
+        self._lock = threading.Lock()
+        self._listener = None
+
+    @classmethod
+    def from_env(cls) -> "PlanCatalog":
+        return cls(check_seconds=float(os.getenv("PLAN_CATALOG_CHECK_SECONDS", "30")))
+
+    def connect(self, redis_client, listen: bool = True):
+        """Usar o Redis para publicar e (com listen) receber novas versões"""
+        self.redis = redis_client
+        self.invalidate()
+        if listen and (self._listener is None or not self._listener.is_alive()):
+            self._listener = threading.Thread(target=self._escutar, name="catalogo-planos", daemon=True)
+            self._listener.start()
+
+    def get(self, db: Session, plano_id: Optional[int]) -> Optional[PlanoInfo]:
+        """Plano pelo id (None se o aluno não tem plano ou o plano não existe)"""
+        if plano_id is None:
+            return None
+        planos = self._garantir(db)
+        plano = planos.get(plano_id)
+        if plano is None and time.monotonic() - self._carregado_em >= MISS_RELOAD_SECONDS:
+            # Plano criado depois da carga, sem notificação recebida
+            plano = self.load(db).get(plano_id)
+        return plano
+
+    def all(self, db: Session) -> dict:
+        """{id: PlanoInfo} de todos os planos"""
+        return self._garantir(db)
+
+    def load(self, db: Session) -> dict:
+        # Sem lock durante a consulta: quem espera o lock pode estar segurando a
+        # conexão que esta carga precisaria do pool. Cargas simultâneas só repetem trabalho.
+        versao = self._versao_redis()
+        planos = {
+            plano_id: PlanoInfo(plano_id, nome, valor, duracao)
+            for plano_id, nome, valor, duracao in db.query(
+                Plano.id, Plano.nome, Plano.valor, Plano.duracao_meses
+            )
+        }
+        with self._lock:
+            self._planos = planos
+            self._versao = versao
+            self._carregado_em = self._conferido_em = time.monotonic()
+        return planos
+
+    def invalidate(self):
+        self._planos = None
+
+    def publish_change(self):
+        """Invalidar este processo e avisar os demais com uma nova versão"""
+        self.invalidate()
+        if self.redis is None:
+            return
+        try:
+            versao = self.redis.incr(VERSION_KEY)
+            self.redis.publish(CHANNEL, versao)
+        except Exception as e:
+            logger.warning(f"Não foi possível publicar a nova versão do catálogo de planos: {e}")
+
+    def _garantir(self, db: Session) -> dict:
+        planos = self._planos
+        if planos is not None and self.redis is not None and time.monotonic() - self._conferido_em >= self.check_seconds:
+            self._conferido_em = time.monotonic()
+            if self._versao_redis() != self._versao:
+                planos = None
+        return planos if planos is not None else self.load(db)
+
+    def _versao_redis(self):
+        if self.redis is None:
+            return None
+        try:
+            return self.redis.get(VERSION_KEY)
+        except Exception as e:
+            logger.debug(f"Versão do catálogo de planos indisponível: {e}")
+            return self._versao
+
+    def _escutar(self):
+        espera = 1.0
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Mensagens podem ter sido perdidas enquanto não estava inscrito
+                self.invalidate()
+                espera = 1.0
+                for mensagem in pubsub.listen():
+                    if mensagem.get("type") == "message":
+                        self.invalidate()
+            except Exception as e:
+                logger.warning(f"Canal do catálogo de planos indisponível, nova tentativa em {espera:.0f}s: {e}")
+                time.sleep(espera)
+                espera = min(espera * 2, 60.0)
+
+
+# Catálogo do processo (API ou worker)
+plan_catalog = PlanCatalog.from_env()
+
+
+def _planos_alterados(session: Session) -> bool:
+    return any(isinstance(obj, Plano) for obj in (*session.new, *session.dirty, *session.deleted))
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_planos(session, flush_context):
+    if _planos_alterados(session):
+        session.info["planos_alterados"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _marcar_planos_em_massa(orm_execute_state):
+    # insert/update/delete em massa (session.execute(update(Plano)...)) não passam pelo flush
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Plano:
+        orm_execute_state.session.info["planos_alterados"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_planos(session):
+    if session.info.pop("planos_alterados", False):
+        plan_catalog.publish_change()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_planos(session):
+    session.info.pop("planos_alterados", None)
@@ -0,0 +1,73 @@
+# app/services/relatorio_service.py
+from sqlalchemy.orm import Session
+from app.services.plan_catalog import PlanCatalog, plan_catalog
+from app.api.schemas import (
+    MapaHorariosResponse, FrequenciaPorPlanoResponse, FrequenciaPlanoItem,
+    SerieCheckinsResponse, SerieCheckinsItem
+)
+from app.analytics.bitmap import DIAS_SEMANA
+from app.analytics.columnar import ColumnarCheckinStore
+from datetime import datetime, timedelta
+
+class RelatorioService:
+    """Relatórios agregados sobre todos os checkins, a partir do store colunar"""
+    
+    def __init__(self, db: Session, store: ColumnarCheckinStore, catalog: PlanCatalog = plan_catalog):
+        self.db = db
+        self.store = store
+        self.catalog = catalog
+    
+    def mapa_horarios(self, dias: int = 30) -> MapaHorariosResponse:
+        inicio, fim = self._periodo(dias)
+        mapa = self.store.hourly_heatmap(inicio, fim)
+        dia_pico, hora_pico = divmod(int(mapa.argmax()), 24)
+        
+        return MapaHorariosResponse(
+            inicio=inicio,
+            fim=fim,
+            dias_semana=DIAS_SEMANA,
+            checkins=mapa.tolist(),
+            dia_pico=DIAS_SEMANA[dia_pico],
+            hora_pico=hora_pico
+        )
+    
+    def frequencia_por_plano(self, dias: int = 30) -> FrequenciaPorPlanoResponse:
+        inicio, fim = self._periodo(dias)
+        agregados = self.store.by_plan(inicio, fim)
+        nomes = {plano_id: plano.nome for plano_id, plano in self.catalog.all(self.db).items()}
+        
+        planos = []
+        for plano_id, valores in sorted(agregados.items()):
+            planos.append(FrequenciaPlanoItem(
+                plano_id=plano_id if plano_id >= 0 else None,
+                plano_nome=nomes.get(plano_id),
+                checkins=valores['checkins'],
+                alunos=valores['alunos'],
+                checkins_por_aluno=valores['checkins'] / valores['alunos'],
+                duracao_media_minutos=valores['duracao_media_minutos']
+            ))
+        
+        return FrequenciaPorPlanoResponse(inicio=inicio, fim=fim, planos=planos)
+    
+    def serie_checkins(self, dias: int = 30, intervalo: str = 'dia') -> SerieCheckinsResponse:
+        inicio, fim = self._periodo(dias)
+        inicios, checkins, alunos = self.store.time_series(inicio, fim, intervalo)
+        
+        return SerieCheckinsResponse(
+            intervalo=intervalo,
+            inicio=inicio,
+            fim=fim,
+            pontos=[
+                SerieCheckinsItem(inicio=momento, checkins=int(total), alunos=int(distintos))
+                for momento, total, distintos in zip(inicios, checkins, alunos)
+            ]
+        )
+    
+    def _periodo(self, dias: int) -> tuple:
+        if dias <= 0:
+            raise ValueError("Período deve ter pelo menos um dia")
+        
+        # Trazer checkins novos antes de agregar
+        self.store.refresh_if_stale(self.db)
+        fim = datetime.utcnow()
+        return fim - timedelta(days=dias), fim
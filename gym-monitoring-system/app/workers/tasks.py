@@ -1,15 +1,29 @@
 # app/workers/tasks.py
-from celery import Celery
+from celery import Celery, signals
 from celery.schedules import crontab
 from sqlalchemy.orm import Session
-from app.models.database import SessionLocal, Checkin, Aluno
+from app.models.database import SessionLocal, ReadSessionLocal, Checkin, Aluno
 from app.services.checkin_service import CheckinService
-from app.ml.churn_model import ChurnPredictor
+from app.services.features_service import FeaturesAlunoService
+from app.services.cohort_service import CohortService
+from app.services.plan_catalog import plan_catalog
+from app.services.eventos_ao_vivo import eventos_ao_vivo
+from app.services.alertas_retencao import EntregaAlertas
+from app.ml.churn_model import ChurnPredictor, MODEL_FEATURES, create_predictor
 from app.ml.feature_engineering import FeatureEngineer
+from app.ml.training_pipeline import TrainingPipeline
+from app.ml.online_model import OnlineChurnPredictor
+from app.ml.snapshot_store import FeatureSnapshotStore, snapshot_datetime
+from app.analytics import bitmap as presenca
+from app.analytics.columnar import ColumnarCheckinStore, OPEN_CHECKIN_HOURS
+from app.monitoring.celery_metrics import install_celery_metrics
+from sklearn.metrics import roc_auc_score
+import numpy as np
 import logging
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+import redis
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -25,10 +39,30 @@ celery_app = Celery(
 celery_app.conf.worker_pool = 'solo'  # Usar pool 'solo' em vez de 'prefork' para evitar problemas no Windows
 celery_app.conf.broker_connection_retry_on_startup = True  # Tentar reconectar ao broker na inicialização
 
+# Duração, retentativas e atraso na fila de todas as tarefas (exportadas em CELERY_METRICS_PORT)
+install_celery_metrics()
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Store colunar do worker: carregado uma vez, depois só checkins novos a cada execução
+checkin_store = ColumnarCheckinStore(refresh_seconds=0)
+
+# Destinos dos alertas de retenção (ALERT_WEBHOOK_URL, ALERT_SMTP_HOST, ALERT_FILE)
+entrega_alertas = EntregaAlertas.from_env()
+
+# Catálogo de planos do worker, invalidado por pub/sub (no pool prefork, em cada processo filho)
+@signals.worker_init.connect
+@signals.worker_process_init.connect
+def connect_plan_catalog(**kwargs):
+    redis_client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6380'), decode_responses=True)
+    plan_catalog.connect(redis_client)
+    # Checkins gravados e alertas do worker também vão para o stream de eventos ao vivo
+    eventos_ao_vivo.connect(redis_client)
+    # Alunos já alertados, para não repetir o alerta a cada análise
+    entrega_alertas.connect(redis_client)
+
 def get_db_session():
     """Obter sessão do banco de dados"""
     db = SessionLocal()
@@ -38,6 +72,10 @@ def get_db_session():
         db.close()
         raise e
 
+def get_read_db_session():
+    """Obter sessão somente leitura (réplica, se configurada)"""
+    return ReadSessionLocal()
+
 @celery_app.task(bind=True, max_retries=3)
 def process_checkin_batch(self, checkin_ids: list):
     """Processar checkins em lote"""
@@ -81,7 +119,7 @@ def process_checkin_batch(self, checkin_ids: list):
 def generate_daily_report(self):
     """Gerar relatório diário de frequência"""
     try:
-        db = get_db_session()
+        db = get_read_db_session()
         
         logger.info("Iniciando geração de relatório diário")
         
@@ -118,25 +156,28 @@ def generate_daily_report(self):
 def identify_at_risk_students(self):
     """Identificar alunos em risco de churn"""
     try:
-        db = get_db_session()
+        db = get_read_db_session()
         
         logger.info("Identificando alunos em risco")
         
-        # Obter todos os alunos ativos
-        alunos_ativos = db.query(Aluno).filter(Aluno.ativo).all()
-        
-        predictor = ChurnPredictor()
+        predictor = create_predictor()
         alunos_risco_alto = []
         alunos_risco_medio = []
         
-        for aluno in alunos_ativos:
-            try:
-                # Extrair features (implementar método similar ao ChurnService)
-                features = extract_student_features(db, aluno)
-                
-                # Prever risco
-                probabilidade = predictor.predict_proba(features)
-                
+        # Agregados de features_aluno em lotes (uma consulta por lote); o histórico só para quem não tem
+        for lote in FeaturesAlunoService(db).features_ativos():
+            pontuaveis = []
+            for aluno, features in lote:
+                try:
+                    pontuaveis.append((aluno, features if features is not None else extract_student_features(db, aluno)))
+                except Exception as e:
+                    logger.error(f"Erro ao analisar aluno {aluno.id}: {e}")
+            if not pontuaveis:
+                continue
+            
+            probabilidades = predictor.predict_proba_batch([features for _, features in pontuaveis])
+            for (aluno, _), probabilidade in zip(pontuaveis, probabilidades):
+                probabilidade = float(probabilidade)
                 if probabilidade >= 0.7:
                     alunos_risco_alto.append({
                         'aluno_id': aluno.id,
@@ -149,9 +190,6 @@ def identify_at_risk_students(self):
                         'nome': aluno.nome,
                         'probabilidade': probabilidade
                     })
-                
-            except Exception as e:
-                logger.error(f"Erro ao analisar aluno {aluno.id}: {e}")
         
         # Enviar notificações para equipe de retenção
         if alunos_risco_alto:
@@ -179,24 +217,27 @@ def identify_at_risk_students(self):
 
 @celery_app.task
 def send_retention_alerts(alunos_risco: list, nivel_risco: str):
-    """Enviar alertas para equipe de retenção"""
+    """Enviar alertas para equipe de retenção (webhook, e-mail e arquivo; ver EntregaAlertas)"""
     try:
         logger.info(f"Enviando alertas de risco {nivel_risco} para {len(alunos_risco)} alunos")
         
-        # Aqui você implementaria:
-        # - Envio de emails
-        # - Notificações push
-        # - Integração com CRM
-        # - Webhooks
+        resumo = entrega_alertas.entregar(alunos_risco, nivel_risco)
+        if not resumo:
+            # Sem destino configurado, os alertas ficam só no log
+            for aluno in alunos_risco:
+                logger.info(f"Alerta {nivel_risco}: Aluno {aluno['nome']} (ID: {aluno['aluno_id']}) - Probabilidade: {aluno['probabilidade']:.2%}")
+        for sink, resultado in resumo.items():
+            logger.info(f"Alertas {nivel_risco} via {sink}: {resultado['enviados']} enviados, "
+                        f"{resultado['repetidos']} já alertados, {resultado['falhas']} falhas")
         
-        for aluno in alunos_risco:
-            logger.info(f"Alerta {nivel_risco}: Aluno {aluno['nome']} (ID: {aluno['aluno_id']}) - Probabilidade: {aluno['probabilidade']:.2%}")
+        # Painéis conectados em /eventos/stream
+        eventos_ao_vivo.alertas(alunos_risco, nivel_risco)
         
-        # Simular envio de notificação
         return {
             "status": "success",
-            "alertas_enviados": len(alunos_risco),
-            "nivel_risco": nivel_risco
+            "alertas_enviados": sum(r['enviados'] for r in resumo.values()),
+            "nivel_risco": nivel_risco,
+            "destinos": resumo
         }
         
     except Exception as e:
@@ -207,29 +248,53 @@ def send_retention_alerts(alunos_risco: list, nivel_risco: str):
 def update_churn_model(self):
     """Atualizar modelo de previsão de churn"""
     try:
-        db = get_db_session()
+        db = get_read_db_session()
         
         logger.info("Iniciando atualização do modelo de churn")
         
-        # Gerar dataset de treinamento
-        feature_engineer = FeatureEngineer(db)
-        training_data = feature_engineer.create_training_dataset(months_back=12)
+        # Features explícitas: o modelo em produção pode ter sido treinado com menos
+        pipeline = TrainingPipeline(
+            feature_names=MODEL_FEATURES,
+            n_jobs=int(os.getenv('TRAINING_N_JOBS', '-1')),
+            latency_budget_us=float(os.getenv('TRAINING_LATENCY_BUDGET_US', '250'))
+        )
         
-        if len(training_data) < 100:
-            logger.warning("Dados insuficientes para retreinamento. Usando dados sintéticos.")
-            training_data = feature_engineer.generate_synthetic_data(1000)
-        
-        # Treinar modelo
-        predictor = ChurnPredictor()
-        metrics = predictor.train_model(training_data)
+        # Gerar dataset de treinamento
+        with pipeline.stage('dataset'):
+            # Checkins carregados em massa só se o snapshot do dia não existir
+            feature_engineer = FeatureEngineer(db, checkin_store=ColumnarCheckinStore(refresh_seconds=float('inf')))
+            
+            # Snapshot do dia: reexecuções e backtests não consultam o banco de novo
+            hoje = snapshot_datetime(datetime.utcnow())
+            training_data = FeatureSnapshotStore().get_or_compute(
+                'treino_12m', hoje,
+                lambda: feature_engineer.create_training_dataset(months_back=12, end_date=hoje),
+                params={'months_back': 12}
+            )
+            
+            if len(training_data) < 100:
+                logger.warning("Dados insuficientes para retreinamento. Usando dados sintéticos.")
+                training_data = feature_engineer.generate_synthetic_data(1000)
         
         db.close()
         
-        logger.info(f"Modelo atualizado com acurácia: {metrics['accuracy']:.3f}")
+        # Busca de hiperparâmetros e promoção apenas se superar o modelo atual
+        relatorio = pipeline.run(training_data, ChurnPredictor())
+        
+        logger.info(
+            f"Busca concluída: AUC candidato {relatorio['auc_candidato']:.3f}, "
+            f"AUC atual {relatorio['auc_atual']}, promovido={relatorio['promovido']}, "
+            f"tempos={relatorio['tempos']}"
+        )
         
         return {
             "status": "success",
-            "accuracy": metrics['accuracy'],
+            "accuracy": relatorio['accuracy'],
+            "auc_candidato": relatorio['auc_candidato'],
+            "auc_atual": relatorio['auc_atual'],
+            "promovido": relatorio['promovido'],
+            "parametros": relatorio['escolhido']['params'],
+            "tempos": relatorio['tempos'],
             "training_samples": len(training_data)
         }
         
@@ -240,6 +305,142 @@ def update_churn_model(self):
         else:
             raise
 
+@celery_app.task(bind=True, max_retries=3)
+def update_online_churn_model(self):
+    """Atualizar o modelo online com os desfechos rotulados desde a última execução"""
+    try:
+        db = get_read_db_session()
+        
+        predictor = OnlineChurnPredictor(
+            batch_size=int(os.getenv('ONLINE_BATCH_SIZE', '256')),
+            checkpoint_every=int(os.getenv('ONLINE_CHECKPOINT_EVERY', '5000'))
+        )
+        feature_engineer = FeatureEngineer(db, checkin_store=ColumnarCheckinStore(refresh_seconds=float('inf')))
+        store = FeatureSnapshotStore()
+        
+        # Dias ainda não processados (no máximo ONLINE_MAX_CATCHUP_DAYS)
+        hoje = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        max_dias = int(os.getenv('ONLINE_MAX_CATCHUP_DAYS', '7'))
+        inicio = hoje if predictor.last_labeled_at is None else predictor.last_labeled_at + timedelta(days=1)
+        inicio = max(inicio, hoje - timedelta(days=max_dias - 1))
+        
+        amostras = 0
+        auc_prequencial = []
+        dia = inicio
+        while dia <= hoje:
+            # Só os desfechos que fecharam neste dia: cada aluno entra uma vez por horizonte,
+            # e só as linhas desses alunos são montadas
+            devidos = feature_engineer.outcome_due_ids(dia)
+            desfechos = store.get_or_compute(
+                'desfechos_devidos', dia, lambda: feature_engineer.create_outcome_dataset(dia, aluno_ids=devidos)
+            )
+            if len(desfechos):
+                desfechos = desfechos[desfechos['aluno_id'].isin(devidos)]
+            if len(desfechos):
+                desfechos = desfechos.sample(frac=1, random_state=dia.toordinal())
+        
+                # Avaliar antes de treinar (teste-depois-treino)
+                if predictor.is_trained and desfechos['churn'].nunique() == 2:
+                    probabilidades = predictor.predict_proba_batch(desfechos.to_dict('records'))
+                    auc_prequencial.append(roc_auc_score(desfechos['churn'], probabilidades))
+        
+                amostras += predictor.partial_fit(desfechos, desfechos['churn'])
+            predictor.last_labeled_at = dia
+            dia += timedelta(days=1)
+        
+        predictor.save_model()
+        db.close()
+        
+        logger.info(f"Modelo online atualizado com {amostras} desfechos (total {predictor.samples_seen})")
+        
+        return {
+            "status": "success",
+            "amostras": amostras,
+            "amostras_total": predictor.samples_seen,
+            "auc_prequencial": float(np.mean(auc_prequencial)) if auc_prequencial else None,
+            "ultimo_dia": predictor.last_labeled_at.date().isoformat()
+        }
+        
+    except Exception as exc:
+        logger.error(f"Erro na atualização do modelo online: {exc}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=600, exc=exc)
+        else:
+            raise
+
+@celery_app.task(bind=True, max_retries=2)
+def reconcile_student_features(self):
+    """Reconstruir features_aluno a partir dos checkins"""
+    try:
+        db = get_db_session()
+        
+        logger.info("Reconciliando agregados de features dos alunos")
+        resultado = FeaturesAlunoService(db).reconstruir()
+        db.close()
+        
+        logger.info(f"Reconciliação concluída: {resultado['alunos']} alunos, {resultado['divergentes']} divergentes")
+        
+        return {
+            "status": "success",
+            **resultado
+        }
+        
+    except Exception as exc:
+        logger.error(f"Erro na reconciliação de features: {exc}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=600, exc=exc)
+        else:
+            raise
+
+@celery_app.task
+def sync_occupancy():
+    """Corrigir o contador de ocupação com os checkins em aberto no banco"""
+    db = get_read_db_session()
+    try:
+        desde = datetime.utcnow() - timedelta(hours=OPEN_CHECKIN_HOURS)
+        presentes = db.query(Checkin).filter(
+            Checkin.data_saida.is_(None),
+            Checkin.data_entrada >= desde
+        ).count()
+    finally:
+        db.close()
+    
+    eventos_ao_vivo.sincronizar_ocupacao(presentes)
+    return {
+        "status": "success",
+        "presentes": presentes
+    }
+
+@celery_app.task(bind=True, max_retries=2)
+def update_cohort_retention(self):
+    """Calcular e armazenar em cache a retenção por coorte do dia que fechou"""
+    try:
+        db = get_read_db_session()
+        redis_client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6380'), decode_responses=True)
+        meses = int(os.getenv('COHORT_MONTHS', '12'))
+        
+        cohort_service = CohortService(db, checkin_store)
+        resultados = {}
+        for por_plano in (False, True):
+            resultado = cohort_service.obter_retencao(redis_client, meses, por_plano)
+            resultados['por_plano' if por_plano else 'geral'] = len(resultado.coortes)
+        db.close()
+        
+        logger.info(f"Retenção por coorte de {resultado.data_referencia} calculada ({len(checkin_store)} checkins)")
+        
+        return {
+            "status": "success",
+            "data_referencia": str(resultado.data_referencia),
+            "coortes": resultados
+        }
+        
+    except Exception as exc:
+        logger.error(f"Erro no cálculo de retenção por coorte: {exc}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=600, exc=exc)
+        else:
+            raise
+
 def extract_student_features(db: Session, aluno: Aluno) -> dict:
     """Extrair features de um aluno para previsão"""
     agora = datetime.utcnow()
@@ -271,12 +472,19 @@ def extract_student_features(db: Session, aluno: Aluno) -> dict:
         features['duracao_media_minutos'] = 0
     
     # Informações do plano
-    features['plano_valor'] = aluno.plano.valor if aluno.plano else 0
-    features['plano_duracao'] = aluno.plano.duracao_meses if aluno.plano else 0
+    plano = plan_catalog.get(db, aluno.plano_id)
+    features['plano_valor'] = plano.valor if plano else 0
+    features['plano_duracao'] = plano.duracao_meses if plano else 0
     
     # Tempo como aluno
     features['dias_como_aluno'] = (agora - aluno.data_matricula).days
     
+    # Presença diária nos mesmos 90 dias
+    bitmap, inicio = presenca.from_days([c.data_entrada for c in checkins], agora)
+    resumo = presenca.attendance_summary(bitmap, inicio, agora)
+    for nome in ('dias_presentes_30', 'sequencia_atual_dias', 'maior_intervalo_dias'):
+        features[nome] = resumo[nome]
+    
     return features
 
 # Configuração de tasks periódicas
@@ -297,6 +505,26 @@ celery_app.conf.beat_schedule = {
         'task': 'app.workers.tasks.update_churn_model',
         'schedule': crontab(hour=2, minute=0, day_of_week=0),
     },
+    # Atualização incremental do modelo online (diariamente às 3h)
+    'online-model-update': {
+        'task': 'app.workers.tasks.update_online_churn_model',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    # Retenção por coorte do dia que fechou (diariamente às 0h30)
+    'cohort-retention': {
+        'task': 'app.workers.tasks.update_cohort_retention',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    # Reconciliação dos agregados de features (diariamente às 4h)
+    'features-reconcile': {
+        'task': 'app.workers.tasks.reconcile_student_features',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    # Ocupação do stream de eventos recontada no banco (a cada 5 minutos)
+    'occupancy-sync': {
+        'task': 'app.workers.tasks.sync_occupancy',
+        'schedule': crontab(minute='*/5'),
+    },
 }
 
 celery_app.conf.timezone = 'America/Sao_Paulo'
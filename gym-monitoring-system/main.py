@@ -1,20 +1,40 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, WebSocket, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import redis
+from typing import List, Optional
+import asyncio
 import json
+import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
 
-from app.models.database import get_db, create_tables
+from app.models.database import get_db, get_read_db, engine, read_engine, SessionLocal
 from app.api.schemas import *
+from app.api.ingestao_catraca import GatewayCatraca, WS_POLICY_VIOLATION
+from app.api.transmissao_eventos import HubEventos
 from app.services.aluno_service import AlunoService
 from app.services.checkin_service import CheckinService
 from app.services.churn_service import ChurnService
-from app.workers.tasks import process_checkin_batch, generate_daily_report
-from app.ml.churn_model import ChurnPredictor
+from app.services.relatorio_service import RelatorioService
+from app.services.cohort_service import CohortService
+from app.services.importacao_service import ImportacaoAlunosService, FORMATOS, iter_linhas
+from app.services.idempotencia import IdempotencyCache
+from app.services.checkin_journal import CheckinJournal
+from app.services.plan_catalog import plan_catalog
+from app.services.eventos_ao_vivo import eventos_ao_vivo
+from app.ml.inference_executor import InferenceExecutor
+from app.analytics.columnar import ColumnarCheckinStore
+from app.monitoring.metrics import REGISTRY, CONTENT_TYPE
+from app.monitoring.instrumentation import (
+    PerformanceMiddleware, InstrumentedRedis, instrument_engine, request_metrics
+)
 
 # Inicializar aplicação
 app = FastAPI(
@@ -32,8 +52,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tempo total, de banco e de Redis por requisição (header Server-Timing)
+app.add_middleware(PerformanceMiddleware)
+instrument_engine(engine)
+instrument_engine(read_engine, 'replica')
+
 # Configurar Redis para cache
-redis_client = redis.Redis(host='localhost', port=6380, decode_responses=True)
+redis_client = InstrumentedRedis(host='localhost', port=6380, decode_responses=True)
+
+def idempotencia() -> IdempotencyCache:
+    """Resultados de eventos de catraca já processados (IDEMPOTENCY_TTL_SECONDS)"""
+    return IdempotencyCache.from_env(redis_client)
+
+# Executor de inferência fora do event loop (INFERENCE_EXECUTOR, INFERENCE_WORKERS,
+# INFERENCE_BATCH_WINDOW_MS, INFERENCE_MAX_BATCH)
+inference_executor = InferenceExecutor.from_env()
+
+# Checkins em colunas para os relatórios agregados, carregados na primeira consulta
+# e atualizados a cada ANALYTICS_REFRESH_SECONDS
+checkin_store = ColumnarCheckinStore.from_env()
 
 # Configurar autenticação
 security = HTTPBearer()
@@ -49,10 +86,60 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
     return credentials.credentials
 
-# Inicializar banco de dados
+logger = logging.getLogger(__name__)
+
+# Importar Celery, pandas e scikit-learn em segundo plano logo após o startup,
+# em vez de atrasar o boot (WARMUP_ON_STARTUP=0 deixa para a primeira chamada)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+def tarefas():
+    """Módulo de tarefas do Celery, importado sob demanda"""
+    from app.workers import tasks
+    return tasks
+
+def aquecer():
+    """Carregar os módulos pesados fora do caminho de inicialização"""
+    inicio = time.perf_counter()
+    try:
+        tarefas()
+        logger.info(f"Aquecimento concluído em {time.perf_counter() - inicio:.2f}s")
+    except Exception as e:
+        logger.error(f"Erro no aquecimento: {e}")
+
+def checkins_gravados(checkins: list):
+    """Checkins recém-gravados fora do request (journal, catracas): store colunar e fila do Celery"""
+    checkin_store.append(checkins)
+    tarefas().process_checkin_batch.delay([c.id for c in checkins])
+
+# Modo write-behind dos checkins (CHECKIN_WRITE_BEHIND=1): entradas confirmadas após o
+# fsync em grupo do journal local e gravadas no banco em lotes (CHECKIN_JOURNAL_DIR,
+# CHECKIN_JOURNAL_FLUSH_MS, CHECKIN_JOURNAL_BATCH, CHECKIN_JOURNAL_MAX_PENDING)
+CHECKIN_WRITE_BEHIND = os.getenv("CHECKIN_WRITE_BEHIND", "0") == "1"
+checkin_journal = CheckinJournal.from_env(ao_gravar=checkins_gravados) if CHECKIN_WRITE_BEHIND else None
+
+# Stream de eventos ao vivo para os painéis (EVENTS_CLIENT_BUFFER, EVENTS_HEARTBEAT_SECONDS, EVENTS_MAX_CLIENTS)
+eventos_hub = HubEventos.from_env()
+
+# As tabelas são criadas pela migração (python scripts/migrate.py), não a cada boot
 @app.on_event("startup")
 async def startup_event():
-    create_tables()
+    inference_executor.start()
+    # Catálogo de planos invalidado pelas escritas de outros processos (pub/sub)
+    plan_catalog.connect(redis_client)
+    # Checkins, ocupação e alertas publicados por qualquer processo, repassados aos clientes deste
+    eventos_ao_vivo.connect(redis_client)
+    eventos_hub.start(redis_client)
+    # Regrava o que uma execução anterior deixou no journal antes de aceitar checkins
+    if checkin_journal is not None:
+        checkin_journal.start()
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=aquecer, name="aquecimento", daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    inference_executor.shutdown()
+    if checkin_journal is not None:
+        checkin_journal.shutdown()
 
 # Endpoints da API
 
@@ -76,24 +163,131 @@ async def registrar_aluno(
 @app.post("/aluno/checkin", response_model=CheckinResponse)
 async def registrar_checkin(
     checkin: CheckinCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=128),
     db: Session = Depends(get_db)
 ):
-    """Registrar entrada do aluno na academia"""
+    """Registrar entrada do aluno na academia (idempotente com chave_idempotencia ou Idempotency-Key)"""
     try:
-        checkin_service = CheckinService(db)
-        novo_checkin = checkin_service.criar_checkin(checkin)
+        # Repetição da catraca: resultado original direto do Redis
+        chave = checkin.chave_idempotencia or idempotency_key
+        cache = idempotencia()
+        original = cache.buscar('entrada', [chave]).get(chave)
+        if original:
+            return original
+        
+        if checkin_journal is not None:
+            resultado, _ = await run_in_threadpool(checkin_journal.aceitar, db, checkin.aluno_id, chave)
+            if isinstance(resultado, dict):
+                # Em disco, ainda sem id: gravado no banco pelo próximo flush do journal
+                aceito = CheckinAceito(aluno_id=resultado['aluno_id'], data_entrada=resultado['data_entrada'],
+                                       chave_idempotencia=resultado['chave'])
+                return JSONResponse(status_code=202, content=jsonable_encoder(aceito))
+            return resultado
         
-        # Adicionar à fila para processamento assíncrono
-        process_checkin_batch.delay([novo_checkin.id])
+        checkin_service = CheckinService(db)
+        novo_checkin, criado = checkin_service.registrar_entrada(checkin.aluno_id, chave)
+        if criado:
+            checkin_store.append([novo_checkin])
+            # Adicionar à fila para processamento assíncrono
+            tarefas().process_checkin_batch.delay([novo_checkin.id])
+        if chave:
+            cache.guardar('entrada', {chave: CheckinResponse.model_validate(novo_checkin).model_dump(mode='json')})
         
         return novo_checkin
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/aluno/checkout", response_model=CheckinResponse)
+async def registrar_checkout(
+    checkout: CheckoutCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+    db: Session = Depends(get_db)
+):
+    """Registrar saída do aluno (idempotente com chave_idempotencia ou Idempotency-Key)"""
+    try:
+        chave = checkout.chave_idempotencia or idempotency_key
+        cache = idempotencia()
+        original = cache.buscar('saida', [chave]).get(chave)
+        if original:
+            return original
+        
+        # Entrada ainda no journal: gravar antes de registrar a saída
+        if checkin_journal is not None and checkin_journal.pendente(checkout.aluno_id):
+            await run_in_threadpool(checkin_journal.flush)
+        
+        checkin_service = CheckinService(db)
+        checkin, _ = checkin_service.registrar_saida_aluno(checkout.aluno_id, chave)
+        if chave:
+            cache.guardar('saida', {chave: CheckinResponse.model_validate(checkin).model_dump(mode='json')})
+        
+        return checkin
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/aluno/checkins/lote", response_model=List[ResultadoEventoCheckin])
+async def registrar_eventos_catraca(
+    eventos: List[EventoCheckin],
+    db: Session = Depends(get_db)
+):
+    """Registrar entradas e saídas em lote; repetições devolvem o resultado original"""
+    try:
+        checkin_service = CheckinService(db)
+        resultados, criados = await run_in_threadpool(checkin_service.registrar_eventos, eventos, idempotencia())
+        # Checkins expirados pelos commits seguintes do lote: ler as colunas fora do event loop
+        await run_in_threadpool(checkin_store.append, criados)
+        if criados:
+            tarefas().process_checkin_batch.delay([c.id for c in criados])
+        return resultados
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.websocket("/ws/catraca")
+async def ingestao_catraca(
+    websocket: WebSocket,
+    dispositivo: Optional[str] = None,
+    sessao: Optional[str] = None,
+    token: Optional[str] = None
+):
+    """Conexão persistente das catracas: entradas e saídas em fluxo, ack em lotes (ver GatewayCatraca)"""
+    # Autenticação uma vez por conexão: header Authorization ou ?token=
+    credencial = token or websocket.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if credencial != "valid_token":
+        await websocket.close(code=WS_POLICY_VIOLATION, reason="Token inválido")
+        return
+    # seq recomeça quando a catraca reinicia: as chaves derivadas precisam da sessão (boot) atual
+    if dispositivo and not sessao:
+        await websocket.close(code=WS_POLICY_VIOLATION, reason="sessao obrigatória com dispositivo")
+        return
+    await websocket.accept()
+    # Sem Depends(get_db): a conexão dura horas, cada lote abre a própria sessão
+    gateway = GatewayCatraca.from_env(websocket, SessionLocal, dispositivo=dispositivo, sessao=sessao, cache=idempotencia(),
+                                      ao_processar=checkins_gravados)
+    await gateway.executar()
+
+@app.get("/eventos/stream")
+async def stream_eventos(
+    tipos: Optional[str] = None,
+    token: str = Depends(verify_token)
+):
+    """Server-Sent Events com checkins, saídas, ocupação e alertas de risco (requer autenticação)
+
+    `tipos` filtra os eventos (ex.: ?tipos=ocupacao,alerta_risco). Clientes lentos
+    perdem os eventos mais antigos e recebem um evento "perdidos" (ver Assinante).
+    """
+    try:
+        assinante = eventos_hub.assinar(tipos.split(',') if tipos else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        eventos_hub.stream(assinante),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/aluno/{aluno_id}/frequencia", response_model=FrequenciaResponse)
 async def obter_frequencia(
     aluno_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Obter histórico de frequência do aluno"""
     try:
@@ -108,7 +302,7 @@ async def obter_frequencia(
         frequencia = checkin_service.obter_frequencia_aluno(aluno_id)
         
         # Armazenar no cache por 15 minutos
-        redis_client.setex(cache_key, 900, json.dumps(frequencia, default=str))
+        redis_client.setex(cache_key, 900, frequencia.model_dump_json())
         
         return frequencia
     except Exception as e:
@@ -117,7 +311,7 @@ async def obter_frequencia(
 @app.get("/aluno/{aluno_id}/risco-churn", response_model=ChurnPredictionResponse)
 async def obter_risco_churn(
     aluno_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Obter probabilidade de desistência do aluno"""
     try:
@@ -128,11 +322,15 @@ async def obter_risco_churn(
         if cached_data:
             return json.loads(cached_data)
         
+        # Extração de features (consultas ao banco) em thread, e inferência
+        # agrupada no executor, sem bloquear o event loop
         churn_service = ChurnService(db)
-        predicao = churn_service.prever_churn(aluno_id)
+        features = await run_in_threadpool(churn_service.obter_features, aluno_id)
+        probabilidade = await inference_executor.predict(features)
+        predicao = churn_service.montar_predicao(aluno_id, features, probabilidade)
         
         # Armazenar no cache por 1 hora
-        redis_client.setex(cache_key, 3600, json.dumps(predicao, default=str))
+        redis_client.setex(cache_key, 3600, predicao.model_dump_json())
         
         return predicao
     except Exception as e:
@@ -142,7 +340,7 @@ async def obter_risco_churn(
 async def listar_alunos(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     token: str = Depends(verify_token)
 ):
     """Listar todos os alunos (requer autenticação)"""
@@ -153,9 +351,61 @@ async def listar_alunos(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+class RespostaImportacao(StreamingResponse):
+    """NDJSON da importação, gerado enquanto o corpo da requisição ainda chega
+
+    O importador roda no threadpool e lê o corpo bloco a bloco. Até o corpo acabar,
+    a desconexão aparece na própria leitura (ClientDisconnect); só depois a escuta
+    de desconexão do StreamingResponse passa a consumir o receive.
+    """
+
+    def __init__(self, request: Request, importar, **kwargs):
+        self.loop = asyncio.get_running_loop()
+        self.corpo_lido = asyncio.Event()
+        eventos = importar(iter_linhas(self._blocos(request)))
+        super().__init__(
+            (json.dumps(evento, ensure_ascii=False, default=str) + "\n" for evento in eventos),
+            media_type="application/x-ndjson", **kwargs
+        )
+
+    def _blocos(self, request: Request):
+        corpo = request.stream().__aiter__()
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(corpo.__anext__(), self.loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.corpo_lido.set)
+
+    async def listen_for_disconnect(self, receive) -> None:
+        await self.corpo_lido.wait()
+        await super().listen_for_disconnect(receive)
+
+@app.post("/alunos/importar")
+async def importar_alunos(
+    request: Request,
+    formato: Optional[str] = None,
+    db: Session = Depends(get_db),
+    token: str = Depends(verify_token)
+):
+    """Cadastrar alunos em massa a partir de CSV ou NDJSON (requer autenticação)
+
+    Responde em NDJSON: um evento por linha rejeitada, progresso a cada lote e o resumo no fim.
+    """
+    if formato is None:
+        formato = 'ndjson' if 'json' in request.headers.get('content-type', '') else 'csv'
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato} (use {', '.join(FORMATOS)})")
+    
+    importacao = ImportacaoAlunosService(db)
+    return RespostaImportacao(request, lambda linhas: importacao.importar(linhas, formato))
+
 @app.get("/relatorio/frequencia", response_model=RelatorioFrequenciaResponse)
 async def obter_relatorio_frequencia(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     token: str = Depends(verify_token)
 ):
     """Obter relatório de frequência (requer autenticação)"""
@@ -166,6 +416,61 @@ async def obter_relatorio_frequencia(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/relatorio/horarios", response_model=MapaHorariosResponse)
+async def obter_mapa_horarios(
+    dias: int = 30,
+    db: Session = Depends(get_read_db),
+    token: str = Depends(verify_token)
+):
+    """Checkins por dia da semana e hora nos últimos dias (requer autenticação)"""
+    try:
+        relatorio_service = RelatorioService(db, checkin_store)
+        return await run_in_threadpool(relatorio_service.mapa_horarios, dias)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/relatorio/planos", response_model=FrequenciaPorPlanoResponse)
+async def obter_frequencia_por_plano(
+    dias: int = 30,
+    db: Session = Depends(get_read_db),
+    token: str = Depends(verify_token)
+):
+    """Checkins, alunos ativos e duração média por plano (requer autenticação)"""
+    try:
+        relatorio_service = RelatorioService(db, checkin_store)
+        return await run_in_threadpool(relatorio_service.frequencia_por_plano, dias)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/relatorio/serie", response_model=SerieCheckinsResponse)
+async def obter_serie_checkins(
+    dias: int = 30,
+    intervalo: str = "dia",
+    db: Session = Depends(get_read_db),
+    token: str = Depends(verify_token)
+):
+    """Checkins e alunos distintos por hora, dia ou semana (requer autenticação)"""
+    try:
+        relatorio_service = RelatorioService(db, checkin_store)
+        return await run_in_threadpool(relatorio_service.serie_checkins, dias, intervalo)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/relatorio/coortes", response_model=RetencaoCoortesResponse)
+async def obter_retencao_coortes(
+    meses: int = 12,
+    por_plano: bool = False,
+    db: Session = Depends(get_read_db),
+    token: str = Depends(verify_token)
+):
+    """Retenção por mês de matrícula e sobrevivência até o último dia fechado (requer autenticação)"""
+    try:
+        # Cache por dia fechado (pré-calculado pela tarefa update_cohort_retention)
+        cohort_service = CohortService(db, checkin_store)
+        return await run_in_threadpool(cohort_service.obter_retencao, redis_client, meses, por_plano)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/processar-checkins-batch")
 async def processar_checkins_batch(
     checkin_ids: List[int],
@@ -174,7 +479,7 @@ async def processar_checkins_batch(
     """Processar checkins em lote (requer autenticação)"""
     try:
         # Enviar para fila de processamento
-        process_checkin_batch.delay(checkin_ids)
+        tarefas().process_checkin_batch.delay(checkin_ids)
         return {"message": f"Processamento de {len(checkin_ids)} checkins iniciado"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -186,11 +491,30 @@ async def gerar_relatorio_diario(
     """Gerar relatório diário (requer autenticação)"""
     try:
         # Enviar para fila de processamento
-        generate_daily_report.delay()
+        tarefas().generate_daily_report.delay()
         return {"message": "Geração de relatório diário iniciada"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/metricas/inferencia")
+async def obter_metricas_inferencia(
+    token: str = Depends(verify_token)
+):
+    """Métricas do executor de inferência: fila e tamanho dos lotes (requer autenticação)"""
+    return inference_executor.metrics()
+
+@app.get("/metricas/requisicoes")
+async def obter_metricas_requisicoes(
+    token: str = Depends(verify_token)
+):
+    """Latência, tempo de banco e consultas por rota, com percentis (requer autenticação)"""
+    return request_metrics.snapshot()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato de texto do Prometheus (para o scraper, sem autenticação)"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.post("/login", response_model=Token)
 async def login(user: UserLogin):
     """Endpoint de login para obter token JWT"""
@@ -0,0 +1,84 @@
+# scripts/benchmark_churn_inference.py
+"""
+Benchmark de latência da inferência de churn
+
+Compara o caminho sklearn (StandardScaler.transform + RandomForest.predict_proba)
+com a floresta compacta (app/ml/compact_forest.py), para uma linha e para lotes,
+e verifica a paridade das probabilidades.
+
+Exemplo:
+    python scripts/benchmark_churn_inference.py --batch-sizes 1 16 256 4096
+"""
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+import numpy as np
+from app.ml.churn_model import ChurnPredictor
+from app.ml.compact_forest import CompactForest
+from app.ml.feature_engineering import FeatureEngineer
+
+
+def _per_call(func, repeticoes: int) -> float:
+    """Tempo médio por chamada, em microssegundos"""
+    func()  # Aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de latência da inferência de churn")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 256, 4096])
+    parser.add_argument("--repeat", type=int, default=200, help="Repetições para uma linha")
+    args = parser.parse_args(argv)
+
+    # O modelo salvo pode ter sido treinado com nomes de colunas; a API usa arrays
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    predictor = ChurnPredictor()
+    if not predictor.is_trained:
+        print("Nenhum modelo treinado em models/. Treine o modelo antes do benchmark.")
+        return
+
+    model, scaler = predictor.model, predictor.scaler
+    inicio = time.perf_counter()
+    forest = CompactForest.from_sklearn(model, scaler)
+    print(f"Exportação: {(time.perf_counter() - inicio) * 1e3:.1f} ms, "
+          f"{len(forest.roots)} árvores, {len(forest.feature)} nós, profundidade {forest.max_depth}")
+
+    dados = FeatureEngineer(db=None).generate_synthetic_data(max(args.batch_sizes), seed=123)
+    X = dados[predictor.feature_names].to_numpy(dtype=np.float64)
+
+    # Paridade
+    esperado = model.predict_proba(scaler.transform(X))[:, 1]
+    diferenca = np.abs(forest.predict_proba(X) - esperado).max()
+    print(f"Maior diferença de probabilidade vs sklearn: {diferenca:.2e}\n")
+
+    # Uma linha pelo ChurnPredictor (caminho da API), com e sem a floresta compacta
+    features = dict(zip(predictor.feature_names, X[0]))
+    t_compacto = _per_call(lambda: predictor.predict_proba(features), args.repeat)
+    predictor.compact, compact = None, predictor.compact
+    t_sklearn = _per_call(lambda: predictor.predict_proba(features), max(5, args.repeat // 20))
+    predictor.compact = compact
+    print(f"ChurnPredictor.predict_proba (1 linha): sklearn {t_sklearn:,.0f} µs, "
+          f"compacto {t_compacto:,.1f} µs ({t_sklearn / t_compacto:.0f}x)\n")
+
+    print(f"{'lote':>6} {'sklearn (µs)':>14} {'compacto (µs)':>14} {'µs/linha':>10}")
+    for n in args.batch_sizes:
+        lote = X[:n]
+        repeticoes = max(3, args.repeat // max(1, n // 16))
+        t_sk = _per_call(lambda: model.predict_proba(scaler.transform(lote)), max(3, repeticoes // 20))
+        t_cf = _per_call(lambda: forest.predict_proba(lote), repeticoes)
+        print(f"{n:>6} {t_sk:>14,.0f} {t_cf:>14,.0f} {t_cf / n:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# scripts/benchmark_model_memory.py
+"""
+Benchmark de memória e tempo de carga do modelo em N processos
+
+Simula N workers (API/Celery) no mesmo host carregando o modelo de churn ao
+mesmo tempo, de duas formas:
+  - joblib: cada processo desserializa sua cópia de models/churn_model.pkl
+  - mmap:   cada processo mapeia a floresta compacta de models/churn_forest/
+
+Para cada processo são medidos o tempo de carga e o aumento de RSS e de PSS
+(/proc/self/smaps_rollup, Linux). PSS divide as páginas compartilhadas entre os
+processos que as mapeiam, então a soma de PSS é a memória real do host.
+
+Exemplo:
+    python scripts/benchmark_model_memory.py --processes 1 4 8
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+# Mesmos caminhos usados pelo ChurnPredictor
+MODEL_PATH = "models/churn_model.pkl"
+SCALER_PATH = "models/scaler.pkl"
+COMPACT_PATH = "models/churn_forest"
+
+
+def _memory_kb():
+    """RSS e PSS do processo atual, em kB"""
+    valores = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for linha in f:
+            partes = linha.split()
+            if partes[0] in ("Rss:", "Pss:"):
+                valores[partes[0][:-1]] = int(partes[1])
+    return valores["Rss"], valores["Pss"]
+
+
+def _worker(modo, barreira, resultados):
+    import warnings
+    import joblib
+    import numpy as np
+    import sklearn.ensemble  # noqa: F401 - carregar as bibliotecas antes da medição base
+    from app.ml.compact_forest import CompactForest
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    X = np.random.default_rng(0).normal(0, 1, (2000, 6)) * [2, 7, 20, 57, 4, 96] + [3, 7, 60, 112, 6, 194]
+
+    rss_antes, pss_antes = _memory_kb()
+    inicio = time.perf_counter()
+    if modo == "joblib":
+        model = joblib.load(MODEL_PATH)
+        scaler = joblib.load(SCALER_PATH)
+        tempo_carga = time.perf_counter() - inicio
+        model.predict_proba(scaler.transform(X))
+    else:
+        forest = CompactForest.load(COMPACT_PATH, mmap_mode="r")
+        tempo_carga = time.perf_counter() - inicio
+        forest.predict_proba(X)
+        # Tocar todas as páginas, como um worker em regime faria ao longo do tempo
+        for nome in ("feature", "threshold", "children", "value", "roots"):
+            getattr(forest, nome).sum()
+
+    # Medir com todos os processos carregados ao mesmo tempo
+    barreira.wait()
+    rss_depois, pss_depois = _memory_kb()
+    resultados.put((tempo_carga, rss_depois - rss_antes, pss_depois - pss_antes))
+    barreira.wait()
+
+
+def run(modo: str, n_processos: int):
+    ctx = mp.get_context("spawn")
+    barreira = ctx.Barrier(n_processos)
+    resultados = ctx.Queue()
+    processos = [ctx.Process(target=_worker, args=(modo, barreira, resultados)) for _ in range(n_processos)]
+    for p in processos:
+        p.start()
+    medidas = [resultados.get() for _ in processos]
+    for p in processos:
+        p.join()
+    return medidas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de memória do modelo em N processos")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args(argv)
+
+    # Garantir que a floresta compacta esteja exportada
+    from app.ml.churn_model import ChurnPredictor
+    predictor = ChurnPredictor()
+    if not predictor.is_trained:
+        print("Nenhum modelo treinado em models/.")
+        return
+    if predictor.compact is None:
+        print("O modelo salvo não pode ser exportado como floresta compacta.")
+        return
+    del predictor
+
+    print(f"{'modo':>7} {'procs':>6} {'carga (ms)':>11} {'ΔRSS/proc (MB)':>15} "
+          f"{'ΔPSS/proc (MB)':>15} {'ΔPSS total (MB)':>16}")
+    for n in args.processes:
+        for modo in ("joblib", "mmap"):
+            medidas = run(modo, n)
+            carga = sum(m[0] for m in medidas) / n * 1e3
+            rss = sum(m[1] for m in medidas) / n / 1024
+            pss = sum(m[2] for m in medidas) / 1024
+            print(f"{modo:>7} {n:>6} {carga:>11.1f} {rss:>15.2f} {pss / n:>15.2f} {pss:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
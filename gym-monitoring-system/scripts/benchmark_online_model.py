@@ -0,0 +1,90 @@
+# scripts/benchmark_online_model.py
+"""
+Benchmark do modelo online (SGD incremental) vs o modelo em lote (Random Forest)
+
+Simula um fluxo de desfechos rotulados: um histórico inicial seguido de N
+passos com novos lotes. A cada passo, o modelo em lote é retreinado do zero
+sobre todo o histórico acumulado (como update_churn_model) e o modelo online
+recebe apenas o lote novo via partial_fit. São medidos o custo de atualização
+e a AUC de ambos em um holdout fixo.
+
+Exemplo:
+    python scripts/benchmark_online_model.py --history 20000 --steps 5 --step-size 2000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import StandardScaler
+from app.ml.feature_engineering import FeatureEngineer
+from app.ml.online_model import OnlineChurnPredictor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do modelo online vs modelo em lote")
+    parser.add_argument("--history", type=int, default=20000, help="Desfechos no histórico inicial")
+    parser.add_argument("--steps", type=int, default=5, help="Passos de atualização")
+    parser.add_argument("--step-size", type=int, default=2000, help="Novos desfechos por passo")
+    parser.add_argument("--holdout", type=int, default=5000)
+    parser.add_argument("--n-estimators", type=int, default=100, help="Árvores do modelo em lote")
+    args = parser.parse_args(argv)
+
+    engineer = FeatureEngineer(db=None)
+    historico = engineer.generate_synthetic_data(args.history, seed=1)
+    holdout = engineer.generate_synthetic_data(args.holdout, seed=2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        online = OnlineChurnPredictor(model_path=str(Path(tmp) / "churn_online.pkl"))
+        features = online.feature_names
+        X_holdout = holdout[features].to_numpy(dtype=np.float64)
+
+        def batch_fit(dados):
+            X = dados[features].to_numpy(dtype=np.float64)
+            scaler = StandardScaler().fit(X)
+            model = RandomForestClassifier(n_estimators=args.n_estimators, random_state=42, n_jobs=-1)
+            model.fit(scaler.transform(X), dados['churn'])
+            return roc_auc_score(holdout['churn'], model.predict_proba(scaler.transform(X_holdout))[:, 1])
+
+        def online_auc():
+            return roc_auc_score(holdout['churn'], online.predict_proba_batch(holdout[features].to_dict('records')))
+
+        print(f"{'passo':>5} {'amostras':>9} {'lote: treino (s)':>17} {'lote: AUC':>10} "
+              f"{'online: atualização (s)':>24} {'online: AUC':>12}")
+
+        inicio = time.perf_counter()
+        auc_lote = batch_fit(historico)
+        t_lote = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        online.train_model(historico)
+        t_online = time.perf_counter() - inicio
+        print(f"{0:>5} {len(historico):>9} {t_lote:>17.3f} {auc_lote:>10.4f} {t_online:>24.3f} {online_auc():>12.4f}")
+
+        acumulado = historico
+        for passo in range(1, args.steps + 1):
+            novos = engineer.generate_synthetic_data(args.step_size, seed=100 + passo)
+            acumulado = pd.concat([acumulado, novos], ignore_index=True)
+
+            inicio = time.perf_counter()
+            auc_lote = batch_fit(acumulado)
+            t_lote = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            online.partial_fit(novos, novos['churn'])
+            t_online = time.perf_counter() - inicio
+            print(f"{passo:>5} {len(acumulado):>9} {t_lote:>17.3f} {auc_lote:>10.4f} "
+                  f"{t_online:>24.4f} {online_auc():>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
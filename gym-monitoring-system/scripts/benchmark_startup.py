@@ -0,0 +1,134 @@
+# scripts/benchmark_startup.py
+"""
+Benchmark do tempo de inicialização da API (python -X importtime)
+
+Importa main.py em processos novos (--runs vezes) e lê o tempo acumulado do
+import de main na saída de -X importtime, além do tempo total do processo. O
+script termina com código 1 se a mediana passar de --budget-ms ou se algum
+módulo de --forbid for importado: a stack de ML e o Celery devem carregar no
+aquecimento após o startup, não no caminho de inicialização.
+
+Com --save-baseline os tempos dos imports diretos de main são gravados em JSON;
+com --baseline eles são comparados, e o budget salvo é usado se --budget-ms não
+for informado.
+
+Exemplos:
+    python scripts/benchmark_startup.py --runs 5
+    python scripts/benchmark_startup.py --save-baseline scripts/startup_baseline.json
+    python scripts/benchmark_startup.py --baseline scripts/startup_baseline.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+
+DEFAULT_BUDGET_MS = 2000.0
+DEFAULT_FORBIDDEN = ["sklearn", "pandas", "scipy", "joblib", "celery"]
+
+
+def parse_importtime(saida: str) -> list:
+    """Linhas de -X importtime: (profundidade, módulo, próprio em ms, acumulado em ms)"""
+    linhas = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|")
+        profundidade = (len(nome) - len(nome.lstrip(" ")) - 1) // 2
+        linhas.append((profundidade, nome.strip(), int(proprio) / 1000, int(acumulado) / 1000))
+    return linhas
+
+
+def measure_once(modulo: str = "main") -> dict:
+    """Importar o módulo em um processo novo"""
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=root_dir, capture_output=True, text=True,
+    )
+    processo_ms = (time.perf_counter() - inicio) * 1000
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{processo.stderr[-2000:]}")
+
+    linhas = parse_importtime(processo.stderr)
+    raiz = next(l for l in reversed(linhas) if l[0] == 0 and l[1] == modulo)
+    # Imports diretos de main: profundidade 1 logo antes da linha de main
+    indice = len(linhas) - 1 - linhas[::-1].index(raiz)
+    diretos = {}
+    for profundidade, nome, _, acumulado in reversed(linhas[:indice]):
+        if profundidade == 0:
+            break
+        if profundidade == 1:
+            diretos[nome] = acumulado
+    return {
+        "import_ms": raiz[3],
+        "processo_ms": processo_ms,
+        "modulos": {l[1] for l in linhas},
+        "diretos": diretos,
+    }
+
+
+def measure(runs: int = 5, modulo: str = "main", forbidden=DEFAULT_FORBIDDEN) -> dict:
+    """Mediana de várias importações e módulos proibidos carregados"""
+    execucoes = [measure_once(modulo) for _ in range(runs)]
+    carregados = set.union(*(e["modulos"] for e in execucoes))
+    diretos = {
+        nome: round(statistics.median(e["diretos"].get(nome, 0.0) for e in execucoes), 2)
+        for nome in execucoes[0]["diretos"]
+    }
+    return {
+        "modulo": modulo,
+        "runs": runs,
+        "import_ms": round(statistics.median(e["import_ms"] for e in execucoes), 2),
+        "processo_ms": round(statistics.median(e["processo_ms"] for e in execucoes), 2),
+        "proibidos": sorted(m for m in forbidden if m in carregados),
+        "diretos": dict(sorted(diretos.items(), key=lambda item: -item[1])),
+    }
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark do tempo de import de main.py")
+    parser.add_argument("--runs", type=int, default=5, help="Processos medidos")
+    parser.add_argument("--budget-ms", type=float, help=f"Mediana máxima do import (padrão: baseline ou {DEFAULT_BUDGET_MS:.0f})")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN, help="Módulos que não podem ser importados")
+    parser.add_argument("--top", type=int, default=10, help="Imports diretos mais lentos exibidos")
+    parser.add_argument("--baseline", help="Comparar com este baseline")
+    parser.add_argument("--save-baseline", help="Gravar os resultados como novo baseline")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = create_parser().parse_args(argv)
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    budget = args.budget_ms or baseline.get("budget_ms", DEFAULT_BUDGET_MS)
+
+    resultado = measure(args.runs, forbidden=args.forbid)
+    print(f"import main: {resultado['import_ms']:.0f} ms (mediana de {args.runs}), "
+          f"processo: {resultado['processo_ms']:.0f} ms, budget: {budget:.0f} ms")
+
+    anteriores = baseline.get("diretos", {})
+    for nome, ms in list(resultado["diretos"].items())[:args.top]:
+        comparacao = f" (baseline {anteriores[nome]:.1f})" if nome in anteriores else ""
+        print(f"  {nome:<40} {ms:>8.1f} ms{comparacao}")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(
+            json.dumps({**resultado, "budget_ms": budget}, indent=2, ensure_ascii=False) + "\n"
+        )
+
+    falhou = False
+    if resultado["proibidos"]:
+        print(f"FALHA: módulos carregados no import: {', '.join(resultado['proibidos'])}")
+        falhou = True
+    if resultado["import_ms"] > budget:
+        print(f"FALHA: import de {resultado['import_ms']:.0f} ms acima do budget de {budget:.0f} ms")
+        falhou = True
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
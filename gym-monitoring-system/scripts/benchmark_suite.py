@@ -0,0 +1,398 @@
+# scripts/benchmark_suite.py
+"""
+Suite de benchmarks reproduzível: serviços, ML e endpoints
+
+Para cada tamanho em --sizes, popula um banco novo com dados determinísticos
+(SQLite em arquivo temporário ou o Postgres local de --database-url, que é
+recriado), usa um Redis em memória (fakeredis, se instalado) e o Celery em modo
+eager com broker em memória, e mede cada caso com aquecimento e repetições. O
+modelo de churn é o de models/ (executar a partir da raiz do projeto).
+
+Os resultados (mediana, p95 e mínimo em ms por operação) são gravados em JSON.
+Com --baseline, cada caso é comparado à mediana salva e o script termina com
+código 1 se algum piorar além de --threshold (e de --min-delta-ms, para não
+acusar ruído em casos sub-milissegundo). Baselines dependem da máquina: gere a
+sua com --save-baseline antes de comparar.
+
+Exemplos:
+    python scripts/benchmark_suite.py --sizes 200 1000 --output resultados.json
+    python scripts/benchmark_suite.py --sizes 200 1000 --save-baseline scripts/benchmark_baseline.json
+    python scripts/benchmark_suite.py --sizes 200 1000 --baseline scripts/benchmark_baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+from app.models.database import Base, Plano, Aluno, Checkin, get_db, get_read_db
+from app.api.schemas import CheckinCreate
+from app.services.checkin_service import CheckinService
+from app.services.churn_service import ChurnService
+from app.services.features_service import FeaturesAlunoService
+from app.ml.churn_model import create_predictor
+from app.ml.feature_engineering import FeatureEngineer
+from app.analytics.columnar import ColumnarCheckinStore
+from app.monitoring.instrumentation import RedisInstrumentationMixin, instrument_engine
+from tests.conftest import RedisMemoria
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+DEFAULT_SIZES = [200, 1000]
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_DELTA_MS = 0.5
+
+# Histórico de checkins gerado por aluno
+HISTORY_DAYS = 180
+INSERT_CHUNK_SIZE = 5000
+
+AUTH_HEADERS = {"Authorization": "Bearer valid_token"}
+
+
+def create_redis():
+    """Redis de teste instrumentado como o da API: fakeredis ou o substituto em memória"""
+    base = fakeredis.FakeRedis if fakeredis is not None else RedisMemoria
+    classe = type("BenchmarkRedis", (RedisInstrumentationMixin, base), {})
+    return classe(decode_responses=True) if fakeredis is not None else classe()
+
+
+def populate(db, n_alunos: int, seed: int, agora: datetime) -> dict:
+    """Planos, alunos e checkins determinísticos; 20% dos alunos pararam de treinar"""
+    rng = np.random.default_rng(seed)
+    planos = [
+        Plano(nome="Mensal", valor=99.9, duracao_meses=1),
+        Plano(nome="Trimestral", valor=269.9, duracao_meses=3),
+        Plano(nome="Anual", valor=899.9, duracao_meses=12),
+    ]
+    db.add_all(planos)
+    db.flush()
+
+    dias_matricula = rng.integers(30, 720, n_alunos)
+    plano_ids = rng.choice([p.id for p in planos], n_alunos)
+    db.execute(insert(Aluno), [
+        {
+            "id": i + 1,
+            "nome": f"Aluno {i + 1}",
+            "email": f"aluno{i + 1}@benchmark.local",
+            "plano_id": int(plano_ids[i]),
+            "data_matricula": agora - timedelta(days=int(dias_matricula[i])),
+            "ativo": True,
+        }
+        for i in range(n_alunos)
+    ])
+
+    # Frequência semanal por aluno; desistentes sem checkins nos últimos 30-120 dias
+    taxa_semanal = rng.gamma(2.0, 1.5, n_alunos)
+    pausa = np.where(rng.random(n_alunos) < 0.2, rng.integers(30, 120, n_alunos), 0)
+    janela = np.maximum(np.minimum(dias_matricula, HISTORY_DAYS) - pausa, 0)
+    quantidade = rng.poisson(taxa_semanal / 7 * janela)
+
+    aluno_ids = np.repeat(np.arange(1, n_alunos + 1), quantidade)
+    dias_atras = np.repeat(pausa, quantidade) + rng.random(len(aluno_ids)) * np.repeat(janela, quantidade)
+    entrada = [
+        (agora - timedelta(days=int(d))).replace(hour=int(h), minute=int(m), second=0, microsecond=0)
+        for d, h, m in zip(dias_atras, rng.choice([6, 7, 8, 12, 17, 18, 19, 20], len(aluno_ids)),
+                           rng.integers(0, 60, len(aluno_ids)))
+    ]
+    duracao = rng.integers(30, 120, len(aluno_ids))
+    linhas = [
+        {
+            "aluno_id": int(aluno_id),
+            "data_entrada": data,
+            "data_saida": data + timedelta(minutes=int(minutos)),
+            "duracao_minutos": int(minutos),
+        }
+        for aluno_id, data, minutos in zip(aluno_ids, entrada, duracao)
+    ]
+    for inicio in range(0, len(linhas), INSERT_CHUNK_SIZE):
+        db.execute(insert(Checkin), linhas[inicio:inicio + INSERT_CHUNK_SIZE])
+    db.commit()
+
+    FeaturesAlunoService(db).reconstruir()
+    return {"alunos": n_alunos, "checkins": len(linhas)}
+
+
+class BenchmarkEnvironment:
+    """Banco populado, Redis em memória, Celery eager e a API apontando para eles"""
+
+    def __init__(self, n_alunos: int, seed: int, database_url: str = None, workdir: str = None):
+        self.n_alunos = n_alunos
+        self._restaurar = []
+        self.agora = datetime.utcnow().replace(second=0, microsecond=0)
+        url = database_url or f"sqlite:///{Path(workdir) / f'benchmark_{n_alunos}.db'}"
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = instrument_engine(create_engine(url, connect_args=connect_args))
+        Base.metadata.drop_all(bind=self.engine)
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.db = self.Session()
+        self.dados = populate(self.db, n_alunos, seed, self.agora)
+        self.rng = np.random.default_rng(seed + 1)
+        self.predictor = create_predictor()
+        self.redis = create_redis()
+        self._configurar_celery()
+        self.client = self._configurar_api()
+
+    def _substituir(self, alvo, nome, valor):
+        """Trocar um atributo global, desfeito em close()"""
+        self._restaurar.append((alvo, nome, getattr(alvo, nome)))
+        setattr(alvo, nome, valor)
+
+    def _configurar_celery(self):
+        from app.workers import tasks
+        for nome, valor in (("task_always_eager", True), ("broker_url", "memory://"),
+                            ("result_backend", "cache+memory://")):
+            self._substituir(tasks.celery_app.conf, nome, valor)
+        self._substituir(tasks, "get_db_session", self.Session)
+        self._substituir(tasks, "get_read_db_session", self.Session)
+        self._substituir(tasks, "checkin_store", ColumnarCheckinStore(refresh_seconds=0))
+
+    def _configurar_api(self):
+        import main
+
+        def get_db_benchmark():
+            db = self.Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        self._substituir(main.app, "dependency_overrides", {
+            **main.app.dependency_overrides, get_db: get_db_benchmark, get_read_db: get_db_benchmark
+        })
+        self._substituir(main, "redis_client", self.redis)
+        self._substituir(main, "checkin_store", ColumnarCheckinStore(refresh_seconds=0))
+        # Sem o contexto do TestClient o startup (create_tables no banco da API) não roda
+        return TestClient(main.app)
+
+    def aluno_aleatorio(self) -> int:
+        return int(self.rng.integers(1, self.n_alunos + 1))
+
+    def fechar_checkins_abertos(self):
+        """Registrar saída dos checkins criados pelos casos, para poder repeti-los"""
+        with self.Session() as db:
+            db.execute(
+                update(Checkin).where(Checkin.data_saida.is_(None))
+                .values(data_saida=self.agora, duracao_minutos=60)
+            )
+            db.commit()
+
+    def close(self):
+        for alvo, nome, valor in reversed(self._restaurar):
+            setattr(alvo, nome, valor)
+        self.db.close()
+        self.engine.dispose()
+
+
+# Cada fábrica devolve (função medida, limpeza fora da medição ou None)
+
+def _case_obter_frequencia(amb):
+    return lambda: CheckinService(amb.db).obter_frequencia_aluno(amb.aluno_aleatorio()), None
+
+
+def _case_prever_churn(amb):
+    return lambda: ChurnService(amb.db, amb.predictor).prever_churn(amb.aluno_aleatorio()), None
+
+
+def _case_criar_checkin(amb):
+    def executar():
+        CheckinService(amb.db).criar_checkin(CheckinCreate(aluno_id=amb.aluno_aleatorio()))
+    return executar, amb.fechar_checkins_abertos
+
+
+def _case_training_dataset(amb):
+    return lambda: FeatureEngineer(amb.db).create_training_dataset(months_back=6), None
+
+
+def _case_training_dataset_colunar(amb):
+    def executar():
+        store = ColumnarCheckinStore(refresh_seconds=0)
+        FeatureEngineer(amb.db, checkin_store=store).create_training_dataset(months_back=6)
+    return executar, None
+
+
+def _case_identify_at_risk(amb):
+    from app.workers.tasks import identify_at_risk_students
+    return lambda: identify_at_risk_students.apply().get(), None
+
+
+def _case_http(metodo: str, caminho: str, limpar_cache: str = None, autenticado: bool = False, corpo=None,
+               aluno_fixo: int = None):
+    def fabrica(amb):
+        def executar():
+            aluno_id = aluno_fixo or amb.aluno_aleatorio()
+            if limpar_cache:
+                amb.redis.delete(f"{limpar_cache}:{aluno_id}")
+            resposta = amb.client.request(
+                metodo, caminho.format(aluno_id=aluno_id),
+                json=corpo(aluno_id) if corpo else None,
+                headers=AUTH_HEADERS if autenticado else None,
+            )
+            if resposta.status_code != 200:
+                raise RuntimeError(f"{metodo} {caminho}: {resposta.status_code} {resposta.text}")
+        return executar, amb.fechar_checkins_abertos if metodo == "POST" else None
+    return fabrica
+
+
+# nome -> (fábrica do caso, pesado: usa --repeat-heavy)
+CASES = {
+    "obter_frequencia_aluno": (_case_obter_frequencia, False),
+    "prever_churn": (_case_prever_churn, False),
+    "criar_checkin": (_case_criar_checkin, False),
+    "create_training_dataset": (_case_training_dataset, True),
+    "create_training_dataset_colunar": (_case_training_dataset_colunar, True),
+    "identify_at_risk_students": (_case_identify_at_risk, True),
+    "http_post_checkin": (_case_http("POST", "/aluno/checkin", corpo=lambda aluno_id: {"aluno_id": aluno_id}), False),
+    "http_frequencia_sem_cache": (_case_http("GET", "/aluno/{aluno_id}/frequencia", limpar_cache="frequencia"), False),
+    "http_frequencia_com_cache": (_case_http("GET", "/aluno/{aluno_id}/frequencia", aluno_fixo=1), False),
+    "http_risco_churn_sem_cache": (_case_http("GET", "/aluno/{aluno_id}/risco-churn", limpar_cache="churn"), False),
+    "http_relatorio_frequencia": (_case_http("GET", "/relatorio/frequencia", autenticado=True), False),
+    "http_relatorio_horarios": (_case_http("GET", "/relatorio/horarios", autenticado=True), False),
+    "http_relatorio_coortes": (_case_http("GET", "/relatorio/coortes", autenticado=True), False),
+}
+
+
+def measure(funcao, repeticoes: int, aquecimento: int = 1, limpeza=None) -> dict:
+    """Tempo por execução em ms: mediana, p95 e mínimo"""
+    tempos = []
+    for i in range(aquecimento + repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        if i >= aquecimento:
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        if limpeza is not None:
+            limpeza()
+    return {
+        "mediana_ms": round(float(np.median(tempos)), 4),
+        "p95_ms": round(float(np.percentile(tempos, 95)), 4),
+        "min_ms": round(min(tempos), 4),
+        "repeticoes": repeticoes,
+    }
+
+
+def run_suite(sizes, cases=None, repeat: int = 20, repeat_heavy: int = 3, seed: int = 42,
+              database_url: str = None) -> dict:
+    """Executar os casos para cada tamanho e devolver os resultados no formato do baseline"""
+    nomes = cases or list(CASES)
+    desconhecidos = set(nomes) - set(CASES)
+    if desconhecidos:
+        raise ValueError(f"Casos desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    resultados = {}
+    dados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for tamanho in sizes:
+            amb = BenchmarkEnvironment(tamanho, seed, database_url=database_url, workdir=tmp)
+            try:
+                dados[str(tamanho)] = amb.dados
+                resultados[str(tamanho)] = {}
+                for nome in nomes:
+                    fabrica, pesado = CASES[nome]
+                    funcao, limpeza = fabrica(amb)
+                    resultados[str(tamanho)][nome] = measure(
+                        funcao, repeat_heavy if pesado else repeat, limpeza=limpeza
+                    )
+            finally:
+                amb.close()
+
+    return {
+        "meta": {
+            "data": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "banco": (database_url or "sqlite").split(":")[0],
+            "redis": "fakeredis" if fakeredis is not None else "memoria",
+            "seed": seed,
+            "dados": dados,
+        },
+        "resultados": resultados,
+    }
+
+
+def compare(resultados: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> list:
+    """Casos cuja mediana piorou além do limite relativo e do mínimo absoluto"""
+    regressoes = []
+    for tamanho, casos in resultados["resultados"].items():
+        for nome, atual in casos.items():
+            base = baseline.get("resultados", {}).get(tamanho, {}).get(nome)
+            if base is None:
+                continue
+            delta = atual["mediana_ms"] - base["mediana_ms"]
+            if atual["mediana_ms"] > base["mediana_ms"] * (1 + threshold) and delta > min_delta_ms:
+                regressoes.append({
+                    "tamanho": int(tamanho),
+                    "caso": nome,
+                    "baseline_ms": base["mediana_ms"],
+                    "atual_ms": atual["mediana_ms"],
+                    "variacao": delta / base["mediana_ms"] if base["mediana_ms"] else float("inf"),
+                })
+    return regressoes
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de serviços, ML e endpoints")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Alunos por cenário")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="Casos a executar (padrão: todos)")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetições por caso")
+    parser.add_argument("--repeat-heavy", type=int, default=3,
+                        help="Repetições dos casos pesados (dataset de treino, tarefa de risco)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Postgres local (será recriado); padrão: SQLite temporário")
+    parser.add_argument("--output", help="Gravar os resultados em JSON")
+    parser.add_argument("--baseline", help="Comparar com este baseline e falhar em regressões")
+    parser.add_argument("--save-baseline", help="Gravar os resultados como novo baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Piora relativa tolerada da mediana (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="Piora absoluta mínima para acusar regressão")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = create_parser().parse_args(argv)
+    logging.disable(logging.WARNING)
+    try:
+        resultados = run_suite(args.sizes, args.cases, args.repeat, args.repeat_heavy, args.seed, args.database_url)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"{'tamanho':>8} {'caso':<34} {'mediana (ms)':>13} {'p95 (ms)':>10} {'min (ms)':>10}")
+    for tamanho, casos in resultados["resultados"].items():
+        for nome, r in casos.items():
+            print(f"{tamanho:>8} {nome:<34} {r['mediana_ms']:>13.3f} {r['p95_ms']:>10.3f} {r['min_ms']:>10.3f}")
+
+    for destino in filter(None, [args.output, args.save_baseline]):
+        Path(destino).write_text(json.dumps(resultados, indent=2, ensure_ascii=False) + "\n")
+
+    if args.baseline:
+        regressoes = compare(resultados, json.loads(Path(args.baseline).read_text()),
+                             args.threshold, args.min_delta_ms)
+        for r in regressoes:
+            print(f"REGRESSÃO {r['caso']} ({r['tamanho']} alunos): "
+                  f"{r['baseline_ms']:.3f} -> {r['atual_ms']:.3f} ms (+{r['variacao']:.0%})")
+        if regressoes:
+            return 1
+        print(f"Sem regressões acima de {args.threshold:.0%} em relação a {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
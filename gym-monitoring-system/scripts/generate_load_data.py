@@ -0,0 +1,333 @@
+# scripts/generate_load_data.py
+"""
+Script para gerar dados sintéticos em grande volume para testes de carga
+
+Exemplo (1M de alunos e ~200M de checkins em 8 processos):
+    python scripts/generate_load_data.py --students 1000000 --checkins 200000000 --processes 8
+
+A geração é feita por lotes de alunos. Cada lote é gerado de forma vetorizada
+com NumPy a partir de (seed, número do lote), escrito com COPY e registrado na
+tabela de controle na mesma transação. Se a execução for interrompida, basta
+rodar o mesmo comando novamente: os lotes já concluídos são ignorados.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+import numpy as np
+import pandas as pd
+
+SEGUNDOS_DIA = 86400
+
+# Tabela de controle dos lotes já carregados (permite retomar a carga)
+TABELA_CONTROLE = "carga_sintetica_lotes"
+
+# Planos padrão, os mesmos de scripts/init_db.py
+PLANOS_PADRAO = [
+    ("Básico", 50.0, 1),
+    ("Semestral", 80.0, 6),
+    ("Anual", 120.0, 12),
+    ("Premium", 200.0, 12),
+]
+
+# Perfis de horário de entrada (peso relativo por hora do dia, 0h a 23h)
+PERFIS_HORARIO = {
+    # Picos às 6h-8h e 18h-20h, movimento moderado no almoço
+    "picos": [0, 0, 0, 0, 0, 1, 8, 9, 6, 3, 2, 2, 4, 4, 2, 2, 3, 6, 10, 9, 6, 3, 1, 0],
+    # Distribuição uniforme no horário de funcionamento (6h às 22h)
+    "uniforme": [0] * 6 + [1] * 17 + [0],
+}
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Gerar dados sintéticos em grande volume para testes de carga")
+    parser.add_argument("--students", type=int, default=100_000, help="Número de alunos")
+    parser.add_argument("--checkins", type=int, default=20_000_000, help="Número aproximado de checkins")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador")
+    parser.add_argument("--history-days", type=int, default=730, help="Janela de matrículas, em dias até hoje")
+    parser.add_argument("--frequency-shape", type=float, default=2.0,
+                        help="Forma da gama que define a frequência individual (menor = mais dispersa)")
+    parser.add_argument("--churn-rate", type=float, default=0.25, help="Proporção de alunos que desistem")
+    parser.add_argument("--churn-decay-days", type=float, default=45.0,
+                        help="Constante de decaimento (dias) da frequência dos alunos que desistem")
+    parser.add_argument("--time-profile", default="picos",
+                        help="Perfil de horário (%s) ou 24 pesos separados por vírgula" % ", ".join(PERFIS_HORARIO))
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Alunos por lote")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Processos em paralelo")
+    parser.add_argument("--first-id", type=int, default=1_000_000, help="ID do primeiro aluno gerado")
+    parser.add_argument("--reference-date", default=None,
+                        help="Data de referência (YYYY-MM-DD); padrão: hoje. Deve ser fixa para retomar a carga")
+    return parser
+
+
+def parse_time_profile(perfil: str) -> np.ndarray:
+    """Converter o perfil de horário em probabilidades por hora"""
+    if perfil in PERFIS_HORARIO:
+        pesos = PERFIS_HORARIO[perfil]
+    else:
+        pesos = [float(p) for p in perfil.split(",")]
+        if len(pesos) != 24:
+            raise ValueError("O perfil de horário deve ter 24 pesos")
+
+    pesos = np.asarray(pesos, dtype=np.float64)
+    if pesos.min() < 0 or pesos.sum() <= 0:
+        raise ValueError("Pesos de horário inválidos")
+    return pesos / pesos.sum()
+
+
+def reference_epoch(args) -> int:
+    """Instante de referência (fim do histórico) em segundos desde a época"""
+    if args.reference_date:
+        data = np.datetime64(args.reference_date, "D")
+    else:
+        data = np.datetime64("today", "D")
+    return int(data.astype("datetime64[s]").astype(np.int64))
+
+
+def config_signature(args) -> str:
+    """Assinatura dos parâmetros que determinam os dados gerados"""
+    campos = {k: v for k, v in vars(args).items() if k != "processes"}
+    campos["reference_date"] = reference_epoch(args)
+    return hashlib.sha1(json.dumps(campos, sort_keys=True).encode()).hexdigest()
+
+
+def _active_profile(rng: np.random.Generator, n: int, args, agora: int):
+    """Gerar matrícula, período ativo e desistência de n alunos"""
+    dias_matricula = rng.uniform(1, args.history_days, n)
+    inicio = agora - (dias_matricula * SEGUNDOS_DIA).astype(np.int64)
+
+    # Alunos que desistem param de frequentar em algum ponto do período
+    desistiu = rng.random(n) < args.churn_rate
+    fracao_ativa = np.where(desistiu, rng.uniform(0.2, 1.0, n), 1.0)
+    dias_ativos = dias_matricula * fracao_ativa
+
+    # Multiplicador individual de frequência (média 1)
+    multiplicador = rng.gamma(args.frequency_shape, 1.0 / args.frequency_shape, n)
+
+    # Dias "efetivos": integral da intensidade ao longo do período ativo.
+    # Para quem desiste a intensidade decai exponencialmente até a saída.
+    tau = args.churn_decay_days
+    dias_efetivos = np.where(desistiu, tau * -np.expm1(-dias_ativos / tau), dias_ativos)
+
+    return inicio, desistiu, dias_ativos, multiplicador, dias_efetivos
+
+
+def base_daily_rate(args, agora: int) -> float:
+    """Taxa diária base calibrada para atingir o total de checkins pedido"""
+    # Amostra de calibração com semente própria, independente dos lotes
+    rng = np.random.default_rng([args.seed, 2**31])
+    _, _, _, multiplicador, dias_efetivos = _active_profile(rng, 200_000, args, agora)
+    media_por_aluno = args.checkins / max(1, args.students)
+    return media_por_aluno / float(np.mean(multiplicador * dias_efetivos))
+
+
+def generate_batch(args, lote: int, planos_ids: list, taxa_base: float, agora: int):
+    """Gerar os alunos e checkins de um lote (determinístico por seed e lote)"""
+    rng = np.random.default_rng([args.seed, lote])
+
+    primeiro = lote * args.batch_size
+    n = min(args.batch_size, args.students - primeiro)
+    ids = args.first_id + primeiro + np.arange(n, dtype=np.int64)
+
+    inicio, desistiu, dias_ativos, multiplicador, dias_efetivos = _active_profile(rng, n, args, agora)
+    idade_dias = rng.integers(18 * 365, 60 * 365, n)
+
+    alunos = pd.DataFrame({
+        "id": ids,
+        "nome": np.char.add("Aluno Carga ", ids.astype(str)),
+        "email": np.char.add(np.char.add("carga", ids.astype(str)), "@email.com"),
+        "data_nascimento": _timestamps(inicio - idade_dias * SEGUNDOS_DIA),
+        "data_matricula": _timestamps(inicio),
+        "plano_id": rng.choice(np.asarray(planos_ids), n),
+        "ativo": ~desistiu,
+    })
+    alunos["created_at"] = alunos["data_matricula"]
+    alunos["updated_at"] = alunos["data_matricula"]
+
+    # Quantidade de checkins por aluno
+    quantidades = rng.poisson(taxa_base * multiplicador * dias_efetivos)
+    total = int(quantidades.sum())
+
+    aluno_idx = np.repeat(np.arange(n), quantidades)
+    u = rng.random(total)
+
+    # Dia do checkin: uniforme no período ativo, ou com intensidade decrescente
+    # (inversa da CDF exponencial truncada) para quem desistiu
+    tau = args.churn_decay_days
+    dias_ativos_rep = dias_ativos[aluno_idx]
+    dia = np.where(
+        desistiu[aluno_idx],
+        -tau * np.log1p(-u * -np.expm1(-dias_ativos_rep / tau)),
+        u * dias_ativos_rep,
+    )
+
+    # Horário de entrada segundo o perfil e duração do treino
+    horas = rng.choice(24, total, p=parse_time_profile(args.time_profile))
+    segundos_hora = rng.integers(0, 3600, total)
+    meia_noite = (inicio[aluno_idx] // SEGUNDOS_DIA) * SEGUNDOS_DIA
+    entrada = meia_noite + dia.astype(np.int64) * SEGUNDOS_DIA + horas * 3600 + segundos_hora
+    entrada = np.clip(entrada, inicio[aluno_idx], agora - 3 * 3600)
+
+    duracao = np.clip(rng.normal(60, 20, total), 10, 180).astype(np.int64)
+
+    checkins = pd.DataFrame({
+        "aluno_id": ids[aluno_idx],
+        "data_entrada": _timestamps(entrada),
+        "data_saida": _timestamps(entrada + duracao * 60),
+        "duracao_minutos": duracao,
+    })
+    checkins["created_at"] = checkins["data_entrada"]
+
+    return alunos, checkins
+
+
+def _timestamps(epochs: np.ndarray) -> np.ndarray:
+    """Converter segundos desde a época em texto ISO aceito pelo COPY"""
+    return np.datetime_as_string(np.asarray(epochs, dtype="datetime64[s]"), unit="s")
+
+
+def _copy(cursor, tabela: str, df: pd.DataFrame, linhas_por_copy: int = 1_000_000):
+    """Escrever um DataFrame com COPY em blocos"""
+    colunas = ", ".join(df.columns)
+    for inicio in range(0, len(df), linhas_por_copy):
+        buffer = io.StringIO()
+        df.iloc[inicio:inicio + linhas_por_copy].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {tabela} ({colunas}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _connect():
+    import psycopg2
+    from app.models.database import DATABASE_URL
+    return psycopg2.connect(DATABASE_URL)
+
+
+def _load_batch(tarefa):
+    """Gerar e gravar um lote (executado nos processos do pool)"""
+    args, lote, planos_ids, taxa_base, agora, assinatura = tarefa
+    inicio = time.perf_counter()
+
+    alunos, checkins = generate_batch(args, lote, planos_ids, taxa_base, agora)
+
+    conn = _connect()
+    try:
+        with conn.cursor() as cursor:
+            _copy(cursor, "alunos", alunos)
+            _copy(cursor, "checkins", checkins)
+            # Registrar o lote na mesma transação: ou tudo, ou nada
+            cursor.execute(
+                f"INSERT INTO {TABELA_CONTROLE} (lote, assinatura, alunos, checkins) VALUES (%s, %s, %s, %s)",
+                (lote, assinatura, len(alunos), len(checkins)),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    return lote, len(alunos), len(checkins), time.perf_counter() - inicio
+
+
+def prepare_database(assinatura: str) -> tuple:
+    """Criar tabelas, garantir planos e obter os lotes já concluídos"""
+    from app.models.database import create_tables
+    create_tables()
+
+    conn = _connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABELA_CONTROLE} ("
+                "lote INTEGER PRIMARY KEY, assinatura TEXT NOT NULL, alunos INTEGER NOT NULL, "
+                "checkins BIGINT NOT NULL, concluido_em TIMESTAMP NOT NULL DEFAULT now())"
+            )
+
+            cursor.execute("SELECT id FROM planos ORDER BY id")
+            planos_ids = [row[0] for row in cursor.fetchall()]
+            if not planos_ids:
+                for nome, valor, duracao in PLANOS_PADRAO:
+                    cursor.execute(
+                        "INSERT INTO planos (nome, valor, duracao_meses, created_at) "
+                        "VALUES (%s, %s, %s, now()) RETURNING id",
+                        (nome, valor, duracao),
+                    )
+                    planos_ids.append(cursor.fetchone()[0])
+
+            cursor.execute(f"SELECT lote, assinatura FROM {TABELA_CONTROLE}")
+            concluidos = cursor.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+
+    if any(a != assinatura for _, a in concluidos):
+        raise ValueError(
+            f"A tabela {TABELA_CONTROLE} contém lotes gerados com outros parâmetros. "
+            "Use os mesmos parâmetros para retomar ou limpe a carga anterior."
+        )
+
+    return planos_ids, {lote for lote, _ in concluidos}
+
+
+def finalize_database():
+    """Ajustar sequências e estatísticas após a carga"""
+    conn = _connect()
+    try:
+        with conn.cursor() as cursor:
+            for tabela in ("alunos", "checkins"):
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {tabela}))"
+                )
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE alunos")
+            cursor.execute("ANALYZE checkins")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    parse_time_profile(args.time_profile)  # Validar antes de iniciar
+
+    agora = reference_epoch(args)
+    assinatura = config_signature(args)
+    planos_ids, concluidos = prepare_database(assinatura)
+
+    total_lotes = (args.students + args.batch_size - 1) // args.batch_size
+    pendentes = [lote for lote in range(total_lotes) if lote not in concluidos]
+    print(f"{total_lotes} lotes no total, {len(concluidos)} já concluídos, {len(pendentes)} pendentes")
+
+    taxa_base = base_daily_rate(args, agora)
+    tarefas = [(args, lote, planos_ids, taxa_base, agora, assinatura) for lote in pendentes]
+
+    inicio = time.perf_counter()
+    total_alunos = total_checkins = 0
+    with Pool(processes=max(1, args.processes)) as pool:
+        for lote, n_alunos, n_checkins, duracao in pool.imap_unordered(_load_batch, tarefas):
+            total_alunos += n_alunos
+            total_checkins += n_checkins
+            decorrido = time.perf_counter() - inicio
+            print(f"Lote {lote}: {n_alunos} alunos, {n_checkins} checkins em {duracao:.1f}s "
+                  f"({total_checkins / max(decorrido, 1e-9):,.0f} checkins/s no total)")
+
+    finalize_database()
+    print(f"Carga concluída: {total_alunos} alunos e {total_checkins} checkins "
+          f"em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
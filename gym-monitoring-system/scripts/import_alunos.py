@@ -0,0 +1,82 @@
+# scripts/import_alunos.py
+"""
+Importação em massa de alunos a partir de CSV (com cabeçalho) ou NDJSON
+
+Colunas/campos: nome, email, plano_id, telefone e data_nascimento (opcionais,
+data em AAAA-MM-DD). Linhas rejeitadas são gravadas em NDJSON (--erros, padrão
+stderr) à medida que cada lote é processado; o resumo vai para stdout. O código
+de saída é 1 se alguma linha for rejeitada.
+
+Exemplos:
+    python scripts/import_alunos.py franquia.csv
+    python scripts/import_alunos.py franquia.ndjson --chunk-size 10000 --erros rejeitados.ndjson
+    cat franquia.csv | python scripts/import_alunos.py - --formato csv
+"""
+import argparse
+import io
+import json
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+from app.models.database import SessionLocal
+from app.services.importacao_service import ImportacaoAlunosService, IMPORT_CHUNK_SIZE, FORMATOS
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Importar alunos em massa (CSV ou NDJSON)")
+    parser.add_argument("arquivo", help="Arquivo de entrada ('-' para stdin)")
+    parser.add_argument("--formato", choices=FORMATOS, help="Padrão: pela extensão do arquivo")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Alunos por transação")
+    parser.add_argument("--erros", help="Gravar as linhas rejeitadas neste arquivo NDJSON (padrão: stderr)")
+    return parser
+
+
+def detect_format(arquivo: str) -> str:
+    return 'ndjson' if Path(arquivo).suffix.lower() in ('.ndjson', '.jsonl', '.json') else 'csv'
+
+
+def run(db, entrada, formato: str, chunk_size: int, saida_erros) -> dict:
+    """Importar e devolver o resumo, escrevendo cada erro em saida_erros"""
+    resumo = None
+    for evento in ImportacaoAlunosService(db, chunk_size=chunk_size).importar(entrada, formato):
+        if evento['tipo'] == 'erro':
+            saida_erros.write(json.dumps(evento, ensure_ascii=False) + "\n")
+        elif evento['tipo'] == 'progresso':
+            print(f"  {evento['linhas']} linhas, {evento['importados']} importados, {evento['erros']} erros", flush=True)
+        else:
+            resumo = evento
+    return resumo
+
+
+def main(argv=None) -> int:
+    args = create_parser().parse_args(argv)
+    formato = args.formato or ('csv' if args.arquivo == '-' else detect_format(args.arquivo))
+
+    db = SessionLocal()
+    entrada = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='') if args.arquivo == '-'
+               else open(args.arquivo, encoding='utf-8-sig', newline=''))
+    saida_erros = open(args.erros, 'w', encoding='utf-8') if args.erros else sys.stderr
+    try:
+        resumo = run(db, entrada, formato, args.chunk_size, saida_erros)
+    finally:
+        entrada.close()
+        if args.erros:
+            saida_erros.close()
+        db.close()
+
+    taxa = resumo['linhas'] / resumo['segundos'] * 60 if resumo['segundos'] else 0
+    print(f"{resumo['importados']} alunos importados, {resumo['erros']} linhas rejeitadas "
+          f"de {resumo['linhas']} em {resumo['segundos']:.1f}s ({taxa:,.0f} linhas/min)")
+    return 1 if resumo['erros'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
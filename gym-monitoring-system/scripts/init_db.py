@@ -16,12 +16,16 @@ load_dotenv()
 
 from sqlalchemy.orm import Session
 from app.models.database import SessionLocal, create_tables, Plano, Aluno, Checkin
+from app.services.plan_catalog import plan_catalog
 from datetime import datetime, timedelta
 import random
+import redis
 
 def create_sample_data():
     """Criar dados de exemplo para teste"""
     db = SessionLocal()
+    # Planos novos invalidam o catálogo da API e dos workers em execução
+    plan_catalog.connect(redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6380')), listen=False)
     
     try:
         # Criar tabelas
@@ -0,0 +1,283 @@
+# scripts/load_test.py
+"""
+Teste de carga HTTP que reproduz um dia da academia com picos de checkin
+
+Cada hora simulada dura --seconds-per-hour segundos. As chegadas são em malha
+aberta (Poisson), com três classes de tráfego simultâneas:
+
+- checkins (POST /aluno/checkin): --checkin-rate req/s no horário de maior
+  movimento, escalado pelo perfil de horário (o mesmo de generate_load_data.py,
+  com picos às 6h e às 18h);
+- painéis: --poll-rate req/s de GET /aluno/{id}/frequencia e /risco-churn;
+- relatórios: --report-rate req/s distribuídas entre os /relatorio/*.
+
+O alvo é uma API já em execução (--url) ou, por padrão, a app de main.py servida
+localmente com uvicorn sobre um banco SQLite populado, Redis em memória e Celery
+eager (ver scripts/benchmark_suite.py). A latência é medida a partir do instante
+agendado de cada requisição, para que a fila no cliente não esconda a saturação.
+
+Exemplos:
+    python scripts/load_test.py --hours 5-8 17-20 --seconds-per-hour 20 --checkin-rate 40
+    python scripts/load_test.py --url http://localhost:8000 --students 5000 --output carga.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+import httpx
+import numpy as np
+from scripts.generate_load_data import PERFIS_HORARIO, parse_time_profile
+
+AUTH_HEADERS = {"Authorization": "Bearer valid_token"}
+
+# (método, caminho) de cada classe de tráfego
+CHECKIN_REQUESTS = [("POST", "/aluno/checkin")]
+POLL_REQUESTS = [("GET", "/aluno/{aluno_id}/frequencia"), ("GET", "/aluno/{aluno_id}/risco-churn")]
+REPORT_REQUESTS = [
+    ("GET", "/relatorio/frequencia"),
+    ("GET", "/relatorio/horarios"),
+    ("GET", "/relatorio/planos"),
+    ("GET", "/relatorio/serie"),
+    ("GET", "/relatorio/coortes"),
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP com picos de checkin")
+    parser.add_argument("--url", help="API em execução; padrão: servir main.py localmente com stand-ins")
+    parser.add_argument("--students", type=int, default=2000,
+                        help="Alunos (populados no modo local; ids 1..N no modo --url)")
+    parser.add_argument("--hours", nargs="+", default=["5-8", "17-20"],
+                        help="Horas simuladas: '6', '5-8' (fim exclusivo)")
+    parser.add_argument("--seconds-per-hour", type=float, default=10.0, help="Duração real de cada hora simulada")
+    parser.add_argument("--time-profile", default="picos",
+                        help="Perfil de horário (%s) ou 24 pesos separados por vírgula" % ", ".join(PERFIS_HORARIO))
+    parser.add_argument("--checkin-rate", type=float, default=20.0, help="Checkins/s no pico do perfil")
+    parser.add_argument("--poll-rate", type=float, default=10.0, help="Consultas de painel/s")
+    parser.add_argument("--report-rate", type=float, default=0.5, help="Relatórios/s")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requisições simultâneas no cliente")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Gravar o resumo em JSON")
+    return parser
+
+
+def parse_hours(faixas) -> list:
+    """['5-8', '18'] -> [5, 6, 7, 18]"""
+    horas = []
+    for faixa in faixas:
+        inicio, _, fim = str(faixa).partition("-")
+        horas.extend(range(int(inicio), int(fim)) if fim else [int(inicio)])
+    if not horas or min(horas) < 0 or max(horas) > 23:
+        raise ValueError("Horas simuladas devem estar entre 0 e 23")
+    return horas
+
+
+def build_schedule(args) -> list:
+    """Requisições agendadas: (segundos desde o início, hora simulada, método, caminho, aluno_id)
+
+    Checkins usam alunos distintos enquanto houver (não há saída no teste de carga);
+    painéis sorteiam alunos com reposição.
+    """
+    rng = np.random.default_rng(args.seed)
+    perfil = parse_time_profile(args.time_profile)
+    perfil = perfil / perfil.max()
+    fila_checkin = iter(rng.permutation(np.arange(1, args.students + 1)))
+
+    agenda = []
+    for posicao, hora in enumerate(parse_hours(args.hours)):
+        inicio = posicao * args.seconds_per_hour
+        for taxa, requisicoes in ((args.checkin_rate * perfil[hora], CHECKIN_REQUESTS),
+                                  (args.poll_rate, POLL_REQUESTS),
+                                  (args.report_rate, REPORT_REQUESTS)):
+            n = rng.poisson(taxa * args.seconds_per_hour)
+            instantes = inicio + rng.random(n) * args.seconds_per_hour
+            escolhas = rng.integers(0, len(requisicoes), n)
+            for t, escolha in zip(instantes, escolhas):
+                metodo, caminho = requisicoes[escolha]
+                if requisicoes is CHECKIN_REQUESTS:
+                    aluno_id = next(fila_checkin, None) or int(rng.integers(1, args.students + 1))
+                else:
+                    aluno_id = int(rng.integers(1, args.students + 1))
+                agenda.append((float(t), hora, metodo, caminho, int(aluno_id)))
+    agenda.sort()
+    return agenda
+
+
+async def run_schedule(base_url: str, agenda: list, concurrency: int = 64, timeout: float = 30.0) -> list:
+    """Disparar a agenda e devolver (hora, "MÉTODO caminho", status ou None, latência em s)"""
+    registros = []
+    limite = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+
+        async def enviar(agendado, hora, metodo, caminho, aluno_id):
+            async with limite:
+                try:
+                    resposta = await client.request(
+                        metodo, caminho.format(aluno_id=aluno_id),
+                        json={"aluno_id": aluno_id} if metodo == "POST" else None,
+                        headers=AUTH_HEADERS if caminho.startswith("/relatorio") else None,
+                    )
+                    status = resposta.status_code
+                except httpx.HTTPError:
+                    status = None
+            registros.append((hora, f"{metodo} {caminho}", status, loop.time() - agendado))
+
+        tarefas = []
+        for t, hora, metodo, caminho, aluno_id in agenda:
+            atraso = inicio + t - loop.time()
+            if atraso > 0:
+                await asyncio.sleep(atraso)
+            tarefas.append(asyncio.create_task(enviar(inicio + t, hora, metodo, caminho, aluno_id)))
+        await asyncio.gather(*tarefas)
+    return registros
+
+
+def _estatisticas(latencias: list, status: list, duracao: float) -> dict:
+    latencias_ms = np.asarray(latencias) * 1000
+    erros = sum(1 for s in status if s is None or s >= 400)
+    resumo = {
+        "requisicoes": len(status),
+        "vazao_rps": round(len(status) / duracao, 2) if duracao else 0.0,
+        "erros": erros,
+        "taxa_erro": round(erros / len(status), 4) if status else 0.0,
+    }
+    for p in PERCENTILES:
+        resumo[f"p{p}_ms"] = round(float(np.percentile(latencias_ms, p)), 2) if len(latencias_ms) else 0.0
+    resumo["max_ms"] = round(float(latencias_ms.max()), 2) if len(latencias_ms) else 0.0
+    return resumo
+
+
+def summarize(registros: list, seconds_per_hour: float, n_horas: int) -> dict:
+    """Vazão, percentis de latência e erros por endpoint e por hora simulada"""
+    por_endpoint, por_hora = {}, {}
+    for hora, endpoint, status, latencia in registros:
+        por_endpoint.setdefault(endpoint, ([], []))
+        por_hora.setdefault(hora, ([], []))
+        for grupo in (por_endpoint[endpoint], por_hora[hora]):
+            grupo[0].append(latencia)
+            grupo[1].append(status)
+
+    codigos = {}
+    for _, endpoint, status, _ in registros:
+        chave = str(status) if status is not None else "falha_conexao"
+        codigos.setdefault(endpoint, {}).setdefault(chave, 0)
+        codigos[endpoint][chave] += 1
+
+    duracao = seconds_per_hour * n_horas
+    return {
+        "duracao_segundos": duracao,
+        "total": _estatisticas([r[3] for r in registros], [r[2] for r in registros], duracao),
+        "endpoints": {
+            endpoint: {**_estatisticas(lat, st, duracao), "status": codigos[endpoint]}
+            for endpoint, (lat, st) in sorted(por_endpoint.items())
+        },
+        "horas": {
+            f"{hora:02d}h": _estatisticas(lat, st, seconds_per_hour)
+            for hora, (lat, st) in sorted(por_hora.items())
+        },
+    }
+
+
+class LocalServer:
+    """main.py servido por uvicorn em uma thread, sobre o ambiente do benchmark"""
+
+    def __init__(self, students: int, seed: int):
+        self.students = students
+        self.seed = seed
+
+    def __enter__(self) -> str:
+        import uvicorn
+        import main
+        from scripts.benchmark_suite import BenchmarkEnvironment
+
+        self._tmp = tempfile.TemporaryDirectory()
+        self.ambiente = BenchmarkEnvironment(self.students, self.seed, workdir=self._tmp.name)
+        # Sem lifespan: o startup criaria as tabelas no banco configurado da API
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="load-test-api", daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Servidor local não iniciou")
+            time.sleep(0.05)
+        porta = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{porta}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+        self.ambiente.close()
+        self._tmp.cleanup()
+
+
+def run(args, agenda: list) -> dict:
+    n_horas = len(parse_hours(args.hours))
+
+    if args.url:
+        registros = asyncio.run(run_schedule(args.url, agenda, args.concurrency, args.timeout))
+    else:
+        with LocalServer(args.students, args.seed) as url:
+            registros = asyncio.run(run_schedule(url, agenda, args.concurrency, args.timeout))
+    return summarize(registros, args.seconds_per_hour, n_horas)
+
+
+def print_summary(resumo: dict):
+    cabecalho = (f"{'requisições':>11} {'req/s':>8} {'erros':>7} {'p50 (ms)':>9} "
+                 f"{'p95 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+
+    def linha(nome, r):
+        print(f"{nome:<34} {r['requisicoes']:>11} {r['vazao_rps']:>8.1f} {r['taxa_erro']:>7.1%} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f}")
+
+    print(f"{'endpoint':<34} {cabecalho}")
+    for endpoint, r in resumo["endpoints"].items():
+        linha(endpoint, r)
+    linha("total", resumo["total"])
+    for endpoint, r in resumo["endpoints"].items():
+        if r["erros"]:
+            print(f"  {endpoint}: status {r['status']}")
+    print(f"\n{'hora simulada':<34} {cabecalho}")
+    for hora, r in resumo["horas"].items():
+        linha(hora, r)
+
+
+def main(argv=None) -> dict:
+    args = create_parser().parse_args(argv)
+    agenda = build_schedule(args)
+    checkins = sum(1 for r in agenda if r[2] == "POST")
+    if checkins > args.students:
+        print(f"Aviso: {checkins} checkins para {args.students} alunos; repetições sem saída retornam 400")
+
+    # Erros aparecem no resumo por status; sem um traceback por requisição no terminal
+    logging.disable(logging.ERROR)
+    try:
+        resumo = run(args, agenda)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print_summary(resumo)
+    if args.output:
+        Path(args.output).write_text(json.dumps(resumo, indent=2, ensure_ascii=False) + "\n")
+    return resumo
+
+
+if __name__ == "__main__":
+    main()
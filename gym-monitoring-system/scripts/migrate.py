@@ -0,0 +1,82 @@
+# scripts/migrate.py
+"""
+Migração do schema: criar as tabelas que ainda não existem
+
+Executada uma vez antes de subir a API e os workers (no docker-compose, pelo
+serviço migrate), em vez de a API rodar create_tables() a cada inicialização.
+O create_all não altera tabelas existentes: colunas novas do modelo que aceitam
+NULL são adicionadas com ALTER TABLE (e as únicas ganham um índice único); as que
+não aceitam são listadas para serem adicionadas manualmente.
+
+Exemplo:
+    python scripts/migrate.py
+"""
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+from sqlalchemy import inspect, text
+from app.models.database import Base, engine
+
+
+def migrate(bind=engine) -> dict:
+    """Criar as tabelas ausentes, adicionar as colunas que aceitam NULL e apontar as demais"""
+    existentes = set(inspect(bind).get_table_names())
+    Base.metadata.create_all(bind=bind)
+
+    criadas = [t.name for t in Base.metadata.sorted_tables if t.name not in existentes]
+    colunas_adicionadas = {}
+    colunas_ausentes = {}
+    inspetor = inspect(bind)
+    for tabela in Base.metadata.sorted_tables:
+        if tabela.name not in existentes:
+            continue
+        no_banco = {c["name"] for c in inspetor.get_columns(tabela.name)}
+        faltando = [c for c in tabela.columns if c.name not in no_banco]
+        adicionaveis = [c for c in faltando if c.nullable and not c.primary_key]
+        if adicionaveis:
+            with bind.begin() as conexao:
+                for coluna in adicionaveis:
+                    for comando in _ddl_coluna(tabela, coluna, bind.dialect):
+                        conexao.execute(text(comando))
+            colunas_adicionadas[tabela.name] = [c.name for c in adicionaveis]
+        pendentes = [c.name for c in faltando if c not in adicionaveis]
+        if pendentes:
+            colunas_ausentes[tabela.name] = pendentes
+    return {"tabelas_criadas": criadas, "colunas_adicionadas": colunas_adicionadas,
+            "colunas_ausentes": colunas_ausentes}
+
+
+def _ddl_coluna(tabela, coluna, dialeto) -> list:
+    """ALTER TABLE da coluna e, se única, o índice único (ADD COLUMN ... UNIQUE não existe no SQLite)"""
+    nomes = dialeto.identifier_preparer
+    nome_tabela, nome_coluna = nomes.quote(tabela.name), nomes.quote(coluna.name)
+    comandos = [f"ALTER TABLE {nome_tabela} ADD COLUMN {nome_coluna} {coluna.type.compile(dialect=dialeto)}"]
+    if coluna.unique:
+        indice = nomes.quote(f"uq_{tabela.name}_{coluna.name}")
+        comandos.append(f"CREATE UNIQUE INDEX IF NOT EXISTS {indice} ON {nome_tabela} ({nome_coluna})")
+    return comandos
+
+
+def main() -> int:
+    resultado = migrate()
+    if resultado["tabelas_criadas"]:
+        print(f"Tabelas criadas: {', '.join(resultado['tabelas_criadas'])}")
+    else:
+        print("Schema já atualizado: nenhuma tabela criada")
+    for tabela, colunas in resultado["colunas_adicionadas"].items():
+        print(f"Colunas adicionadas em {tabela}: {', '.join(colunas)}")
+    for tabela, colunas in resultado["colunas_ausentes"].items():
+        print(f"Atenção: {tabela} sem as colunas {', '.join(colunas)} (adicionar com ALTER TABLE)")
+    return 1 if resultado["colunas_ausentes"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# scripts/simulate_turnstiles.py
+"""
+Simulador de catracas: WebSocket persistente vs uma requisição HTTP por evento
+
+Cada catraca recebe uma fatia dos alunos e gera, para cada um, uma entrada e
+logo depois a saída, a --rate eventos/s ou o mais rápido que o modo permite:
+
+- ws:   uma conexão por catraca em /ws/catraca; os eventos seguem sem esperar o
+        ack, limitados pela janela anunciada pelo servidor (controle de fluxo);
+- http: um POST /aluno/checkin ou /aluno/checkout por evento, com uma conexão
+        nova a cada requisição (como as catracas fazem hoje).
+
+São medidos eventos/s, a latência de cada evento até o seu ack (ou resposta) e
+os erros. O alvo é uma API já em execução (--url, alunos 1..N existentes, sem
+checkin em aberto) ou, por padrão, main.py servido localmente como em
+scripts/load_test.py.
+
+Exemplos:
+    python scripts/simulate_turnstiles.py --devices 8 --events 400
+    python scripts/simulate_turnstiles.py --url http://localhost:8000 --students 5000 --mode ws
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Adicionar o diretório raiz ao sys.path para garantir que os módulos sejam encontrados
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+import httpx
+import numpy as np
+import websockets
+from scripts.load_test import AUTH_HEADERS, LocalServer
+
+TOKEN = "valid_token"
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Simulador de catracas (WebSocket vs HTTP por evento)")
+    parser.add_argument("--url", help="API em execução; padrão: servir main.py localmente com stand-ins")
+    parser.add_argument("--students", type=int, default=2000, help="Alunos 1..N divididos entre as catracas")
+    parser.add_argument("--devices", type=int, default=8, help="Catracas simultâneas")
+    parser.add_argument("--events", type=int, default=200, help="Eventos por catraca (entradas + saídas)")
+    parser.add_argument("--mode", choices=("ws", "http", "both"), default="both")
+    parser.add_argument("--rate", type=float, default=0, help="Eventos/s por catraca (0: o mais rápido possível)")
+    parser.add_argument("--per-message", type=int, default=1, help="Eventos por mensagem WebSocket")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def device_events(dispositivo: int, args) -> list:
+    """(tipo, aluno_id) da catraca: entrada e saída de cada aluno da sua fatia"""
+    alunos = range(dispositivo + 1, args.students + 1, args.devices)
+    eventos = []
+    for aluno_id in alunos:
+        if len(eventos) >= args.events:
+            break
+        eventos.extend([("entrada", aluno_id), ("saida", aluno_id)])
+    return eventos[:args.events]
+
+
+async def pace(inicio: float, indice: int, rate: float):
+    """Esperar o instante agendado do evento `indice` (sem espera com rate 0)"""
+    if rate > 0:
+        atraso = inicio + indice / rate - time.perf_counter()
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+
+
+async def run_ws_device(base_url: str, dispositivo: int, eventos: list, por_mensagem: int, rate: float) -> tuple:
+    """Latências (s) e número de erros de uma catraca conectada por WebSocket"""
+    # Sessão nova a cada execução, como uma catraca recém-ligada: seq recomeça em 1
+    url = base_url.replace("http", "ws", 1) + (
+        f"/ws/catraca?dispositivo=sim-{dispositivo}&sessao={uuid.uuid4().hex}&token={TOKEN}"
+    )
+    enviados = {}
+    latencias = []
+    erros = 0
+    async with websockets.connect(url, max_queue=None) as ws:
+        pronto = await receive_json(ws)
+        creditos = asyncio.Semaphore(pronto["janela"])
+        concluido = asyncio.Event()
+
+        async def receber():
+            nonlocal erros
+            while len(latencias) < len(eventos):
+                ack = await receive_json(ws)
+                agora = time.perf_counter()
+                for resultado in ack.get("resultados", []):
+                    latencias.append(agora - enviados.pop(resultado["seq"]))
+                    erros += resultado["status"] == "erro"
+                    creditos.release()
+            concluido.set()
+
+        receptor = asyncio.create_task(receber())
+        comeco = time.perf_counter()
+        for inicio in range(0, len(eventos), por_mensagem):
+            mensagem = []
+            for seq, (tipo, aluno_id) in enumerate(eventos[inicio:inicio + por_mensagem], start=inicio + 1):
+                await pace(comeco, seq - 1, rate)
+                await creditos.acquire()
+                enviados[seq] = time.perf_counter()
+                mensagem.append({"seq": seq, "tipo": tipo, "aluno_id": aluno_id})
+            await ws.send(json.dumps(mensagem if por_mensagem > 1 else mensagem[0]))
+        await concluido.wait()
+        await receptor
+    return latencias, erros
+
+
+async def run_http_device(base_url: str, eventos: list, rate: float) -> tuple:
+    latencias = []
+    erros = 0
+    comeco = time.perf_counter()
+    for indice, (tipo, aluno_id) in enumerate(eventos):
+        await pace(comeco, indice, rate)
+        caminho = "/aluno/checkin" if tipo == "entrada" else "/aluno/checkout"
+        inicio = time.perf_counter()
+        # Conexão nova por evento, como uma catraca sem keep-alive
+        async with httpx.AsyncClient(base_url=base_url, headers=AUTH_HEADERS, timeout=30.0) as client:
+            resposta = await client.post(caminho, json={"aluno_id": aluno_id})
+        latencias.append(time.perf_counter() - inicio)
+        erros += resposta.status_code >= 400
+    return latencias, erros
+
+
+async def run_mode(base_url: str, modo: str, args) -> dict:
+    eventos = [device_events(d, args) for d in range(args.devices)]
+    inicio = time.perf_counter()
+    if modo == "ws":
+        tarefas = [run_ws_device(base_url, d, e, args.per_message, args.rate) for d, e in enumerate(eventos)]
+    else:
+        tarefas = [run_http_device(base_url, e, args.rate) for e in eventos]
+    resultados = await asyncio.gather(*tarefas)
+    duracao = time.perf_counter() - inicio
+    latencias_ms = np.array([l for lat, _ in resultados for l in lat]) * 1000
+    total = len(latencias_ms)
+    return {
+        "eventos": total,
+        "eventos_s": total / duracao if duracao else 0.0,
+        "erros": sum(e for _, e in resultados),
+        "p50_ms": float(np.percentile(latencias_ms, 50)) if total else 0.0,
+        "p99_ms": float(np.percentile(latencias_ms, 99)) if total else 0.0,
+    }
+
+
+async def receive_json(ws) -> dict:
+    return json.loads(await ws.recv())
+
+
+def run(args) -> dict:
+    modos = ("ws", "http") if args.mode == "both" else (args.mode,)
+    resultados = {}
+    if args.url:
+        for modo in modos:
+            resultados[modo] = asyncio.run(run_mode(args.url, modo, args))
+        return resultados
+    servidor = LocalServer(args.students, args.seed)
+    with servidor as url:
+        for modo in modos:
+            # Cada modo parte de todos os alunos sem checkin em aberto
+            servidor.ambiente.fechar_checkins_abertos()
+            resultados[modo] = asyncio.run(run_mode(url, modo, args))
+    return resultados
+
+
+def main(argv=None) -> dict:
+    args = create_parser().parse_args(argv)
+    logging.disable(logging.ERROR)
+    try:
+        resultados = run(args)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"{'modo':>5} {'catracas':>9} {'eventos':>8} {'eventos/s':>10} {'erros':>6} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for modo, r in resultados.items():
+        print(f"{modo:>5} {args.devices:>9} {r['eventos']:>8} {r['eventos_s']:>10.1f} {r['erros']:>6} "
+              f"{r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
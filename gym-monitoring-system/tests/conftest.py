@@ -0,0 +1,180 @@
+# tests/conftest.py
+import queue
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models.database import Base
+from app.monitoring.instrumentation import RedisInstrumentationMixin
+
+
+class RedisMemoria:
+    """Redis em memória para testes e benchmarks (sem fakeredis)
+
+    Comandos: GET, MGET, SET (EX/NX), SETEX, DEL, INCRBY, HGETALL, FLUSHALL,
+    PUBLISH, pipeline() e pubsub(). Os métodos passam por execute_command, então
+    a instrumentação de RedisInstrumentationMixin enxerga todos os comandos.
+    """
+
+    def __init__(self):
+        self.dados = {}
+        self.expira = {}
+        self.inscritos = []
+        self.pipelines = []  # comandos por execute()
+
+    def _ler(self, chave):
+        if chave in self.expira and self.expira[chave] <= time.monotonic():
+            self.dados.pop(chave, None)
+            self.expira.pop(chave, None)
+        return self.dados.get(chave)
+
+    def execute_command(self, *args, **options):
+        comando = str(args[0]).upper()
+        if comando == 'GET':
+            return self._ler(args[1])
+        if comando == 'MGET':
+            return [self._ler(chave) for chave in args[1:]]
+        if comando == 'HGETALL':
+            return dict(self._ler(args[1]) or {})
+        if comando == 'SET':
+            opcoes = [str(opcao).upper() for opcao in args[3:]]
+            if 'NX' in opcoes and self._ler(args[1]) is not None:
+                return None
+            self.dados[args[1]] = args[2]
+            self.expira.pop(args[1], None)
+            if 'EX' in opcoes:
+                self.expira[args[1]] = time.monotonic() + float(args[3 + opcoes.index('EX') + 1])
+            return True
+        if comando == 'SETEX':
+            self.dados[args[1]] = args[3]
+            self.expira[args[1]] = time.monotonic() + float(args[2])
+            return True
+        if comando == 'INCRBY':
+            self.dados[args[1]] = int(self._ler(args[1]) or 0) + int(args[2])
+            return self.dados[args[1]]
+        if comando == 'DEL':
+            removidas = sum(self._ler(chave) is not None for chave in args[1:])
+            for chave in args[1:]:
+                self.dados.pop(chave, None)
+                self.expira.pop(chave, None)
+            return removidas
+        if comando == 'FLUSHALL':
+            self.dados.clear()
+            self.expira.clear()
+            return True
+        if comando == 'PUBLISH':
+            for fila in self.inscritos:
+                fila.put({"type": "message", "channel": args[1], "data": args[2]})
+            return len(self.inscritos)
+        raise NotImplementedError(f"Comando {comando} não suportado pelo Redis em memória")
+
+    def get(self, chave):
+        return self.execute_command('GET', chave)
+
+    def mget(self, chaves):
+        return self.execute_command('MGET', *chaves)
+
+    def hgetall(self, chave):
+        return self.execute_command('HGETALL', chave)
+
+    def set(self, chave, valor, ex=None, nx=False):
+        opcoes = (['EX', ex] if ex is not None else []) + (['NX'] if nx else [])
+        return self.execute_command('SET', chave, valor, *opcoes)
+
+    def setex(self, chave, ttl, valor):
+        return self.execute_command('SETEX', chave, ttl, valor)
+
+    def incr(self, chave):
+        return self.incrby(chave, 1)
+
+    def incrby(self, chave, quantidade):
+        return self.execute_command('INCRBY', chave, quantidade)
+
+    def delete(self, *chaves):
+        return self.execute_command('DEL', *chaves)
+
+    def flushall(self):
+        return self.execute_command('FLUSHALL')
+
+    def publish(self, canal, mensagem):
+        return self.execute_command('PUBLISH', canal, mensagem)
+
+    def pipeline(self, transaction=True):
+        return PipelineMemoria(self)
+
+    def pubsub(self, **kwargs):
+        return PubSubMemoria(self)
+
+
+class PipelineMemoria:
+    """Comandos do RedisMemoria enfileirados e executados juntos em execute()"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.comandos = []
+
+    def __getattr__(self, nome):
+        metodo = getattr(self.redis, nome)
+
+        def enfileirar(*args, **kwargs):
+            self.comandos.append((metodo, args, kwargs))
+            return self
+        return enfileirar
+
+    def execute(self):
+        comandos, self.comandos = self.comandos, []
+        self.redis.pipelines.append(len(comandos))
+        return [metodo(*args, **kwargs) for metodo, args, kwargs in comandos]
+
+
+class PubSubMemoria:
+    """Assinatura de um canal do RedisMemoria (mensagens de todos os canais)"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.fila = None
+
+    def subscribe(self, canal):
+        self.fila = queue.Queue()
+        self.redis.inscritos.append(self.fila)
+
+    def listen(self):
+        while True:
+            yield self.fila.get()
+
+
+class RedisMemoriaInstrumentado(RedisInstrumentationMixin, RedisMemoria):
+    """RedisMemoria com a instrumentação do cliente da API"""
+
+
+def criar_sessao_sqlite():
+    """Sessão em um SQLite em memória novo, com o schema criado"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+@pytest.fixture
+def redis_memoria():
+    """Redis em memória instrumentado, novo a cada teste"""
+    return RedisMemoriaInstrumentado()
+
+
+@pytest.fixture
+def nova_sessao_sqlite():
+    """Fábrica de sessões, cada uma em um SQLite em memória próprio (fechadas no fim do teste)"""
+    sessoes = []
+
+    def criar():
+        sessoes.append(criar_sessao_sqlite())
+        return sessoes[-1]
+    yield criar
+    for sessao in sessoes:
+        sessao.close()
+
+
+@pytest.fixture
+def sessao_sqlite(nova_sessao_sqlite):
+    """Sessão em um SQLite em memória com o schema criado"""
+    return nova_sessao_sqlite()
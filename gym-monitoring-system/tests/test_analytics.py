@@ -0,0 +1,199 @@
+# tests/test_analytics.py
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from app.analytics import bitmap
+
+
+def test_bitmap_incremental_igual_ao_historico():
+    """Testar que marcar dia a dia produz o mesmo bitmap que montar do histórico"""
+    hoje = date(2025, 1, 6)
+    dias = [hoje - timedelta(days=d) for d in (300, 45, 7, 6, 2, 1, 1, 0)]
+
+    atual, inicio = None, None
+    for dia in dias:
+        atual, inicio = bitmap.mark_day(atual, inicio, dia)
+    assert (atual, inicio) == bitmap.from_days(dias, hoje)
+
+    resumo = bitmap.attendance_summary(atual, inicio, hoje)
+    assert resumo['dias_presentes_7'] == 4
+    assert resumo['dias_presentes_30'] == 5
+    assert resumo['dias_presentes_90'] == 6
+    assert resumo['sequencia_atual_dias'] == 3
+    assert resumo['maior_sequencia_dias'] == 3
+    assert resumo['maior_intervalo_dias'] == 44
+    assert resumo['presencas_por_dia_semana']['seg'] == 2
+
+
+def test_bitmap_limite_de_dias():
+    """Testar que o bitmap descarta os dias mais antigos ao passar do limite"""
+    inicio_historico = date(2020, 1, 1)
+    atual, inicio = bitmap.mark_day(None, None, inicio_historico)
+    atual, inicio = bitmap.mark_day(atual, inicio, inicio_historico + timedelta(days=bitmap.BITMAP_MAX_DAYS + 9))
+
+    assert len(atual) == bitmap.BITMAP_MAX_DAYS // 8
+    assert inicio == inicio_historico + timedelta(days=10)
+    assert bitmap.unpack(atual).sum() == 1
+    # Sequência atual conta a partir de ontem quando ainda não houve checkin hoje
+    ontem = bitmap.from_days([date(2025, 1, 5), date(2025, 1, 4)], date(2025, 1, 6))
+    assert bitmap.attendance_summary(*ontem, date(2025, 1, 6))['sequencia_atual_dias'] == 2
+
+
+def _popular_checkins(db, n_alunos=40, seed=0):
+    """Alunos em três planos com checkins aleatórios no último ano"""
+    from datetime import datetime
+    from app.models.database import Aluno, Plano, Checkin
+
+    rng = np.random.default_rng(seed)
+    agora = datetime(2025, 6, 1, 12, 0)
+    planos = [Plano(nome=nome, valor=valor, duracao_meses=meses)
+              for nome, valor, meses in (("Mensal", 80.0, 1), ("Semestral", 120.0, 6), ("Anual", 200.0, 12))]
+    db.add_all(planos)
+    db.commit()
+    for i in range(n_alunos):
+        aluno = Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=planos[i % 3].id,
+                      data_matricula=agora - timedelta(days=int(rng.integers(200, 400))))
+        db.add(aluno)
+        db.flush()
+        for _ in range(int(rng.integers(0, 60))):
+            entrada = agora - timedelta(minutes=int(rng.integers(0, 365 * 24 * 60)))
+            duracao = None if rng.random() < 0.2 else int(rng.integers(20, 120))
+            db.add(Checkin(aluno_id=aluno.id, data_entrada=entrada, duracao_minutos=duracao))
+    db.commit()
+    return agora
+
+
+def test_store_colunar_consultas_e_atualizacao(sessao_sqlite):
+    """Testar agregações do store colunar contra o banco e a atualização incremental"""
+    from datetime import datetime
+    from collections import Counter
+    from app.analytics.columnar import ColumnarCheckinStore
+    from app.models.database import Aluno, Checkin
+
+    db = sessao_sqlite
+    agora = _popular_checkins(db)
+    store = ColumnarCheckinStore(refresh_seconds=0)
+    store.refresh_if_stale(db)
+    checkins = db.query(Checkin).all()
+    assert len(store) == len(checkins)
+
+    inicio = agora - timedelta(days=30)
+    recentes = [c for c in checkins if inicio <= c.data_entrada < agora]
+    mapa = store.hourly_heatmap(inicio, agora)
+    esperado = Counter((c.data_entrada.weekday(), c.data_entrada.hour) for c in recentes)
+    assert mapa.sum() == len(recentes)
+    assert all(mapa[dia, hora] == total for (dia, hora), total in esperado.items())
+
+    planos = store.by_plan(inicio, agora)
+    assert sum(p['checkins'] for p in planos.values()) == len(recentes)
+    assert sum(p['alunos'] for p in planos.values()) == len({c.aluno_id for c in recentes})
+
+    dias, por_dia, alunos_por_dia = store.time_series(inicio, agora, 'dia')
+    assert len(dias) == 31 and por_dia.sum() == len(recentes)  # 30 dias de meio-dia a meio-dia
+    assert alunos_por_dia.max() <= por_dia.max()
+
+    # Novo checkin de um aluno existente, um checkin antigo inserido por fora e uma saída
+    aluno = db.query(Aluno).first()
+    novo = Checkin(aluno_id=aluno.id, data_entrada=agora + timedelta(hours=1))
+    antigo = Checkin(aluno_id=aluno.id, data_entrada=agora - timedelta(days=500), duracao_minutos=45)
+    db.add_all([novo, antigo])
+    db.commit()
+    # append não espera o lock de uma carga em andamento nem consulta o banco
+    with store._lock:
+        store.append([novo])
+    assert len(store) == len(checkins)
+    store.refresh_seconds = float('inf')
+    store.refresh_if_stale(db)
+    assert len(store) == len(checkins) + 1
+    assert store.columns()['plano_id'][store.columns()['id'] == novo.id][0] == aluno.plano_id
+    novo.duracao_minutos = 50
+    db.commit()
+    store.refresh(db)
+
+    colunas = store.columns()
+    assert len(store) == len(checkins) + 2
+    assert (colunas['duracao'][colunas['id'] == novo.id] == 50).all()
+    assert (np.diff(colunas['aluno_id']) >= 0).all()
+    mesmo_aluno = np.diff(colunas['aluno_id']) == 0
+    assert (np.diff(colunas['entrada'])[mesmo_aluno] >= 0).all()
+    alunos, contagens = store.checkins_per_student()
+    assert contagens.sum() == len(store)
+    db.close()
+
+
+def test_features_colunares_iguais_ao_calculo_por_aluno(sessao_sqlite):
+    """Testar que o caminho vetorizado do FeatureEngineer reproduz _calculate_features"""
+    import pandas as pd
+    from app.analytics.columnar import ColumnarCheckinStore
+    from app.ml.feature_engineering import FeatureEngineer, FEATURE_COLUMNS
+
+    db = sessao_sqlite
+    agora = _popular_checkins(db, seed=1)
+    por_aluno = FeatureEngineer(db).create_training_dataset(months_back=6, end_date=agora)
+    colunar = FeatureEngineer(db, checkin_store=ColumnarCheckinStore()).create_training_dataset(
+        months_back=6, end_date=agora
+    )
+
+    assert len(por_aluno) > 0
+    por_aluno = por_aluno.sort_values('aluno_id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(colunar[FEATURE_COLUMNS + ['churn', 'aluno_id']],
+                                  por_aluno[FEATURE_COLUMNS + ['churn', 'aluno_id']],
+                                  check_dtype=False)
+    db.close()
+
+
+def test_retencao_coortes_e_sobrevivencia(sessao_sqlite):
+    """Testar matriz de retenção e Kaplan-Meier contra o cálculo aluno a aluno, e o cache diário"""
+    from datetime import date, datetime
+    from app.analytics.columnar import ColumnarCheckinStore
+    from app.models.database import Aluno, Checkin
+    from app.services.cohort_service import CohortService
+
+    db = sessao_sqlite
+    _popular_checkins(db, n_alunos=120, seed=2)
+    dia = date(2025, 5, 31)
+    as_of = datetime(2025, 6, 1)
+    resultado = CohortService(db, ColumnarCheckinStore()).calcular_retencao(6, False, dia)
+
+    # Vida de cada aluno: até o último checkin se ficou mais de 90 dias sem vir
+    vidas = []
+    for aluno in db.query(Aluno).all():
+        entradas = [c.data_entrada for c in db.query(Checkin).filter(
+            Checkin.aluno_id == aluno.id, Checkin.data_entrada < as_of)]
+        ultimo = max(entradas + [aluno.data_matricula])
+        evento = as_of - ultimo > timedelta(days=90)
+        fim = ultimo if evento else as_of - timedelta(microseconds=1)
+        meses = (fim.year - aluno.data_matricula.year) * 12 + fim.month - aluno.data_matricula.month
+        vidas.append((aluno.data_matricula, (fim - aluno.data_matricula).days, meses, evento))
+
+    for item in resultado.coortes:
+        membros = [v for v in vidas if v[0].strftime('%Y-%m') == item.coorte]
+        assert item.alunos == len(membros)
+        for k, valor in enumerate(item.retencao):
+            if valor is not None:
+                assert valor == round(sum(v[2] >= k for v in membros) / len(membros), 4)
+
+    # Kaplan-Meier: produto de (1 - mortes / em risco) em cada dia com desistência até t
+    curva = resultado.sobrevivencia[0]
+    assert curva.desistencias == sum(v[3] for v in vidas)
+    for k, valor in enumerate(curva.sobrevivencia):
+        t = 30 * k
+        esperado = 1.0
+        for d in sorted({v[1] for v in vidas if v[3] and v[1] <= t}):
+            em_risco = sum(v[1] >= d for v in vidas)
+            mortes = sum(v[1] == d and v[3] for v in vidas)
+            esperado *= 1 - mortes / em_risco
+        assert valor == pytest.approx(esperado, abs=1e-4)
+
+    # Cache do dia fechado: a segunda chamada não recalcula
+    class CacheMemoria(dict):
+        def setex(self, chave, ttl, valor):
+            self[chave] = valor
+
+    cache = CacheMemoria()
+    service = CohortService(db, ColumnarCheckinStore())
+    primeira = service.obter_retencao(cache, 6, True, dia)
+    assert list(cache) == [CohortService.cache_key(dia, 6, True)]
+    service.calcular_retencao = None
+    assert service.obter_retencao(cache, 6, True, dia) == primeira
+    db.close()
@@ -0,0 +1,50 @@
+# tests/test_benchmark_suite.py
+import json
+from scripts.benchmark_suite import compare, main, run_suite
+
+def _resultados(**medianas):
+    return {"resultados": {"200": {nome: {"mediana_ms": valor} for nome, valor in medianas.items()}}}
+
+def test_compare_detecta_regressoes():
+    """Testar limite relativo, piso absoluto e casos sem baseline"""
+    baseline = _resultados(lento=100.0, rapido=0.2, estavel=10.0)
+    atual = _resultados(lento=130.0, rapido=0.4, estavel=11.0, novo=50.0)
+
+    regressoes = compare(atual, baseline, threshold=0.25, min_delta_ms=0.5)
+    assert [r["caso"] for r in regressoes] == ["lento"]
+    assert regressoes[0]["variacao"] == 0.3
+
+    # Sub-milissegundo: +100% mas abaixo do piso absoluto
+    assert compare(atual, baseline, threshold=0.25, min_delta_ms=0.1)[1]["caso"] == "rapido"
+
+def test_suite_pequena_e_baseline(tmp_path, capsys):
+    """Testar a suite ponta a ponta em um cenário pequeno e a falha por regressão"""
+    casos = ["obter_frequencia_aluno", "criar_checkin", "identify_at_risk_students",
+             "http_post_checkin", "http_frequencia_com_cache"]
+    resultados = run_suite([30], casos, repeat=2, repeat_heavy=1)
+
+    assert resultados["meta"]["dados"]["30"]["alunos"] == 30
+    assert resultados["meta"]["dados"]["30"]["checkins"] > 0
+    assert set(resultados["resultados"]["30"]) == set(casos)
+    assert all(r["repeticoes"] in (1, 2) and r["mediana_ms"] > 0 for r in resultados["resultados"]["30"].values())
+
+    # Baseline impossível de atingir: toda mediana vira regressão
+    baseline = tmp_path / "baseline.json"
+    for caso in resultados["resultados"]["30"].values():
+        caso["mediana_ms"] = 1e-6
+    baseline.write_text(json.dumps(resultados))
+    argv = ["--sizes", "30", "--cases", "prever_churn", "--repeat", "2", "--baseline", str(baseline)]
+    assert main(argv) == 0  # caso ausente no baseline
+
+    argv[3] = "obter_frequencia_aluno"
+    assert main(argv + ["--min-delta-ms", "0", "--output", str(tmp_path / "saida.json")]) == 1
+    assert "REGRESSÃO obter_frequencia_aluno" in capsys.readouterr().out
+    assert "30" in json.loads((tmp_path / "saida.json").read_text())["resultados"]
+
+def test_memory_redis_expira(redis_memoria):
+    """Testar o Redis em memória usado quando fakeredis não está instalado"""
+    redis_memoria.setex("frequencia:1", 60, "a")
+    redis_memoria.setex("churn:1", -1, "b")
+    assert redis_memoria.get("frequencia:1") == "a"
+    assert redis_memoria.get("churn:1") is None
+    assert redis_memoria.delete("frequencia:1", "x") == 1
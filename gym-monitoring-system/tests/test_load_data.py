@@ -0,0 +1,45 @@
+# tests/test_load_data.py
+import numpy as np
+import pytest
+from scripts.generate_load_data import (
+    create_parser, generate_batch, base_daily_rate, reference_epoch, parse_time_profile
+)
+
+def _args(*extra):
+    return create_parser().parse_args([
+        "--students", "2500", "--checkins", "250000", "--batch-size", "1000",
+        "--reference-date", "2025-01-01", *extra
+    ])
+
+def test_generate_batch_deterministico():
+    """Testar que o mesmo lote gera sempre os mesmos dados"""
+    args = _args()
+    agora = reference_epoch(args)
+    taxa = base_daily_rate(args, agora)
+
+    alunos_1, checkins_1 = generate_batch(args, 1, [1, 2, 3, 4], taxa, agora)
+    alunos_2, checkins_2 = generate_batch(args, 1, [1, 2, 3, 4], taxa, agora)
+
+    assert alunos_1.equals(alunos_2)
+    assert checkins_1.equals(checkins_2)
+    assert alunos_1["id"].iloc[0] == args.first_id + 1000
+
+def test_generate_batch_escala_e_ultimo_lote():
+    """Testar volume aproximado de checkins e tamanho do último lote"""
+    args = _args()
+    agora = reference_epoch(args)
+    taxa = base_daily_rate(args, agora)
+
+    alunos, checkins = generate_batch(args, 2, [1], taxa, agora)
+
+    assert len(alunos) == 500
+    assert len(checkins) == pytest.approx(500 * 100, rel=0.2)
+    assert set(checkins["aluno_id"]) <= set(alunos["id"])
+    assert (checkins["data_saida"] > checkins["data_entrada"]).all()
+
+def test_parse_time_profile():
+    """Testar perfis de horário nomeados e personalizados"""
+    assert parse_time_profile("picos").sum() == pytest.approx(1.0)
+    assert parse_time_profile(",".join(["1"] * 24))[0] == pytest.approx(1 / 24)
+    with pytest.raises(ValueError):
+        parse_time_profile("1,2,3")
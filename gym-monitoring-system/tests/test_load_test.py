@@ -0,0 +1,38 @@
+# tests/test_load_test.py
+from collections import Counter
+from scripts.load_test import create_parser, build_schedule, parse_hours, main
+
+def _args(*extra):
+    return create_parser().parse_args(["--students", "300", "--seconds-per-hour", "1", *extra])
+
+def test_agenda_reproduz_picos_de_checkin():
+    """Testar agenda determinística, picos às 6h/18h e checkins de alunos distintos"""
+    args = _args("--hours", "6", "10", "18", "--seconds-per-hour", "20", "--students", "2000")
+    agenda = build_schedule(args)
+    assert agenda == build_schedule(args)
+    assert [t for t, *_ in agenda] == sorted(t for t, *_ in agenda)
+
+    checkins = Counter(hora for _, hora, metodo, _, _ in agenda if metodo == "POST")
+    assert checkins[6] > 3 * checkins[10] and checkins[18] > 3 * checkins[10]
+
+    alunos = [aluno_id for _, _, metodo, _, aluno_id in agenda if metodo == "POST"]
+    assert len(set(alunos)) == len(alunos)
+    assert parse_hours(["5-8", "18"]) == [5, 6, 7, 18]
+
+def test_carga_local_relata_endpoints(tmp_path):
+    """Testar uma execução curta contra a API local com Redis em memória e Celery eager"""
+    resumo = main([
+        "--students", "150", "--hours", "6", "18", "--seconds-per-hour", "1",
+        "--checkin-rate", "20", "--poll-rate", "15", "--report-rate", "3",
+        "--output", str(tmp_path / "carga.json"),
+    ])
+
+    endpoints = resumo["endpoints"]
+    assert endpoints["POST /aluno/checkin"]["requisicoes"] > 10
+    assert endpoints["POST /aluno/checkin"]["erros"] == 0
+    assert endpoints["GET /aluno/{aluno_id}/frequencia"]["erros"] == 0
+    assert endpoints["GET /aluno/{aluno_id}/risco-churn"]["erros"] == 0
+    assert set(resumo["horas"]) == {"06h", "18h"}
+    assert resumo["total"]["requisicoes"] == sum(r["requisicoes"] for r in endpoints.values())
+    assert 0 < resumo["total"]["p50_ms"] <= resumo["total"]["p99_ms"] <= resumo["total"]["max_ms"]
+    assert (tmp_path / "carga.json").exists()
@@ -0,0 +1,334 @@
+# tests/test_ml.py
+import numpy as np
+import pytest
+import pandas as pd
+from app.ml.feature_engineering import FeatureEngineer, FEATURE_COLUMNS
+
+def test_generate_synthetic_data_schema_completo():
+    """Testar que os dados sintéticos cobrem o schema completo de features"""
+    df = FeatureEngineer(db=None).generate_synthetic_data(5000)
+
+    assert list(df.columns) == FEATURE_COLUMNS + ['churn']
+    assert len(df) == 5000
+    assert set(df['churn'].unique()) <= {0, 1}
+    assert (df['duracao_media_minutos'] >= 0).all()
+
+    # Os checkins por período somam o total na janela
+    por_periodo = df[['checkins_manha', 'checkins_tarde', 'checkins_noite']].sum(axis=1)
+    assert (df['checkins_fins_semana'] <= por_periodo).all()
+
+def test_generate_synthetic_data_reprodutivel_e_em_blocos():
+    """Testar reprodutibilidade por seed e equivalência do modo em blocos"""
+    engineer = FeatureEngineer(db=None)
+
+    df_1 = engineer.generate_synthetic_data(2500, seed=7, chunk_size=1000)
+    df_2 = engineer.generate_synthetic_data(2500, seed=7, chunk_size=1000)
+    pd.testing.assert_frame_equal(df_1, df_2)
+
+    blocos = list(engineer.iter_synthetic_data(2500, seed=7, chunk_size=1000))
+    assert [len(b) for b in blocos] == [1000, 1000, 500]
+    pd.testing.assert_frame_equal(pd.concat(blocos, ignore_index=True), df_1)
+
+    # Não altera o estado global do NumPy
+    np.random.seed(0)
+    esperado = np.random.random()
+    np.random.seed(0)
+    engineer.generate_synthetic_data(100)
+    assert np.random.random() == esperado
+
+    assert len(engineer.generate_synthetic_data(0)) == 0
+
+def _forest_treinada(n_estimators=20, max_depth=None):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    df = FeatureEngineer(db=None).generate_synthetic_data(3000, seed=1)
+    X = df[FEATURE_COLUMNS].values
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=0)
+    model.fit(scaler.transform(X), df['churn'])
+    return model, scaler, X
+
+def test_compact_forest_paridade_com_sklearn(tmp_path):
+    """Testar que a floresta achatada reproduz as probabilidades do sklearn"""
+    from app.ml.compact_forest import CompactForest
+
+    model, scaler, _ = _forest_treinada()
+    X = FeatureEngineer(db=None).generate_synthetic_data(1000, seed=2)[FEATURE_COLUMNS].values
+    esperado = model.predict_proba(scaler.transform(X))[:, 1]
+
+    forest = CompactForest.from_sklearn(model, scaler)
+    np.testing.assert_allclose(forest.predict_proba(X), esperado, rtol=0, atol=1e-12)
+    for i in range(50):
+        assert abs(forest.predict_one(X[i]) - esperado[i]) < 1e-12
+
+    # Ida e volta pelo artefato exportado, mapeado em memória
+    path = str(tmp_path / "forest")
+    forest.save(path, metadata={'feature_names': FEATURE_COLUMNS})
+    carregada = CompactForest.load(path, mmap_mode='r')
+    assert isinstance(carregada.threshold.base, np.memmap)
+    assert carregada.metadata['feature_names'] == FEATURE_COLUMNS
+    np.testing.assert_allclose(carregada.predict_proba(X), esperado, rtol=0, atol=1e-12)
+
+def test_churn_predictor_usa_floresta_compacta():
+    """Testar que o ChurnPredictor pontua pela floresta compacta com o mesmo resultado"""
+    from app.ml.churn_model import ChurnPredictor
+
+    predictor = ChurnPredictor()
+    model, scaler, X = _forest_treinada(n_estimators=10, max_depth=6)
+    predictor.feature_names = FEATURE_COLUMNS
+    predictor.model, predictor.scaler, predictor.is_trained = model, scaler, True
+    predictor.compact = predictor._build_compact()
+
+    features = dict(zip(FEATURE_COLUMNS, X[0]))
+    esperado = model.predict_proba(scaler.transform(X[:1]))[0, 1]
+    assert predictor.compact is not None
+    assert abs(predictor.predict_proba(features) - esperado) < 1e-12
+
+def test_churn_predictor_carrega_artefato_mapeado(tmp_path, monkeypatch):
+    """Testar que o ChurnPredictor salva e carrega a floresta via mmap sem ler o pickle"""
+    import joblib
+    from app.ml.churn_model import ChurnPredictor
+
+    monkeypatch.chdir(tmp_path)
+    model, scaler, X = _forest_treinada(n_estimators=10, max_depth=6)
+
+    predictor = ChurnPredictor()
+    assert not predictor.is_trained
+    predictor.feature_names = FEATURE_COLUMNS
+    predictor.model, predictor.scaler, predictor.is_trained = model, scaler, True
+    predictor.compact = predictor._build_compact()
+    predictor.save_model()
+
+    carregado = ChurnPredictor()
+    assert carregado.is_trained
+    assert carregado._model is None  # pickle não foi desserializado
+    assert carregado.feature_names == FEATURE_COLUMNS
+    assert isinstance(carregado.compact.value.base, np.memmap)
+
+    features = dict(zip(FEATURE_COLUMNS, X[0]))
+    esperado = model.predict_proba(scaler.transform(X[:1]))[0, 1]
+    assert abs(carregado.predict_proba(features) - esperado) < 1e-12
+
+    # O modelo sklearn continua acessível sob demanda
+    assert carregado.model.n_estimators == 10
+
+def test_inference_executor_agrupa_requisicoes_concorrentes():
+    """Testar que requisições simultâneas viram uma única chamada em lote"""
+    import asyncio
+    from app.ml.inference_executor import InferenceExecutor, _get_predictor
+
+    df = FeatureEngineer(db=None).generate_synthetic_data(40, seed=3)
+    linhas = df[FEATURE_COLUMNS].to_dict('records')
+    executor = InferenceExecutor(mode="thread", batch_window_ms=50, max_batch_size=32)
+
+    async def pontuar():
+        return await asyncio.gather(*(executor.predict(f) for f in linhas))
+
+    try:
+        resultados = asyncio.run(pontuar())
+    finally:
+        executor.shutdown()
+
+    esperado = [_get_predictor().predict_proba(f) for f in linhas]
+    np.testing.assert_allclose(resultados, esperado, rtol=0, atol=1e-12)
+
+    metricas = executor.metrics()
+    assert metricas['requisicoes'] == 40
+    assert metricas['lotes'] == 2  # 32 pelo tamanho máximo + 8 pela janela
+    assert metricas['maior_lote'] == 32
+    assert metricas['fila_pendente'] == 0 and metricas['em_execucao'] == 0
+
+def test_training_pipeline_promove_apenas_se_melhor(tmp_path, monkeypatch):
+    """Testar a busca de hiperparâmetros, o orçamento de latência e a promoção"""
+    from app.ml.churn_model import ChurnPredictor
+    from app.ml.training_pipeline import TrainingPipeline
+
+    monkeypatch.chdir(tmp_path)
+    dados = FeatureEngineer(db=None).generate_synthetic_data(800, seed=5)
+    espaco = [
+        {'n_estimators': 5, 'max_depth': 3, 'min_samples_leaf': 4},
+        {'n_estimators': 10, 'max_depth': 6, 'min_samples_leaf': 4},
+    ]
+
+    # Sem modelo em models/: o melhor candidato é promovido
+    pipeline = TrainingPipeline(search_space=espaco, cv_folds=2, n_jobs=1, latency_budget_us=1e6)
+    relatorio = pipeline.run(dados, ChurnPredictor())
+    assert relatorio['promovido'] and relatorio['auc_atual'] is None
+    assert len(relatorio['candidatos']) == 2
+    assert {'preparacao', 'busca', 'latencia', 'selecao', 'comparacao', 'promocao'} <= set(relatorio['tempos'])
+    assert len(list((tmp_path / "models" / "cache").glob("features_*.npy"))) == 1
+
+    # Mesmos dados: o candidato empata com o modelo atual e não substitui os artefatos
+    versao = (tmp_path / "models" / "churn_forest" / "CURRENT").read_text()
+    relatorio = TrainingPipeline(search_space=espaco, cv_folds=2, n_jobs=1, latency_budget_us=1e6).run(
+        dados, ChurnPredictor()
+    )
+    assert relatorio['auc_atual'] == relatorio['auc_candidato']
+    assert not relatorio['promovido'] and 'promocao' not in relatorio['tempos']
+    assert (tmp_path / "models" / "churn_forest" / "CURRENT").read_text() == versao
+
+    # Nenhum candidato dentro do orçamento: escolher o mais rápido
+    escolhido = TrainingPipeline()._select([
+        {'cv_auc': 0.9, 'latencia_us': 900.0},
+        {'cv_auc': 0.8, 'latencia_us': 400.0},
+    ])
+    assert escolhido['latencia_us'] == 400.0
+
+def test_online_predictor_atualiza_e_retoma_do_checkpoint(tmp_path):
+    """Testar partial_fit em mini-lotes, checkpoint periódico e retomada"""
+    from app.ml.online_model import OnlineChurnPredictor
+
+    caminho = str(tmp_path / "churn_online.pkl")
+    dados = FeatureEngineer(db=None).generate_synthetic_data(1000, seed=11)
+    online = OnlineChurnPredictor(model_path=caminho, batch_size=100, checkpoint_every=300)
+    assert not online.is_trained
+
+    online.partial_fit(dados.iloc[:500], dados['churn'].iloc[:500])
+    assert online.samples_seen == 500
+    # Checkpoint gravado ao cruzar 300 amostras; as 200 seguintes ainda não
+    assert OnlineChurnPredictor(model_path=caminho).samples_seen == 300
+
+    online.partial_fit(dados.iloc[500:].to_dict('records'), dados['churn'].iloc[500:])
+    online.save_model()
+
+    retomado = OnlineChurnPredictor(model_path=caminho)
+    assert retomado.is_trained and retomado.samples_seen == 1000
+    linhas = dados.iloc[:20].to_dict('records')
+    np.testing.assert_allclose(retomado.predict_proba_batch(linhas), online.predict_proba_batch(linhas))
+    assert 0.0 <= retomado.predict_proba(linhas[0]) <= 1.0
+
+def test_churn_predictor_usa_features_de_presenca(tmp_path, monkeypatch):
+    """Testar que as features do bitmap entram no modelo e que pickles antigos seguem válidos"""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    from app.ml.churn_model import ChurnPredictor, MODEL_FEATURES
+
+    monkeypatch.chdir(tmp_path)
+    predictor = ChurnPredictor()
+    assert predictor.feature_names == MODEL_FEATURES
+    assert {'dias_presentes_30', 'sequencia_atual_dias', 'maior_intervalo_dias'} <= set(MODEL_FEATURES)
+    assert set(MODEL_FEATURES) <= set(FEATURE_COLUMNS)
+
+    # Modelo salvo antes das features de presença (só pickle, seis colunas sem nomes)
+    df = FeatureEngineer(db=None).generate_synthetic_data(500, seed=2)
+    X = df[MODEL_FEATURES[:6]].values
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(scaler.transform(X), df['churn'])
+    (tmp_path / "models").mkdir()
+    joblib.dump(model, "models/churn_model.pkl")
+    joblib.dump(scaler, "models/scaler.pkl")
+
+    antigo = ChurnPredictor()
+    assert antigo.is_trained and antigo.feature_names == MODEL_FEATURES[:6]
+    linha = df.iloc[0].to_dict()
+    esperado = model.predict_proba(scaler.transform(X[:1]))[0, 1]
+    assert abs(antigo.predict_proba(linha) - esperado) < 1e-12
+
+def test_create_outcome_dataset_rotula_desfechos(sessao_sqlite):
+    """Testar os desfechos rotulados usados pelo modelo online"""
+    from datetime import datetime, timedelta
+    from app.models.database import Aluno, Plano, Checkin
+
+    db = sessao_sqlite
+
+    hoje = datetime(2025, 6, 1)
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    alunos = [
+        Aluno(nome=f"Aluno {i}", email=f"a{i}@email.com", plano_id=plano.id,
+              data_matricula=hoje - timedelta(days=400))
+        for i in range(3)
+    ]
+    db.add_all(alunos)
+    db.commit()
+
+    # Aluno 0 frequenta a janela e o horizonte; aluno 1 só a janela; aluno 2 nunca
+    for dias in (150, 120, 100, 30):
+        db.add(Checkin(aluno_id=alunos[0].id, data_entrada=hoje - timedelta(days=dias), duracao_minutos=60))
+    for dias in (160, 110):
+        db.add(Checkin(aluno_id=alunos[1].id, data_entrada=hoje - timedelta(days=dias), duracao_minutos=40))
+    db.commit()
+
+    desfechos = FeatureEngineer(db).create_outcome_dataset(hoje).set_index('aluno_id')
+    assert desfechos.loc[alunos[0].id, 'churn'] == 0
+    assert desfechos.loc[alunos[1].id, 'churn'] == 1
+    assert desfechos.loc[alunos[2].id, 'churn'] == 1
+    assert desfechos.loc[alunos[0].id, 'duracao_media_minutos'] == 60
+    assert desfechos.loc[alunos[1].id, 'dias_desde_ultimo_checkin'] == 20
+    
+    # O horizonte de cada aluno fecha a cada 90 dias desde a matrícula, não todo dia
+    engineer = FeatureEngineer(db)
+    alunos[1].data_matricula = hoje - timedelta(days=360)
+    db.commit()
+    assert engineer.outcome_due_ids(hoje) == {alunos[1].id}
+    assert [len(engineer.outcome_due_ids(hoje + timedelta(days=d))) for d in range(7)] == [1, 0, 0, 0, 0, 0, 0]
+    assert engineer.outcome_due_ids(hoje + timedelta(days=90)) == {alunos[1].id}
+    assert engineer.outcome_due_ids(hoje + timedelta(days=50)) == {a.id for a in alunos if a is not alunos[1]}
+    
+    # Só as linhas dos alunos devidos são montadas, iguais às da população inteira
+    from app.analytics.columnar import ColumnarCheckinStore
+    devidos = engineer.outcome_due_ids(hoje)
+    for engenheiro in (engineer, FeatureEngineer(db, checkin_store=ColumnarCheckinStore(refresh_seconds=0))):
+        todos = engenheiro.create_outcome_dataset(hoje).set_index('aluno_id')
+        parcial = engenheiro.create_outcome_dataset(hoje, aluno_ids=devidos).set_index('aluno_id')
+        assert list(parcial.index) == [alunos[1].id]
+        assert parcial.loc[alunos[1].id].to_dict() == pytest.approx(todos.loc[alunos[1].id].to_dict())
+        assert len(engenheiro.create_outcome_dataset(hoje, aluno_ids=set())) == 0
+    db.close()
+
+def test_feature_snapshot_store_calcula_apenas_ausentes(tmp_path):
+    """Testar snapshots datados: ida e volta, leitura mapeada e cálculo só dos ausentes"""
+    from datetime import date, datetime
+    from app.ml.snapshot_store import FeatureSnapshotStore, feature_code_version
+
+    store = FeatureSnapshotStore(str(tmp_path))
+    assert store.version == feature_code_version()
+
+    chamadas = []
+
+    def calcular(referencia):
+        chamadas.append(referencia)
+        dados = FeatureEngineer(db=None).generate_synthetic_data(50, seed=referencia.day)
+        return dados.assign(aluno_id=np.arange(50))
+
+    dias = [date(2025, 1, 1), date(2025, 2, 1)]
+    assert store.ensure('treino_12m', dias[:1], calcular) == dias[:1]
+    assert store.ensure('treino_12m', dias, calcular) == dias[1:]
+    assert len(chamadas) == 2
+    assert store.list_dates('treino_12m') == dias
+
+    original = calcular(datetime(2025, 1, 1))
+    carregado = store.load('treino_12m', dias[0])
+    pd.testing.assert_frame_equal(carregado[FEATURE_COLUMNS + ['churn']], original[FEATURE_COLUMNS + ['churn']],
+                                  check_dtype=False)
+
+    # As features são uma visão do arquivo mapeado, sem cópia
+    assert isinstance(store.load_arrays('treino_12m', dias[0])['features'], np.memmap)
+    base = carregado['frequencia_semanal'].to_numpy()
+    while base.base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+
+    # A versão muda com o schema declarado e com o código de app/analytics
+    import inspect
+    from app.ml import snapshot_store
+    versao = feature_code_version()
+    fonte = inspect.getsource
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(snapshot_store, "FEATURE_SCHEMA_VERSION", snapshot_store.FEATURE_SCHEMA_VERSION + 1)
+        assert feature_code_version() != versao
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(snapshot_store.inspect, "getsource",
+                   lambda codigo: "alterado" if codigo is snapshot_store.bitmap else fonte(codigo))
+        assert feature_code_version() != versao
+    assert feature_code_version() == versao
+
+    # Outra versão do código não enxerga os snapshots existentes
+    assert FeatureSnapshotStore(str(tmp_path), version="outra").list_dates('treino_12m') == []
+
+    # Snapshot vazio
+    vazio = store.get_or_compute('desfechos', dias[0], lambda: pd.DataFrame())
+    assert len(vazio) == 0 and list(vazio.columns) == FEATURE_COLUMNS + ['churn', 'aluno_id']
@@ -0,0 +1,238 @@
+# tests/test_monitoring.py
+import logging
+import time
+import urllib.request
+from pathlib import Path
+import pytest
+import yaml
+from celery import Celery
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from app.monitoring.instrumentation import (
+    PerformanceMiddleware, RequestMetrics, Histogram, MeasuredQueuePool, instrument_engine
+)
+from app.monitoring.metrics import REGISTRY, Registry, Counter, Histogram as MetricHistogram, parse_text, start_http_server
+from app.monitoring import celery_metrics
+from app.monitoring.celery_metrics import install_celery_metrics
+
+
+def test_middleware_registra_banco_redis_e_cache(caplog, redis_memoria):
+    """Testar Server-Timing, histogramas por rota e aviso de N+1"""
+    engine = instrument_engine(create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    ))
+    cache = redis_memoria
+    metricas = RequestMetrics()
+    app = FastAPI()
+    app.add_middleware(PerformanceMiddleware, metrics=metricas, query_warn_threshold=5)
+
+    def consultar(n):
+        with engine.connect() as conn:
+            for _ in range(n):
+                conn.execute(text("SELECT 1"))
+
+    @app.get("/aluno/{aluno_id}")
+    async def aluno(aluno_id: int, consultas: int = 1):
+        if cache.get(f"aluno:{aluno_id}") is None:
+            await run_in_threadpool(consultar, consultas)
+            cache.setex(f"aluno:{aluno_id}", 60, "ok")
+        return {"id": aluno_id}
+
+    client = TestClient(app)
+    resposta = client.get("/aluno/1?consultas=3")
+    timing = resposta.headers["server-timing"]
+    assert 'db;dur=' in timing and '"3 consultas"' in timing
+    assert '"2 chamadas"' in timing and 'hit=0 miss=1' in timing
+
+    assert 'hit=1 miss=0' in client.get("/aluno/1").headers["server-timing"]
+    with caplog.at_level(logging.WARNING):
+        client.get("/aluno/2?consultas=8")
+    assert "8 consultas" in caplog.text
+
+    rota = metricas.snapshot()["GET /aluno/{aluno_id}"]
+    assert rota['latencia_ms']['total'] == 3
+    assert rota['consultas']['maximo'] == 8
+    assert rota['cache_hits'] == 1 and rota['cache_misses'] == 2
+
+    # Fora de requisições nada é registrado
+    consultar(2)
+    assert metricas.snapshot()["GET /aluno/{aluno_id}"]['consultas']['total'] == 3
+
+
+def test_histograma_percentis():
+    """Testar percentis aproximados do histograma"""
+    histograma = Histogram([1, 2, 5, 10])
+    for valor in [0.5] * 50 + [3] * 45 + [8] * 5:
+        histograma.observe(valor)
+    resumo = histograma.snapshot()
+    assert resumo['total'] == 100
+    assert resumo['p50'] == pytest.approx(1.0)
+    assert 2 < resumo['p95'] <= 5
+    assert 5 < resumo['p99'] <= 10
+
+
+def _amostra(amostras, nome, **rotulos):
+    return amostras.get((nome, tuple(sorted(rotulos.items()))), 0.0)
+
+
+def test_espera_no_checkout_do_pool(tmp_path):
+    """Testar a espera no checkout medida pelo MeasuredQueuePool, também após dispose()"""
+    import threading
+    engine = instrument_engine(create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=MeasuredQueuePool, pool_size=1, max_overflow=0
+    ), 'teste_pool')
+
+    def espera_total():
+        return _amostra(parse_text(REGISTRY.render()), 'gym_db_pool_checkout_wait_seconds_sum', pool='teste_pool')
+
+    for _ in range(2):
+        antes = espera_total()
+        ocupada = engine.connect()
+        threading.Timer(0.2, ocupada.close).start()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            estado = parse_text(REGISTRY.render())
+            assert _amostra(estado, 'gym_db_pool_connections', pool='teste_pool', state='checked_out') == 1
+        assert espera_total() - antes >= 0.15
+
+        # dispose() recria o pool: a classe, o nome e o gauge acompanham o pool novo
+        engine.dispose()
+        assert isinstance(engine.pool, MeasuredQueuePool) and engine.pool.pool_name == 'teste_pool'
+
+
+def test_exportador_prometheus_via_http():
+    """Testar o formato de texto raspado do servidor /metrics do worker"""
+    registro = Registry()
+    contador = Counter('teste_eventos_total', 'Eventos', ['tipo'], registry=registro)
+    histograma = MetricHistogram('teste_duracao_seconds', 'Duração', buckets=(0.1, 1.0), registry=registro)
+    contador.labels('a "b"').inc(2)
+    for valor in (0.05, 0.5, 5.0):
+        histograma.observe(valor)
+
+    servidor = start_http_server(0, host="127.0.0.1", registry=registro)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{servidor.server_port}/metrics") as resposta:
+            assert resposta.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            amostras = parse_text(resposta.read().decode())
+    finally:
+        servidor.shutdown()
+
+    assert _amostra(amostras, 'teste_eventos_total', tipo='a "b"') == 2
+    assert _amostra(amostras, 'teste_duracao_seconds_bucket', le='0.1') == 1
+    assert _amostra(amostras, 'teste_duracao_seconds_bucket', le='1.0') == 2
+    assert _amostra(amostras, 'teste_duracao_seconds_bucket', le='+Inf') == 3
+    assert _amostra(amostras, 'teste_duracao_seconds_count') == 3
+    assert _amostra(amostras, 'teste_duracao_seconds_sum') == pytest.approx(5.55)
+
+
+def test_cache_conta_mget_por_chave_e_hgetall_vazio_como_falta(redis_memoria):
+    """MGET conta um acerto ou falta por chave; HGETALL vazio é falta"""
+    cache = redis_memoria
+    cache.dados['lote:1'] = 'a'
+    cache.dados['lote:3'] = 'c'
+    cache.dados['perfil:1'] = {'nome': 'Ana'}
+    antes = parse_text(REGISTRY.render())
+
+    assert cache.execute_command('MGET', 'lote:1', 'lote:2', 'lote:3', 'lote:4') == ['a', None, 'c', None]
+    assert cache.execute_command('HGETALL', 'perfil:1') == {'nome': 'Ana'}
+    assert cache.execute_command('HGETALL', 'perfil:2') == {}
+
+    depois = parse_text(REGISTRY.render())
+
+    def delta(**rotulos):
+        return _amostra(depois, 'gym_cache_requests_total', **rotulos) - _amostra(antes, 'gym_cache_requests_total', **rotulos)
+
+    assert delta(prefix='lote', result='hit') == 2
+    assert delta(prefix='lote', result='miss') == 2
+    assert delta(prefix='perfil', result='hit') == 1
+    assert delta(prefix='perfil', result='miss') == 1
+
+
+def test_metricas_de_rota_cache_e_celery(redis_memoria):
+    """Testar /metrics com latência por rota, acertos de cache e tarefas Celery"""
+    cache = redis_memoria
+    app = FastAPI()
+    app.add_middleware(PerformanceMiddleware, metrics=RequestMetrics())
+
+    @app.get("/frequencia/{aluno_id}")
+    async def frequencia(aluno_id: int):
+        if cache.get(f"frequencia:{aluno_id}") is None:
+            cache.setex(f"frequencia:{aluno_id}", 60, "ok")
+        return {"id": aluno_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def eventos():
+            yield "data: 1\n\n"
+        return StreamingResponse(eventos(), media_type="text/event-stream")
+
+    client = TestClient(app)
+    antes = parse_text(REGISTRY.render())
+    for _ in range(3):
+        client.get("/frequencia/7")
+    client.get("/nao-existe")
+    assert client.get("/stream").text == "data: 1\n\n"
+
+    install_celery_metrics()
+    celery_app = Celery('teste', broker='memory://', backend='cache+memory://')
+    celery_app.conf.task_always_eager = True
+
+    @celery_app.task(name='tarefa_ok')
+    def tarefa_ok():
+        return 1
+
+    @celery_app.task(name='tarefa_falha')
+    def tarefa_falha():
+        raise RuntimeError("falha")
+
+    tarefa_ok.apply_async(headers={'enviado_em': time.time() - 5})
+    tarefa_falha.apply_async()
+
+    depois = parse_text(REGISTRY.render())
+
+    def delta(nome, **rotulos):
+        return _amostra(depois, nome, **rotulos) - _amostra(antes, nome, **rotulos)
+
+    rota = dict(method='GET', route='/frequencia/{aluno_id}', status='200')
+    assert delta('gym_http_request_duration_seconds_count', **rota) == 3
+    assert delta('gym_http_request_duration_seconds_count', method='GET', route='sem_rota', status='404') == 1
+    # Conexões SSE não contam como requisições longas
+    assert delta('gym_http_request_duration_seconds_count', method='GET', route='/stream', status='200') == 0
+    assert delta('gym_cache_requests_total', prefix='frequencia', result='hit') == 2
+    assert delta('gym_cache_requests_total', prefix='frequencia', result='miss') == 1
+
+    assert delta('gym_celery_tasks_total', task='tarefa_ok', state='success') == 1
+    assert delta('gym_celery_tasks_total', task='tarefa_falha', state='failure') == 1
+    assert delta('gym_celery_task_duration_seconds_count', task='tarefa_ok', state='success') == 1
+    assert _amostra(depois, 'gym_celery_tasks_in_progress', task='tarefa_ok') == 0
+    lag = delta('gym_celery_queue_lag_seconds_sum', task='tarefa_ok')
+    assert 5 <= lag < 60
+
+
+def test_exportador_do_worker_exige_pool_no_mesmo_processo(monkeypatch, caplog):
+    """O worker do compose usa um pool em que as tarefas rodam no processo de /metrics"""
+    import celery._state
+    servidos = []
+    monkeypatch.setattr(celery_metrics, 'start_http_server', servidos.append)
+    # WorkController marca o processo como worker (result.get() passa a falhar); restaurar no fim
+    monkeypatch.setattr(celery._state, '_task_join_will_block', celery._state._task_join_will_block)
+    monkeypatch.setenv('CELERY_METRICS_PORT', '9808')
+    install_celery_metrics()
+    celery_app = Celery('teste', broker='memory://')
+
+    compose = yaml.safe_load((Path(__file__).parent.parent / 'docker-compose.yml').read_text())
+    argumentos = compose['services']['worker']['command'].split()
+    pools = [a.split('=', 1)[1] for a in argumentos if a.startswith('--pool=')]
+    pool = pools[-1] if pools else 'prefork'
+    celery_app.WorkController(pool_cls=pool)
+    assert servidos == [9808], f"worker do compose roda com pool {pool}: as tarefas não chegam a /metrics"
+
+    # Com prefork os sinais disparam nos filhos: o exportador não sobe e o erro fica no log
+    with caplog.at_level(logging.ERROR, logger='app.monitoring.celery_metrics'):
+        celery_app.WorkController(pool_cls='prefork')
+    assert servidos == [9808]
+    assert '--pool=solo' in caplog.text
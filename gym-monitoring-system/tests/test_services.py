@@ -1,4 +1,5 @@
 # tests/test_services.py
+import os
 import pytest
 from unittest.mock import Mock
 from app.services.aluno_service import AlunoService
@@ -30,4 +31,965 @@ def test_aluno_service():
         # service.criar_aluno(aluno_data)  # Comentado pois precisa de mock mais complexo
         assert True
     except:
-        assert True  # Aceitar erro por simplicidade nos testes
\ No newline at end of file
+        assert True  # Aceitar erro por simplicidade nos testes
+
+def test_features_aluno_atualizado_a_cada_checkin(sessao_sqlite):
+    """Testar que os agregados incrementais batem com o cálculo a partir do histórico"""
+    from datetime import datetime, timedelta
+    from app.models.database import Aluno, Plano, Checkin, FeaturesAluno
+    from app.services.checkin_service import CheckinService
+    from app.services.churn_service import ChurnService
+    from app.services.features_service import FeaturesAlunoService
+    from app.api.schemas import CheckinCreate
+    
+    db = sessao_sqlite
+    agora = datetime.utcnow()
+    plano = Plano(nome="Anual", valor=120.0, duracao_meses=12)
+    db.add(plano)
+    db.commit()
+    aluno = Aluno(nome="Teste", email="teste@email.com", plano_id=plano.id, data_matricula=agora - timedelta(days=200))
+    db.add(aluno)
+    db.commit()
+    
+    # Histórico anterior à tabela de agregados
+    for dias in (90, 40, 10):
+        db.add(Checkin(aluno_id=aluno.id, data_entrada=agora - timedelta(days=dias, hours=1),
+                       data_saida=agora - timedelta(days=dias), duracao_minutos=60))
+    db.commit()
+    assert db.query(FeaturesAluno).count() == 0
+    
+    # O primeiro checkin cria a linha a partir do histórico; os seguintes somam
+    service = CheckinService(db)
+    checkin = service.criar_checkin(CheckinCreate(aluno_id=aluno.id))
+    service.registrar_saida(checkin.id)
+    service.criar_checkin(CheckinCreate(aluno_id=aluno.id))
+    
+    features = db.query(FeaturesAluno).filter(FeaturesAluno.aluno_id == aluno.id).one()
+    assert features.total_checkins == 5
+    assert features.checkins_com_duracao == 4
+    assert features.soma_duracao_minutos == 180 + checkin.duracao_minutos
+    
+    churn_service = ChurnService(db)
+    rapidas = FeaturesAlunoService(db).obter_features(aluno.id)
+    completas = churn_service._extrair_features(aluno)
+    for nome, valor in completas.items():
+        assert rapidas[nome] == pytest.approx(valor)
+    assert rapidas['checkins_semana_atual'] >= 2
+    assert rapidas['frequencia_recente'] > 0
+    
+    # Presença diária pelo bitmap: dois checkins hoje contam um dia só
+    frequencia = service.obter_frequencia_aluno(aluno.id)
+    assert frequencia.dias_presentes_90 == 3
+    assert frequencia.dias_presentes_7 == 1
+    assert frequencia.sequencia_atual_dias == 1
+    assert sum(frequencia.presencas_por_dia_semana.values()) == 3
+    assert rapidas['dias_presentes_30'] == 2
+    
+    # Divergência (ex.: checkin inserido por fora do serviço) é corrigida pela reconciliação
+    features.total_checkins = 99
+    db.commit()
+    resultado = FeaturesAlunoService(db).reconstruir(batch_size=1)
+    assert resultado == {"alunos": 1, "divergentes": 1}
+    db.refresh(features)
+    assert features.total_checkins == 5
+    assert FeaturesAlunoService(db).reconstruir()["divergentes"] == 0
+    
+    # Sem a linha de agregados, a frequência é calculada dos checkins com o mesmo resultado
+    db.delete(features)
+    db.commit()
+    assert service.obter_frequencia_aluno(aluno.id).model_dump() == frequencia.model_dump()
+    db.close()
+
+def test_varredura_de_risco_pontua_em_lotes(monkeypatch, sessao_sqlite):
+    """Testar a varredura de risco: agregados em lotes, histórico só sem agregados e pontuação em lote"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from app.models.database import Aluno, Plano, Checkin
+    from app.ml.churn_model import ChurnPredictor
+    from app.services.features_service import FeaturesAlunoService
+    from app.workers import tasks
+    
+    db = sessao_sqlite
+    agora = datetime.utcnow()
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    alunos = [Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=plano.id,
+                    data_matricula=agora - timedelta(days=120)) for i in range(5)]
+    alunos.append(Aluno(nome="Inativo", email="inativo@email.com", plano_id=plano.id, ativo=False))
+    db.add_all(alunos)
+    db.commit()
+    for aluno in alunos[:4]:
+        db.add(Checkin(aluno_id=aluno.id, data_entrada=agora - timedelta(days=60)))
+    db.commit()
+    # Agregados para todos menos o último ativo
+    FeaturesAlunoService(db)._reconstruir_alunos([a.id for a in alunos[:4]])
+    db.commit()
+    ids = [a.id for a in alunos]
+    
+    historico = []
+    extrair = tasks.extract_student_features
+    monkeypatch.setattr(tasks, "extract_student_features", lambda db, aluno: historico.append(aluno.id) or extrair(db, aluno))
+    lotes = []
+    
+    class _Preditor(ChurnPredictor):
+        def predict_proba(self, features_dict):
+            raise AssertionError("pontuação deve ser em lote")
+        
+        def predict_proba_batch(self, features_list):
+            lotes.append(len(features_list))
+            return super().predict_proba_batch(features_list)
+    
+    alertas = []
+    monkeypatch.setattr(tasks, "create_predictor", _Preditor)
+    monkeypatch.setattr(tasks, "get_read_db_session", lambda: db)
+    monkeypatch.setattr(tasks.send_retention_alerts, "delay", lambda alunos_risco, nivel: alertas.append((nivel, alunos_risco)))
+    features_ativos = FeaturesAlunoService.features_ativos
+    monkeypatch.setattr(FeaturesAlunoService, "features_ativos", lambda self, **kwargs: features_ativos(self, batch_size=2))
+    consultas = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: consultas.append(args[2]))
+    
+    resultado = tasks.identify_at_risk_students()
+    
+    assert historico == [ids[4]]
+    assert lotes == [2, 2, 1]
+    # Uma consulta por lote (e a do lote vazio que encerra a paginação) fora o histórico do aluno sem agregados
+    assert sum("FROM alunos LEFT OUTER JOIN features_aluno" in c for c in consultas) == 4
+    pontuados = [a for _, lista in alertas for a in lista]
+    assert resultado["alunos_risco_alto"] + resultado["alunos_risco_medio"] == len(pontuados)
+    assert all(isinstance(a["probabilidade"], float) for a in pontuados)
+    assert ids[5] not in {a["aluno_id"] for a in pontuados}
+
+def test_catalogo_de_planos_em_memoria(sessao_sqlite, redis_memoria):
+    """Testar carga única, invalidação por escrita e aviso a outro processo por pub/sub"""
+    import time
+    from datetime import datetime, timedelta
+    from sqlalchemy import event, update
+    from app.models.database import Aluno, Plano, Checkin
+    from app.ml.feature_engineering import FeatureEngineer
+    from app.services.plan_catalog import PlanCatalog, plan_catalog
+    
+    db = sessao_sqlite
+    agora = datetime.utcnow()
+    planos = [Plano(nome="Mensal", valor=100.0, duracao_meses=1), Plano(nome="Anual", valor=900.0, duracao_meses=12)]
+    db.add_all(planos)
+    db.commit()
+    for i in range(20):
+        aluno = Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=planos[i % 2].id,
+                      data_matricula=agora - timedelta(days=200))
+        db.add(aluno)
+        db.flush()
+        db.add(Checkin(aluno_id=aluno.id, data_entrada=agora - timedelta(days=30 + i)))
+    db.commit()
+    
+    consultas_planos = []
+    
+    @event.listens_for(db.get_bind(), "before_cursor_execute")
+    def _contar(conn, cursor, statement, *args):
+        if "FROM planos" in statement:
+            consultas_planos.append(statement)
+    
+    # Dataset de treino: planos lidos uma vez para todos os alunos
+    dataset = FeatureEngineer(db).create_training_dataset(months_back=6, end_date=agora)
+    assert len(dataset) == 20
+    assert set(dataset['plano_valor']) == {100.0, 900.0}
+    assert len(consultas_planos) == 1
+    FeatureEngineer(db).create_training_dataset(months_back=6, end_date=agora)
+    assert len(consultas_planos) == 1
+    
+    # Escrita pelo ORM (inclusive em massa) invalida o catálogo no commit
+    planos[0].valor = 120.0
+    db.commit()
+    assert plan_catalog.get(db, planos[0].id).valor == 120.0
+    db.execute(update(Plano).where(Plano.id == planos[1].id).values(valor=950.0))
+    db.commit()
+    assert plan_catalog.get(db, planos[1].id).valor == 950.0
+    assert plan_catalog.get(db, None) is None
+    
+    # Dois processos: o que escreve publica a versão nova, o outro descarta a cópia
+    redis = redis_memoria
+    escritor, leitor = PlanCatalog(), PlanCatalog(check_seconds=3600)
+    escritor.connect(redis, listen=False)
+    leitor.connect(redis)
+    assert leitor.get(db, planos[0].id).valor == 120.0
+    for _ in range(100):
+        if redis.inscritos:
+            break
+        time.sleep(0.01)
+    escritor.publish_change()
+    assert redis.get("planos:versao") == 1
+    for _ in range(100):
+        if leitor._planos is None:
+            break
+        time.sleep(0.01)
+    assert leitor._planos is None
+    
+    # Sem o listener, a versão no Redis é conferida a cada check_seconds
+    conferido = PlanCatalog(check_seconds=0)
+    conferido.connect(redis, listen=False)
+    conferido.get(db, planos[0].id)
+    carregados = len(consultas_planos)
+    conferido.get(db, planos[0].id)
+    assert len(consultas_planos) == carregados
+    escritor.publish_change()
+    conferido.get(db, planos[0].id)
+    assert len(consultas_planos) == carregados + 1
+    db.close()
+
+def test_importacao_de_alunos_em_massa(sessao_sqlite):
+    """Testar validação por conjunto, ON CONFLICT, erros por linha e o endpoint em NDJSON"""
+    import json
+    import main
+    from fastapi.testclient import TestClient
+    from app.models.database import Aluno, Plano, get_db
+    from app.services.importacao_service import ImportacaoAlunosService
+    
+    db = sessao_sqlite
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    db.add(Aluno(nome="Existente", email="existente@franquia.com", plano_id=plano.id))
+    db.commit()
+    
+    csv_texto = (
+        "nome,email,telefone,data_nascimento,plano_id\n"
+        f"Ana,ana@Franquia.COM,11999990000,1990-05-01,{plano.id}\n"
+        f"Bruno,bruno@franquia.com,,,{plano.id}\n"
+        f"Existente,existente@franquia.com,,,{plano.id}\n"
+        f"Sem Email,,,,{plano.id}\n"
+        "Sem Plano,semplano@franquia.com,,,999\n"
+        f"Ana de novo,ana@franquia.com,,,{plano.id}\n"
+        f"Data,data@franquia.com,,31/12/1990,{plano.id}\n"
+        f"Carla,carla@dominio-invalido,,,{plano.id}\n"
+    )
+    eventos = list(ImportacaoAlunosService(db, chunk_size=3).importar(csv_texto.splitlines(keepends=True), 'csv'))
+    erros = {e['linha']: e['erro'] for e in eventos if e['tipo'] == 'erro'}
+    assert erros == {
+        4: "Email já cadastrado",
+        5: erros[5],
+        6: "Plano não encontrado",
+        7: "Email repetido no arquivo (linha 2)",
+        8: "data_nascimento inválida (use AAAA-MM-DD)",
+        9: erros[9],
+    }
+    assert erros[5].startswith("Email inválido") and erros[9].startswith("Email inválido")
+    assert [e['linhas'] for e in eventos if e['tipo'] == 'progresso'] == [3, 6, 8]
+    assert eventos[-1]['tipo'] == 'resumo'
+    assert (eventos[-1]['linhas'], eventos[-1]['importados'], eventos[-1]['erros']) == (8, 2, 6)
+    
+    ana = db.query(Aluno).filter(Aluno.email == "ana@franquia.com").one()
+    assert ana.telefone == "11999990000" and ana.data_nascimento.year == 1990 and ana.ativo
+    assert db.query(Aluno).count() == 3
+    
+    # Endpoint: NDJSON na entrada e na saída, com autenticação
+    def get_db_teste():
+        yield db
+    main.app.dependency_overrides[get_db] = get_db_teste
+    try:
+        client = TestClient(main.app)
+        corpo = "\n".join([
+            json.dumps({"nome": "Davi", "email": "davi@franquia.com", "plano_id": plano.id}),
+            "{quebrado",
+            json.dumps({"nome": "Bruno", "email": "bruno@franquia.com", "plano_id": plano.id}),
+        ])
+        cabecalhos = {"Authorization": "Bearer valid_token", "Content-Type": "application/x-ndjson"}
+        resposta = client.post("/alunos/importar", content=corpo, headers=cabecalhos)
+        assert resposta.status_code == 200
+        assert resposta.headers["content-type"].startswith("application/x-ndjson")
+        linhas = [json.loads(linha) for linha in resposta.text.splitlines()]
+        assert [(e['linha'], e['erro'][:12]) for e in linhas if e['tipo'] == 'erro'] == [
+            (2, "JSON inválid"), (3, "Email já cad")
+        ]
+        assert linhas[-1]['importados'] == 1
+        
+        assert client.post("/alunos/importar?formato=xml", content="", headers=cabecalhos).status_code == 400
+        assert client.post("/alunos/importar", content=corpo).status_code in (401, 403)
+        
+        # Corpo em blocos: BOM e caracteres multibyte partidos entre blocos
+        texto = "\ufeffnome,email,plano_id\n" + f"João,joao@franquia.com,{plano.id}\n"
+        dados = texto.encode("utf-8")
+        blocos = [dados[i:i + 2] for i in range(0, len(dados), 2)]
+        cabecalhos_csv = {"Authorization": "Bearer valid_token", "Content-Type": "text/csv"}
+        resposta = client.post("/alunos/importar", content=iter(blocos), headers=cabecalhos_csv)
+        assert json.loads(resposta.text.splitlines()[-1])['importados'] == 1
+        assert db.query(Aluno).filter(Aluno.email == "joao@franquia.com").one().nome == "João"
+    finally:
+        main.app.dependency_overrides.pop(get_db, None)
+    db.close()
+
+def test_linhas_do_corpo_em_blocos():
+    """Testar a decodificação incremental do corpo da importação"""
+    from app.services.importacao_service import iter_linhas
+    
+    dados = '\ufeffa,"b\nc"\r\nçã,1\nfim'.encode("utf-8")
+    blocos = [dados[i:i + 1] for i in range(len(dados))]
+    assert list(iter_linhas(blocos)) == ['a,"b\n', 'c"\r\n', 'çã,1\n', 'fim']
+    assert list(iter_linhas([dados])) == list(iter_linhas(blocos))
+    assert list(iter_linhas([])) == []
+
+def _alunos_para_copy():
+    from datetime import datetime
+    agora = datetime(2024, 1, 2, 3, 4, 5, 678000)
+    return [
+        {'nome': 'Ana, "A"', 'email': 'ana@franquia.com', 'telefone': None, 'data_nascimento': None,
+         'plano_id': 1, 'data_matricula': agora, 'ativo': True, 'created_at': agora, 'updated_at': agora},
+        {'nome': 'Bruno', 'email': 'bruno@franquia.com', 'telefone': '11999990000',
+         'data_nascimento': datetime(1990, 5, 1), 'plano_id': 2, 'data_matricula': agora,
+         'ativo': False, 'created_at': agora, 'updated_at': agora},
+    ]
+
+def test_importacao_copy_envia_csv_ao_postgres():
+    """Testar o CSV do COPY (NULL, booleanos, aspas) com um cursor DBAPI falso"""
+    import csv
+    import io
+    from app.services.importacao_service import ImportacaoAlunosService, COLUNAS
+    
+    class Cursor:
+        def __init__(self):
+            self.comandos, self.copiado = [], None
+        def __enter__(self):
+            return self
+        def __exit__(self, *erro):
+            return False
+        def execute(self, sql):
+            self.comandos.append(sql)
+        def copy_expert(self, sql, arquivo):
+            self.comandos.append(sql)
+            self.copiado = arquivo.read()
+        def fetchall(self):
+            return [('ana@franquia.com',)]
+    
+    class Conexao:
+        def __init__(self):
+            self.ultimo = Cursor()
+        def cursor(self):
+            return self.ultimo
+    
+    conexao = Conexao()
+    inseridos = ImportacaoAlunosService(Mock())._inserir_copy(conexao, _alunos_para_copy())
+    assert inseridos == {'ana@franquia.com'}
+    
+    cursor = conexao.ultimo
+    assert cursor.comandos[0].startswith("CREATE TEMP TABLE IF NOT EXISTS alunos_importacao")
+    assert cursor.comandos[1] == f"COPY alunos_importacao ({', '.join(COLUNAS)}) FROM STDIN WITH (FORMAT csv)"
+    assert "ON CONFLICT (email) DO NOTHING RETURNING email" in cursor.comandos[2]
+    
+    # NULL no COPY csv é o campo vazio sem aspas; booleanos e datas em texto que o PostgreSQL aceita
+    linhas = cursor.copiado.splitlines()
+    assert linhas[0] == '"Ana, ""A""",ana@franquia.com,,,1,2024-01-02 03:04:05.678000,True,' \
+        '2024-01-02 03:04:05.678000,2024-01-02 03:04:05.678000'
+    registros = list(csv.reader(io.StringIO(cursor.copiado)))
+    assert [dict(zip(COLUNAS, r))['ativo'] for r in registros] == ['True', 'False']
+    assert dict(zip(COLUNAS, registros[1]))['data_nascimento'] == '1990-05-01 00:00:00'
+
+@pytest.mark.skipif(not os.getenv("DATABASE_URL", "").startswith("postgresql"),
+                    reason="COPY só roda com DATABASE_URL apontando para o PostgreSQL")
+def test_importacao_copy_no_postgres():
+    """Testar o COPY de verdade: NULL, booleanos e emails já cadastrados"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.models.database import Base, Aluno, Plano
+    from app.services.importacao_service import ImportacaoAlunosService
+    
+    engine = create_engine(os.environ["DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        planos = [Plano(nome="Copy 1", valor=1.0, duracao_meses=1), Plano(nome="Copy 2", valor=1.0, duracao_meses=1)]
+        db.add_all(planos)
+        db.commit()
+        alunos = _alunos_para_copy()
+        for aluno, plano in zip(alunos, planos):
+            aluno['plano_id'] = plano.id
+            aluno['email'] = f"copy-{plano.id}-{aluno['email']}"
+        
+        servico = ImportacaoAlunosService(db)
+        assert servico._inserir(alunos) == {a['email'] for a in alunos}
+        assert servico._inserir(alunos) == set()
+        
+        gravados = {a.email: a for a in db.query(Aluno).filter(Aluno.email.in_([a['email'] for a in alunos]))}
+        ana, bruno = (gravados[a['email']] for a in alunos)
+        assert ana.telefone is None and ana.data_nascimento is None and ana.ativo is True
+        assert ana.nome == 'Ana, "A"' and bruno.ativo is False
+    finally:
+        db.query(Aluno).filter(Aluno.plano_id.in_([p.id for p in planos])).delete(synchronize_session=False)
+        db.query(Plano).filter(Plano.id.in_([p.id for p in planos])).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+def test_eventos_de_catraca_idempotentes(monkeypatch, sessao_sqlite, nova_sessao_sqlite, redis_memoria):
+    """Testar repetições de entrada/saída pela coluna única, pelo Redis e no lote"""
+    import main
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from app.models.database import Aluno, Plano, Checkin, get_db
+    from app.services.checkin_service import CheckinService
+    from app.services.idempotencia import IdempotencyCache
+    from app.analytics.columnar import ColumnarCheckinStore
+    from app.workers import tasks
+    
+    db = sessao_sqlite
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    alunos = [Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=plano.id) for i in range(3)]
+    db.add_all(alunos)
+    db.commit()
+    service = CheckinService(db)
+    
+    # Sem Redis: a coluna única devolve o original, inclusive depois da saída
+    checkin, criado = service.registrar_entrada(alunos[0].id, "catraca-1:100")
+    assert criado
+    assert service.registrar_entrada(alunos[0].id, "catraca-1:100") == (checkin, False)
+    saida, criado = service.registrar_saida_aluno(alunos[0].id, "catraca-1:101")
+    assert criado and saida.id == checkin.id and saida.data_saida is not None
+    assert service.registrar_entrada(alunos[0].id, "catraca-1:100") == (checkin, False)
+    assert service.registrar_saida_aluno(alunos[0].id, "catraca-1:101") == (checkin, False)
+    with pytest.raises(ValueError, match="não possui checkin ativo"):
+        service.registrar_saida_aluno(alunos[0].id, "catraca-1:102")
+    assert db.query(Checkin).count() == 1
+    
+    # Lote com o cache: repetições no mesmo lote e em lotes seguintes
+    redis = redis_memoria
+    pipelines = []
+    pipeline = redis.pipeline
+    redis.pipeline = lambda **kwargs: pipelines.append(kwargs) or pipeline(**kwargs)
+    cache = IdempotencyCache(redis, ttl_seconds=60)
+    eventos = [
+        {"tipo": "entrada", "aluno_id": alunos[1].id, "chave_idempotencia": "c2:1"},
+        {"tipo": "entrada", "aluno_id": alunos[1].id, "chave_idempotencia": "c2:1"},
+        {"tipo": "entrada", "aluno_id": alunos[2].id},
+        {"tipo": "saida", "aluno_id": alunos[1].id, "chave_idempotencia": "c2:2"},
+        {"tipo": "entrada", "aluno_id": 999, "chave_idempotencia": "c2:3"},
+    ]
+    resultados, criados = service.registrar_eventos(eventos, cache)
+    assert [r['status'] for r in resultados] == ['criado', 'repetido', 'criado', 'criado', 'erro']
+    assert resultados[0]['checkin'] == resultados[1]['checkin']
+    assert resultados[4]['erro'] == "Aluno não encontrado"
+    assert len(criados) == 2
+    # Uma ida ao Redis por tipo para gravar os resultados do lote
+    assert len(pipelines) == 2 and redis.get("idem:entrada:c2:1") is not None
+    
+    # Reenvio do lote: as chaves conhecidas são respondidas sem consultar o banco
+    comandos = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: comandos.append(args[2]))
+    repetidos, criados = service.registrar_eventos([eventos[0], eventos[3]], cache)
+    assert [r['status'] for r in repetidos] == ['repetido', 'repetido']
+    assert repetidos[1]['checkin'] == resultados[3]['checkin']
+    assert criados == [] and comandos == []
+    
+    # Endpoints: a repetição pelo header volta do Redis com o mesmo checkin
+    monkeypatch.setattr(main, "redis_client", redis_memoria)
+    monkeypatch.setattr(main, "checkin_store", ColumnarCheckinStore(refresh_seconds=0))
+    monkeypatch.setattr(tasks.celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(tasks, "get_db_session", nova_sessao_sqlite)
+    
+    def get_db_teste():
+        yield db
+    main.app.dependency_overrides[get_db] = get_db_teste
+    try:
+        client = TestClient(main.app)
+        cabecalhos = {"Idempotency-Key": "c3:1"}
+        primeira = client.post("/aluno/checkin", json={"aluno_id": alunos[0].id}, headers=cabecalhos)
+        repetida = client.post("/aluno/checkin", json={"aluno_id": alunos[0].id}, headers=cabecalhos)
+        assert primeira.status_code == repetida.status_code == 200
+        assert primeira.json() == repetida.json()
+        
+        saida = {"aluno_id": alunos[0].id, "chave_idempotencia": "c3:2"}
+        assert client.post("/aluno/checkout", json=saida).json() == client.post("/aluno/checkout", json=saida).json()
+        
+        lote = client.post("/aluno/checkins/lote", json=[{"tipo": "entrada", "aluno_id": alunos[0].id, "chave_idempotencia": "c3:1"}])
+        assert lote.json()[0]["status"] == "repetido"
+        assert lote.json()[0]["checkin"]["id"] == primeira.json()["id"]
+    finally:
+        main.app.dependency_overrides.pop(get_db, None)
+    db.close()
+
+def test_journal_de_checkins_sobrevive_a_queda(tmp_path, sessao_sqlite):
+    """Testar o modo write-behind: confirmação antes do banco e regravação após uma queda"""
+    from sqlalchemy.orm import sessionmaker
+    from app.models.database import Aluno, Plano, Checkin, FeaturesAluno
+    from app.services.checkin_journal import CheckinJournal
+    
+    db = sessao_sqlite
+    sessoes = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    alunos = [Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=plano.id) for i in range(4)]
+    db.add_all(alunos)
+    db.commit()
+    
+    # Aceitos e em disco, sem nenhuma escrita no banco
+    journal = CheckinJournal(tmp_path, sessoes, flush_interval=3600)
+    journal.start()
+    # Outro processo (ou worker) no mesmo diretório é recusado
+    with pytest.raises(ValueError, match="em uso por outro processo"):
+        CheckinJournal(tmp_path, sessoes, flush_interval=3600).start()
+    registro, aceito = journal.aceitar(db, alunos[0].id, "catraca-1:1")
+    assert aceito and registro['chave'] == "catraca-1:1"
+    assert journal.aceitar(db, alunos[0].id, "catraca-1:1") == (registro, False)
+    journal.aceitar(db, alunos[1].id)
+    journal.aceitar(db, alunos[2].id)
+    with pytest.raises(ValueError, match="checkin ativo"):
+        journal.aceitar(db, alunos[1].id)
+    with pytest.raises(ValueError, match="não encontrado"):
+        journal.aceitar(db, 999)
+    assert db.query(Checkin).count() == 0
+    
+    # Queda: a thread para sem gravar, o processo solta a trava e a última linha fica pela metade
+    journal._parar.set()
+    journal._acordar.set()
+    journal._thread.join()
+    journal._liberar_trava()
+    segmento = next(tmp_path.glob("checkins-*.log"))
+    conteudo = segmento.read_text()
+    with open(segmento, "a") as arquivo:
+        arquivo.write('{"aluno_id": 4, "data_en')
+    
+    gravados = []
+    journal = CheckinJournal(tmp_path, sessoes, flush_interval=3600, ao_gravar=gravados.extend)
+    journal.start()
+    assert db.query(Checkin).count() == 3
+    assert len(gravados) == 3
+    assert db.query(Checkin).filter(Checkin.chave_entrada == "catraca-1:1").one().aluno_id == alunos[0].id
+    assert not segmento.exists()
+    
+    # Queda entre o commit e a remoção do segmento: a regravação não duplica nem recontabiliza
+    journal._parar.set()
+    journal._acordar.set()
+    journal._thread.join()
+    journal._liberar_trava()
+    (tmp_path / "checkins-000000000000.log").write_text(conteudo)
+    journal = CheckinJournal(tmp_path, sessoes, flush_interval=3600)
+    journal.start()
+    assert db.query(Checkin).count() == 3
+    features = db.query(FeaturesAluno).filter(FeaturesAluno.aluno_id == alunos[0].id).one()
+    db.refresh(features)
+    assert features.total_checkins == 1
+    
+    # Repetição de uma chave já gravada volta do banco; flush sob demanda antes da saída
+    original, aceito = journal.aceitar(db, alunos[0].id, "catraca-1:1")
+    assert not aceito and isinstance(original, Checkin)
+    journal.aceitar(db, alunos[3].id, "catraca-1:2")
+    assert journal.pendente(alunos[3].id)
+    assert journal.flush() == 1
+    assert not journal.pendente(alunos[3].id)
+    journal.shutdown()
+    assert db.query(Checkin).count() == 4
+    assert list(tmp_path.glob("checkins-*.log")) == []
+    db.close()
+
+def test_journal_de_checkins_rejeita_linha_recusada_pelo_banco(tmp_path):
+    """Testar que um checkin recusado de vez (aluno removido) não trava os segmentos seguintes"""
+    import json
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from app.models.database import Base, Aluno, Plano, Checkin
+    from app.monitoring.metrics import REGISTRY, parse_text
+    from app.services.checkin_journal import CheckinJournal
+    
+    engine = create_engine(f"sqlite:///{tmp_path / 'journal.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", lambda conexao, _: conexao.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=engine)
+    sessoes = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = sessoes()
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    alunos = [Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=plano.id) for i in range(3)]
+    db.add_all(alunos)
+    db.commit()
+    ids = [a.id for a in alunos]
+    
+    diretorio = tmp_path / "journal"
+    journal = CheckinJournal(diretorio, sessoes, flush_interval=3600)
+    journal.start()
+    
+    def rejeitados_total():
+        return parse_text(REGISTRY.render()).get(("gym_checkin_journal_rejected_total", ()), 0.0)
+    
+    antes = rejeitados_total()
+    journal.aceitar(db, ids[0], "catraca-1:1")
+    journal.aceitar(db, ids[1], "catraca-1:2")
+    # Aluno removido depois de aceito: a chave estrangeira recusa a linha no flush
+    db.delete(db.get(Aluno, ids[1]))
+    db.commit()
+    
+    assert journal.flush() == 1
+    assert not journal.pendente(ids[1])
+    # Só resta o segmento aberto, ainda vazio
+    assert [f.read_text() for f in diretorio.glob("checkins-*.log")] == [""]
+    rejeitados = [json.loads(l) for f in diretorio.glob("rejeitados-*.log") for l in f.read_text().splitlines()]
+    assert [r["chave"] for r in rejeitados] == ["catraca-1:2"] and "FOREIGN KEY" in rejeitados[0]["erro"]
+    assert rejeitados_total() - antes == 1
+    
+    # Os segmentos seguintes não ficam atrás do recusado
+    journal.aceitar(db, ids[2], "catraca-1:3")
+    assert journal.flush() == 1
+    assert sorted(c.chave_entrada for c in db.query(Checkin)) == ["catraca-1:1", "catraca-1:3"]
+    journal.shutdown()
+    db.close()
+
+def test_journal_de_checkins_fsync_em_grupo(tmp_path, monkeypatch):
+    """Testar que checkins simultâneos compartilham o mesmo fsync"""
+    import os
+    import threading
+    import time
+    from datetime import datetime
+    from app.services.checkin_journal import CheckinJournal
+    
+    journal = CheckinJournal(tmp_path, session_factory=lambda: None, flush_interval=3600)
+    journal.start()
+    fsync = os.fsync
+    chamadas = []
+    
+    def fsync_lento(descritor):
+        chamadas.append(descritor)
+        time.sleep(0.005)
+        fsync(descritor)
+    monkeypatch.setattr(os, "fsync", fsync_lento)
+    
+    resultados = []
+    def aceitar(aluno_id):
+        resultados.append(journal.append({'aluno_id': aluno_id, 'data_entrada': datetime.utcnow(), 'chave': f"c:{aluno_id}"}))
+    threads = [threading.Thread(target=aceitar, args=(i,)) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(resultados) == 50 and all(aceito for _, aceito in resultados)
+    assert len(chamadas) < 50
+    assert journal._duraveis == journal._escritos == 50
+    linhas = next(tmp_path.glob("checkins-*.log")).read_text().splitlines()
+    assert sorted(linhas) == sorted(set(linhas)) and len(linhas) == 50
+    journal._parar.set()
+    journal._acordar.set()
+    journal._liberar_trava()
+
+def test_gateway_de_catracas_por_websocket(monkeypatch, tmp_path, nova_sessao_sqlite, redis_memoria):
+    """Testar eventos em fluxo por WebSocket: ack em lote, reenvio idempotente, janela e conexões do pool"""
+    import main
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import QueuePool
+    from app.models.database import Base, Aluno, Plano, Checkin
+    from app.analytics.columnar import ColumnarCheckinStore
+    from app.workers import tasks
+    
+    # Pool de verdade: cada conexão em uso aparece em checkedout()
+    engine = create_engine(f"sqlite:///{tmp_path / 'catracas.db'}", connect_args={"check_same_thread": False},
+                           poolclass=QueuePool)
+    Base.metadata.create_all(bind=engine)
+    sessoes = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = sessoes()
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    alunos = [Aluno(nome=f"Aluno {i}", email=f"aluno{i}@email.com", plano_id=plano.id) for i in range(2)]
+    db.add_all(alunos)
+    db.commit()
+    ids = [a.id for a in alunos]
+    db.close()
+    
+    def checkins():
+        with sessoes() as sessao:
+            return sessao.query(Checkin).count()
+    
+    monkeypatch.setattr(main, "redis_client", redis_memoria)
+    monkeypatch.setattr(main, "checkin_store", ColumnarCheckinStore(refresh_seconds=0))
+    monkeypatch.setattr(tasks.celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(tasks, "get_db_session", nova_sessao_sqlite)
+    monkeypatch.setattr(main, "SessionLocal", sessoes)
+    
+    def receber_acks(ws, n):
+        resultados = {}
+        while len(resultados) < n:
+            ack = ws.receive_json()
+            assert ack["tipo"] == "ack"
+            resultados.update({r["seq"]: r for r in ack["resultados"]})
+        return resultados
+    
+    try:
+        client = TestClient(main.app)
+        with pytest.raises(WebSocketDisconnect) as fechamento:
+            with client.websocket_connect("/ws/catraca?dispositivo=cat-1") as ws:
+                ws.receive_json()
+        assert fechamento.value.code == 1008
+        
+        # Sem sessão, seq repetido após um reboot colidiria com as chaves antigas
+        with pytest.raises(WebSocketDisconnect) as fechamento:
+            with client.websocket_connect("/ws/catraca?dispositivo=cat-1&token=valid_token") as ws:
+                ws.receive_json()
+        assert fechamento.value.code == 1008
+        
+        url = "/ws/catraca?dispositivo=cat-1&sessao=boot-1&token=valid_token"
+        with client.websocket_connect(url) as ws:
+            assert ws.receive_json()["tipo"] == "pronto"
+            ws.send_json([
+                {"seq": 1, "tipo": "entrada", "aluno_id": ids[0]},
+                {"seq": 2, "tipo": "entrada", "aluno_id": ids[1]},
+                {"seq": 3, "tipo": "entrada", "aluno_id": 999},
+            ])
+            ws.send_json({"seq": 4, "tipo": "pausa", "aluno_id": ids[0]})
+            resultados = receber_acks(ws, 4)
+            # Entre lotes a catraca conectada não segura conexão do pool
+            assert engine.pool.checkedout() == 0
+            assert [resultados[s]["status"] for s in (1, 2, 3, 4)] == ["criado", "criado", "erro", "erro"]
+            assert resultados[3]["erro"] == "Aluno não encontrado"
+            ws.send_json({"seq": 5, "tipo": "saida", "aluno_id": ids[0]})
+            assert receber_acks(ws, 1)[5]["checkin_id"] == resultados[1]["checkin_id"]
+            assert engine.pool.checkedout() == 0
+        
+        # Reconexão: o reenvio sem ack devolve o resultado original pela chave "cat-1:boot-1:<seq>"
+        with client.websocket_connect(url) as ws:
+            ws.receive_json()
+            ws.send_json({"seq": 1, "tipo": "entrada", "aluno_id": ids[0]})
+            reenvio = receber_acks(ws, 1)[1]
+            assert reenvio["status"] == "repetido" and reenvio["checkin_id"] == resultados[1]["checkin_id"]
+        assert checkins() == 2
+        
+        # Reboot: mesma catraca, sessão nova e seq recomeçando em 1 gera checkins novos
+        with client.websocket_connect("/ws/catraca?dispositivo=cat-1&sessao=boot-2&token=valid_token") as ws:
+            ws.receive_json()
+            ws.send_json({"seq": 1, "tipo": "entrada", "aluno_id": ids[0]})
+            novo = receber_acks(ws, 1)[1]
+            assert novo["status"] == "criado" and novo["checkin_id"] != resultados[1]["checkin_id"]
+        assert checkins() == 3
+        
+        # Controle de fluxo: mais eventos sem ack do que a janela encerra a conexão
+        monkeypatch.setenv("INGEST_WINDOW", "2")
+        with pytest.raises(WebSocketDisconnect) as fechamento:
+            with client.websocket_connect(url) as ws:
+                assert ws.receive_json()["janela"] == 2
+                ws.send_json([{"seq": s, "tipo": "entrada", "aluno_id": ids[1]} for s in (10, 11, 12)])
+                ws.receive_json()
+        assert fechamento.value.code == 1008
+    finally:
+        engine.dispose()
+
+def test_stream_de_eventos_ao_vivo(monkeypatch, sessao_sqlite, redis_memoria):
+    """Testar publicação após o commit e fan-out com filtro, buffer limitado e heartbeat"""
+    import asyncio
+    import json
+    import main
+    from fastapi.testclient import TestClient
+    from app.models.database import Aluno, Plano, Checkin
+    from app.services.checkin_service import CheckinService
+    from app.services.eventos_ao_vivo import CHANNEL, OCUPACAO_KEY, eventos_ao_vivo
+    from app.api.transmissao_eventos import HubEventos
+    
+    redis = redis_memoria
+    monkeypatch.setattr(eventos_ao_vivo, "redis", redis)
+    canal = redis.pubsub()
+    canal.subscribe(CHANNEL)
+    
+    def mensagens():
+        recebidas = []
+        while not canal.fila.empty():
+            recebidas.extend(json.loads(canal.fila.get()["data"])["eventos"])
+        return recebidas
+    
+    db = sessao_sqlite
+    plano = Plano(nome="Mensal", valor=100.0, duracao_meses=1)
+    db.add(plano)
+    db.commit()
+    aluno = Aluno(nome="Aluno", email="aluno@email.com", plano_id=plano.id)
+    db.add(aluno)
+    db.commit()
+    assert mensagens() == []
+    
+    # Entrada e saída: uma mensagem por transação, com a ocupação resultante
+    service = CheckinService(db)
+    checkin, _ = service.registrar_entrada(aluno.id)
+    entrada = mensagens()
+    assert [e["tipo"] for e in entrada] == ["checkin", "ocupacao"]
+    assert entrada[0]["dados"]["checkin_id"] == checkin.id and entrada[1]["dados"] == {"presentes": 1}
+    service.registrar_saida_aluno(aluno.id)
+    assert [(e["tipo"], e["dados"].get("presentes")) for e in mensagens()] == [("checkout", None), ("ocupacao", 0)]
+    
+    # Transação desfeita não publica nada
+    db.add(Checkin(aluno_id=aluno.id))
+    db.flush()
+    db.rollback()
+    assert mensagens() == [] and redis.dados[OCUPACAO_KEY] == 0
+    db.close()
+    
+    async def proximo(stream):
+        return await asyncio.wait_for(stream.__anext__(), 2)
+    
+    async def esperar(condicao):
+        for _ in range(200):
+            if condicao():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("Evento não chegou ao assinante")
+    
+    async def cenario():
+        hub = HubEventos(buffer_size=2, heartbeat_seconds=0.05, max_clients=3)
+        hub.start(redis)
+        await esperar(lambda: len(redis.inscritos) == 2)
+        
+        todos = hub.assinar()
+        so_alertas = hub.assinar(["alerta_risco"])
+        lento = hub.assinar()
+        with pytest.raises(ValueError):
+            hub.assinar()
+        with pytest.raises(ValueError):
+            HubEventos().assinar(["pagamento"])
+        
+        stream = hub.stream(todos)
+        assert await proximo(stream) == b"retry: 5000\n\n"
+        eventos_ao_vivo.alertas([{"aluno_id": 1, "nome": "Aluno", "probabilidade": 0.9}], "alto")
+        eventos_ao_vivo.sincronizar_ocupacao(3)
+        recebido = b""
+        while b"event: ocupacao" not in recebido:
+            recebido += await proximo(stream)
+        assert recebido.count(b"event: alerta_risco") == 1 and b'{"presentes": 3}' in recebido
+        
+        # Sem eventos, o stream envia apenas o heartbeat
+        assert await proximo(stream) == b": ping\n\n"
+        
+        # Cliente lento: buffer de 2 eventos e só a ocupação mais recente
+        for nivel in ("alto", "medio", "alto"):
+            eventos_ao_vivo.alertas([], nivel)
+        eventos_ao_vivo.sincronizar_ocupacao(5)
+        await esperar(lambda: lento._ocupacao is not None and b"5" in lento._ocupacao)
+        pendente = lento.drenar().decode()
+        assert pendente.startswith('event: perdidos\ndata: {"eventos": 2}\n\n')
+        assert pendente.count("event: alerta_risco") == 2 and pendente.count("event: ocupacao") == 1
+        assert '"presentes": 5' in pendente
+        
+        assert b"ocupacao" not in so_alertas.drenar()
+        
+        # Ao desconectar, o assinante sai do hub; quem conecta recebe a ocupação atual
+        await stream.aclose()
+        assert todos not in hub._assinantes
+        assert b'{"presentes": 5}' in hub.assinar(["ocupacao"]).drenar()
+    
+    asyncio.run(cenario())
+    
+    client = TestClient(main.app)
+    assert client.get("/eventos/stream").status_code in (401, 403)
+    resposta = client.get("/eventos/stream?tipos=pagamento", headers={"Authorization": "Bearer valid_token"})
+    assert resposta.status_code == 400
+
+def test_entrega_de_alertas_de_retencao(tmp_path, redis_memoria):
+    """Testar lotes, retentativas, conexões reaproveitadas e deduplicação com webhook e SMTP locais"""
+    import json
+    import socketserver
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from app.services.alertas_retencao import EntregaAlertas, SinkWebhook, SinkSMTP, SinkArquivo
+    
+    lotes_http = []
+    conexoes_http = set()
+    
+    class _Webhook(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        falhas = 1
+        
+        def do_POST(self):
+            conexoes_http.add(self.client_address)
+            corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/recusar":
+                status = 400
+            elif _Webhook.falhas:
+                _Webhook.falhas -= 1
+                status = 503
+            else:
+                status = 200
+                lotes_http.append(corpo)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        
+        def log_message(self, *args):
+            pass
+    
+    emails = []
+    conexoes_smtp = []
+    
+    class _SMTP(socketserver.StreamRequestHandler):
+        falhas = 1
+        
+        def responder(self, linha):
+            self.wfile.write(linha.encode() + b"\r\n")
+        
+        def handle(self):
+            conexoes_smtp.append(self.client_address)
+            self.responder("220 local")
+            while linha := self.rfile.readline().decode():
+                comando = linha[:4].upper()
+                if comando == "DATA":
+                    self.responder("354 fim com .")
+                    corpo = []
+                    while (linha := self.rfile.readline().decode()) != ".\r\n":
+                        corpo.append(linha)
+                    if _SMTP.falhas:
+                        _SMTP.falhas -= 1
+                        self.responder("451 tente novamente")
+                    else:
+                        emails.append("".join(corpo))
+                        self.responder("250 ok")
+                elif comando == "QUIT":
+                    self.responder("221 tchau")
+                    return
+                else:
+                    self.responder("250 ok")
+    
+    http = ThreadingHTTPServer(("127.0.0.1", 0), _Webhook)
+    smtp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTP)
+    for servidor in (http, smtp):
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_address[1]}"
+    
+    redis = redis_memoria
+    arquivo = tmp_path / "alertas" / "retencao.ndjson"
+    entrega = EntregaAlertas([
+        SinkWebhook(url + "/alertas", batch_size=2, concorrencia=2),
+        SinkSMTP("127.0.0.1", smtp.server_address[1], destinatarios=["retencao@gym.local"], batch_size=3, concorrencia=1),
+        SinkArquivo(str(arquivo)),
+    ], redis, espera_base=0.01)
+    alunos = [{"aluno_id": i, "nome": f"Aluno {i}", "probabilidade": 0.9} for i in range(1, 6)]
+    
+    try:
+        # Aluno repetido na mesma análise conta uma vez; a primeira falha de cada destino é repetida
+        resumo = entrega.entregar(alunos + alunos[:1], "alto")
+        assert resumo == {destino: {"enviados": 5, "repetidos": 0, "falhas": 0} for destino in ("webhook", "smtp", "arquivo")}
+        assert sorted(len(lote["alertas"]) for lote in lotes_http) == [1, 2, 2]
+        assert sorted(a["aluno_id"] for lote in lotes_http for a in lote["alertas"]) == [1, 2, 3, 4, 5]
+        assert len(conexoes_http) <= 2
+        assert len(emails) == 2 and "Aluno 5 (ID: 5) - Probabilidade: 90.00%" in "".join(emails)
+        # 451 descarta a conexão; o e-mail seguinte reaproveita a nova
+        assert len(conexoes_smtp) == 2
+        linhas = [json.loads(l) for l in arquivo.read_text().splitlines()]
+        assert [l["aluno_id"] for l in linhas] == [1, 2, 3, 4, 5] and linhas[0]["nivel"] == "alto"
+        # Uma ida ao Redis para as reservas de cada destino e uma para as confirmações de cada lote
+        assert sorted(redis.pipelines) == sorted([5, 5, 5] + [2, 2, 1] + [3, 2] + [5])
+        
+        # Na próxima análise só o aluno novo é alertado; outro nível é outro alerta
+        lotes_http.clear()
+        novo = {"aluno_id": 6, "nome": "Aluno 6", "probabilidade": 0.8}
+        resumo = entrega.entregar(alunos + [novo], "alto")
+        assert resumo["webhook"] == {"enviados": 1, "repetidos": 5, "falhas": 0}
+        assert [a["aluno_id"] for lote in lotes_http for a in lote["alertas"]] == [6]
+        assert entrega.entregar(alunos[:1], "medio")["smtp"]["enviados"] == 1
+        
+        # Recusa (4xx) não é repetida; falha de conexão esgota as tentativas; ambas liberam a reserva
+        recusa = EntregaAlertas([SinkWebhook(url + "/recusar")], redis, espera_base=0.01)
+        assert recusa.entregar([novo], "medio")["webhook"] == {"enviados": 0, "repetidos": 0, "falhas": 1}
+        fora_do_ar = EntregaAlertas([SinkWebhook("http://127.0.0.1:9/alertas")], redis, max_tentativas=2, espera_base=0.01)
+        assert fora_do_ar.entregar([novo], "medio")["webhook"]["falhas"] == 1
+        assert "alerta:webhook:medio:6" not in redis.dados
+        assert "alerta:webhook:alto:6" in redis.dados
+    finally:
+        http.shutdown()
+        smtp.shutdown()
+        http.server_close()
+        smtp.server_close()
+
@@ -0,0 +1,68 @@
+# tests/test_startup.py
+from sqlalchemy import create_engine, text
+from scripts.benchmark_startup import parse_importtime, measure
+from scripts.migrate import migrate
+
+def test_parse_importtime():
+    """Testar a leitura da saída de python -X importtime"""
+    saida = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   json.decoder\n"
+        "import time:       300 |        420 |   json\n"
+        "import time:      1500 |       1920 | main\n"
+    )
+    assert parse_importtime(saida) == [
+        (1, "json.decoder", 0.12, 0.12), (1, "json", 0.3, 0.42), (0, "main", 1.5, 1.92)
+    ]
+
+def test_import_main_sem_stack_de_ml_e_celery():
+    """Testar que a API sobe sem importar scikit-learn, pandas, joblib e Celery"""
+    resultado = measure(runs=1)
+    assert resultado["proibidos"] == []
+    assert resultado["import_ms"] > 0
+    assert "fastapi" in resultado["diretos"]
+
+def test_migrate_cria_tabelas_e_aponta_colunas_ausentes():
+    """Testar a migração em um banco vazio e em um com tabela desatualizada"""
+    engine = create_engine("sqlite://")
+    resultado = migrate(engine)
+    assert {"planos", "alunos", "checkins", "features_aluno"} <= set(resultado["tabelas_criadas"])
+    assert migrate(engine) == {"tabelas_criadas": [], "colunas_adicionadas": {}, "colunas_ausentes": {}}
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE features_aluno (aluno_id INTEGER PRIMARY KEY)"))
+    resultado = migrate(engine)
+    assert "features_aluno" not in resultado["tabelas_criadas"]
+    assert "bitmap_presenca" in resultado["colunas_adicionadas"]["features_aluno"]
+    # NOT NULL sem default no banco não é adicionada automaticamente
+    assert "total_checkins" in resultado["colunas_ausentes"]["features_aluno"]
+
+def test_migrate_adiciona_chaves_de_idempotencia_ao_schema_original(tmp_path):
+    """Testar a atualização de um banco criado com o schema original de checkins"""
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'original.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE planos (id INTEGER PRIMARY KEY, nome VARCHAR NOT NULL, valor FLOAT NOT NULL, "
+                          "duracao_meses INTEGER NOT NULL, created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE alunos (id INTEGER PRIMARY KEY, nome VARCHAR NOT NULL, email VARCHAR NOT NULL, "
+                          "telefone VARCHAR, data_nascimento DATETIME, data_matricula DATETIME, "
+                          "plano_id INTEGER REFERENCES planos(id), ativo BOOLEAN, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE TABLE checkins (id INTEGER PRIMARY KEY, aluno_id INTEGER REFERENCES alunos(id), "
+                          "data_entrada DATETIME, data_saida DATETIME, duracao_minutos INTEGER, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO alunos (id, nome, email) VALUES (1, 'Ana', 'ana@email.com')"))
+        conn.execute(text("INSERT INTO checkins (aluno_id, data_entrada) VALUES (1, '2024-01-01 08:00:00')"))
+
+    resultado = migrate(engine)
+    assert resultado["colunas_adicionadas"] == {"checkins": ["chave_entrada", "chave_saida"]}
+    assert resultado["colunas_ausentes"] == {}
+    assert migrate(engine)["colunas_adicionadas"] == {}
+
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT chave_entrada FROM checkins")).scalar() is None
+        conn.execute(text("INSERT INTO checkins (aluno_id, chave_entrada) VALUES (1, 'catraca-1:a:1')"))
+    with pytest.raises(IntegrityError):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO checkins (aluno_id, chave_entrada) VALUES (1, 'catraca-1:a:1')"))